@@ -4,13 +4,17 @@ AGENT CONTROLLER
 Orquesta el flujo principal del sistema inteligente basado en LangChain.
 Gestiona la inicialización del agente, la ejecución del pipeline,
 la delegación de tareas y el control de estados del sistema.
+
+Cada llamada a run_pipeline crea un trabajo en el JobScheduler (ID propio,
+estado, resultado y error), con concurrencia acotada por clase de recurso.
+El trabajo ejecuta un PipelineDAG cuyas etapas guardan su salida en disco, de
+modo que un re-run solo repite las etapas cuyas entradas o código cambiaron.
 """
 
 from __future__ import annotations
-import threading
 import traceback
-from enum import Enum
-from typing import Optional, Dict, Any
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterable, List, Union
 import pandas as pd
 
 
@@ -18,29 +22,35 @@ from core.controller.data_manager import DataManager
 from core.controller.model_manager import ModelManager
 from core.controller.report_manager import ReportManager
 from core.heavy_modules.agents.autonomous_agent import AutonomousAgent
+from core.heavy_modules.agents.chain_manager import ChainManager
+from core.controller.job_scheduler import Job, JobCancelled, JobScheduler, JobState
+from core.controller.pipeline_dag import PipelineDAG, Stage, source_version
+from core.heavy_modules.analytics.statistical_summary import generate_histograms
+from core.heavy_modules.reporting.report_builder import ReportBuilder
+from core.utils.data_cleaner import clean_dataframe
+from core.utils.prompt_builder import BuilderPrompt
 
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced, tracer
 logger = init_logger("AgentController")
 
 
-class AgentState(Enum):
-    """Estados posibles del agente."""
-    IDLE = "idle"
-    RUNNING = "running"
-    TRAINING = "training"
-    ERROR = "error"
+# Los estados del agente son los mismos que los de sus trabajos
+# (IDLE/RUNNING/TRAINING/ERROR + QUEUED/CANCELLED/DONE)
+AgentState = JobState
 
 
 class AgentController:
     """Controlador principal del sistema autónomo."""
 
-    def __init__(self):
+    def __init__(self, max_jobs: int = 4, max_queue: int = 100, resources: Optional[Dict[str, int]] = None):
         self.state = AgentState.IDLE
         self.agent: Optional[AutonomousAgent] = None
         self.data_manager = DataManager()
         self.model_manager = ModelManager()
         self.report_manager = ReportManager()
-        self.current_thread: Optional[threading.Thread] = None
+        self.scheduler = JobScheduler(max_workers=max_jobs, max_queue=max_queue, resources=resources)
+        self.pipeline = self._build_pipeline()
 
     # -------------------------------------------------------------------------
     # Inicialización
@@ -60,52 +70,129 @@ class AgentController:
     # -------------------------------------------------------------------------
     # Ejecución del pipeline principal
     # -------------------------------------------------------------------------
-    def run_pipeline(self, file_path: str) -> None:
+    def _build_pipeline(self) -> PipelineDAG:
         """
-        Ejecuta el flujo completo:
-        1. Carga y validación del dataset
-        2. Limpieza y análisis
-        3. Fine-tuning y evaluación
-        4. Generación de reporte
+        DAG del flujo principal. Los gráficos, el análisis LLM y el fine-tuning
+        dependen solo de los datos limpios y corren en paralelo; el reporte
+        combina datos, hallazgos y gráficos. La versión de cada etapa incluye el
+        código del que depende (p. ej. cambiar ReportBuilder solo rehace el reporte);
+        el análisis depende además de la huella del modelo (parámetro `model`).
         """
-        def _pipeline():
-            try:
-                self.state = AgentState.RUNNING
-                log_info(logger,f"Inicio del pipeline con archivo: {file_path}")
-
-                # 1. Cargar y limpiar datos
-                df = self.data_manager.load_data(file_path)
-                df = self.data_manager.clean_data(df)
-                self.data_manager.validate_structure(df)
-
-                # 2. Análisis inteligente (LangChain)
-                insights = self.agent.analyze_data(df)
+        return PipelineDAG([
+            Stage("clean", self._stage_clean, inputs=("file_path",), resource="cpu",
+                  version=source_version(clean_dataframe)),
+            Stage("charts", self._stage_charts, inputs=("clean",), resource="cpu", workdir=True,
+                  version=source_version(generate_histograms)),
+            Stage("analysis", self._stage_analysis, inputs=("clean", "model"), resource="llm",
+                  version=source_version(AutonomousAgent.analyze_data, ChainManager, BuilderPrompt)),
+            Stage("fine_tune", self._stage_fine_tune, inputs=("clean",), resource="training",
+                  state=AgentState.TRAINING),
+            Stage("report", self._stage_report, inputs=("clean", "analysis", "charts"), resource="cpu",
+                  version=source_version(ReportBuilder, ReportManager.generate_report)),
+        ], max_workers=3)
+
+    # --- Etapas del pipeline ---
+    def _stage_clean(self, file_path: str) -> pd.DataFrame:
+        df = self.data_manager.load_data(file_path)
+        df = self.data_manager.clean_data(df, inplace=True)
+        self.data_manager.validate_structure(df)
+        return df
+
+    def _stage_charts(self, clean: pd.DataFrame, workdir: Path) -> List[str]:
+        # Un directorio por huella: datasets con columnas de igual nombre no comparten imágenes
+        return generate_histograms(clean, output_dir=str(workdir))
+
+    def _stage_analysis(self, clean: pd.DataFrame, model: str) -> Any:
+        # `model` solo entra en la huella: otro checkpoint invalida el análisis cacheado
+        return self.agent.analyze_data(clean)
+
+    def _analysis_model(self) -> str:
+        """Huella del modelo GGUF que usa el agente (ver model_file_digest)."""
+        chain_manager = getattr(self.agent, "chain_manager", None)
+        return getattr(chain_manager, "model_digest", None) or "sin-modelo"
+
+    def _stage_fine_tune(self, clean: pd.DataFrame) -> Dict[str, Any]:
+        self.model_manager.fine_tune(clean, epochs=3)
+        return {"version": self.model_manager.current_version}
+
+    def _stage_report(self, clean: pd.DataFrame, analysis: Any, charts: List[str]) -> Dict[str, Any]:
+        sections = analysis if isinstance(analysis, dict) else {"Hallazgos del análisis": str(analysis)}
+        # Reporte nuevo por ejecución: los gráficos no se acumulan entre trabajos
+        return self.report_manager.generate_report(clean, sections, charts=list(charts))
+
+    def _pipeline(self, job: Job, file_path: str, force: Union[bool, Iterable[str]] = ()) -> Dict[str, Any]:
+        """Ejecuta el DAG para un dataset; las etapas sin cambios se reutilizan del caché."""
+        try:
+            log_info(logger,f"[{job.job_id}] Inicio del pipeline con archivo: {file_path}")
+            # Los spans del trabajo llevan su ID: la traza exportada no mezcla otros trabajos
+            params = {"file_path": file_path, "model": self._analysis_model()}
+            with tracer.bind(job.job_id):
+                run = self.pipeline.run(params, job=job, force=force, targets=("analysis", "report", "fine_tune"))
+            report = run.outputs["report"]
+            log_info(logger,f"[{job.job_id}] Reporte generado (etapas reutilizadas: {run.cached}).")
 
-                # 3. Fine-tuning (si aplica)
-                self.state = AgentState.TRAINING
-                self.model_manager.fine_tune("data/datasets/processed/", epochs=3)
+            self.state = AgentState.IDLE
+            return {
+                "file_path": file_path,
+                "insights": run.outputs["analysis"],
+                "report_path": report,
+                "model_version": run.outputs["fine_tune"].get("version"),
+                "executed": run.executed,
+                "cached": run.cached,
+                "trace": self._export_trace(f"pipeline_{job.job_id}", job.job_id),
+            }
+
+        except JobCancelled:
+            raise
+        except Exception as e:
+            log_error(logger,f"[{job.job_id}] Error en el pipeline: {e}")
+            self.state = AgentState.ERROR
+            raise
 
-                # 4. Generar reporte final
-                self.state = AgentState.RUNNING
-                report_path = self.report_manager.generate_report(df, insights)
-                log_info(logger,f"Reporte generado: {report_path}")
+    def _export_trace(self, prefix: str, trace_id: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """
+        Con la instrumentación activa, exporta la traza (JSONL + Chrome trace) y
+        resume los spans más costosos. Con `trace_id`, solo los spans de ese trabajo.
+        """
+        if not tracer.enabled:
+            return None
+        paths = tracer.export(prefix=prefix, trace_id=trace_id)
+        top = ", ".join(f"{e['name']} {e['wall_ms'] / 1000:.2f}s" for e in tracer.summary(trace_id)[:5])
+        log_info(logger,f"Traza exportada a {paths['chrome']} (mayor tiempo: {top})")
+        return paths
+
+    def run_pipeline(self, file_path: str, force: Union[bool, Iterable[str]] = ()) -> str:
+        """
+        Encola el flujo completo y retorna el ID del trabajo:
+        1. Carga, limpieza y validación del dataset
+        2. Gráficos, análisis LLM y fine-tuning (en paralelo)
+        3. Generación de reporte
+        `force` re-ejecuta las etapas indicadas (o todas con True) aunque su
+        artefacto esté vigente. El resultado se obtiene con get_job_result(job_id).
+        """
+        if self.agent is None:
+            log_error(logger,"El agente no está inicializado; ejecute initialize_agent() primero.")
+        job_id = self.scheduler.submit(self._pipeline, file_path, force, name=f"pipeline:{file_path}")
+        log_info(logger,f"Pipeline encolado como trabajo {job_id}")
+        return job_id
 
-                self.state = AgentState.IDLE
-                log_info(logger,"Pipeline completado correctamente.")
+    def get_job_status(self, job_id: str) -> Dict[str, Any]:
+        return self.scheduler.status(job_id)
 
-            except Exception as e:
-                log_error(logger,f"Error en el pipeline: {e}")
-                self.state = AgentState.ERROR
-                traceback.print_exc()
+    def get_job_result(self, job_id: str, timeout: Optional[float] = None) -> Any:
+        """Espera el trabajo y retorna su resultado (RuntimeError si falló o fue cancelado)."""
+        return self.scheduler.result(job_id, timeout=timeout)
 
-        # Ejecutar el pipeline en hilo separado
-        self.current_thread = threading.Thread(target=_pipeline, daemon=True)
+    def cancel_job(self, job_id: str) -> bool:
+        return self.scheduler.cancel(job_id)
 
-        self.current_thread.start()
+    def list_jobs(self) -> List[Dict[str, Any]]:
+        return self.scheduler.list_jobs()
 
     # -------------------------------------------------------------------------
     # Delegación de tareas
     # -------------------------------------------------------------------------
+    @traced("AgentController.delegate_task", "controller")
     def delegate_task(self, task_name: str, params: Dict[str, Any]) -> Any:
         """Delegar tareas específicas a los módulos correspondientes."""
         log_info(logger,f"Delegando tarea: {task_name}")
@@ -127,13 +214,29 @@ class AgentController:
     # Monitoreo y estado
     # -------------------------------------------------------------------------
     def monitor_progress(self) -> str:
-        """Devuelve el estado actual del agente."""
-        return f"Estado actual del agente: {self.state.value}"
+        """Devuelve el estado actual del agente y el de cada trabajo."""
+        lines = [f"Estado actual del agente: {self.get_agent_state().value}"]
+        for job in self.scheduler.list_jobs():
+            phase = f" ({job['phase']})" if job["phase"] and job["state"] in ("running", "training") else ""
+            error = f" — {job['error']}" if job["error"] else ""
+            lines.append(f"- {job['job_id']} {job['name']}: {job['state']}{phase}{error}")
+        return "\n".join(lines)
 
     def get_agent_state(self) -> AgentState:
-        """Obtiene el estado actual del agente."""
+        """
+        Estado agregado: TRAINING o RUNNING si algún trabajo está en esa fase,
+        QUEUED si solo hay trabajos en cola; si no, el estado propio del agente.
+        """
+        states = {job["state"] for job in self.scheduler.list_jobs()}
+        for state in (AgentState.TRAINING, AgentState.RUNNING, AgentState.QUEUED):
+            if state.value in states:
+                return state
         return self.state
 
+    def shutdown(self, wait: bool = True) -> None:
+        """Cancela los trabajos en cola y detiene el scheduler."""
+        self.scheduler.shutdown(wait=wait, cancel_pending=True)
+
     # -------------------------------------------------------------------------
     # Reinicio y limpieza
     # -------------------------------------------------------------------------
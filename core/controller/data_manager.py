@@ -1,19 +1,24 @@
 # core/controller/data_manager.py
 
+import codecs
 import json
 from pathlib import Path
-from typing import Tuple
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 from jsonschema import ValidationError
 
 from core.utils.data_cleaner import (
-    remove_nulls,
-    remove_duplicates,
     normalize_columns,
-    detect_noise,
+    clean_dataframe,
+    fill_nulls_with,
+    filter_zscore,
     save_clean_data
 )
+from core.utils.column_inspector import ColumnProfile, apply_dtype_hints
 from core.utils.logger import init_logger, log_info, log_warning, log_error
+from core.utils.tracer import traced
+from core.heavy_modules.analytics.stats_engine import NumericStats, StatsAccumulator, compute_numeric_stats
 
 # Inicializar logger central
 logger = init_logger("DataManager")
@@ -22,6 +27,26 @@ logger = init_logger("DataManager")
 PROCESSED_DIR = Path("data/datasets/processed/")
 PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
+# Encodings soportados para CSV, en orden de preferencia
+CSV_ENCODINGS = ("utf-8", "latin-1", "cp1252")
+
+# Tamaño por defecto de los bloques en modo streaming (filas)
+DEFAULT_CHUNKSIZE = 100_000
+
+# Formato columnar por defecto para datos procesados (conserva dtypes)
+PROCESSED_FORMAT = "parquet"
+
+# Extensiones reconocidas por tipo de archivo
+FILE_TYPES = {
+    ".csv": "csv",
+    ".xlsx": "excel",
+    ".xls": "excel",
+    ".parquet": "parquet",
+    ".feather": "feather",
+    ".arrow": "feather",
+}
+COLUMNAR_TYPES = ("parquet", "feather")
+
 
 class DataManager:
     """
@@ -32,52 +57,174 @@ class DataManager:
     def __init__(self, schema_path: str = "config/data_schema.json"):
         self.schema_path = Path(schema_path)
         self.processed_dir = PROCESSED_DIR
+        self.last_cleaning_report: Optional[dict] = None
 
     # ---------------------------------------------------------------
     # 1. Detectar tipo de archivo
     # ---------------------------------------------------------------
     def detect_file_type(self, file_path: str) -> str:
-        if file_path.endswith(".csv"):
-            return "csv"
-        elif file_path.endswith(".xlsx") or file_path.endswith(".xls"):
-            return "excel"
-        else:
-            raise ValueError("Tipo de archivo no soportado. Solo CSV o Excel.")
+        file_type = FILE_TYPES.get(Path(file_path).suffix.lower())
+        if file_type is None:
+            raise ValueError("Tipo de archivo no soportado. Solo CSV, Excel, Parquet o Feather/Arrow.")
+        return file_type
 
     # ---------------------------------------------------------------
     # 2. Cargar datos
     # ---------------------------------------------------------------
-    def load_data(self, file_path: str) -> pd.DataFrame:
-        """Carga un dataset CSV o Excel intentando distintos encodings si es CSV"""
+    def detect_encoding(self, file_path: str, sample_bytes: int = 1024 * 1024) -> str:
+        """
+        Detecta el encoding de un CSV leyendo solo un prefijo del archivo.
+        Evita releer el archivo completo por cada encoding candidato.
+        """
+        with open(file_path, "rb") as f:
+            sample = f.read(sample_bytes)
+
+        for enc in CSV_ENCODINGS:
+            try:
+                # final=False: un carácter multibyte cortado al final del prefijo no es error
+                codecs.getincrementaldecoder(enc)().decode(sample, final=False)
+                log_info(logger, f"Encoding detectado para {Path(file_path).name}: '{enc}'")
+                return enc
+            except UnicodeDecodeError:
+                log_info(logger, f"Prefijo no válido en encoding '{enc}', probando siguiente...")
+        raise ValueError("No se pudo decodificar el archivo con encodings probados.")
+
+    def _read_csv(self, file_path: str, **kwargs):
+        """read_csv con el encoding detectado; si el prefijo engañó, un único reintento en latin-1."""
+        enc = self.detect_encoding(file_path)
+        try:
+            return pd.read_csv(file_path, encoding=enc, **kwargs), enc
+        except UnicodeDecodeError:
+            log_warning(logger, f"Bytes inválidos para '{enc}' fuera del prefijo; se usa 'latin-1'.")
+            return pd.read_csv(file_path, encoding="latin-1", **kwargs), "latin-1"
+
+    def _read_csv_chunks(self, file_path: str, chunksize: int, **kwargs) -> Iterator[pd.DataFrame]:
+        """
+        read_csv por bloques con el mismo reintento que _read_csv. El lector es
+        perezoso: un byte inválido fuera del prefijo aparece recién al iterar, y
+        entonces se relee en latin-1 descartando las filas ya entregadas.
+        """
+        reader, enc = self._read_csv(file_path, chunksize=chunksize, **kwargs)
+        log_info(logger, f"Lectura por bloques con encoding '{enc}'")
+        delivered = 0
+        try:
+            with reader:
+                for chunk in reader:
+                    delivered += len(chunk)
+                    yield chunk
+            return
+        except UnicodeDecodeError:
+            log_warning(logger, f"Bytes inválidos para '{enc}' tras {delivered} filas; se continúa en 'latin-1'.")
+
+        with pd.read_csv(file_path, encoding="latin-1", chunksize=chunksize, **kwargs) as reader:
+            for chunk in reader:
+                if delivered >= len(chunk):
+                    delivered -= len(chunk)
+                    continue
+                yield chunk.iloc[delivered:]
+                delivered = 0
+
+    def _columnar_dataset(self, file_path: str, file_type: str):
+        """Dataset de pyarrow sobre un archivo Parquet o Feather/Arrow IPC."""
+        import pyarrow.dataset as ds
+        return ds.dataset(file_path, format="parquet" if file_type == "parquet" else "feather")
+
+    def _filter_expression(self, filters):
+        """Convierte filtros estilo pandas/pyarrow ([("col", ">", 5), ...]) en una expresión."""
+        if filters is None:
+            return None
+        import pyarrow.parquet as pq
+        return pq.filters_to_expression(filters)
+
+    @traced("DataManager.load_data", "data")
+    def load_data(self, file_path: str, dtype: Optional[dict] = None,
+                  usecols: Optional[List[str]] = None, filters: Optional[list] = None,
+                  profile: Optional[ColumnProfile] = None) -> pd.DataFrame:
+        """
+        Carga un dataset CSV, Excel, Parquet o Feather/Arrow.
+        - CSV: el encoding se detecta una sola vez sobre un prefijo del archivo.
+        - Parquet/Feather: solo se leen las columnas de `usecols` y las filas que
+          cumplen `filters` (p. ej. [("edad", ">=", 18)]); los dtypes se conservan.
+        dtype/usecols son pistas opcionales; `filters` solo aplica a formatos columnares.
+        `profile` (column_inspector.profile_columns de una carga anterior) aporta
+        dtypes detectados: categóricas se leen directo como category (CSV/Excel) y
+        números/fechas guardados como texto se convierten. `dtype` tiene prioridad.
+        """
         file_type = self.detect_file_type(file_path)
         log_info(logger, f"Cargando dataset desde {file_path} ({file_type})")
 
+        if filters is not None and file_type not in COLUMNAR_TYPES:
+            raise ValueError("Los filtros solo están soportados para archivos Parquet o Feather/Arrow.")
+
+        hints = {}
+        if profile is not None:
+            hints = {col: hint for col, hint in profile.dtype_hints.items()
+                     if col not in (dtype or {}) and (usecols is None or col in usecols)}
+            if hints and file_type not in COLUMNAR_TYPES:
+                # category se aplica al parsear (sin pasar por object)
+                dtype = {**{col: hint for col, hint in hints.items() if hint == "category"}, **(dtype or {})}
+
         try:
             if file_type == "csv":
-                # Intentar distintos encodings en orden
-                for enc in ("utf-8", "latin-1", "cp1252"):
-                    try:
-                        df = pd.read_csv(file_path, encoding=enc)
-                        log_info(logger, f"Archivo CSV cargado con encoding '{enc}'")
-                        break
-                    except UnicodeDecodeError:
-                        log_info(logger, f"Fallo con encoding '{enc}', intentando siguiente...")
-                else:
-                    raise UnicodeDecodeError("No se pudo decodificar el archivo con encodings probados.")
+                df, enc = self._read_csv(file_path, dtype=dtype, usecols=usecols)
+                log_info(logger, f"Archivo CSV cargado con encoding '{enc}'")
+            elif file_type in COLUMNAR_TYPES:
+                table = self._columnar_dataset(file_path, file_type).to_table(
+                    columns=usecols, filter=self._filter_expression(filters)
+                )
+                df = table.to_pandas()
+                if dtype:
+                    df = df.astype(dtype)
+                log_info(logger, f"Archivo {file_type} cargado: {table.num_rows} filas, {table.num_columns} columnas")
             else:
                 # Para Excel no se suele necesitar cambio de encoding
-                df = pd.read_excel(file_path)
+                df = pd.read_excel(file_path, dtype=dtype, usecols=usecols)
                 log_info(logger, "Archivo Excel cargado correctamente")
+            if hints:
+                df = apply_dtype_hints(df, hints)
+                log_info(logger, f"Pistas de tipo del perfil aplicadas a {len(hints)} columnas")
         except Exception as e:
             log_error(logger, f"Error al cargar el archivo: {e}")
             raise RuntimeError(f"No se pudo cargar el archivo: {e}")
 
         return df
 
+    def load_data_chunks(self, file_path: str, chunksize: int = DEFAULT_CHUNKSIZE,
+                         dtype: Optional[dict] = None, usecols: Optional[List[str]] = None,
+                         filters: Optional[list] = None) -> Iterator[pd.DataFrame]:
+        """
+        Modo streaming: produce DataFrames de hasta `chunksize` filas sin cargar
+        el archivo completo en memoria. Excel no admite lectura parcial, así que
+        se carga una vez y se entrega por bloques. `filters` solo aplica a
+        formatos columnares.
+        """
+        file_type = self.detect_file_type(file_path)
+        log_info(logger, f"Cargando dataset por bloques desde {file_path} ({file_type}, {chunksize} filas)")
+
+        try:
+            if file_type == "csv":
+                yield from self._read_csv_chunks(file_path, chunksize, dtype=dtype, usecols=usecols)
+            elif file_type in COLUMNAR_TYPES:
+                batches = self._columnar_dataset(file_path, file_type).to_batches(
+                    columns=usecols, filter=self._filter_expression(filters), batch_size=chunksize
+                )
+                for batch in batches:
+                    if batch.num_rows:
+                        chunk = batch.to_pandas()
+                        yield chunk.astype(dtype) if dtype else chunk
+            else:
+                df = pd.read_excel(file_path, dtype=dtype, usecols=usecols)
+                for start in range(0, len(df), chunksize):
+                    yield df.iloc[start:start + chunksize]
+        except Exception as e:
+            log_error(logger, f"Error al cargar el archivo por bloques: {e}")
+            raise RuntimeError(f"No se pudo cargar el archivo: {e}")
+
 
     # ---------------------------------------------------------------
     # 3. Validación de estructura
     # ---------------------------------------------------------------
+    @traced("DataManager.validate_structure", "data")
     def validate_structure(self, df: pd.DataFrame) -> bool:
         try:
             if not self.schema_path.exists():
@@ -102,16 +249,101 @@ class DataManager:
     # ---------------------------------------------------------------
     # 4. Limpieza y preprocesamiento
     # ---------------------------------------------------------------
-    def clean_data(self, df: pd.DataFrame, fill_strategy="mean", remove_outliers=True) -> pd.DataFrame:
+    @traced("DataManager.clean_data", "data")
+    def clean_data(self, df: pd.DataFrame, fill_strategy="mean", remove_outliers=True,
+                   optimize_dtypes=True, track_memory=False,
+                   memory_budget_mb: Optional[float] = None, inplace: bool = False) -> pd.DataFrame:
+        """
+        Limpieza columna por columna (ver data_cleaner.clean_dataframe): rellena
+        nulos, reduce dtypes (downcast sin pérdida y categóricas), elimina
+        duplicados y outliers con una única copia final. El reporte de la última
+        limpieza (filas, memoria y duración por paso) queda en self.last_cleaning_report.
+
+        Por defecto se limpia una copia y `df` no cambia. Con inplace=True se
+        evita esa copia, pero `df` queda modificado (columnas renombradas, nulos
+        rellenados, dtypes reducidos a int8/category...): usarlo solo si quien
+        llama no vuelve a usar `df`.
+        """
         log_info(logger, "Iniciando limpieza de datos...")
-        df = normalize_columns(df)
-        df = remove_nulls(df, strategy=fill_strategy)
-        df = remove_duplicates(df)
-        if remove_outliers:
-            df = detect_noise(df)
-        log_info(logger, "Limpieza completada.")
+        df, report = clean_dataframe(
+            df if inplace else df.copy(),
+            fill_strategy=fill_strategy,
+            remove_outliers=remove_outliers,
+            optimize_dtypes=optimize_dtypes,
+            track_memory=track_memory,
+            memory_budget_mb=memory_budget_mb
+        )
+        self.last_cleaning_report = report
+
+        if report.get("over_budget"):
+            log_warning(
+                logger,
+                f"El dataset ({report['frame_mb_optimized']} MB tras optimizar) excede el presupuesto de "
+                f"{memory_budget_mb} MB; considere clean_data_chunked."
+            )
+        if track_memory:
+            for step in report["steps"]:
+                log_info(logger, f"  {step['step']}: {step['seconds']}s, pico {step['peak_mb']} MB")
+        log_info(logger, f"Limpieza completada: {report['rows_in']} -> {report['rows_out']} filas.")
         return df
 
+    @traced("DataManager.clean_data_chunked", "data")
+    def clean_data_chunked(self, file_path: str, chunksize: int = DEFAULT_CHUNKSIZE, fill_strategy="mean",
+                           remove_outliers=True, z_thresh=3, dtype: Optional[dict] = None,
+                           usecols: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+        """
+        Versión por bloques de clean_data para archivos que no caben en memoria.
+
+        1ª pasada: estadísticas globales combinables (StatsAccumulator).
+        2ª pasada: normaliza, rellena nulos con los valores globales, elimina
+        duplicados entre bloques (hash de fila) y filtra outliers con el z-score global.
+        """
+        log_info(logger, "Iniciando limpieza por bloques (1ª pasada: estadísticas globales)...")
+        accumulator = StatsAccumulator()
+        for chunk in self.load_data_chunks(file_path, chunksize=chunksize, dtype=dtype, usecols=usecols):
+            accumulator.update(normalize_columns(chunk))
+        stats = accumulator.result()
+
+        fill_values = dict(zip(stats.columns, stats.median if fill_strategy == "median" else stats.mean))
+        # z-score con ddof=0 (como scipy.stats.zscore) sobre la columna ya rellenada:
+        # los k nulos rellenados son un grupo de varianza 0 en el valor de relleno y
+        # se fusionan con (count, mean, M2) como en StatsAccumulator. Rellenar con la
+        # mediana mueve la media y suma k·n/(n+k)·(mediana − media)² a M2.
+        means, stds = {}, {}
+        for i, col in enumerate(stats.columns):
+            n, k, mean = float(stats.count[i]), float(stats.null_count[i]), float(stats.mean[i])
+            m2 = float(stats.std[i]) ** 2 * (n - 1) if n > 1 else 0.0
+            if fill_strategy in ("mean", "median") and n and k:
+                delta = float(fill_values[col]) - mean
+                mean += delta * k / (n + k)
+                m2 += delta ** 2 * n * k / (n + k)
+                n += k
+            means[col] = mean
+            stds[col] = float(np.sqrt(m2 / n)) if stats.count[i] > 1 else np.nan
+
+        log_info(logger, "Limpieza por bloques (2ª pasada)...")
+        seen_hashes = np.array([], dtype=np.uint64)
+        rows_in = rows_out = 0
+        for chunk in self.load_data_chunks(file_path, chunksize=chunksize, dtype=dtype, usecols=usecols):
+            rows_in += len(chunk)
+            chunk = normalize_columns(chunk)
+            if fill_strategy in ("mean", "median"):
+                chunk = fill_nulls_with(chunk, fill_values)
+
+            # Duplicados dentro del bloque y contra los bloques anteriores
+            hashes = pd.util.hash_pandas_object(chunk, index=False).to_numpy()
+            keep = ~pd.Series(hashes).duplicated().to_numpy() & ~np.isin(hashes, seen_hashes)
+            seen_hashes = np.union1d(seen_hashes, hashes[keep])
+            chunk = chunk[keep]
+
+            if remove_outliers:
+                chunk = filter_zscore(chunk, means, stds, z_thresh=z_thresh)
+
+            rows_out += len(chunk)
+            yield chunk
+
+        log_info(logger, f"Limpieza por bloques completada: {rows_in} filas leídas, {rows_out} conservadas.")
+
     # ---------------------------------------------------------------
     # 5. División de datos
     # ---------------------------------------------------------------
@@ -127,21 +359,82 @@ class DataManager:
     # ---------------------------------------------------------------
     # 6. Guardado de datos procesados
     # ---------------------------------------------------------------
-    def save_processed(self, df: pd.DataFrame, filename: str = "processed_data.csv") -> str:
+    @traced("DataManager.save_processed", "data")
+    def save_processed(self, df: pd.DataFrame, filename: str = f"processed_data.{PROCESSED_FORMAT}") -> str:
+        """Guarda el dataset procesado; el formato sale de la extensión (Parquet por defecto)."""
         output_path = self.processed_dir / filename
         save_clean_data(df, output_path)
         log_info(logger, f"Datos procesados guardados en: {output_path}")
         return str(output_path)
 
+    def list_processed_files(self, directory: Optional[Path] = None) -> List[Path]:
+        """
+        Archivos procesados legibles por load_data. Si un mismo dataset existe en
+        formato columnar y en texto/Excel (p. ej. de ejecuciones anteriores), se
+        usa solo la versión columnar para no cargarlo dos veces. La versión
+        columnar puede llevar la extensión original en el nombre
+        (ventas.csv.parquet sustituye a ventas.csv).
+        """
+        directory = Path(directory or self.processed_dir)
+        paths = [p for p in sorted(directory.glob("*.*")) if p.suffix.lower() in FILE_TYPES]
+        columnar = {p.stem for p in paths if FILE_TYPES[p.suffix.lower()] in COLUMNAR_TYPES}
+        return [p for p in paths
+                if FILE_TYPES[p.suffix.lower()] in COLUMNAR_TYPES or not {p.stem, p.name} & columnar]
+
     # ---------------------------------------------------------------
     # 7. Resumen del dataset
     # ---------------------------------------------------------------
-    def summarize_dataset(self, df: pd.DataFrame) -> dict:
+    @traced("DataManager.summarize_dataset", "data")
+    def summarize_dataset(self, df: pd.DataFrame, stats: NumericStats = None) -> dict:
+        """
+        Resumen del dataset. Las columnas numéricas salen del motor de estadísticas
+        (se puede pasar un NumericStats ya calculado); las demás, de describe().
+        """
+        stats = stats or compute_numeric_stats(df)
+        summary_stats = stats.to_frame().drop(columns=["median"]).to_dict(orient="index")
+
+        other_cols = [col for col in df.columns if col not in set(stats.columns)]
+        if other_cols:
+            summary_stats.update(df[other_cols].describe(include="all").to_dict())
+
         summary = {
             "rows": len(df),
             "columns": list(df.columns),
             "missing_values": df.isnull().sum().to_dict(),
-            "summary_stats": df.describe(include="all").to_dict()
+            "summary_stats": {col: summary_stats[col] for col in df.columns if col in summary_stats}
         }
         log_info(logger, "Resumen del dataset generado.")
         return summary
+
+    @traced("DataManager.summarize_dataset_chunked", "data")
+    def summarize_dataset_chunked(self, chunks) -> dict:
+        """
+        Resumen equivalente a summarize_dataset a partir de un iterable de bloques
+        (p. ej. load_data_chunks). Combina resultados parciales sin concatenar el dataset.
+        """
+        accumulator = StatsAccumulator()
+        rows = 0
+        columns: List[str] = []
+        missing = pd.Series(dtype=float)
+        non_null = pd.Series(dtype=float)
+
+        for chunk in chunks:
+            rows += len(chunk)
+            columns.extend(col for col in chunk.columns if col not in columns)
+            missing = missing.add(chunk.isnull().sum(), fill_value=0)
+            non_null = non_null.add(chunk.notnull().sum(), fill_value=0)
+            accumulator.update(chunk)
+
+        stats = accumulator.result()
+        summary_stats = stats.to_frame().drop(columns=["median"]).to_dict(orient="index")
+        for col in columns:
+            summary_stats.setdefault(col, {"count": float(non_null.get(col, 0))})
+
+        summary = {
+            "rows": rows,
+            "columns": columns,
+            "missing_values": {col: int(missing.get(col, 0)) for col in columns},
+            "summary_stats": {col: summary_stats[col] for col in columns}
+        }
+        log_info(logger, f"Resumen por bloques generado ({accumulator.n_chunks} bloques).")
+        return summary
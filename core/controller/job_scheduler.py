@@ -0,0 +1,260 @@
+# core/controller/job_scheduler.py
+
+import os
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+
+logger = init_logger("JobScheduler")
+
+
+class JobState(Enum):
+    """Estados de un trabajo (y del agente)."""
+    IDLE = "idle"
+    QUEUED = "queued"
+    RUNNING = "running"
+    TRAINING = "training"
+    DONE = "done"
+    ERROR = "error"
+    CANCELLED = "cancelled"
+
+
+FINAL_STATES = (JobState.DONE, JobState.ERROR, JobState.CANCELLED)
+
+# Concurrencia máxima por clase de recurso. La inferencia LLM y el entrenamiento
+# ya saturan la máquina con un único trabajo; la limpieza es CPU pura.
+DEFAULT_RESOURCES = {
+    "cpu": max(1, (os.cpu_count() or 2) // 2),
+    "llm": 1,
+    "training": 1,
+}
+
+
+class JobCancelled(Exception):
+    """Se lanza dentro de un trabajo cuando se solicitó su cancelación."""
+
+
+@dataclass
+class Job:
+    job_id: str
+    name: str
+    func: Callable
+    args: tuple
+    kwargs: dict
+    state: JobState = JobState.QUEUED
+    phase: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    _scheduler: Any = field(default=None, repr=False)
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    # --- API para el código del trabajo ---
+    def set_state(self, state: JobState, phase: str = "") -> None:
+        self.check_cancelled()
+        self.state = state
+        self.phase = phase or self.phase
+        log_info(logger, f"[{self.job_id}] {self.name}: {state.value} {self.phase}".rstrip())
+
+    def check_cancelled(self) -> None:
+        """Punto de cancelación cooperativa (entre fases del trabajo)."""
+        if self._cancel.is_set():
+            raise JobCancelled(f"Trabajo {self.job_id} cancelado.")
+
+    @contextmanager
+    def resource(self, name: str):
+        """Reserva una plaza de la clase de recurso `name` mientras dura el bloque."""
+        self.check_cancelled()
+        semaphore = self._scheduler.resources[name]
+        semaphore.acquire()
+        try:
+            self.check_cancelled()
+            yield
+        finally:
+            semaphore.release()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "name": self.name,
+            "state": self.state.value,
+            "phase": self.phase,
+            "error": self.error,
+            "queued_seconds": round((self.started_at or end) - self.created_at, 3),
+            "run_seconds": round(end - self.started_at, 3) if self.started_at else None,
+        }
+
+
+class JobScheduler:
+    """
+    Cola acotada de trabajos con un pool fijo de hilos.
+
+    - Cada trabajo tiene ID, estado, fase, resultado y error propios.
+    - Los trabajos en cola se cancelan de inmediato; los que están en ejecución
+      se detienen en el siguiente punto de cancelación (set_state/resource).
+    - Las clases de recurso (cpu/llm/training) limitan cuántos trabajos usan a
+      la vez cada recurso, independientemente del tamaño del pool.
+    - Se conserva el historial de los últimos `max_history` trabajos terminados.
+    """
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 100, resources: Optional[Dict[str, int]] = None,
+                 max_history: int = 500):
+        if max_workers < 1:
+            raise ValueError("max_workers debe ser >= 1.")
+        self.max_history = max_history
+        self.resources = {
+            name: threading.BoundedSemaphore(limit)
+            for name, limit in {**DEFAULT_RESOURCES, **(resources or {})}.items()
+        }
+        self.resource_limits = {**DEFAULT_RESOURCES, **(resources or {})}
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=max_queue)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+            for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        log_info(logger, f"JobScheduler iniciado: {max_workers} workers, recursos {self.resource_limits}")
+
+    # ---------------------------------------------------------------
+    # Ejecución
+    # ---------------------------------------------------------------
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if job.state == JobState.CANCELLED:
+                continue
+            self._run(job)
+
+    def _run(self, job: Job) -> None:
+        job.started_at = time.time()
+        try:
+            job.set_state(JobState.RUNNING)
+            job.result = job.func(job, *job.args, **job.kwargs)
+            job.state = JobState.DONE
+            log_info(logger, f"[{job.job_id}] {job.name}: completado.")
+        except JobCancelled:
+            job.state = JobState.CANCELLED
+            log_warning(logger, f"[{job.job_id}] {job.name}: cancelado durante la ejecución.")
+        except Exception as e:
+            job.state = JobState.ERROR
+            job.error = f"{type(e).__name__}: {e}"
+            log_error(logger, f"[{job.job_id}] {job.name}: error: {e}\n{traceback.format_exc()}")
+        finally:
+            job.finished_at = time.time()
+            job._done.set()
+            self._prune_history()
+
+    def _prune_history(self) -> None:
+        with self._lock:
+            finished = [jid for jid, job in self._jobs.items() if job.state in FINAL_STATES]
+            for jid in finished[:max(0, len(finished) - self.max_history)]:
+                del self._jobs[jid]
+
+    # ---------------------------------------------------------------
+    # API pública
+    # ---------------------------------------------------------------
+    def submit(self, func: Callable, *args, name: Optional[str] = None, **kwargs) -> str:
+        """
+        Encola func(job, *args, **kwargs) y retorna el ID del trabajo.
+        Lanza RuntimeError si la cola está llena o el scheduler fue detenido.
+        """
+        if self._closed:
+            raise RuntimeError("JobScheduler ya fue detenido.")
+        job = Job(job_id=uuid.uuid4().hex[:12], name=name or getattr(func, "__name__", "job"),
+                  func=func, args=args, kwargs=kwargs, _scheduler=self)
+        with self._lock:
+            self._jobs[job.job_id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self._jobs[job.job_id]
+            log_error(logger, "Cola de trabajos llena; se rechaza el trabajo.")
+            raise RuntimeError("Cola de trabajos llena.")
+        log_info(logger, f"[{job.job_id}] {job.name}: en cola ({self._queue.qsize()} pendientes).")
+        return job.job_id
+
+    def get(self, job_id: str) -> Job:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            raise KeyError(f"Trabajo desconocido: {job_id}")
+        return job
+
+    def status(self, job_id: str) -> dict:
+        return self.get(job_id).to_dict()
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Job:
+        job = self.get(job_id)
+        if not job._done.wait(timeout):
+            raise TimeoutError(f"El trabajo {job_id} no terminó en {timeout}s.")
+        return job
+
+    def result(self, job_id: str, timeout: Optional[float] = None) -> Any:
+        """Espera el trabajo y retorna su resultado (RuntimeError si falló o se canceló)."""
+        job = self.wait(job_id, timeout)
+        if job.state != JobState.DONE:
+            detail = f": {job.error}" if job.error else ""
+            raise RuntimeError(f"Trabajo {job_id} terminó en estado {job.state.value}{detail}")
+        return job.result
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancela un trabajo. Retorna False si ya había terminado."""
+        job = self.get(job_id)
+        if job.state in FINAL_STATES:
+            return False
+        job._cancel.set()
+        if job.state == JobState.QUEUED:
+            job.state = JobState.CANCELLED
+            job.finished_at = time.time()
+            job._done.set()
+        log_info(logger, f"[{job_id}] Cancelación solicitada ({job.state.value}).")
+        return True
+
+    def list_jobs(self) -> List[dict]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs]
+
+    def stats(self) -> dict:
+        counts: Dict[str, int] = {}
+        for job in self.list_jobs():
+            counts[job["state"]] = counts.get(job["state"], 0) + 1
+        return {"queued": self._queue.qsize(), "states": counts, "resources": dict(self.resource_limits)}
+
+    def shutdown(self, wait: bool = True, cancel_pending: bool = False) -> None:
+        """Detiene los workers; opcionalmente cancela los trabajos aún en cola."""
+        self._closed = True
+        if cancel_pending:
+            for job in self.list_jobs():
+                if job["state"] == JobState.QUEUED.value:
+                    self.cancel(job["job_id"])
+        for _ in self._workers:
+            self._queue.put(None)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        log_info(logger, "JobScheduler detenido.")
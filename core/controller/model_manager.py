@@ -2,9 +2,11 @@
 
 import os
 import json
+import hashlib
 import pandas as pd
 from datetime import datetime
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced, tracer
 from core.heavy_modules.fine_tuning.data_preparation import (
     clean_training_data,
     tokenize_texts,
@@ -23,6 +25,8 @@ from core.heavy_modules.fine_tuning.model_saver import (
     list_model_versions,
     delete_old_models
 )
+from core.heavy_modules.inference.streaming import TokenStream, stream_from_iterable
+from core.heavy_modules.inference.response_cache import get_response_cache
 
 # Inicializar logger central
 logger = init_logger("ModelManager")
@@ -52,6 +56,7 @@ class ModelManager:
     # ---------------------------------------------------------------
     # 1. Cargar modelo
     # ---------------------------------------------------------------
+    @traced("ModelManager.load_model", "model")
     def load_model(self, version="latest"):
         try:
             versions = list_model_versions()
@@ -85,6 +90,7 @@ class ModelManager:
     # ---------------------------------------------------------------
     # 3. Fine-tuning
     # ---------------------------------------------------------------
+    @traced("ModelManager.fine_tune", "model")
     def fine_tune(self, data_path: str, epochs=3, batch_size=32):
         try:
             df = pd.read_csv(data_path) if isinstance(data_path, str) else data_path
@@ -107,6 +113,7 @@ class ModelManager:
     # ---------------------------------------------------------------
     # 4. Evaluación
     # ---------------------------------------------------------------
+    @traced("ModelManager.evaluate_model", "model")
     def evaluate_model(self, metrics: list):
         try:
             results = compute_metrics(self.model, metrics)
@@ -149,6 +156,7 @@ class ModelManager:
     # ---------------------------------------------------------------
     # 7. Cargar fine-tuned
     # ---------------------------------------------------------------
+    @traced("ModelManager.load_fine_tuned_model", "model")
     def load_fine_tuned_model(self):
         try:
             versions = list_model_versions()
@@ -182,28 +190,114 @@ class ModelManager:
     # ---------------------------------------------------------------
     # 9. Generar texto a partir de un prompt
     # ---------------------------------------------------------------
-    def generate_from_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7) -> str:
+    @traced("ModelManager.generate_from_prompt", "model")
+    def generate_from_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7,
+                             use_cache: bool = True, reuse_sampled: bool = False) -> str:
         if self.model is None:
             raise RuntimeError(
                 "No hay modelo cargado. Llama a load_model() o load_fine_tuned_model() primero."
             )
 
         try:
+            native = hasattr(self.model, "generate_text")
+            # Solo se cachea si se conoce la versión del modelo (identifica los pesos)
+            cache = get_response_cache() if use_cache and self.current_version else None
+            if cache is not None:
+                params = self._cache_params(native, max_tokens, temperature)
+                model_id = f"checkpoint:{self.current_version}"
+                prompt_hash = hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+                cached = cache.get(model_id, params, prompt_hash, allow_sampled=reuse_sampled)
+                if cached is not None:
+                    log_info(logger, "Texto servido desde la caché de respuestas.")
+                    tracer.current().set(cache_hit=True)
+                    return cached
+
             # Caso para modelos que tienen método nativo generate_text
-            if hasattr(self.model, "generate_text"):
+            if native:
                 output = self.model.generate_text(prompt, max_tokens=max_tokens, temperature=temperature)
             else:
-                # Usar tokenizer inyectado o crear uno nuevo si no se pasó
-                if self.tokenizer is None:
-                    from transformers import AutoTokenizer
-                    self.tokenizer = AutoTokenizer.from_pretrained("ruta_a_modelo_o_cache_local")
-                
+                self._get_tokenizer()
                 inputs = self.tokenizer(prompt, return_tensors="pt")
                 outputs = self.model.generate(**inputs, max_new_tokens=max_tokens)
                 output = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
+                prompt_tokens = inputs["input_ids"].shape[-1]
+                tracer.current().set(prompt_tokens=prompt_tokens, completion_tokens=len(outputs[0]) - prompt_tokens)
+
+            if cache is not None:
+                cache.put(model_id, params, prompt_hash, output, allow_sampled=reuse_sampled)
 
             log_info(logger, "Texto generado correctamente a partir del prompt.")
             return output
         except Exception as e:
             log_error(logger, f"Error generando texto desde el prompt: {e}")
-            raise
\ No newline at end of file
+            raise
+
+    def _cache_params(self, native: bool, max_tokens: int, temperature: float) -> dict:
+        """Parámetros de muestreo efectivos, usados como parte de la clave de caché."""
+        if native:
+            return {"max_tokens": max_tokens, "temperature": temperature}
+        # model.generate sin do_sample decodifica de forma greedy (determinista)
+        do_sample = bool(getattr(getattr(self.model, "generation_config", None), "do_sample", False))
+        return {"max_tokens": max_tokens, "temperature": temperature if do_sample else 0}
+
+    # ---------------------------------------------------------------
+    # 10. Generar texto en streaming
+    # ---------------------------------------------------------------
+    def _get_tokenizer(self):
+        # Usar tokenizer inyectado o crear uno nuevo si no se pasó
+        if self.tokenizer is None:
+            from transformers import AutoTokenizer
+            self.tokenizer = AutoTokenizer.from_pretrained("ruta_a_modelo_o_cache_local")
+        return self.tokenizer
+
+    def _iter_transformers_tokens(self, prompt: str, max_tokens: int):
+        """Itera los trozos de texto que produce model.generate mediante TextIteratorStreamer."""
+        import threading
+        from transformers import TextIteratorStreamer
+
+        tokenizer = self._get_tokenizer()
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        inputs = tokenizer(prompt, return_tensors="pt")
+        worker = threading.Thread(
+            target=self.model.generate,
+            kwargs={**inputs, "max_new_tokens": max_tokens, "streamer": streamer},
+            daemon=True
+        )
+        worker.start()
+        for text in streamer:
+            yield text
+        worker.join()
+
+    def stream_from_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7) -> TokenStream:
+        """
+        Variante en streaming de generate_from_prompt.
+        Retorna un TokenStream (iterable sync/async) con métricas en `stream.stats`.
+        """
+        if self.model is None:
+            raise RuntimeError(
+                "No hay modelo cargado. Llama a load_model() o load_fine_tuned_model() primero."
+            )
+
+        try:
+            if hasattr(self.model, "stream_text"):
+                def make_iterable():
+                    return self.model.stream_text(prompt, max_tokens=max_tokens, temperature=temperature)
+            elif hasattr(self.model, "generate_text"):
+                # Sin streaming nativo: se entrega el texto completo como un único trozo
+                def make_iterable():
+                    return [self.model.generate_text(prompt, max_tokens=max_tokens, temperature=temperature)]
+            else:
+                def make_iterable():
+                    return self._iter_transformers_tokens(prompt, max_tokens)
+
+            log_info(logger, "Generación en streaming iniciada.")
+            return stream_from_iterable(make_iterable, label="ModelManager")
+        except Exception as e:
+            log_error(logger, f"Error iniciando generación en streaming: {e}")
+            raise
+
+    async def astream_from_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7):
+        """Iterador asíncrono de tokens: `async for token in manager.astream_from_prompt(p)`."""
+        stream = self.stream_from_prompt(prompt, max_tokens=max_tokens, temperature=temperature)
+        async for token in stream:
+            yield token
@@ -0,0 +1,415 @@
+# core/controller/pipeline_dag.py
+
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+import pandas as pd
+
+from core.controller.job_scheduler import Job, JobCancelled, JobState
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+from core.utils.tracer import tracer
+
+logger = init_logger("PipelineDAG")
+
+# Artefactos intermedios de cada etapa: <ARTIFACT_DIR>/<etapa>/<huella>.(parquet|pkl)
+ARTIFACT_DIR = "data/artifacts/pipeline"
+
+# Artefactos conservados por etapa (los usados más recientemente)
+KEEP_ARTIFACTS = 5
+
+# Huellas de archivos ya leídos: (ruta, tamaño, mtime) -> sha256
+_file_digests: Dict[Tuple[str, int, int], str] = {}
+
+
+# ---------------------------------------------------------------
+# Huellas (fingerprints)
+# ---------------------------------------------------------------
+def source_version(*objects) -> str:
+    """Hash del código fuente de funciones, clases o módulos (versión de código de una etapa)."""
+    h = hashlib.sha256()
+    for obj in objects:
+        try:
+            source = inspect.getsource(obj)
+        except (OSError, TypeError):
+            source = getattr(obj, "__qualname__", repr(obj))
+        h.update(source.encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def file_digest(path) -> str:
+    """sha256 del contenido de un archivo, memorizado por (ruta, tamaño, mtime)."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    digest = _file_digests.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = _file_digests[key] = h.hexdigest()
+    return digest
+
+
+def fingerprint_value(value) -> str:
+    """
+    Huella de un parámetro de entrada: las rutas a archivos se identifican por
+    su contenido, los DataFrames por sus valores y el resto por su JSON.
+    """
+    if isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+        return f"file:{file_digest(value)}"
+    h = hashlib.sha256()
+    if isinstance(value, pd.DataFrame):
+        h.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        h.update(json.dumps([list(map(str, value.columns)), list(map(str, value.dtypes))]).encode("utf-8"))
+    else:
+        h.update(json.dumps(value, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+
+# ---------------------------------------------------------------
+# Etapas y almacén de artefactos
+# ---------------------------------------------------------------
+@dataclass
+class Stage:
+    """
+    Etapa del pipeline: func(**entradas) -> salida.
+
+    `inputs` nombra otras etapas o parámetros de run(). La huella de la etapa
+    combina las huellas de sus entradas, `version` y el código de `func`;
+    `resource`/`state` se aplican al trabajo del JobScheduler mientras corre.
+    Con `workdir=True`, func recibe además workdir=<directorio propio de la
+    huella> para los archivos que genere (ver ArtifactStore.workdir).
+    """
+    name: str
+    func: Callable[..., Any]
+    inputs: Tuple[str, ...] = ()
+    version: str = "1"
+    resource: Optional[str] = None
+    state: JobState = JobState.RUNNING
+    cache: bool = True
+    workdir: bool = False
+
+
+class ArtifactStore:
+    """
+    Persistencia de salidas de etapas: DataFrames en Parquet, el resto con pickle.
+
+    Por etapa se conservan los `keep` artefactos usados más recientemente (cargar
+    un artefacto actualiza su mtime). Los artefactos fijados con pinned() por una
+    ejecución en curso no se desalojan hasta que esta termina.
+    """
+
+    # Fijaciones compartidas entre instancias del proceso: (raíz, etapa, huella) -> usos
+    _pins: Dict[Tuple[str, str, str], int] = {}
+    _pins_lock = threading.Lock()
+
+    def __init__(self, root: Union[str, Path] = ARTIFACT_DIR, keep: int = KEEP_ARTIFACTS):
+        self.root = Path(root)
+        self.keep = keep
+
+    def _pin_key(self, stage: str, fingerprint: str) -> Tuple[str, str, str]:
+        return (os.path.abspath(self.root), stage, fingerprint)
+
+    @contextmanager
+    def pinned(self, artifacts: Iterable[Tuple[str, str]]):
+        """Evita que se desalojen los artefactos (etapa, huella) mientras dura el bloque."""
+        keys = [self._pin_key(stage, fingerprint) for stage, fingerprint in artifacts]
+        with self._pins_lock:
+            for key in keys:
+                self._pins[key] = self._pins.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._pins_lock:
+                for key in keys:
+                    self._pins[key] -= 1
+                    if not self._pins[key]:
+                        del self._pins[key]
+
+    def workdir(self, stage: str, fingerprint: str) -> Path:
+        """
+        Directorio para archivos que genera una etapa (p. ej. imágenes) y que su
+        artefacto referencia por ruta: uno por huella, así dos datasets no se
+        pisan y las rutas cacheadas siguen siendo válidas. No se desaloja con el
+        artefacto (otras etapas cacheadas pueden seguir apuntando a él).
+        """
+        path = self.root / stage / fingerprint
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def find(self, stage: str, fingerprint: str) -> Optional[Path]:
+        for suffix in (".parquet", ".pkl"):
+            path = self.root / stage / f"{fingerprint}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def load(self, stage: str, fingerprint: str) -> Any:
+        path = self.find(stage, fingerprint)
+        if path is None:
+            raise FileNotFoundError(f"No hay artefacto para la etapa '{stage}' ({fingerprint[:12]}).")
+        os.utime(path)  # mtime = último uso (orden de desalojo)
+        if path.suffix == ".parquet":
+            return pd.read_parquet(path)
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+    def save(self, stage: str, fingerprint: str, value: Any) -> Path:
+        stage_dir = self.root / stage
+        stage_dir.mkdir(parents=True, exist_ok=True)
+        path = None
+        if isinstance(value, pd.DataFrame):
+            path = stage_dir / f"{fingerprint}.parquet"
+            tmp_path = path.with_suffix(".parquet.tmp")
+            try:
+                value.to_parquet(tmp_path)
+            except Exception as e:
+                # Columnas object mixtas, etc.: se recurre a pickle
+                log_warning(logger, f"Etapa '{stage}': no se pudo guardar en Parquet ({e}); se usa pickle.")
+                tmp_path.unlink(missing_ok=True)
+                path = None
+        if path is None:
+            path = stage_dir / f"{fingerprint}.pkl"
+            tmp_path = path.with_suffix(".pkl.tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        self._prune(stage_dir)
+        return path
+
+    def _prune(self, stage_dir: Path) -> None:
+        """Desaloja los artefactos menos usados por encima de `keep`, salvo los fijados."""
+        artifacts = []
+        for path in stage_dir.iterdir():
+            if path.suffix not in (".parquet", ".pkl"):
+                continue
+            try:
+                artifacts.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        artifacts.sort(key=lambda item: item[0], reverse=True)
+        root = os.path.abspath(self.root)
+        with self._pins_lock:
+            pinned = {fp for pin_root, stage, fp in self._pins if pin_root == root and stage == stage_dir.name}
+        for _, path in artifacts[self.keep:]:
+            if path.stem not in pinned:
+                path.unlink(missing_ok=True)
+
+
+@dataclass
+class PipelineRun:
+    """Resultado de una ejecución: salidas de las etapas objetivo y qué se ejecutó o reutilizó."""
+    outputs: Dict[str, Any]
+    fingerprints: Dict[str, str]
+    executed: List[str] = field(default_factory=list)
+    cached: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    skipped: List[str] = field(default_factory=list)
+    timings: Dict[str, float] = field(default_factory=dict)
+
+
+# ---------------------------------------------------------------
+# DAG
+# ---------------------------------------------------------------
+class PipelineDAG:
+    """
+    Pipeline expresado como grafo de etapas con entradas y salidas explícitas.
+
+    - Las huellas se calculan antes de ejecutar nada (dependen solo de las
+      entradas), así que las etapas con artefacto vigente se omiten y su salida
+      se carga de disco únicamente si otra etapa que sí corre la necesita.
+    - Las etapas independientes corren en paralelo (hasta `max_workers`).
+    - Si una etapa falla, las que no dependen de ella terminan igual y sus
+      artefactos (y los de etapas previas) quedan guardados para el próximo run.
+    """
+
+    def __init__(self, stages: Iterable[Stage] = (), store: Optional[ArtifactStore] = None, max_workers: int = 4):
+        self.stages: Dict[str, Stage] = {}
+        self.store = store or ArtifactStore()
+        self.max_workers = max_workers
+        for stage in stages:
+            self.add_stage(stage)
+
+    def add_stage(self, stage: Stage) -> "PipelineDAG":
+        if stage.name in self.stages:
+            raise ValueError(f"Etapa duplicada: {stage.name}")
+        self.stages[stage.name] = stage
+        return self
+
+    # ---------------------------------------------------------------
+    # Estructura del grafo
+    # ---------------------------------------------------------------
+    def order(self) -> List[str]:
+        """Orden topológico de las etapas (ValueError si hay ciclos)."""
+        order, visiting, done = [], set(), set()
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if name in done:
+                return
+            if name in visiting:
+                raise ValueError(f"Ciclo en el pipeline: {' -> '.join(path + (name,))}")
+            visiting.add(name)
+            for dep in self.stages[name].inputs:
+                if dep in self.stages:
+                    visit(dep, path + (name,))
+            visiting.discard(name)
+            done.add(name)
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return order
+
+    def _upstream(self, names: Iterable[str]) -> Set[str]:
+        result, stack = set(), list(names)
+        while stack:
+            name = stack.pop()
+            if name not in result:
+                result.add(name)
+                stack.extend(dep for dep in self.stages[name].inputs if dep in self.stages)
+        return result
+
+    def _downstream(self, names: Iterable[str]) -> Set[str]:
+        result = set(names)
+        for name in self.order():
+            if any(dep in result for dep in self.stages[name].inputs):
+                result.add(name)
+        return result
+
+    def sinks(self) -> List[str]:
+        used = {dep for stage in self.stages.values() for dep in stage.inputs}
+        return [name for name in self.stages if name not in used]
+
+    def fingerprints(self, params: Dict[str, Any]) -> Dict[str, str]:
+        """Huella de cada etapa (y de cada parámetro) sin ejecutar nada."""
+        fps = {name: fingerprint_value(value) for name, value in params.items()}
+        for name in self.order():
+            stage = self.stages[name]
+            missing = [dep for dep in stage.inputs if dep not in fps]
+            if missing:
+                raise ValueError(f"Etapa '{name}': entradas desconocidas {missing}")
+            payload = {
+                "stage": name,
+                "version": stage.version,
+                "code": source_version(stage.func),
+                "inputs": {dep: fps[dep] for dep in stage.inputs},
+            }
+            fps[name] = hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+        return fps
+
+    # ---------------------------------------------------------------
+    # Ejecución
+    # ---------------------------------------------------------------
+    def run(self, params: Dict[str, Any], job: Optional[Job] = None, force: Union[bool, Iterable[str]] = (),
+            targets: Optional[Iterable[str]] = None) -> PipelineRun:
+        """
+        Ejecuta las etapas necesarias para `targets` (por defecto, las etapas
+        finales). `force=True` o una lista de etapas las re-ejecuta junto con
+        todo lo que depende de ellas. Lanza la primera excepción de etapa tras
+        dejar terminar las etapas independientes.
+        """
+        start = time.perf_counter()
+        targets = list(targets) if targets is not None else self.sinks()
+        fps = self.fingerprints(params)
+        needed = self._upstream(targets)
+        forced = set(self.stages) if force is True else self._downstream(force or ())
+
+        # Los artefactos de las etapas necesarias no se desalojan mientras dura el run
+        with self.store.pinned((name, fps[name]) for name in needed):
+            return self._execute(params, job, targets, fps, needed, forced, start)
+
+    def _execute(self, params: Dict[str, Any], job: Optional[Job], targets: List[str], fps: Dict[str, str],
+                 needed: Set[str], forced: Set[str], start: float) -> PipelineRun:
+        """Cuerpo de run() con los artefactos de `needed` ya fijados."""
+        cached = {
+            name for name in needed
+            if name not in forced and self.stages[name].cache and self.store.find(name, fps[name]) is not None
+        }
+        pending = [name for name in self.order() if name in needed and name not in cached]
+        result = PipelineRun(outputs={}, fingerprints=fps, cached=sorted(cached))
+        log_info(logger, f"Pipeline: {len(pending)} etapas a ejecutar, {len(cached)} reutilizadas del caché.")
+
+        values: Dict[str, Any] = {}
+        load_lock = threading.Lock()
+        # Las etapas corren en otros hilos: heredan la traza de quien llamó a run()
+        trace_id = tracer.current_trace_id()
+
+        def value_of(name: str) -> Any:
+            if name in params:
+                return params[name]
+            with load_lock:
+                if name not in values:
+                    values[name] = self.store.load(name, fps[name])
+                return values[name]
+
+        def run_stage(name: str) -> Any:
+            stage = self.stages[name]
+            if job is not None:
+                job.set_state(stage.state, name)
+            context = job.resource(stage.resource) if job is not None and stage.resource else nullcontext()
+            with context, tracer.bind(trace_id), tracer.span(f"stage:{name}", "stage", fingerprint=fps[name][:12]):
+                stage_start = time.perf_counter()
+                kwargs = {dep: value_of(dep) for dep in stage.inputs}
+                if stage.workdir:
+                    kwargs["workdir"] = self.store.workdir(name, fps[name])
+                output = stage.func(**kwargs)
+                result.timings[name] = round(time.perf_counter() - stage_start, 3)
+            if stage.cache:
+                self.store.save(name, fps[name], output)
+            return output
+
+        first_error: Optional[BaseException] = None
+        done = set(cached)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stage") as executor:
+            while pending or running:
+                blocked = [n for n in pending if any(d in result.failed or d in result.skipped
+                                                     for d in self.stages[n].inputs)]
+                for name in blocked:
+                    pending.remove(name)
+                    result.skipped.append(name)
+                ready = [n for n in pending if all(d in done or d not in self.stages for d in self.stages[n].inputs)]
+                # Tras una cancelación no se inicia ninguna etapa más
+                if not isinstance(first_error, JobCancelled):
+                    for name in ready:
+                        pending.remove(name)
+                        running[executor.submit(run_stage, name)] = name
+                if not running:
+                    result.skipped.extend(pending)
+                    break
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        output = future.result()
+                        with load_lock:
+                            values[name] = output
+                        done.add(name)
+                        result.executed.append(name)
+                    except BaseException as e:
+                        result.failed[name] = f"{type(e).__name__}: {e}"
+                        log_error(logger, f"Etapa '{name}' falló: {e}")
+                        first_error = first_error or e
+
+        if first_error is not None:
+            log_warning(logger, f"Pipeline incompleto: fallidas {list(result.failed)}, omitidas {result.skipped}.")
+            raise first_error
+
+        result.outputs = {name: value_of(name) for name in targets}
+        log_info(
+            logger,
+            f"Pipeline completado en {time.perf_counter() - start:.2f}s: ejecutadas {result.executed}, "
+            f"reutilizadas {result.cached}."
+        )
+        return result
@@ -5,6 +5,7 @@ import os
 from datetime import datetime
 import pandas as pd
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced
 from core.heavy_modules.reporting.report_builder import ReportBuilder
 from core.utils.prompt_builder import BuilderPrompt
 from core.controller.model_manager import ModelManager
@@ -33,28 +34,63 @@ class ReportManager:
     # ---------------------------------------------------------------
     # Generación de texto interpretativo con el modelo Gemma
     # ---------------------------------------------------------------
-    def generate_interpretative_text(self, data: pd.DataFrame) -> str:
+    @traced("ReportManager.generate_interpretative_text", "report")
+    def generate_interpretative_text(self, data: pd.DataFrame, on_token=None) -> str:
+        """
+        Genera el texto interpretativo. Si se pasa `on_token(token)`, el texto
+        se consume en streaming y el callback recibe cada trozo al producirse.
+        """
         try:
-            prompt = self.prompt_builder.build_report_prompt(data)
-            self.model_manager.load_fine_tuned_model()
-            response = self.model_manager.generate_from_prompt(prompt)
+            if on_token is not None:
+                stream = self.stream_interpretative_text(data)
+                for token in stream:
+                    on_token(token)
+                response = stream.text
+            else:
+                prompt = self.prompt_builder.build_report_prompt(data)
+                self.model_manager.load_fine_tuned_model()
+                response = self.model_manager.generate_from_prompt(prompt)
             log_info(logger, "Texto interpretativo generado correctamente por el modelo.")
             return response
         except Exception as e:
             log_error(logger, f"Error generando texto interpretativo: {e}")
             return "No se pudo generar el texto interpretativo."
 
+    def stream_interpretative_text(self, data: pd.DataFrame):
+        """
+        Inicia la generación del texto interpretativo en streaming.
+        Retorna un TokenStream para ir armando el reporte mientras el modelo genera.
+        """
+        try:
+            prompt = self.prompt_builder.build_report_prompt(data)
+            self.model_manager.load_fine_tuned_model()
+            return self.model_manager.stream_from_prompt(prompt)
+        except Exception as e:
+            log_error(logger, f"Error iniciando streaming del texto interpretativo: {e}")
+            raise
+
     # ---------------------------------------------------------------
     # Generación principal de reporte
     # ---------------------------------------------------------------
-    def generate_report(self, data: pd.DataFrame, insights: dict, model_results: dict = None):
+    @traced("ReportManager.generate_report", "report")
+    def generate_report(self, data: pd.DataFrame, insights: dict, model_results: dict = None,
+                        charts: list = None):
+        """
+        Arma un reporte nuevo (ReportBuilder propio por llamada): ejecuciones
+        sucesivas o concurrentes no mezclan secciones ni gráficos. Al terminar
+        queda como reporte actual para exportar / agregar visualizaciones.
+        """
         try:
-            self.builder.build_structure()
-            self.builder.add_text_sections(insights)
+            builder = ReportBuilder()
+            builder.build_structure()
+            builder.add_text_sections(insights)
             if model_results:
-                self.builder.insert_metrics(model_results)
+                builder.insert_metrics(model_results)
+            if charts:
+                builder.embed_charts(list(charts))
+            self.builder = builder
             log_info(logger, "Reporte generado correctamente.")
-            return self.builder.report
+            return builder.report
         except Exception as e:
             log_error(logger, f"Error generando el reporte: {e}")
             raise
@@ -86,6 +122,7 @@ class ReportManager:
     # ---------------------------------------------------------------
     # Exportación
     # ---------------------------------------------------------------
+    @traced("ReportManager.export_to_pdf", "report")
     def export_to_pdf(self, filename: str = None):
         try:
             if filename is None:
@@ -97,6 +134,7 @@ class ReportManager:
             log_error(logger, f"Error exportando PDF: {e}")
             raise
 
+    @traced("ReportManager.export_to_excel", "report")
     def export_to_excel(self, filename: str = None):
         try:
             if filename is None:
@@ -3,17 +3,26 @@
 from core.utils.logger import init_logger, log_info, log_warning, log_error
 from core.heavy_modules.agents.chain_manager import ChainManager
 from core.heavy_modules.agents.memory_manager import MemoryManager
-from core.utils.prompt_builder import BuilderPrompt
+from core.heavy_modules.agents.knowledge_index import KnowledgeIndex, condense_findings, profile_dataset
+from core.heavy_modules.analytics.stats_engine import compute_numeric_stats
+from core.heavy_modules.analytics.correlation_analysis import compute_correlation_result
 import pandas as pd
 
 logger = init_logger("AutonomousAgent")
 
+# Hallazgos previos que se recuperan para un dataset nuevo
+PRIOR_FINDINGS_K = 3
+# Similitud mínima para considerar relevante un hallazgo previo
+PRIOR_FINDINGS_MIN_SCORE = 0.5
+
 
 class AutonomousAgent:
-    def __init__(self, session_id: str = "default_session"):
+    def __init__(self, session_id: str = "default_session", knowledge: KnowledgeIndex = None):
         try:
             self.session_id = session_id
             self.memory = MemoryManager()
+            # Índice de análisis previos por similitud de dataset
+            self.knowledge = knowledge or KnowledgeIndex()
 
             # ChainManager ya contiene el modelo GGUF cargado con llama_cpp
             self.chain_manager = ChainManager()
@@ -21,6 +30,8 @@ class AutonomousAgent:
             # Variables internas
             self.last_analysis = None
             self.last_analysis_df = None
+            self.last_stats = None
+            self.last_correlations = None
 
             log_info(logger, f"AutonomousAgent iniciado para sesión {session_id}.")
 
@@ -28,10 +39,15 @@ class AutonomousAgent:
             log_error(logger, f"Error al inicializar AutonomousAgent: {e}")
             raise
 
-    def analyze_data(self, df: pd.DataFrame):
+    def analyze_data(self, df: pd.DataFrame, reuse_cached: bool = False, reuse_similar: bool = True):
         """
         Analiza un DataFrame completo y genera hallazgos usando ChainManager.
         Maneja DataFrames vacíos y asegura siempre una respuesta no vacía.
+        Con reuse_cached=True se reutiliza una respuesta previa para el mismo prompt
+        aunque el muestreo no sea determinista (p. ej. reportes nocturnos).
+        Con reuse_similar=True, si ya se analizó un dataset casi idéntico se
+        devuelve ese análisis sin llamar al modelo; si no, los hallazgos de los
+        datasets más parecidos se agregan condensados al prompt.
         """
         try:
             if df is None or df.empty:
@@ -42,11 +58,31 @@ class AutonomousAgent:
                 self.memory.store_context(self.session_id, {"analysis": response})
                 return response
 
-            # Guardamos el DataFrame
+            # Guardamos el DataFrame, sus estadísticas y correlaciones (se reutilizan en generate_summary)
             self.last_analysis_df = df.copy()
+            self.last_stats = compute_numeric_stats(self.last_analysis_df)
+            self.last_correlations = compute_correlation_result(self.last_analysis_df)
+            profile = profile_dataset(self.last_analysis_df, self.last_stats)
+
+            duplicate = self.knowledge.find_duplicate(profile) if reuse_similar else None
+            if duplicate is not None:
+                response = duplicate["analysis"]
+                self.last_analysis = response
+                self.memory.store_context(self.session_id, {"analysis": response})
+                log_info(logger, f"Dataset casi idéntico a uno ya analizado ({duplicate['id']}): se reutiliza su análisis.")
+                return response
+
+            # Hallazgos previos de datasets parecidos (condensados para acortar el prompt)
+            related = self.knowledge.search(profile, k=PRIOR_FINDINGS_K, min_score=PRIOR_FINDINGS_MIN_SCORE)
+            self.chain_manager.inject_context({"hallazgos_previos": condense_findings(related)})
 
             # Llamamos al análisis completo
-            response = self.chain_manager.execute_chain(df=df)
+            response = self.chain_manager.execute_chain(
+                df=df, reuse_sampled=reuse_cached, stats=self.last_stats,
+                correlations=self.last_correlations
+            )
+            if response:
+                self.knowledge.add(profile, response, session_id=self.session_id)
             response = response or "No se generaron hallazgos del análisis."
 
             # Guardamos en memoria
@@ -63,9 +99,10 @@ class AutonomousAgent:
             self.last_analysis = response
             return response
 
-    def generate_summary(self, analysis_results: dict, instruction: str = "") -> str:
+    def generate_summary(self, analysis_results: dict, instruction: str = "", on_token=None) -> str:
         """
         Genera un resumen final del análisis usando el contenido del prompt.
+        Si se pasa `on_token(token)`, el resumen se consume en streaming.
         Si el modelo falla, retorna un fallback seguro.
         """
         try:
@@ -73,12 +110,15 @@ class AutonomousAgent:
                 raise ValueError("No hay análisis previo. Ejecuta analyze_data() primero.")
 
             # Genera prompt completo con todos los datos, estadísticas y roles
-            prompt_builder = BuilderPrompt()
-            prompt_text = prompt_builder.build_prompt_chain(
+            # (se reutiliza el BuilderPrompt del ChainManager: no carga otro modelo)
+            budgeted = self.chain_manager.prompt_builder.build_budgeted_prompt_chain(
                 df=self.last_analysis_df,
                 metadata=analysis_results,
-                instruction=instruction
+                instruction=instruction,
+                stats=self.last_stats,
+                correlations=self.last_correlations
             )
+            prompt_text = budgeted.text
 
             # Aquí guardas el prompt si quieres depuración
             self.last_prompt = prompt_text
@@ -87,7 +127,13 @@ class AutonomousAgent:
 
             # Ejecuta el modelo usando el prompt generado
             try:
-                response = self.chain_manager.execute_prompt(prompt_text)
+                if on_token is not None:
+                    stream = self.chain_manager.stream_prompt(prompt_text, prefix=budgeted.prefix)
+                    for token in stream:
+                        on_token(token)
+                    response = stream.text.strip()
+                else:
+                    response = self.chain_manager.execute_prompt(prompt_text, prefix=budgeted.prefix)
             except Exception as e:
                 log_error(logger, f"Error ejecutando modelo: {e}")
                 response = ""
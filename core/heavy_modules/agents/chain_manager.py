@@ -1,53 +1,63 @@
 # core/heavy_modules/agents/chain_manager.py
 
-import os
-from llama_cpp import Llama
-
 from core.utils.logger import init_logger, log_info, log_error
-from core.utils.prompt_builder import BuilderPrompt
+from core.utils.tracer import traced, tracer
+from core.utils.column_inspector import infer_column_roles
+from core.utils.prompt_builder import GROUP_INSTRUCTION, GROUP_TASKS, MAX_CORRELATION_PAIRS, BuilderPrompt
+from core.utils.prompt_budget import context_budget
+from core.heavy_modules.agents.map_reduce import MAP_GROUP_COLUMNS, cross_group_pairs, partition_columns
+from core.heavy_modules.analytics.stats_engine import compute_numeric_stats
+from core.heavy_modules.analytics.correlation_analysis import compute_correlation_result
+from core.heavy_modules.inference.model_pool import DEFAULT_MODEL_PATH
+from core.heavy_modules.inference.inference_scheduler import get_inference_scheduler
+from core.heavy_modules.inference.response_cache import get_response_cache, model_file_digest
+from core.heavy_modules.inference.streaming import TokenStream
 
 logger = init_logger("ChainManager")
 
+# Tokens de salida por defecto de execute_prompt (reservados al armar el prompt)
+DEFAULT_MAX_TOKENS = 512
+# Tokens de salida de cada resumen parcial en el modo map-reduce
+MAP_MAX_TOKENS = 256
+
 
 class ChainManager:
     """
     Maneja generación de prompts y ejecución del modelo GGUF con llama.cpp
     """
 
-    def __init__(self):
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, n_parallel: int = 2):
         try:
-            # --------------------------
-            # RUTA CORRECTA DEL MODELO
-            # --------------------------
-            self.model_path = (
-                "data/models/gemma_2b_it_base/"
-                "models--google--gemma-2b-it/"
-                "snapshots/96988410cbdaeb8d5093d1ebdc5a8fb563e02bad/"
-                "gemma-2b-it.gguf"
-            )
-
-            if not os.path.exists(self.model_path):
-                raise FileNotFoundError(
-                    f"Modelo GGUF no encontrado en:\n{self.model_path}"
-                )
+            self.model_path = model_path
 
             # --------------------------
-            # CARGA DEL MODELO LLAMA.CPP
+            # COLA DE INFERENCIA COMPARTIDA
             # --------------------------
-            self.llm = Llama(
-                model_path=self.model_path,
+            # Los modelos salen del pool del proceso y cada contexto llama.cpp
+            # es atendido por un solo hilo: varias instancias/hilos pueden
+            # llamar a execute_prompt a la vez sin compartir un mismo Llama.
+            self.scheduler = get_inference_scheduler(
+                self.model_path,
+                n_parallel=n_parallel,
                 n_ctx=4096,
-                n_threads=6,
-                n_gpu_layers=20,
-                verbose=False
+                n_gpu_layers=20
             )
 
+            # BuilderPrompt no carga el modelo hasta que se le pide generar
+            self.prompt_builder = BuilderPrompt()
+
+            # Caché de respuestas (modelo + parámetros de muestreo + hash del prompt)
+            self.response_cache = get_response_cache()
+            self.model_digest = model_file_digest(self.model_path)
+
             self.memory_context = {}
             self.trace = []
+            # Resultado (tokens, líneas resumidas) del último build_prompt
+            self.last_prompt = None
 
             log_info(
                 logger,
-                f"ChainManager inicializado correctamente.\nModelo cargado: {self.model_path}"
+                f"ChainManager inicializado correctamente.\nModelo en uso: {self.model_path}"
             )
 
         except Exception as e:
@@ -56,19 +66,29 @@ class ChainManager:
 
     # ---------------------------------------------------------------------
 
-    def build_prompt(self, df=None, metadata=None, instruction=""):
-        """Construye un prompt profesional usando BuilderPrompt."""
+    @traced("ChainManager.build_prompt", "llm")
+    def build_prompt(self, df=None, metadata=None, instruction="", stats=None, correlations=None,
+                     max_tokens: int = DEFAULT_MAX_TOKENS):
+        """
+        Construye un prompt profesional usando BuilderPrompt, ajustado para que
+        el prompt más `max_tokens` de salida quepan en el contexto del modelo
+        (contando con su tokenizer).
+        """
         try:
-            builder = BuilderPrompt()
-            prompt_text = builder.build_prompt_chain(
+            self.last_prompt = self.prompt_builder.build_budgeted_prompt_chain(
                 df=df,
                 metadata=metadata,
-                instruction=instruction or "Analiza y resume los datos."
+                instruction=instruction or "Analiza y resume los datos.",
+                stats=stats,
+                correlations=correlations,
+                context=self.memory_context,
+                token_budget=context_budget(self.scheduler.n_ctx, max_tokens),
+                count_tokens=self.scheduler.count_tokens
             )
 
             self.trace.append("Prompt construido correctamente.")
-            log_info(logger, "Prompt generado con BuilderPrompt.")
-            return prompt_text
+            log_info(logger, f"Prompt generado con BuilderPrompt ({self.last_prompt.tokens} tokens).")
+            return self.last_prompt.text
 
         except Exception as e:
             log_error(logger, f"Error al construir prompt: {e}")
@@ -76,26 +96,35 @@ class ChainManager:
 
     # ---------------------------------------------------------------------
 
-    def execute_prompt(self, prompt: str, max_tokens: int = 512):
-        """Ejecuta el modelo GGUF usando llama_cpp."""
+    def _sampling_params(self, max_tokens: int, temperature: float, top_p: float) -> dict:
+        return {"max_tokens": max_tokens, "temperature": temperature, "top_p": top_p, "stop": ["#HASH:"]}
+
+    def execute_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7, top_p: float = 0.9,
+                       reuse_sampled: bool = False, prefix: str = None):
+        """
+        Ejecuta el modelo GGUF usando llama_cpp (a través de la cola de inferencia).
+        Las respuestas deterministas (temperature=0) se sirven desde la caché; con
+        reuse_sampled=True también se reutilizan respuestas muestreadas.
+        `prefix` (parte fija inicial del prompt) permite reutilizar su estado KV.
+        """
 
         try:
-            response = self.llm(
-                prompt=prompt,            # <-- corregido (antes era sin keyword)
-                max_tokens=max_tokens,
-                temperature=0.7,
-                top_p=0.9,
-                stop=["#HASH:"]
-            )
+            with tracer.span("ChainManager.execute_prompt", "llm", prompt_chars=len(prompt)) as span:
+                params = self._sampling_params(max_tokens, temperature, top_p)
+                prompt_hash = self.prompt_builder._generate_hash(prompt)
+                cached = self.response_cache.get(self.model_digest, params, prompt_hash, allow_sampled=reuse_sampled)
+                span.set(cache_hit=cached is not None)
+                if cached is not None:
+                    self.trace.append("Respuesta servida desde caché.")
+                    log_info(logger, "Respuesta del modelo GGUF servida desde caché.")
+                    return cached
 
-            text = response["choices"][0]["text"].strip()
+                text = self.scheduler.generate(prompt, prefix=prefix, **params)
+                span.set(output_chars=len(text))
+                self.response_cache.put(self.model_digest, params, prompt_hash, text, allow_sampled=reuse_sampled)
 
             self.trace.append("Prompt ejecutado correctamente.")
-            log_info(logger, "Modelo GGUF ejecutado sobre el prompt.")
-
-            print("\n========== PROMPT ENVIADO AL MODELO ==========\n")
-            print(prompt)
-            print("\n==============================================\n")
+            log_info(logger, f"Modelo GGUF ejecutado sobre el prompt ({len(prompt)} caracteres).")
 
             return text
 
@@ -105,11 +134,157 @@ class ChainManager:
 
     # ---------------------------------------------------------------------
 
-    def execute_chain(self, df=None, metadata=None, instruction=""):
-        """Genera prompt y lo ejecuta."""
+    def stream_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7, top_p: float = 0.9,
+                      reuse_sampled: bool = False, prefix: str = None):
+        """
+        Ejecuta el prompt en modo streaming.
+        Retorna un TokenStream: iterable (sync y async) de tokens, con
+        tiempo al primer token y tokens/s en `stream.stats`.
+        """
+        try:
+            params = self._sampling_params(max_tokens, temperature, top_p)
+            prompt_hash = self.prompt_builder._generate_hash(prompt)
+            cached = self.response_cache.get(self.model_digest, params, prompt_hash, allow_sampled=reuse_sampled)
+            if cached is not None:
+                self.trace.append("Respuesta servida desde caché.")
+                return TokenStream.from_text(cached)
+
+            stream = self.scheduler.submit_stream(prompt, prefix=prefix, **params)
+            stream.add_done_callback(
+                lambda text: self.response_cache.put(
+                    self.model_digest, params, prompt_hash, text.strip(), allow_sampled=reuse_sampled
+                )
+            )
+            self.trace.append("Prompt encolado en modo streaming.")
+            return stream
+        except Exception as e:
+            log_error(logger, f"Error iniciando streaming del modelo GGUF: {e}")
+            raise
+
+    async def astream_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7, top_p: float = 0.9):
+        """Iterador asíncrono de tokens: `async for token in chain.astream_prompt(p)`."""
+        stream = self.stream_prompt(prompt, max_tokens=max_tokens, temperature=temperature, top_p=top_p)
+        async for token in stream:
+            yield token
+
+    # ---------------------------------------------------------------------
+
+    def execute_prompts(self, prompts, max_tokens: int = 512, temperature: float = 0.7, top_p: float = 0.9,
+                        reuse_sampled: bool = False, prefix: str = None):
+        """
+        Ejecuta varios prompts en paralelo (se reparten entre los contextos de la
+        cola) y devuelve los textos en el mismo orden. Usa la caché como execute_prompt.
+        """
+        try:
+            params = self._sampling_params(max_tokens, temperature, top_p)
+            results = [None] * len(prompts)
+            pending = {}
+            for i, prompt in enumerate(prompts):
+                prompt_hash = self.prompt_builder._generate_hash(prompt)
+                cached = self.response_cache.get(self.model_digest, params, prompt_hash,
+                                                 allow_sampled=reuse_sampled)
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    pending[i] = (prompt_hash, self.scheduler.submit(prompt, prefix=prefix, **params))
+
+            for i, (prompt_hash, future) in pending.items():
+                results[i] = future.result()
+                self.response_cache.put(self.model_digest, params, prompt_hash, results[i],
+                                        allow_sampled=reuse_sampled)
+
+            self.trace.append(f"{len(prompts)} prompts ejecutados ({len(prompts) - len(pending)} desde caché).")
+            return results
+        except Exception as e:
+            log_error(logger, f"Error ejecutando prompts en paralelo: {e}")
+            raise
+
+    # ---------------------------------------------------------------------
+
+    @traced("ChainManager.execute_map_reduce", "llm")
+    def execute_map_reduce(self, df, metadata=None, instruction="", reuse_sampled: bool = False, stats=None,
+                           correlations=None, max_group_columns: int = MAP_GROUP_COLUMNS):
+        """
+        Resumen jerárquico para datasets demasiado anchos para un solo prompt:
+        1. map: las columnas se parten en grupos (clusters de correlación para las
+           numéricas, familia de rol para el resto) y cada grupo se resume con su
+           propio prompt; los prompts se ejecutan en paralelo en la cola de inferencia.
+        2. reduce: los hallazgos parciales y las correlaciones fuertes entre grupos
+           se combinan en el resumen ejecutivo final.
+        """
         try:
-            prompt = self.build_prompt(df=df, metadata=metadata, instruction=instruction)
-            result = self.execute_prompt(prompt)
+            stats = stats or compute_numeric_stats(df)
+            if correlations is None and stats.columns:
+                correlations = compute_correlation_result(df[stats.columns])
+            groups = partition_columns(df, correlations, infer_column_roles(df), max_columns=max_group_columns)
+
+            map_budget = context_budget(self.scheduler.n_ctx, MAP_MAX_TOKENS)
+            group_prompts = []
+            for i, group in enumerate(groups, start=1):
+                group_prompts.append(self.prompt_builder.build_budgeted_prompt_chain(
+                    df[group.columns],
+                    metadata={"grupo": f"{i} de {len(groups)} ({group.label})",
+                              "columnas del dataset completo": df.shape[1]},
+                    instruction=f"{GROUP_INSTRUCTION} {instruction}".strip(),
+                    stats=stats.select(group.columns),
+                    correlations=correlations.select(group.columns) if correlations is not None else None,
+                    token_budget=map_budget,
+                    count_tokens=self.scheduler.count_tokens,
+                    tasks=GROUP_TASKS
+                ))
+            # Todos los grupos comparten las instrucciones: un único prefijo KV
+            partials = self.execute_prompts([p.text for p in group_prompts], max_tokens=MAP_MAX_TOKENS,
+                                            reuse_sampled=reuse_sampled, prefix=group_prompts[0].prefix)
+
+            self.last_prompt = self.prompt_builder.build_reduce_prompt(
+                [(group.label, text) for group, text in zip(groups, partials)],
+                shape=df.shape,
+                metadata=metadata,
+                instruction=instruction,
+                cross_pairs=cross_group_pairs(correlations, groups, top_k=MAX_CORRELATION_PAIRS),
+                context=self.memory_context,
+                token_budget=context_budget(self.scheduler.n_ctx, DEFAULT_MAX_TOKENS),
+                count_tokens=self.scheduler.count_tokens
+            )
+            result = self.execute_prompt(self.last_prompt.text, reuse_sampled=reuse_sampled,
+                                         prefix=self.last_prompt.prefix)
+
+            self.trace.append(f"Map-reduce ejecutado sobre {len(groups)} grupos de columnas.")
+            log_info(logger, f"Resumen map-reduce completado ({len(groups)} grupos, {df.shape[1]} columnas).")
+            return result
+
+        except Exception as e:
+            log_error(logger, f"Error ejecutando el resumen map-reduce: {e}")
+            raise
+
+    # ---------------------------------------------------------------------
+
+    @traced("ChainManager.execute_chain", "llm")
+    def execute_chain(self, df=None, metadata=None, instruction="", reuse_sampled: bool = False, stats=None,
+                      correlations=None, hierarchical: bool = None):
+        """
+        Genera prompt y lo ejecuta.
+        Con hierarchical=None se pasa a execute_map_reduce cuando el prompt único
+        tuvo que resumir columnas (roles o estadísticas) para entrar en el contexto
+        y el dataset tiene más columnas que un grupo; True/False fuerzan el modo.
+        """
+        try:
+            if hierarchical is None:
+                prompt = self.build_prompt(df=df, metadata=metadata, instruction=instruction, stats=stats,
+                                           correlations=correlations)
+                dropped = self.last_prompt.dropped
+                hierarchical = (df is not None and df.shape[1] > MAP_GROUP_COLUMNS
+                                and (dropped.get("roles", 0) > 0 or dropped.get("estadisticas", 0) > 0))
+            elif not hierarchical:
+                prompt = self.build_prompt(df=df, metadata=metadata, instruction=instruction, stats=stats,
+                                           correlations=correlations)
+
+            if hierarchical:
+                result = self.execute_map_reduce(df, metadata=metadata, instruction=instruction,
+                                                 reuse_sampled=reuse_sampled, stats=stats,
+                                                 correlations=correlations)
+            else:
+                result = self.execute_prompt(prompt, reuse_sampled=reuse_sampled, prefix=self.last_prompt.prefix)
 
             self.trace.append("Cadena ejecutada correctamente.")
             log_info(logger, "Cadena ejecutada exitosamente.")
@@ -122,6 +297,10 @@ class ChainManager:
     # ---------------------------------------------------------------------
 
     def inject_context(self, memory: dict):
+        """
+        Agrega contexto de memoria a los próximos prompts de build_prompt.
+        Las claves con valor vacío no se incluyen en el prompt.
+        """
         try:
             self.memory_context.update(memory)
             self.trace.append("Contexto inyectado.")
@@ -134,3 +313,37 @@ class ChainManager:
 
     def trace_chain(self):
         return self.trace
+
+    # ---------------------------------------------------------------------
+
+    def submit_prompts(self, prompts, max_tokens: int = 512, temperature: float = 0.7, top_p: float = 0.9):
+        """Encola varios prompts y devuelve sus futures (se ejecutan en paralelo)."""
+        try:
+            futures = self.scheduler.submit_batch(
+                prompts,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                stop=["#HASH:"]
+            )
+            self.trace.append(f"{len(futures)} prompts encolados.")
+            return futures
+        except Exception as e:
+            log_error(logger, f"Error encolando prompts: {e}")
+            raise
+
+    async def aexecute_prompt(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7, top_p: float = 0.9):
+        """Variante asyncio de execute_prompt."""
+        try:
+            text = await self.scheduler.agenerate(
+                prompt,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                top_p=top_p,
+                stop=["#HASH:"]
+            )
+            self.trace.append("Prompt ejecutado correctamente (async).")
+            return text
+        except Exception as e:
+            log_error(logger, f"Error ejecutando el modelo GGUF (async): {e}")
+            raise
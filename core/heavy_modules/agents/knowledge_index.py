@@ -0,0 +1,309 @@
+# core/heavy_modules/agents/knowledge_index.py
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+from core.heavy_modules.analytics.stats_engine import NumericStats, compute_numeric_stats
+from core.heavy_modules.inference.model_pool import DEFAULT_MODEL_PATH
+
+logger = init_logger("KnowledgeIndex")
+
+KNOWLEDGE_DIR = Path("data/outputs/memory/knowledge")
+
+# Similitud coseno a partir de la cual un dataset se considera casi duplicado
+DUPLICATE_THRESHOLD = 0.98
+# Entradas máximas del índice (se descartan las más antiguas)
+MAX_ENTRIES = 5000
+
+
+# ---------------------------------------------------------------
+# Perfil del dataset (texto que se indexa)
+# ---------------------------------------------------------------
+@dataclass
+class DatasetProfile:
+    """Descripción compacta de un dataset: esquema y estadísticas redondeadas."""
+    columns: List[str]
+    rows: int
+    text: str
+
+    @property
+    def fingerprint(self) -> str:
+        return hashlib.sha256(self.text.encode("utf-8")).hexdigest()
+
+
+def _bucket(value) -> str:
+    """Redondea a 2 cifras significativas: datasets parecidos comparten tokens."""
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return "na"
+    return f"{value:.2g}" if np.isfinite(value) else "na"
+
+
+def profile_dataset(df: pd.DataFrame, stats: Optional[NumericStats] = None) -> DatasetProfile:
+    """
+    Perfil textual de un DataFrame: un token por columna/tipo y por estadística
+    (media, std, mín, máx, fracción de nulos) redondeada. No lee valores fila a
+    fila más allá de lo que ya calcula compute_numeric_stats.
+    """
+    stats = stats or compute_numeric_stats(df)
+    rows = len(df)
+    tokens = [f"rows~{_bucket(rows)}", f"cols~{df.shape[1]}"]
+    for col in df.columns:
+        name = re.sub(r"\s+", "_", str(col).lower())
+        tokens.append(f"col:{name}")
+        tokens.append(f"{name}:dtype={df[col].dtype}")
+    for col in stats.columns:
+        name = re.sub(r"\s+", "_", str(col).lower())
+        row = stats.row(col)
+        tokens.extend([
+            f"{name}:mean={_bucket(row['mean'])}",
+            f"{name}:std={_bucket(row['std'])}",
+            f"{name}:min={_bucket(row['min'])}",
+            f"{name}:max={_bucket(row['max'])}",
+            f"{name}:nulls={_bucket(row['nulls'] / rows if rows else 0)}",
+        ])
+    return DatasetProfile(columns=[str(c) for c in df.columns], rows=rows, text=" ".join(tokens))
+
+
+# ---------------------------------------------------------------
+# Embeddings
+# ---------------------------------------------------------------
+class HashingEmbedder:
+    """
+    Embedding en CPU sin modelo: hashing de tokens y bigramas a `dim` dimensiones
+    con signo (blake2b, estable entre procesos) y normalización L2.
+    """
+    name = "hashing"
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _index(self, token: str) -> Tuple[int, float]:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            words = text.lower().split()
+            for token in words + [f"{a}|{b}" for a, b in zip(words, words[1:])]:
+                j, sign = self._index(token)
+                vectors[i, j] += sign
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class LlamaEmbedder:
+    """
+    Embeddings del modelo GGUF local (llama.cpp con embedding=True).
+    El modelo se carga en el primer uso; sus pesos se comparten vía mmap con
+    las instancias de generación.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, n_ctx: int = 2048, n_threads: int = 4):
+        self.model_path = model_path
+        self.n_ctx = n_ctx
+        self.n_threads = n_threads
+        self.name = f"llama:{os.path.basename(model_path)}"
+        self.dim = None
+        self._llm = None
+        self._lock = threading.Lock()
+
+    def _model(self):
+        if self._llm is None:
+            # Import local: llama_cpp solo es necesario si se usa este embedder
+            from llama_cpp import Llama
+
+            self._llm = Llama(model_path=self.model_path, n_ctx=self.n_ctx, n_threads=self.n_threads,
+                              embedding=True, verbose=False)
+        return self._llm
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        with self._lock:
+            raw = [self._model().embed(text) for text in texts]
+        vectors = []
+        for vector in raw:
+            vector = np.asarray(vector, dtype=np.float32)
+            # Sin pooling en el modelo: promedio de los embeddings por token
+            vectors.append(vector.mean(axis=0) if vector.ndim == 2 else vector)
+        vectors = np.vstack(vectors)
+        self.dim = vectors.shape[1]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1.0, norms)
+
+
+# ---------------------------------------------------------------
+# Índice vectorial persistente
+# ---------------------------------------------------------------
+class KnowledgeIndex:
+    """
+    Índice de análisis previos por similitud de dataset.
+
+    - Búsqueda exacta por fuerza bruta (producto matricial con NumPy): con
+      miles de entradas es una sola multiplicación de ~MB.
+    - Persistencia en index_dir: entries.jsonl (metadatos y análisis) y
+      vectors.npy (escrito de forma atómica).
+    - Si cambia el embedder, los vectores se recalculan desde los perfiles guardados.
+    """
+
+    def __init__(self, index_dir: Path = KNOWLEDGE_DIR, embedder=None, max_entries: int = MAX_ENTRIES):
+        self.index_dir = Path(index_dir)
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.embedder = embedder or HashingEmbedder()
+        self.max_entries = max_entries
+        self._entries_path = self.index_dir / "entries.jsonl"
+        self._vectors_path = self.index_dir / "vectors.npy"
+        self._meta_path = self.index_dir / "meta.json"
+        self._lock = threading.Lock()
+        self._entries: List[dict] = []
+        self._vectors: Optional[np.ndarray] = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ---------------------------------------------------------------
+    # Persistencia
+    # ---------------------------------------------------------------
+    def _load(self) -> None:
+        try:
+            if self._entries_path.exists():
+                with open(self._entries_path, "r", encoding="utf-8") as f:
+                    self._entries = [json.loads(line) for line in f if line.strip()]
+            meta = {}
+            if self._meta_path.exists():
+                with open(self._meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+
+            if self._entries and self._vectors_path.exists() and meta.get("embedder") == self.embedder.name:
+                vectors = np.load(self._vectors_path)
+                # Un corte entre las dos escrituras deja entradas sin vector: se recalculan
+                if len(vectors) == len(self._entries):
+                    self._vectors = vectors
+            if self._entries and self._vectors is None:
+                log_warning(logger, "Vectores del índice ausentes o de otro embedder: se recalculan.")
+                self._vectors = self.embedder.embed([e["profile"] for e in self._entries])
+                self._save_vectors()
+            log_info(logger, f"KnowledgeIndex cargado con {len(self._entries)} entradas.")
+        except Exception as e:
+            log_error(logger, f"Error al cargar el índice de conocimiento: {e}")
+            raise
+
+    def _save_vectors(self) -> None:
+        tmp = self._vectors_path.with_suffix(".tmp.npy")
+        np.save(tmp, self._vectors)
+        os.replace(tmp, self._vectors_path)
+        with open(self._meta_path, "w", encoding="utf-8") as f:
+            json.dump({"embedder": self.embedder.name, "dim": int(self._vectors.shape[1])}, f)
+
+    def _rewrite_entries(self) -> None:
+        tmp = self._entries_path.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            for entry in self._entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        os.replace(tmp, self._entries_path)
+
+    # ---------------------------------------------------------------
+    # Alta y búsqueda
+    # ---------------------------------------------------------------
+    def add(self, profile: DatasetProfile, analysis: str, session_id: Optional[str] = None) -> dict:
+        """Indexa el análisis de un dataset. Retorna la entrada guardada."""
+        try:
+            vector = self.embedder.embed([profile.text])
+            entry = {
+                "id": f"{int(time.time() * 1000)}-{profile.fingerprint[:12]}",
+                "session_id": session_id,
+                "fingerprint": profile.fingerprint,
+                "columns": profile.columns,
+                "rows": profile.rows,
+                "profile": profile.text,
+                "analysis": analysis,
+                "created_at": time.time(),
+            }
+            with self._lock:
+                self._entries.append(entry)
+                self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+                if len(self._entries) > self.max_entries:
+                    drop = len(self._entries) - self.max_entries
+                    self._entries = self._entries[drop:]
+                    self._vectors = self._vectors[drop:]
+                    self._rewrite_entries()
+                else:
+                    with open(self._entries_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                self._save_vectors()
+            log_info(logger, f"Análisis indexado ({len(self._entries)} entradas).")
+            return entry
+        except Exception as e:
+            log_error(logger, f"Error al indexar análisis: {e}")
+            raise
+
+    def search(self, profile: DatasetProfile, k: int = 3, min_score: float = 0.0) -> List[Tuple[float, dict]]:
+        """Las k entradas más parecidas (similitud coseno, de mayor a menor)."""
+        with self._lock:
+            if self._vectors is None or not self._entries:
+                return []
+            vectors, entries = self._vectors, list(self._entries)
+        scores = vectors @ self.embedder.embed([profile.text])[0]
+        k = min(k, len(entries))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), entries[i]) for i in top if scores[i] >= min_score]
+
+    def find_duplicate(self, profile: DatasetProfile, threshold: float = DUPLICATE_THRESHOLD) -> Optional[dict]:
+        """
+        Entrada de un dataset casi idéntico: misma huella exacta, o mismas
+        columnas y similitud >= threshold. La más reciente si hay varias.
+        """
+        with self._lock:
+            for entry in reversed(self._entries):
+                if entry["fingerprint"] == profile.fingerprint:
+                    return entry
+        for score, entry in self.search(profile, k=1, min_score=threshold):
+            if entry["columns"] == profile.columns:
+                return entry
+        return None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+            for path in (self._entries_path, self._vectors_path, self._meta_path):
+                if path.exists():
+                    path.unlink()
+
+
+# ---------------------------------------------------------------
+# Condensado para el prompt
+# ---------------------------------------------------------------
+_SECTION_RE = re.compile(r"(RESUMEN EJECUTIVO|SUMMARY)\W*\n?(.*?)(?=\n\s*[#*]*\s*[A-ZÁÉÍÓÚ ]{6,}[*:]|\Z)", re.S)
+
+
+def condense_findings(results: Sequence[Tuple[float, dict]], max_chars: int = 400) -> str:
+    """
+    Resume los hallazgos recuperados en pocas líneas: de cada análisis se toma
+    su RESUMEN EJECUTIVO (o SUMMARY) si existe, y si no su inicio, recortado.
+    """
+    lines = []
+    for score, entry in results:
+        text = entry.get("analysis") or ""
+        match = _SECTION_RE.search(text)
+        excerpt = " ".join((match.group(2) if match and match.group(2).strip() else text).split())
+        if len(excerpt) > max_chars:
+            excerpt = excerpt[:max_chars].rsplit(" ", 1)[0] + "…"
+        columns = ", ".join(entry.get("columns", [])[:8])
+        lines.append(f"- (similitud {score:.2f}; columnas: {columns}) {excerpt}")
+    return "\n".join(lines)
@@ -0,0 +1,110 @@
+# core/heavy_modules/agents/map_reduce.py
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from core.utils.column_inspector import infer_column_roles
+from core.heavy_modules.analytics.correlation_analysis import CorrelationResult
+
+# Columnas máximas por grupo: cada prompt parcial cabe en el contexto sin recortes grandes
+MAP_GROUP_COLUMNS = 40
+# |r| a partir del cual dos columnas numéricas van al mismo grupo
+CLUSTER_THRESHOLD = 0.5
+
+
+@dataclass
+class ColumnGroup:
+    """Grupo de columnas que se resume en un solo prompt parcial."""
+    label: str
+    columns: List[str]
+
+
+# ---------------------------------------------------------------
+# Agrupamiento de columnas
+# ---------------------------------------------------------------
+def _correlation_clusters(columns: List[str], correlations: Optional[CorrelationResult],
+                          threshold: float) -> List[List[str]]:
+    """Componentes conexas del grafo |r| > threshold (union-find), en orden de aparición."""
+    parent = {c: c for c in columns}
+
+    def find(c):
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    if correlations is not None:
+        for a, b, _ in correlations.select(columns).pairs(threshold=threshold):
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    clusters: Dict[str, List[str]] = {}
+    for c in columns:
+        clusters.setdefault(find(c), []).append(c)
+    return list(clusters.values())
+
+
+def _pack(clusters: List[List[str]], max_columns: int) -> List[List[str]]:
+    """
+    Reparte los clusters en grupos de hasta max_columns (first-fit decreasing).
+    Un cluster más grande que el límite se parte en trozos consecutivos.
+    """
+    pieces = []
+    for cluster in clusters:
+        pieces.extend(cluster[i:i + max_columns] for i in range(0, len(cluster), max_columns))
+    groups: List[List[str]] = []
+    for piece in sorted(pieces, key=len, reverse=True):
+        for group in groups:
+            if len(group) + len(piece) <= max_columns:
+                group.extend(piece)
+                break
+        else:
+            groups.append(list(piece))
+    return groups
+
+
+def partition_columns(df: pd.DataFrame, correlations: Optional[CorrelationResult] = None,
+                      roles: Optional[Dict[str, str]] = None, max_columns: int = MAP_GROUP_COLUMNS,
+                      threshold: float = CLUSTER_THRESHOLD) -> List[ColumnGroup]:
+    """
+    Particiona las columnas para el modo map-reduce:
+    - numéricas: por cluster de correlación (columnas relacionadas quedan juntas),
+    - resto: por familia de rol según infer_column_roles ("categórico", "fecha", ...).
+    Ningún grupo supera max_columns.
+    """
+    numeric = list(df.select_dtypes(include="number").columns)
+    numeric_set = set(numeric)
+    roles = roles if roles is not None else infer_column_roles(df)
+
+    groups = []
+    for i, cols in enumerate(_pack(_correlation_clusters(numeric, correlations, threshold), max_columns), 1):
+        groups.append(ColumnGroup(f"numéricas {i}: {cols[0]} … {cols[-1]}" if len(cols) > 1
+                                  else f"numéricas {i}: {cols[0]}", cols))
+
+    families: Dict[str, List[str]] = {}
+    for col in df.columns:
+        if col not in numeric_set:
+            family = str(roles.get(col, "otro")).split(",")[0].strip() or "otro"
+            families.setdefault(family, []).append(col)
+    for family, cols in families.items():
+        for start in range(0, len(cols), max_columns):
+            groups.append(ColumnGroup(family, cols[start:start + max_columns]))
+    return groups
+
+
+def cross_group_pairs(correlations: Optional[CorrelationResult], groups: Sequence[ColumnGroup],
+                      threshold: float = 0.8, top_k: Optional[int] = None) -> List[str]:
+    """Pares fuertes entre columnas de grupos distintos (no los ve ningún prompt parcial)."""
+    if correlations is None:
+        return []
+    group_of = {c: i for i, group in enumerate(groups) for c in group.columns}
+    lines = []
+    for a, b, value in correlations.pairs(threshold=threshold):
+        if group_of.get(a) != group_of.get(b):
+            lines.append(f"{a} ↔ {b}: {value:.2f}")
+            if top_k is not None and len(lines) >= top_k:
+                break
+    return lines
@@ -1,37 +1,162 @@
 # core/heavy_modules/agents/memory_manager.py
 
 import json
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from core.utils.logger import init_logger, log_info, log_error
+from typing import Dict, List, Optional
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
 
 logger = init_logger("MemoryManager")
 
+# Versiones anteriores que se conservan por clave (las más viejas se compactan)
+MAX_VERSIONS = 20
+
+
 class MemoryManager:
-    def __init__(self, memory_dir="data/outputs/memory"):
+    """
+    Memoria persistente de sesiones sobre SQLite (modo WAL).
+
+    - Cada clave de una sesión es una fila: store_context hace upsert solo de
+      las claves recibidas, sin reescribir el resto de la sesión.
+    - Cada cambio incrementa la versión de la clave y queda en el historial
+      (se conservan las últimas max_versions por clave).
+    - Las escrituras usan transacciones BEGIN IMMEDIATE, así que varios
+      agentes (hilos o procesos) sobre la misma sesión no pierden cambios.
+    - recall_context se sirve desde una caché en memoria, que se invalida
+      cuando otra conexión modifica la base (PRAGMA data_version).
+    - Los archivos {session_id}.json del formato anterior se importan la
+      primera vez que se usa la sesión.
+    """
+
+    def __init__(self, memory_dir="data/outputs/memory", max_versions: int = MAX_VERSIONS,
+                 busy_timeout: float = 30.0):
         self.memory_dir = Path(memory_dir)
         self.memory_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.memory_dir / "memory.sqlite"
+        self.max_versions = max_versions
+
+        self._lock = threading.RLock()
+        self._cache: Dict[str, dict] = {}
+        self._migrated = set()
+
+        self._conn = sqlite3.connect(str(self.db_path), timeout=busy_timeout,
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS context ("
+            " session_id TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " value TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (session_id, key))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            " session_id TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " version INTEGER NOT NULL,"
+            " value TEXT,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (session_id, key, version))"
+        )
+        self._data_version = self._read_data_version()
         log_info(logger, "MemoryManager inicializado correctamente.")
 
+    # ---------------------------------------------------------------
+    # Utilidades internas
+    # ---------------------------------------------------------------
     def _get_memory_file(self, session_id):
+        """Archivo JSON del formato anterior (solo para migración)."""
         return self.memory_dir / f"{session_id}.json"
 
+    def _read_data_version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _sync_cache(self) -> None:
+        """Descarta la caché si otra conexión escribió desde la última lectura."""
+        current = self._read_data_version()
+        if current != self._data_version:
+            self._cache.clear()
+            self._data_version = current
+
+    def _migrate_legacy(self, session_id) -> None:
+        """Importa (una sola vez) el archivo {session_id}.json del formato anterior."""
+        if session_id in self._migrated:
+            return
+        self._migrated.add(session_id)
+        file = self._get_memory_file(session_id)
+        try:
+            with open(file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._write(session_id, data)
+            file.rename(file.with_suffix(".json.migrated"))
+        except FileNotFoundError:
+            # No hay archivo antiguo, o ya lo migró otro proceso
+            return
+        log_info(logger, f"Memoria de sesión {session_id} migrada desde JSON.")
+
+    def _write(self, session_id, info: dict) -> int:
+        """Upsert por clave dentro de una transacción. Retorna cuántas claves cambiaron."""
+        now = time.time()
+        changed = 0
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, value in info.items():
+                key = str(key)
+                encoded = json.dumps(value, ensure_ascii=False, default=str)
+                row = self._conn.execute(
+                    "SELECT value, version FROM context WHERE session_id = ? AND key = ?",
+                    (session_id, key)
+                ).fetchone()
+                if row is not None and row[0] == encoded:
+                    continue
+                version = row[1] + 1 if row is not None else 1
+                self._conn.execute(
+                    "INSERT INTO context (session_id, key, value, version, updated_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(session_id, key) DO UPDATE SET "
+                    "value = excluded.value, version = excluded.version, updated_at = excluded.updated_at",
+                    (session_id, key, encoded, version, now)
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO history (session_id, key, version, value, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session_id, key, version, encoded, now)
+                )
+                if self.max_versions:
+                    self._conn.execute(
+                        "DELETE FROM history WHERE session_id = ? AND key = ? AND version <= ?",
+                        (session_id, key, version - self.max_versions)
+                    )
+                changed += 1
+            self._conn.execute("COMMIT")
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+        return changed
+
+    # ---------------------------------------------------------------
+    # API pública
+    # ---------------------------------------------------------------
     def store_context(self, session_id, info: dict):
         """
         Guarda información relevante entre ejecuciones.
+        Solo se escriben las claves de `info`; las demás se conservan.
         """
         try:
             if not isinstance(info, dict):
                 raise TypeError("store_context espera un diccionario como 'info'.")
 
-            file = self._get_memory_file(session_id)
-            data = {}
-            if file.exists():
-                with open(file, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-            data.update(info)
-            with open(file, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=4, ensure_ascii=False)
-            log_info(logger, f"Contexto guardado para sesión {session_id}.")
+            with self._lock:
+                self._migrate_legacy(session_id)
+                changed = self._write(session_id, info)
+                # Las escrituras propias no cambian data_version: basta con descartar la sesión
+                self._cache.pop(session_id, None)
+            log_info(logger, f"Contexto guardado para sesión {session_id} ({changed} claves actualizadas).")
         except Exception as e:
             log_error(logger, f"Error al guardar contexto: {e}")
             raise
@@ -41,28 +166,90 @@ class MemoryManager:
         Recupera contexto previo.
         """
         try:
-            file = self._get_memory_file(session_id)
-            if not file.exists():
-                return {}
-            with open(file, "r", encoding="utf-8") as f:
-                data = json.load(f)
+            with self._lock:
+                self._migrate_legacy(session_id)
+                self._sync_cache()
+                data = self._cache.get(session_id)
+                if data is None:
+                    rows = self._conn.execute(
+                        "SELECT key, value FROM context WHERE session_id = ?", (session_id,)
+                    ).fetchall()
+                    data = {key: json.loads(value) for key, value in rows}
+                    self._cache[session_id] = data
             log_info(logger, f"Contexto recuperado para sesión {session_id}.")
-            return data
+            return dict(data)
         except Exception as e:
             log_error(logger, f"Error al recuperar contexto: {e}")
             raise
 
+    def get_history(self, session_id, key: Optional[str] = None, limit: Optional[int] = None) -> List[dict]:
+        """
+        Versiones guardadas de una sesión (o de una clave), de la más reciente a la más antigua.
+        Cada elemento: {"key", "version", "value", "created_at"}.
+        """
+        try:
+            with self._lock:
+                self._migrate_legacy(session_id)
+                query = "SELECT key, version, value, created_at FROM history WHERE session_id = ?"
+                params = [session_id]
+                if key is not None:
+                    query += " AND key = ?"
+                    params.append(key)
+                query += " ORDER BY created_at DESC, version DESC"
+                if limit is not None:
+                    query += " LIMIT ?"
+                    params.append(int(limit))
+                rows = self._conn.execute(query, params).fetchall()
+            return [
+                {"key": k, "version": v, "value": json.loads(value), "created_at": created_at}
+                for k, v, value, created_at in rows
+            ]
+        except Exception as e:
+            log_error(logger, f"Error al recuperar historial: {e}")
+            raise
+
+    def list_sessions(self) -> List[str]:
+        """Sesiones con memoria guardada."""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT session_id FROM context ORDER BY session_id").fetchall()
+        return [row[0] for row in rows]
+
     def clear_memory(self, session_id):
         """
-        Limpia la memoria asociada a una sesión.
+        Limpia la memoria asociada a una sesión (contexto e historial).
         """
         try:
-            file = self._get_memory_file(session_id)
-            if file.exists():
-                file.unlink()
+            with self._lock:
+                self._migrate_legacy(session_id)
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    deleted = self._conn.execute(
+                        "DELETE FROM context WHERE session_id = ?", (session_id,)
+                    ).rowcount
+                    self._conn.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._cache.pop(session_id, None)
+            if deleted:
                 log_info(logger, f"Memoria de sesión {session_id} eliminada.")
             else:
                 log_info(logger, f"No se encontró memoria para la sesión {session_id}.")
         except Exception as e:
             log_error(logger, f"Error al limpiar memoria: {e}")
             raise
+
+    def compact(self) -> None:
+        """Aplica el checkpoint del WAL y recupera el espacio libre del archivo."""
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                self._conn.execute("VACUUM")
+            log_info(logger, "Memoria compactada.")
+        except sqlite3.Error as e:
+            log_warning(logger, f"No se pudo compactar la memoria: {e}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,40 +1,209 @@
 #core/heavy_modules/analytics/anomaly_detection.py
 
 
+import warnings
+from typing import Dict, Iterable, Optional, Tuple, Union
+
 import pandas as pd
 import numpy as np
-from scipy.stats import zscore
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced
+from core.heavy_modules.analytics.quantile_sketch import QuantileSketch
 
 logger = init_logger("AnomalyDetection")
 
+OUTLIER_METHODS = ("zscore", "iqr", "mad")
 
-def detect_outliers(df: pd.DataFrame, method: str = "zscore", threshold: float = 3.0) -> pd.DataFrame:
-    try:
-        df_copy = df.copy()
-        numeric_cols = df_copy.select_dtypes(include='number').columns
+# Umbral por defecto de cada método (mad: z-score modificado de Iglewicz-Hoaglin)
+DEFAULT_THRESHOLDS = {"zscore": 3.0, "iqr": 1.5, "mad": 3.5}
+
+# MAD → desviación estándar equivalente bajo normalidad (0.6745 = Φ⁻¹(0.75))
+_MAD_SCALE = 0.6745
+
+
+def _check_method(method: str) -> None:
+    if method not in OUTLIER_METHODS:
+        raise ValueError("Método no soportado. Usa 'zscore', 'iqr' o 'mad'.")
+
+
+def _bounds_from_stats(method: str, threshold: float, center: float, spread: float,
+                       q1: float = np.nan, q3: float = np.nan) -> Tuple[float, float]:
+    """Límites [bajo, alto] fuera de los cuales un valor es outlier. Sin dispersión → sin límites."""
+    if method == "iqr":
+        iqr = q3 - q1
+        if not np.isfinite(iqr):
+            return -np.inf, np.inf
+        return q1 - threshold * iqr, q3 + threshold * iqr
+    if not np.isfinite(spread) or spread == 0:
+        return -np.inf, np.inf
+    if method == "mad":
+        spread = spread / _MAD_SCALE
+    return center - threshold * spread, center + threshold * spread
 
+
+@traced("compute_outlier_bounds", "analytics")
+def compute_outlier_bounds(df: pd.DataFrame, method: str = "zscore",
+                           threshold: Optional[float] = None) -> Dict[str, Tuple[float, float]]:
+    """
+    Límites exactos por columna numérica para datos en memoria, calculados con
+    una sola llamada vectorizada por estadístico (sin copiar el DataFrame).
+    """
+    _check_method(method)
+    threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+    numeric = df.select_dtypes(include="number")
+    if numeric.shape[1] == 0 or len(numeric) == 0:
+        return {}
+    X = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    with np.errstate(invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
         if method == "zscore":
-            z_scores = np.abs(df_copy[numeric_cols].apply(zscore))
-            df_copy["is_outlier"] = (z_scores > threshold).any(axis=1)
+            center = np.nanmean(X, axis=0)
+            spread = np.nanstd(X, axis=0)
+            q1 = q3 = np.full(X.shape[1], np.nan)
         elif method == "iqr":
-            df_copy["is_outlier"] = False
-            for col in numeric_cols:
-                Q1 = df_copy[col].quantile(0.25)
-                Q3 = df_copy[col].quantile(0.75)
-                IQR = Q3 - Q1
-                mask = (df_copy[col] < (Q1 - 1.5 * IQR)) | (df_copy[col] > (Q3 + 1.5 * IQR))
-                df_copy.loc[mask, "is_outlier"] = True
+            q1, q3 = np.nanquantile(X, [0.25, 0.75], axis=0)
+            center = spread = np.full(X.shape[1], np.nan)
         else:
-            raise ValueError("Método no soportado. Usa 'zscore' o 'iqr'.")
+            center = np.nanmedian(X, axis=0)
+            spread = np.nanmedian(np.abs(X - center), axis=0)
+            q1 = q3 = np.full(X.shape[1], np.nan)
+
+    return {
+        col: _bounds_from_stats(method, threshold, center[i], spread[i], q1[i], q3[i])
+        for i, col in enumerate(numeric.columns)
+    }
+
+
+def outlier_mask(df: pd.DataFrame, bounds: Dict[str, Tuple[float, float]]) -> np.ndarray:
+    """Máscara booleana por fila: True si algún valor numérico cae fuera de sus límites."""
+    mask = np.zeros(len(df), dtype=bool)
+    for col, (low, high) in bounds.items():
+        if col not in df.columns or (np.isneginf(low) and np.isposinf(high)):
+            continue
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            mask |= (values < low) | (values > high)
+    return mask
+
+
+@traced("detect_outliers", "analytics")
+def detect_outliers(df: pd.DataFrame, method: str = "zscore", threshold: Optional[float] = None,
+                    return_mask: bool = False) -> Union[pd.DataFrame, np.ndarray]:
+    """
+    Detecta outliers por z-score, IQR o MAD (z-score modificado).
 
-        log_info(logger, f"Detección de outliers completada usando método {method}.")
+    Por defecto retorna una copia con la columna `is_outlier` (compatibilidad);
+    con return_mask=True retorna solo la máscara booleana por fila, sin copiar
+    el DataFrame. Los nulos nunca cuentan como outlier.
+    """
+    try:
+        mask = outlier_mask(df, compute_outlier_bounds(df, method, threshold))
+        log_info(logger, f"Detección de outliers completada usando método {method}: {int(mask.sum())} filas.")
+        if return_mask:
+            return mask
+        df_copy = df.copy()
+        df_copy["is_outlier"] = mask
         return df_copy
     except Exception as e:
         log_error(logger, f"Error al detectar outliers: {e}")
         raise
 
 
+class OutlierDetector:
+    """
+    Detección de outliers por bloques (datasets fuera de memoria).
+
+    - zscore: media/varianza combinables (fórmula de Chan), exactas.
+    - iqr: Q1/Q3 con un QuantileSketch por columna (aproximados).
+    - mad: mediana y MAD aproximadas desde el mismo sketch, en una sola pasada.
+
+    Uso: detector.fit(bloques) y luego detector.mask(bloque) o
+    detector.outlier_indices(bloques). Los detectores se pueden combinar con merge().
+    """
+
+    def __init__(self, method: str = "zscore", threshold: Optional[float] = None, sketch_size: int = 2048):
+        _check_method(method)
+        self.method = method
+        self.threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+        self.sketch_size = sketch_size
+        self.moments: Dict[str, np.ndarray] = {}
+        self.sketches: Dict[str, QuantileSketch] = {}
+        self._bounds: Optional[Dict[str, Tuple[float, float]]] = None
+
+    def partial_fit(self, chunk: pd.DataFrame) -> "OutlierDetector":
+        """Agrega un bloque a las estadísticas."""
+        for col in chunk.select_dtypes(include="number").columns:
+            values = chunk[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            if self.method == "zscore":
+                values = values[~np.isnan(values)]
+                if values.size:
+                    mean = values.mean()
+                    self._merge_moments(col, np.array([values.size, mean, ((values - mean) ** 2).sum()]))
+            else:
+                self.sketches.setdefault(col, QuantileSketch(k=self.sketch_size)).update(values)
+        self._bounds = None
+        return self
+
+    def _merge_moments(self, col: str, other: np.ndarray) -> None:
+        current = self.moments.get(col)
+        if current is None:
+            self.moments[col] = other
+            return
+        na, ma, m2a = current
+        nb, mb, m2b = other
+        n = na + nb
+        delta = mb - ma
+        self.moments[col] = np.array([n, ma + delta * nb / n, m2a + m2b + delta ** 2 * na * nb / n])
+
+    def fit(self, chunks: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> "OutlierDetector":
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+        for chunk in chunks:
+            self.partial_fit(chunk)
+        return self
+
+    def merge(self, other: "OutlierDetector") -> "OutlierDetector":
+        """Combina un detector entrenado sobre otra partición de los datos."""
+        if other.method != self.method:
+            raise ValueError("Solo se pueden combinar detectores del mismo método.")
+        for col, moments in other.moments.items():
+            self._merge_moments(col, moments.copy())
+        for col, sketch in other.sketches.items():
+            self.sketches.setdefault(col, QuantileSketch(k=self.sketch_size)).merge(sketch)
+        self._bounds = None
+        return self
+
+    @property
+    def bounds(self) -> Dict[str, Tuple[float, float]]:
+        if self._bounds is None:
+            bounds = {}
+            for col, (n, mean, m2) in self.moments.items():
+                bounds[col] = _bounds_from_stats(self.method, self.threshold, mean, np.sqrt(m2 / n))
+            for col, sketch in self.sketches.items():
+                if self.method == "iqr":
+                    q1, q3 = sketch.quantiles([0.25, 0.75])
+                    bounds[col] = _bounds_from_stats(self.method, self.threshold, np.nan, np.nan, q1, q3)
+                else:
+                    median, mad = sketch.median_abs_deviation()
+                    bounds[col] = _bounds_from_stats(self.method, self.threshold, median, mad)
+            self._bounds = bounds
+        return self._bounds
+
+    def mask(self, chunk: pd.DataFrame) -> np.ndarray:
+        return outlier_mask(chunk, self.bounds)
+
+    def outlier_indices(self, chunks: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> np.ndarray:
+        """Etiquetas de índice de las filas outlier (los bloques deben traer índice global)."""
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+        found = [chunk.index.to_numpy()[self.mask(chunk)] for chunk in chunks]
+        indices = np.concatenate(found) if found else np.array([], dtype=np.int64)
+        log_info(logger, f"Outliers detectados por bloques ({self.method}): {len(indices)} filas.")
+        return indices
+
+
+@traced("remove_anomalies", "analytics")
 def remove_anomalies(df: pd.DataFrame) -> pd.DataFrame:
     try:
         clean_df = df[df.get("is_outlier", False) == False].drop(columns=["is_outlier"], errors="ignore")
@@ -45,6 +214,7 @@ def remove_anomalies(df: pd.DataFrame) -> pd.DataFrame:
         raise
 
 
+@traced("flag_noisy_data", "analytics")
 def flag_noisy_data(df: pd.DataFrame) -> pd.DataFrame:
     try:
         df_copy = df.copy()
@@ -58,6 +228,7 @@ def flag_noisy_data(df: pd.DataFrame) -> pd.DataFrame:
         raise
 
 
+@traced("score_data_quality", "analytics")
 def score_data_quality(df: pd.DataFrame) -> float:
     try:
         total_rows = len(df)
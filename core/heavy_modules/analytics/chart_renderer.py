@@ -0,0 +1,227 @@
+# core/heavy_modules/analytics/chart_renderer.py
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+from core.utils.tracer import traced
+
+logger = init_logger("ChartRenderer")
+
+# Archivo (dentro de cada carpeta de salida) con el hash de los datos de cada gráfico
+MANIFEST_NAME = ".charts_manifest.json"
+
+# Versión del estilo: cambiarla invalida los gráficos ya renderizados
+STYLE_VERSION = 1
+
+# Por debajo de este número de gráficos pendientes no compensa arrancar procesos
+MIN_CHARTS_FOR_POOL = 16
+
+# Heatmaps: sin anotaciones por encima de ANNOTATE_MAX columnas,
+# y se conservan solo las HEATMAP_MAX_COLUMNS más correlacionadas por encima de ese tamaño
+ANNOTATE_MAX = 20
+HEATMAP_MAX_COLUMNS = 60
+
+
+# ---------------------------------------------------------------
+# Especificaciones de gráficos (datos ya reducidos, baratos de enviar a un proceso)
+# ---------------------------------------------------------------
+@dataclass
+class HistogramSpec:
+    filename: str
+    title: str
+    xlabel: str
+    counts: np.ndarray
+    edges: np.ndarray
+    kind: str = field(default="histogram", init=False)
+
+    def payload(self) -> bytes:
+        return self.counts.tobytes() + self.edges.tobytes() + f"{self.title}|{self.xlabel}".encode("utf-8")
+
+
+@dataclass
+class HeatmapSpec:
+    filename: str
+    title: str
+    labels: List[str]
+    matrix: np.ndarray
+    annotate: bool = True
+    kind: str = field(default="heatmap", init=False)
+
+    def payload(self) -> bytes:
+        meta = json.dumps([self.title, self.labels, self.annotate], ensure_ascii=False)
+        return np.ascontiguousarray(self.matrix, dtype=np.float32).tobytes() + meta.encode("utf-8")
+
+
+def spec_hash(spec) -> str:
+    h = hashlib.sha256(f"{spec.kind}|{STYLE_VERSION}|".encode("utf-8"))
+    h.update(spec.payload())
+    return h.hexdigest()
+
+
+def histogram_spec(values, name: str, bins: int = 20) -> HistogramSpec:
+    """Precalcula el histograma con np.histogram (los nulos se ignoran)."""
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    counts, edges = np.histogram(values, bins=bins) if values.size else (np.zeros(bins, dtype=np.int64),
+                                                                         np.linspace(0, 1, bins + 1))
+    return HistogramSpec(filename=f"{name}_hist.png", title=f"Histograma de {name}", xlabel=name,
+                         counts=counts, edges=edges)
+
+
+def heatmap_spec(matrix: np.ndarray, labels: Sequence[str], filename: str, title: str = "Matriz de Correlación",
+                 max_columns: int = HEATMAP_MAX_COLUMNS, annotate: Optional[bool] = None) -> HeatmapSpec:
+    """
+    Prepara un heatmap de correlación. Con más de `max_columns` columnas se
+    conservan las de mayor |r| fuera de la diagonal; las anotaciones se
+    desactivan automáticamente por encima de ANNOTATE_MAX columnas.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    labels = list(labels)
+    if len(labels) > max_columns:
+        strength = np.abs(np.nan_to_num(matrix))
+        np.fill_diagonal(strength, 0)
+        keep = np.sort(np.argsort(-strength.max(axis=0), kind="stable")[:max_columns])
+        log_warning(logger, f"Heatmap reducido de {len(labels)} a {max_columns} columnas (mayor |r|).")
+        matrix = matrix[np.ix_(keep, keep)]
+        labels = [labels[i] for i in keep]
+    if annotate is None:
+        annotate = len(labels) <= ANNOTATE_MAX
+    return HeatmapSpec(filename=filename, title=title, labels=labels, matrix=matrix, annotate=annotate)
+
+
+# ---------------------------------------------------------------
+# Renderizado (Agg, API orientada a objetos, plantilla reutilizada por proceso)
+# ---------------------------------------------------------------
+_templates: Dict[str, Figure] = {}
+
+
+def _template(kind: str, figsize) -> Figure:
+    """Figura reutilizable por tipo de gráfico: evita crear figura y canvas en cada render."""
+    fig = _templates.get(kind)
+    if fig is None:
+        fig = Figure(figsize=figsize)
+        FigureCanvasAgg(fig)
+        _templates[kind] = fig
+    fig.clf()
+    return fig
+
+
+def _render_histogram(spec: HistogramSpec, path: Path) -> None:
+    fig = _template("histogram", (6.4, 4.8))
+    ax = fig.add_subplot()
+    ax.bar(spec.edges[:-1], spec.counts, width=np.diff(spec.edges), align="edge",
+           color="steelblue", edgecolor="black")
+    ax.grid(True, alpha=0.3)
+    ax.set_title(spec.title)
+    ax.set_xlabel(spec.xlabel)
+    ax.set_ylabel("Frecuencia")
+    fig.savefig(path)
+
+
+def _render_heatmap(spec: HeatmapSpec, path: Path) -> None:
+    n = len(spec.labels)
+    size = min(max(8.0, n * 0.25), 24.0)
+    fig = _template("heatmap", (size + 2, size))
+    fig.set_size_inches(size + 2, size)
+    ax = fig.add_subplot()
+    image = ax.imshow(spec.matrix, cmap="coolwarm", vmin=-1, vmax=1, interpolation="nearest")
+    fig.colorbar(image, ax=ax)
+    ticks = np.arange(n)
+    ax.set_xticks(ticks, labels=spec.labels, rotation=90, fontsize=max(4, 10 - n // 15))
+    ax.set_yticks(ticks, labels=spec.labels, fontsize=max(4, 10 - n // 15))
+    if spec.annotate:
+        for i in range(n):
+            for j in range(n):
+                value = spec.matrix[i, j]
+                if np.isfinite(value):
+                    ax.text(j, i, f"{value:.2f}", ha="center", va="center", fontsize=8)
+    ax.set_title(spec.title)
+    fig.tight_layout()
+    fig.savefig(path)
+
+
+_RENDERERS = {"histogram": _render_histogram, "heatmap": _render_heatmap}
+
+
+def _render_batch(specs: list, output_dir: str) -> List[str]:
+    """Renderiza un lote de gráficos en el proceso actual (también es la unidad de trabajo del pool)."""
+    paths = []
+    for spec in specs:
+        path = Path(output_dir) / spec.filename
+        _RENDERERS[spec.kind](spec, path)
+        paths.append(str(path))
+    return paths
+
+
+# ---------------------------------------------------------------
+# Servicio de renderizado
+# ---------------------------------------------------------------
+def _load_manifest(output_dir: Path) -> dict:
+    try:
+        with open(output_dir / MANIFEST_NAME, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_manifest(output_dir: Path, manifest: dict) -> None:
+    tmp_path = output_dir / f"{MANIFEST_NAME}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, output_dir / MANIFEST_NAME)
+
+
+@traced("render_charts", "analytics")
+def render_charts(specs: list, output_dir, workers: Optional[int] = None, force: bool = False) -> List[str]:
+    """
+    Renderiza gráficos en `output_dir` y retorna las rutas de todos ellos.
+
+    - Omite los gráficos cuyo archivo existe y cuyos datos (hash) no cambiaron.
+    - workers=None decide solo: pool de procesos si hay al menos
+      MIN_CHARTS_FOR_POOL pendientes; workers=1 fuerza modo secuencial.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    start = time.perf_counter()
+    try:
+        manifest = {} if force else _load_manifest(output_dir)
+        hashes = {spec.filename: spec_hash(spec) for spec in specs}
+        pending = [
+            spec for spec in specs
+            if manifest.get(spec.filename) != hashes[spec.filename] or not (output_dir / spec.filename).exists()
+        ]
+
+        if workers is None:
+            workers = min(os.cpu_count() or 1, 8) if len(pending) >= MIN_CHARTS_FOR_POOL else 1
+        workers = max(1, min(workers, len(pending) or 1))
+
+        if workers > 1:
+            # Lotes intercalados: cada proceso reutiliza su plantilla en muchos gráficos
+            batches = [pending[i::workers] for i in range(workers)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(_render_batch, batches, [str(output_dir)] * workers))
+        elif pending:
+            _render_batch(pending, str(output_dir))
+
+        manifest.update({spec.filename: hashes[spec.filename] for spec in pending})
+        _save_manifest(output_dir, manifest)
+        log_info(
+            logger,
+            f"Gráficos en {output_dir}: {len(pending)} renderizados, {len(specs) - len(pending)} sin cambios "
+            f"({workers} procesos, {time.perf_counter() - start:.2f}s)."
+        )
+        return [str(output_dir / spec.filename) for spec in specs]
+    except Exception as e:
+        log_error(logger, f"Error al renderizar gráficos: {e}")
+        raise
@@ -1,20 +1,156 @@
 # core/heavy_modules/analytics/correlation_analysis.py
 
+import warnings
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
 import pandas as pd
-import seaborn as sns
-import matplotlib.pyplot as plt
 from pathlib import Path
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced
 from core.utils.file_manager import validate_path
+from core.heavy_modules.analytics.chart_renderer import HEATMAP_MAX_COLUMNS, heatmap_spec, render_charts
 import numpy as np
 
 
 logger = init_logger("CorrelationAnalysis")
 
+# Columnas por bloque en el producto matricial: acota los temporales en tablas anchas
+DEFAULT_BLOCK_SIZE = 512
+
+
+@dataclass
+class CorrelationResult:
+    """
+    Matriz de correlación calculada una sola vez y compartida por el prompt,
+    el reporte de multicolinealidad y los gráficos.
+    """
+    columns: List[str]
+    matrix: np.ndarray
+    method: str = "pearson"
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.matrix.astype(np.float64), index=self.columns, columns=self.columns)
+
+    def select(self, columns) -> "CorrelationResult":
+        """Submatriz de las columnas dadas (las que no están en la matriz se ignoran)."""
+        position = {c: i for i, c in enumerate(self.columns)}
+        idx = np.array([position[c] for c in columns if c in position], dtype=np.intp)
+        return CorrelationResult(columns=[self.columns[i] for i in idx],
+                                 matrix=self.matrix[np.ix_(idx, idx)], method=self.method)
+
+    def pairs(self, threshold: Optional[float] = None, top_k: Optional[int] = None,
+              absolute: bool = False) -> List[Tuple[str, str, float]]:
+        """
+        Pares (col_a, col_b, r) del triángulo superior, ordenados por |r| descendente.
+        threshold filtra |r| > threshold; top_k se queda con los k más fuertes.
+        absolute=True retorna |r| en lugar de r.
+        """
+        rows, cols = np.triu_indices(len(self.columns), k=1)
+        values = self.matrix[rows, cols]
+        strength = np.abs(values)
+        keep = ~np.isnan(strength)
+        if threshold is not None:
+            keep &= strength > threshold
+        idx = np.flatnonzero(keep)
+
+        if top_k is not None and idx.size > top_k:
+            idx = idx[np.argpartition(-strength[idx], top_k - 1)[:top_k]]
+        # Orden determinista: |r| descendente y, en empates, posición en la matriz
+        idx = idx[np.lexsort((idx, -strength[idx]))]
+
+        out = strength if absolute else values
+        return [(self.columns[rows[i]], self.columns[cols[i]], float(out[i])) for i in idx]
+
+
+def _rank_columns(numeric: pd.DataFrame) -> pd.DataFrame:
+    """Transformación a rangos promedio por columna (Spearman = Pearson sobre rangos)."""
+    return numeric.rank(method="average")
+
+
+def _pearson_blocks(X: np.ndarray, dtype, block_size: int) -> np.ndarray:
+    """
+    Pearson por bloques de columnas con productos matriciales (BLAS).
+    Sin nulos: datos estandarizados en `dtype` y un único Z_i^T Z_j por bloque.
+    Con nulos: exclusión por pares (como DataFrame.corr) acumulando N, Σx, Σx² y Σxy.
+    """
+    n_rows, p = X.shape
+    corr = np.full((p, p), np.nan, dtype=dtype)
+    valid = ~np.isnan(X)
+
+    if valid.all():
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = X.mean(axis=0)
+            norm = np.sqrt(((X - mean) ** 2).sum(axis=0))
+            Z = ((X - mean) / norm).astype(dtype)
+        for i in range(0, p, block_size):
+            Zi = Z[:, i:i + block_size]
+            for j in range(i, p, block_size):
+                block = Zi.T @ Z[:, j:j + block_size]
+                corr[i:i + block_size, j:j + block_size] = block
+                corr[j:j + block_size, i:i + block_size] = block.T
+    else:
+        V = valid.astype(np.float64)
+        # Centrar por la media de cada columna reduce la cancelación en Σx² - (Σx)²/n
+        with np.errstate(invalid="ignore"), warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            X0 = np.where(valid, X - np.nanmean(X, axis=0), 0.0)
+        X2 = X0 ** 2
+        for i in range(0, p, block_size):
+            sl_i = slice(i, i + block_size)
+            for j in range(i, p, block_size):
+                sl_j = slice(j, j + block_size)
+                n = V[:, sl_i].T @ V[:, sl_j]
+                sx = X0[:, sl_i].T @ V[:, sl_j]           # Σx_i donde x_i y x_j son válidos
+                sy = V[:, sl_i].T @ X0[:, sl_j]           # Σx_j donde ambos son válidos
+                sxx = X2[:, sl_i].T @ V[:, sl_j]
+                syy = V[:, sl_i].T @ X2[:, sl_j]
+                sxy = X0[:, sl_i].T @ X0[:, sl_j]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    cov = sxy - sx * sy / n
+                    block = cov / np.sqrt((sxx - sx ** 2 / n) * (syy - sy ** 2 / n))
+                block = np.where(n > 1, block, np.nan).astype(dtype)
+                corr[sl_i, sl_j] = block
+                corr[sl_j, sl_i] = block.T
+
+    corr = np.clip(corr, -1.0, 1.0)
+    diag = np.diag(corr).copy()
+    np.fill_diagonal(corr, np.where(np.isnan(diag), np.nan, 1.0))
+    return corr
+
+
+@traced("compute_correlation_result", "analytics")
+def compute_correlation_result(df: pd.DataFrame, method: str = "pearson", dtype=np.float32,
+                               block_size: int = DEFAULT_BLOCK_SIZE) -> CorrelationResult:
+    """
+    Calcula la matriz de correlación de las columnas numéricas una sola vez.
+    pearson/spearman usan productos matriciales en float32 (spearman sobre rangos);
+    kendall recurre a pandas.
+    """
+    try:
+        numeric = df.select_dtypes(include="number")
+        columns = list(numeric.columns)
+        if method == "kendall":
+            matrix = numeric.corr(method="kendall").to_numpy(dtype=dtype)
+        elif method in ("pearson", "spearman"):
+            if method == "spearman":
+                numeric = _rank_columns(numeric)
+            X = numeric.to_numpy(dtype=np.float64, na_value=np.nan)
+            matrix = _pearson_blocks(X, dtype, block_size)
+        else:
+            raise ValueError(f"Método de correlación no soportado: {method}")
 
+        log_info(logger, f"Matriz de correlación ({method}) calculada para {len(columns)} columnas.")
+        return CorrelationResult(columns=columns, matrix=matrix, method=method)
+    except Exception as e:
+        log_error(logger, f"Error al calcular correlaciones: {e}")
+        raise
+
+
+@traced("compute_correlations", "analytics")
 def compute_correlations(df: pd.DataFrame, method: str = "pearson") -> pd.DataFrame:
     try:
-        corr_matrix = df.corr(method=method, numeric_only=True)
+        corr_matrix = compute_correlation_result(df, method=method).to_frame()
         log_info(logger, f"Matriz de correlación ({method}) calculada correctamente.")
         return corr_matrix
     except Exception as e:
@@ -22,14 +158,81 @@ def compute_correlations(df: pd.DataFrame, method: str = "pearson") -> pd.DataFr
         raise
 
 
-def detect_multicollinearity(df: pd.DataFrame, threshold: float = 0.9) -> list:
+@traced("compute_correlations_chunked", "analytics")
+def compute_correlations_chunked(chunks, method: str = "pearson") -> pd.DataFrame:
+    """
+    Correlación de Pearson exacta sobre un iterable de bloques (exclusión de nulos
+    por pares, como DataFrame.corr). Por cada par de columnas se acumulan N, medias,
+    M2 y co-momento centrados; cada bloque se centra en sus propias medias y se
+    combina con la actualización por pares de Chan (como StatsAccumulator), así las
+    medias grandes no se cancelan numéricamente.
+    Spearman/Kendall necesitan rangos globales y no se soportan en este modo.
+    """
+    if method != "pearson":
+        raise ValueError(f"Método '{method}' no soportado por bloques; solo 'pearson'.")
+    try:
+        columns = None
+        for chunk in chunks:
+            numeric = chunk.select_dtypes(include="number")
+            if columns is None:
+                columns = list(numeric.columns)
+                k = len(columns)
+                # [i, j]: estadísticos de x_i sobre las filas donde x_i y x_j son válidos
+                n = np.zeros((k, k))
+                mean = np.zeros((k, k))
+                m2 = np.zeros((k, k))
+                comoment = np.zeros((k, k))
+            X = numeric.reindex(columns=columns).to_numpy(dtype=np.float64, na_value=np.nan)
+            valid = ~np.isnan(X)
+            if not valid.any():
+                continue
+            V = valid.astype(np.float64)
+            # Centrar por la media del bloque evita la cancelación en Σx² - (Σx)²/n
+            shift = np.divide(np.nansum(X, axis=0), valid.sum(axis=0),
+                              out=np.zeros(len(columns)), where=valid.any(axis=0))
+            X0 = np.where(valid, X - shift, 0.0)
+
+            nb = V.T @ V
+            sx = X0.T @ V
+            with np.errstate(invalid="ignore", divide="ignore"):
+                mb = np.where(nb > 0, sx / nb, 0.0)
+                m2b = np.where(nb > 0, (X0 ** 2).T @ V - sx * mb, 0.0)
+                cb = np.where(nb > 0, X0.T @ X0 - sx * mb.T, 0.0)
+                mb = mb + shift[:, None]
+
+                # Actualización de Chan: delta de medias entre lo acumulado y el bloque
+                total = n + nb
+                delta = mb - mean
+                weight = np.where(total > 0, n * nb / total, 0.0)
+                mean = mean + delta * np.where(total > 0, nb / total, 0.0)
+                m2 = m2 + m2b + delta ** 2 * weight
+                comoment = comoment + cb + delta * delta.T * weight
+            n = total
+
+        if columns is None:
+            return pd.DataFrame()
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = comoment / np.sqrt(m2 * m2.T)
+        corr = np.where(n > 1, np.clip(corr, -1.0, 1.0), np.nan)
+        corr_matrix = pd.DataFrame(corr, index=columns, columns=columns)
+        log_info(logger, "Matriz de correlación (pearson) calculada por bloques.")
+        return corr_matrix
+    except Exception as e:
+        log_error(logger, f"Error al calcular correlaciones por bloques: {e}")
+        raise
+
+
+@traced("detect_multicollinearity", "analytics")
+def detect_multicollinearity(df: pd.DataFrame, threshold: float = 0.9,
+                             corr: Optional[CorrelationResult] = None) -> list:
+    """
+    Pares (col_a, col_b, |r|) con |r| > threshold, del más fuerte al más débil.
+    Acepta un CorrelationResult ya calculado para no recalcular la matriz.
+    """
     try:
-        corr = df.corr(numeric_only=True).abs()
-        upper = corr.where(pd.DataFrame(np.triu(np.ones(corr.shape), k=1), index=corr.index, columns=corr.columns).astype(bool))
-        high_corr = [(col, row, corr_val)
-                     for col in upper.columns
-                     for row, corr_val in upper[col].items()
-                     if corr_val > threshold]
+        corr = corr or compute_correlation_result(df)
+        high_corr = corr.pairs(threshold=threshold, absolute=True)
         log_info(logger, f"Se detectaron {len(high_corr)} pares altamente correlacionados.")
         return high_corr
     except Exception as e:
@@ -37,16 +240,28 @@ def detect_multicollinearity(df: pd.DataFrame, threshold: float = 0.9) -> list:
         raise
 
 
-def visualize_correlation_matrix(corr_matrix: pd.DataFrame, output_file: str = "reports/analytics/correlation_heatmap.png") -> None:
+@traced("visualize_correlation_matrix", "analytics")
+def visualize_correlation_matrix(corr_matrix, output_file: str = "reports/analytics/correlation_heatmap.png",
+                                 max_columns: int = HEATMAP_MAX_COLUMNS, annotate: Optional[bool] = None,
+                                 force: bool = False) -> str:
+    """
+    Heatmap de correlación (DataFrame o CorrelationResult) renderizado con Agg.
+    Las anotaciones se omiten en matrices grandes y por encima de `max_columns`
+    se muestran solo las columnas más correlacionadas. Si la matriz no cambió
+    desde el último render, no se vuelve a dibujar.
+    """
     try:
-        output_path = validate_path(Path(output_file).parent)
-        plt.figure(figsize=(10, 8))
-        sns.heatmap(corr_matrix, annot=True, cmap="coolwarm", fmt=".2f")
-        plt.title("Matriz de Correlación")
-        plt.tight_layout()
-        plt.savefig(output_file)
-        plt.close()
+        output_path = Path(output_file)
+        validate_path(output_path.parent, create=True)
+        if isinstance(corr_matrix, CorrelationResult):
+            labels, matrix = corr_matrix.columns, corr_matrix.matrix
+        else:
+            labels, matrix = [str(c) for c in corr_matrix.columns], corr_matrix.to_numpy()
+
+        spec = heatmap_spec(matrix, labels, filename=output_path.name, max_columns=max_columns, annotate=annotate)
+        render_charts([spec], output_path.parent, workers=1, force=force)
         log_info(logger, f"Heatmap de correlación guardado en {output_file}")
+        return str(output_path)
     except Exception as e:
         log_error(logger, f"Error al visualizar matriz de correlaciones: {e}")
         raise
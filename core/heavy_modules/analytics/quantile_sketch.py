@@ -0,0 +1,130 @@
+# core/heavy_modules/analytics/quantile_sketch.py
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def weighted_quantiles(values: np.ndarray, weights: np.ndarray, quantiles: Sequence[float],
+                       lower: Optional[float] = None, upper: Optional[float] = None) -> np.ndarray:
+    """
+    Cuantiles de una muestra ponderada por interpolación lineal entre los puntos
+    medios de cada peso. `lower`/`upper` (mínimo/máximo exactos) fijan los extremos.
+    """
+    if values.size == 0:
+        return np.full(len(quantiles), np.nan)
+    order = np.argsort(values, kind="stable")
+    values = values[order]
+    weights = weights[order].astype(np.float64)
+    total = weights.sum()
+    positions = (np.cumsum(weights) - weights / 2) / total
+    if lower is not None:
+        positions = np.concatenate([[0.0], positions])
+        values = np.concatenate([[lower], values])
+    if upper is not None:
+        positions = np.concatenate([positions, [1.0]])
+        values = np.concatenate([values, [upper]])
+    return np.interp(np.asarray(quantiles, dtype=np.float64), positions, values)
+
+
+class QuantileSketch:
+    """
+    Sketch de cuantiles combinable (estilo KLL) para datos que no caben en memoria.
+
+    Los valores entran al nivel 0; cuando un nivel supera `k` elementos se ordena
+    y se promueve al siguiente nivel uno de cada dos (con desplazamiento
+    aleatorio), duplicando su peso. La memoria queda acotada a ~k·log2(n/k)
+    valores y el error de rango es del orden de log2(n/k)/k. Mientras no haya
+    compactaciones (n <= k) los cuantiles son exactos.
+    """
+
+    def __init__(self, k: int = 2048, seed: Optional[int] = None):
+        self.k = k
+        self.levels: List[np.ndarray] = [np.empty(0, dtype=np.float64)]
+        self.count = 0
+        self.min = np.nan
+        self.max = np.nan
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values) -> "QuantileSketch":
+        """Agrega valores (los NaN se ignoran)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.count += values.size
+        self.min = np.fmin(self.min, values.min())
+        self.max = np.fmax(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        """Combina otro sketch (p. ej. de otro bloque o proceso)."""
+        if other.count == 0:
+            return self
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for h, level in enumerate(other.levels):
+            if level.size:
+                self.levels[h] = np.concatenate([self.levels[h], level])
+        self.count += other.count
+        self.min = np.fmin(self.min, other.min)
+        self.max = np.fmax(self.max, other.max)
+        self._compress()
+        return self
+
+    def _compress(self) -> None:
+        h = 0
+        while h < len(self.levels):
+            level = self.levels[h]
+            if level.size > self.k:
+                level = np.sort(level)
+                # Con tamaño impar, el último elemento se queda en el nivel
+                odd = level[-1:] if level.size % 2 else level[:0]
+                even = level[:level.size - odd.size]
+                promoted = even[self._rng.integers(2)::2]
+                self.levels[h] = odd
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0, dtype=np.float64))
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    @property
+    def is_exact(self) -> bool:
+        return all(level.size == 0 for level in self.levels[1:])
+
+    def weighted_items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Valores retenidos y su peso (2^nivel)."""
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(level.size, 2 ** h, dtype=np.int64)
+                                  for h, level in enumerate(self.levels)])
+        return values, weights
+
+    def quantiles(self, quantiles: Sequence[float]) -> np.ndarray:
+        if self.count == 0:
+            return np.full(len(quantiles), np.nan)
+        if self.is_exact:
+            return np.quantile(self.levels[0], quantiles)
+        values, weights = self.weighted_items()
+        return weighted_quantiles(values, weights, quantiles, lower=self.min, upper=self.max)
+
+    def quantile(self, q: float) -> float:
+        return float(self.quantiles([q])[0])
+
+    def median_abs_deviation(self) -> Tuple[float, float]:
+        """
+        (mediana, MAD) en una sola pasada: la MAD se estima sobre los valores
+        retenidos con sus pesos, que representan la distribución completa.
+        """
+        if self.count == 0:
+            return np.nan, np.nan
+        median = self.quantile(0.5)
+        values, weights = self.weighted_items()
+        deviations = np.abs(values - median)
+        if self.is_exact:
+            return median, float(np.median(deviations))
+        return median, float(weighted_quantiles(deviations, weights, [0.5])[0])
+
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
@@ -1,19 +1,30 @@
 # core/heavy_modules/analytics/statistical_summary.py
 
 import pandas as pd
+import numpy as np
 import json
-import matplotlib.pyplot as plt
 from pathlib import Path
+from typing import List, Optional
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced
 from core.utils.file_manager import validate_path
+from core.heavy_modules.analytics.stats_engine import NumericStats, StatsAccumulator, compute_numeric_stats
+from core.heavy_modules.analytics.chart_renderer import histogram_spec, render_charts
 
 logger = init_logger("StatSummary")
 
 
-def compute_descriptive_stats(df: pd.DataFrame) -> pd.DataFrame:
+@traced("compute_descriptive_stats", "analytics")
+def compute_descriptive_stats(df: pd.DataFrame, stats: NumericStats = None) -> pd.DataFrame:
+    """
+    Equivalente a describe().T + median para las columnas numéricas.
+    Acepta un NumericStats ya calculado para no recorrer los datos de nuevo.
+    """
     try:
-        desc = df.describe().T
-        desc["median"] = df.median(numeric_only=True)
+        if stats is None and df.select_dtypes(include="number").shape[1] == 0:
+            desc = df.describe().T
+        else:
+            desc = (stats or compute_numeric_stats(df)).to_frame()
         log_info(logger, "Estadísticas descriptivas calculadas correctamente.")
         return desc
     except Exception as e:
@@ -21,29 +32,57 @@ def compute_descriptive_stats(df: pd.DataFrame) -> pd.DataFrame:
         raise
 
 
-def generate_histograms(df: pd.DataFrame, output_dir: str = "reports/analytics/histograms") -> None:
+@traced("compute_descriptive_stats_chunked", "analytics")
+def compute_descriptive_stats_chunked(chunks) -> pd.DataFrame:
+    """
+    compute_descriptive_stats sobre un iterable de bloques (p. ej. DataManager.load_data_chunks).
+    count/mean/std/min/max son exactos; los cuantiles y la mediana son aproximados.
+    """
     try:
-        output_path = validate_path(output_dir)
+        accumulator = StatsAccumulator()
+        for chunk in chunks:
+            accumulator.update(chunk)
+        desc = accumulator.result().to_frame()
+        log_info(logger, f"Estadísticas descriptivas calculadas por bloques ({accumulator.n_chunks} bloques).")
+        return desc
+    except Exception as e:
+        log_error(logger, f"Error al calcular estadísticas descriptivas por bloques: {e}")
+        raise
+
+
+@traced("generate_histograms", "analytics")
+def generate_histograms(df: pd.DataFrame, output_dir: str = "reports/analytics/histograms",
+                        bins: int = 20, workers: Optional[int] = None, force: bool = False) -> List[str]:
+    """
+    Genera un histograma por columna numérica (PNG). Los conteos se calculan con
+    np.histogram y el dibujo se delega a chart_renderer (Agg, pool de procesos,
+    se omiten los gráficos cuyos datos no cambiaron). Retorna las rutas generadas.
+    """
+    try:
+        output_path = Path(output_dir)
+        validate_path(output_path, create=True)
         numeric_cols = df.select_dtypes(include="number").columns
 
-        for col in numeric_cols:
-            plt.figure()
-            df[col].hist(bins=20, color='steelblue', edgecolor='black')
-            plt.title(f"Histograma de {col}")
-            plt.xlabel(col)
-            plt.ylabel("Frecuencia")
-            plt.savefig(Path(output_path) / f"{col}_hist.png")
-            plt.close()
+        specs = [
+            histogram_spec(df[col].to_numpy(dtype="float64", na_value=np.nan), str(col), bins=bins)
+            for col in numeric_cols
+        ]
+        paths = render_charts(specs, output_path, workers=workers, force=force)
 
         log_info(logger, f"Histogramas generados y guardados en {output_path}")
+        return paths
     except Exception as e:
         log_error(logger, f"Error al generar histogramas: {e}")
         raise
 
 
-def summary_to_json(summary_df: pd.DataFrame, output_file: str = "reports/analytics/descriptive_stats.json") -> None:
+@traced("summary_to_json", "analytics")
+def summary_to_json(summary_df, output_file: str = "reports/analytics/descriptive_stats.json") -> None:
+    """Exporta el resumen (DataFrame o NumericStats) a JSON."""
     try:
         output_path = validate_path(Path(output_file).parent)
+        if isinstance(summary_df, NumericStats):
+            summary_df = summary_df.to_frame(extended=True)
         summary_json = summary_df.to_dict(orient="index")
 
         with open(output_file, "w", encoding="utf-8") as f:
@@ -0,0 +1,296 @@
+# core/heavy_modules/analytics/stats_engine.py
+
+import warnings
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+import numpy as np
+import pandas as pd
+from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced
+from core.heavy_modules.analytics.quantile_sketch import QuantileSketch
+
+logger = init_logger("StatsEngine")
+
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+# Columnas procesadas por bloque: acota la memoria de las matrices temporales
+_COLUMN_BLOCK = 32
+
+
+@dataclass
+class NumericStats:
+    """
+    Estadísticas de todas las columnas numéricas calculadas en una sola pasada.
+    Cada atributo es un array alineado con `columns`.
+    """
+    columns: List[str]
+    count: np.ndarray
+    null_count: np.ndarray
+    mean: np.ndarray
+    std: np.ndarray
+    min: np.ndarray
+    max: np.ndarray
+    quantiles: Dict[float, np.ndarray]
+    mode: np.ndarray
+    outliers: np.ndarray
+    z_threshold: float = 3.0
+
+    @property
+    def median(self) -> np.ndarray:
+        return self.quantiles[0.5]
+
+    def to_frame(self, extended: bool = False) -> pd.DataFrame:
+        """
+        Tabla equivalente a describe().T + median.
+        Con extended=True agrega moda, outliers y nulos.
+        """
+        data = {
+            "count": self.count.astype(float),
+            "mean": self.mean,
+            "std": self.std,
+            "min": self.min,
+        }
+        for q, values in self.quantiles.items():
+            data[f"{q * 100:g}%"] = values
+        data["max"] = self.max
+        data["median"] = self.median
+        if extended:
+            data["mode"] = self.mode
+            data["outliers"] = self.outliers
+            data["nulls"] = self.null_count
+        return pd.DataFrame(data, index=pd.Index(self.columns))
+
+    def select(self, columns: Sequence[str]) -> "NumericStats":
+        """Subconjunto de columnas (en el orden dado), sin recalcular nada."""
+        position = {c: i for i, c in enumerate(self.columns)}
+        idx = np.array([position[c] for c in columns if c in position], dtype=np.intp)
+        return NumericStats(
+            columns=[self.columns[i] for i in idx],
+            count=self.count[idx],
+            null_count=self.null_count[idx],
+            mean=self.mean[idx],
+            std=self.std[idx],
+            min=self.min[idx],
+            max=self.max[idx],
+            quantiles={q: values[idx] for q, values in self.quantiles.items()},
+            mode=self.mode[idx],
+            outliers=self.outliers[idx],
+            z_threshold=self.z_threshold,
+        )
+
+    def row(self, col: str) -> dict:
+        """Estadísticas de una columna como diccionario."""
+        i = self.columns.index(col)
+        outliers = self.outliers[i]
+        return {
+            "count": int(self.count[i]),
+            "mean": self.mean[i],
+            "median": self.median[i],
+            "mode": self.mode[i],
+            "std": self.std[i],
+            "min": self.min[i],
+            "max": self.max[i],
+            # Puede no estar disponible (NaN) en resultados combinados por bloques
+            "outliers": int(outliers) if np.isfinite(outliers) else None,
+            "nulls": int(self.null_count[i]),
+        }
+
+
+def _block_stats(X: np.ndarray, quantiles: Sequence[float], z_threshold: float) -> dict:
+    """Calcula todas las estadísticas de un bloque (n_filas x n_cols) de floats."""
+    n_rows, n_cols = X.shape
+    valid = ~np.isnan(X)
+    count = valid.sum(axis=0)
+
+    with warnings.catch_warnings(), np.errstate(invalid="ignore", divide="ignore"):
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(X, axis=0)
+        std = np.nanstd(X, axis=0, ddof=1)
+        std0 = np.nanstd(X, axis=0, ddof=0)
+
+        # Outliers por z-score (misma definición que scipy.stats.zscore, ddof=0)
+        outliers = (np.abs(X - mean) > z_threshold * std0).sum(axis=0)
+
+    # Un único sort por columna alimenta min/max, cuantiles y moda (NaN quedan al final)
+    Xs = np.sort(X, axis=0)
+    has_data = count > 0
+    last = np.maximum(count - 1, 0)
+    cols = np.arange(n_cols)
+
+    minimum = np.where(has_data, Xs[0] if n_rows else np.nan, np.nan)
+    maximum = np.where(has_data, Xs[last, cols] if n_rows else np.nan, np.nan)
+
+    quantile_values = {}
+    for q in quantiles:
+        pos = last * q
+        lo = np.floor(pos).astype(int)
+        hi = np.ceil(pos).astype(int)
+        if n_rows:
+            values = Xs[lo, cols] + (Xs[hi, cols] - Xs[lo, cols]) * (pos - lo)
+        else:
+            values = np.full(n_cols, np.nan)
+        quantile_values[q] = np.where(has_data, values, np.nan)
+
+    # Moda: corrida más larga de valores iguales en la columna ordenada.
+    # argmax devuelve la primera corrida máxima → el menor valor, como pandas.mode().iloc[0]
+    if n_rows > 1:
+        eq = Xs[1:] == Xs[:-1]
+        runs = np.cumsum(eq, axis=0)
+        resets = np.maximum.accumulate(np.where(eq, 0, runs), axis=0)
+        run_len = runs - resets
+        best = run_len.argmax(axis=0)
+        mode = np.where(run_len[best, cols] > 0, Xs[best + 1, cols], Xs[0])
+    elif n_rows == 1:
+        mode = Xs[0].copy()
+    else:
+        mode = np.full(n_cols, np.nan)
+    mode = np.where(has_data, mode, np.nan)
+
+    return {
+        "count": count,
+        "null_count": n_rows - count,
+        "mean": mean,
+        "std": std,
+        "min": minimum,
+        "max": maximum,
+        "quantiles": quantile_values,
+        "mode": mode,
+        "outliers": outliers,
+    }
+
+
+@traced("compute_numeric_stats", "analytics")
+def compute_numeric_stats(df: pd.DataFrame, quantiles: Sequence[float] = DEFAULT_QUANTILES,
+                          z_threshold: float = 3.0) -> NumericStats:
+    """
+    Calcula count/mean/std/min/max/cuantiles/moda/outliers de todas las
+    columnas numéricas con operaciones vectorizadas de NumPy.
+    """
+    try:
+        quantiles = tuple(sorted(set(quantiles) | {0.5}))
+        numeric_df = df.select_dtypes(include="number")
+        columns = list(numeric_df.columns)
+
+        blocks = []
+        for start in range(0, len(columns), _COLUMN_BLOCK):
+            block_cols = columns[start:start + _COLUMN_BLOCK]
+            X = numeric_df[block_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+            blocks.append(_block_stats(X, quantiles, z_threshold))
+
+        def _concat(name):
+            if not blocks:
+                return np.array([], dtype=float)
+            return np.concatenate([b[name] for b in blocks])
+
+        stats = NumericStats(
+            columns=columns,
+            count=_concat("count"),
+            null_count=_concat("null_count"),
+            mean=_concat("mean"),
+            std=_concat("std"),
+            min=_concat("min"),
+            max=_concat("max"),
+            quantiles={
+                q: np.concatenate([b["quantiles"][q] for b in blocks]) if blocks else np.array([], dtype=float)
+                for q in quantiles
+            },
+            mode=_concat("mode"),
+            outliers=_concat("outliers"),
+            z_threshold=z_threshold,
+        )
+        log_info(logger, f"Estadísticas numéricas calculadas para {len(columns)} columnas.")
+        return stats
+    except Exception as e:
+        log_error(logger, f"Error calculando estadísticas numéricas: {e}")
+        raise
+
+
+class StatsAccumulator:
+    """
+    Combina estadísticas numéricas calculadas por bloques (chunks).
+
+    count, nulos, media, desviación, mínimo y máximo se combinan de forma exacta
+    (fórmula de Chan para la varianza). Los cuantiles salen de un QuantileSketch
+    por columna (exactos hasta `sketch_size` valores, aproximados después);
+    moda y outliers no son combinables y quedan como NaN.
+    """
+
+    def __init__(self, quantiles: Sequence[float] = DEFAULT_QUANTILES, sketch_size: int = 2048):
+        self.quantiles = tuple(sorted(set(quantiles) | {0.5}))
+        self.sketch_size = sketch_size
+        self.n_chunks = 0
+        self.count = pd.Series(dtype=float)
+        self.null_count = pd.Series(dtype=float)
+        self.mean = pd.Series(dtype=float)
+        self.m2 = pd.Series(dtype=float)
+        self.min = pd.Series(dtype=float)
+        self.max = pd.Series(dtype=float)
+        self.sketches: Dict[str, QuantileSketch] = {}
+
+    def update(self, df: pd.DataFrame) -> "StatsAccumulator":
+        """Agrega un bloque de datos."""
+        chunk = compute_numeric_stats(df, quantiles=self.quantiles)
+        idx = pd.Index(chunk.columns)
+        count = pd.Series(chunk.count, index=idx, dtype=float)
+        mean = pd.Series(chunk.mean, index=idx).fillna(0.0)
+        m2 = (pd.Series(chunk.std, index=idx) ** 2 * (count - 1)).fillna(0.0)
+
+        self._merge_moments(count, mean, m2)
+        self.null_count = self.null_count.add(pd.Series(chunk.null_count, index=idx, dtype=float), fill_value=0)
+        self.min = pd.concat([self.min, pd.Series(chunk.min, index=idx)], axis=1).min(axis=1)
+        self.max = pd.concat([self.max, pd.Series(chunk.max, index=idx)], axis=1).max(axis=1)
+        for col in chunk.columns:
+            sketch = self.sketches.setdefault(col, QuantileSketch(k=self.sketch_size))
+            sketch.update(df[col].to_numpy(dtype=np.float64, na_value=np.nan))
+        self.n_chunks += 1
+        return self
+
+    def _merge_moments(self, count: pd.Series, mean: pd.Series, m2: pd.Series) -> None:
+        cols = self.count.index.union(count.index, sort=False)
+        na = self.count.reindex(cols, fill_value=0.0)
+        nb = count.reindex(cols, fill_value=0.0)
+        ma = self.mean.reindex(cols, fill_value=0.0)
+        mb = mean.reindex(cols, fill_value=0.0)
+        n = na + nb
+        delta = mb - ma
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean = (ma + delta * (nb / n)).where(n > 0, 0.0)
+            self.m2 = (self.m2.reindex(cols, fill_value=0.0) + m2.reindex(cols, fill_value=0.0)
+                       + (delta ** 2 * na * nb / n).where(n > 0, 0.0))
+        self.count = n
+
+    def merge(self, other: "StatsAccumulator") -> "StatsAccumulator":
+        """Combina otro acumulador (p. ej. calculado en otro proceso)."""
+        self._merge_moments(other.count, other.mean, other.m2)
+        self.null_count = self.null_count.add(other.null_count, fill_value=0)
+        self.min = pd.concat([self.min, other.min], axis=1).min(axis=1)
+        self.max = pd.concat([self.max, other.max], axis=1).max(axis=1)
+        for col, sketch in other.sketches.items():
+            self.sketches.setdefault(col, QuantileSketch(k=self.sketch_size)).merge(sketch)
+        self.n_chunks += other.n_chunks
+        return self
+
+    def result(self) -> NumericStats:
+        cols = list(self.count.index)
+        count = self.count.reindex(cols).to_numpy()
+        has_data = count > 0
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2.reindex(cols).to_numpy() / (count - 1))
+        per_column = np.array([self.sketches[col].quantiles(self.quantiles) for col in cols]).reshape(
+            len(cols), len(self.quantiles)
+        )
+        quantiles = {q: per_column[:, i] for i, q in enumerate(self.quantiles)}
+        nan = np.full(len(cols), np.nan)
+        return NumericStats(
+            columns=cols,
+            count=count.astype(int),
+            null_count=self.null_count.reindex(cols, fill_value=0).to_numpy().astype(int),
+            mean=np.where(has_data, self.mean.reindex(cols).to_numpy(), np.nan),
+            std=np.where(count > 1, std, np.nan),
+            min=self.min.reindex(cols).to_numpy(dtype=float),
+            max=self.max.reindex(cols).to_numpy(dtype=float),
+            quantiles=quantiles,
+            mode=nan,
+            outliers=nan.copy(),
+        )
@@ -0,0 +1,348 @@
+# core/heavy_modules/inference/inference_scheduler.py
+
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+from core.utils.tracer import tracer
+from core.heavy_modules.inference.model_pool import DEFAULT_MODEL_PATH, ModelPool, get_model_pool
+from core.heavy_modules.inference.prefix_cache import PrefixStateCache, get_prefix_cache
+from core.heavy_modules.inference.response_cache import model_file_digest
+from core.heavy_modules.inference.streaming import TokenStream
+
+logger = init_logger("InferenceScheduler")
+
+# Señal de apagado para los workers
+_STOP = object()
+
+
+@dataclass
+class InferenceRequest:
+    """Petición encolada: prompt + parámetros de muestreo propios."""
+    prompt: str
+    params: Dict
+    future: Future = field(default_factory=Future)
+    stream: Optional[TokenStream] = None
+    # Prefijo fijo del prompt (instrucciones) cuyo estado KV se reutiliza
+    prefix: Optional[str] = None
+    # Gramática de salida: ("gbnf", texto) o ("json_schema", esquema serializado)
+    grammar: Optional[Tuple[str, str]] = None
+    # Traza de quien encoló la petición (el worker la hereda para sus spans)
+    trace_id: Optional[str] = field(default_factory=tracer.current_trace_id)
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class InferenceScheduler:
+    """
+    Cola de inferencia delante de llama.cpp.
+
+    - Cola acotada: si se llena, submit() espera hasta `submit_timeout` y luego falla.
+    - `n_parallel` contextos independientes (réplicas del pool), cada uno atendido
+      por un único hilo: nunca hay dos llamadas simultáneas sobre el mismo Llama.
+    - llama.cpp libera el GIL durante la evaluación, así que los hilos escalan con los núcleos.
+    - Con `prefix_cache`, las peticiones con `prefix` restauran el estado KV de
+      ese prefijo fijo y solo se evalúa la parte dinámica del prompt.
+    - Con `grammar` / `json_schema` el muestreo queda restringido por una gramática
+      GBNF: la salida siempre es parseable y termina al cerrarse la estructura.
+    """
+
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, n_parallel: int = 2,
+                 n_ctx: int = 4096, n_threads: Optional[int] = None, n_gpu_layers: int = 20,
+                 max_queue: int = 64, submit_timeout: Optional[float] = 30.0,
+                 pool: Optional[ModelPool] = None, prefix_cache: Optional[PrefixStateCache] = None):
+        if n_parallel < 1:
+            raise ValueError("n_parallel debe ser >= 1.")
+
+        self.model_path = model_path
+        self.n_parallel = n_parallel
+        self.n_ctx = n_ctx
+        # Reparto de núcleos entre contextos para no sobresuscribir la CPU
+        self.n_threads = n_threads or max(1, (os.cpu_count() or 1) // n_parallel)
+        self.n_gpu_layers = n_gpu_layers
+        self.submit_timeout = submit_timeout
+        # Estados KV de prefijos fijos (None = sin reutilización entre peticiones)
+        self.prefix_cache = prefix_cache
+        self._model_digest = None
+
+        self._pool = pool or get_model_pool()
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._leases = []
+        self._workers: List[threading.Thread] = []
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {"completed": 0, "failed": 0, "busy_seconds": 0.0, "queue_wait_seconds": 0.0}
+
+        try:
+            for replica in range(n_parallel):
+                lease = self._pool.acquire(
+                    model_path,
+                    n_ctx=n_ctx,
+                    n_threads=self.n_threads,
+                    n_gpu_layers=n_gpu_layers,
+                    replica=replica
+                )
+                self._leases.append(lease)
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    args=(lease.llm,),
+                    name=f"llm-worker-{replica}",
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+
+            log_info(
+                logger,
+                f"InferenceScheduler iniciado: {n_parallel} contextos, {self.n_threads} hilos c/u, "
+                f"cola máx. {max_queue}."
+            )
+        except Exception as e:
+            log_error(logger, f"Error inicializando InferenceScheduler: {e}")
+            self.shutdown(wait=False)
+            raise
+
+    # ---------------------------------------------------------------
+    # Workers
+    # ---------------------------------------------------------------
+    def _worker_loop(self, llm) -> None:
+        # Gramáticas compiladas de este contexto (LlamaGrammar no se comparte entre hilos)
+        grammars: Dict[Tuple[str, str], object] = {}
+        while True:
+            request = self._queue.get()
+            try:
+                if request is _STOP:
+                    return
+                # Si la petición fue cancelada mientras esperaba, se descarta
+                if not request.future.set_running_or_notify_cancel():
+                    if request.stream is not None:
+                        request.stream.close()
+                    continue
+
+                started = time.perf_counter()
+                try:
+                    with tracer.bind(request.trace_id):
+                        self._prime_prefix(llm, request)
+                        result = self._execute(llm, request, self._grammar(request, grammars))
+                    request.future.set_result(result)
+                    ok = True
+                except Exception as e:
+                    log_error(logger, f"Error en inferencia: {e}")
+                    if request.stream is not None:
+                        request.stream.close(error=e)
+                    request.future.set_exception(e)
+                    ok = False
+
+                with self._stats_lock:
+                    self._stats["completed" if ok else "failed"] += 1
+                    self._stats["busy_seconds"] += time.perf_counter() - started
+                    self._stats["queue_wait_seconds"] += started - request.enqueued_at
+            finally:
+                self._queue.task_done()
+
+    def _prime_prefix(self, llm, request: InferenceRequest) -> None:
+        """Restaura (o calcula y guarda) el estado KV del prefijo fijo antes de generar."""
+        if self.prefix_cache is None or not request.prefix or not request.prompt.startswith(request.prefix):
+            return
+        if self._model_digest is None:
+            try:
+                self._model_digest = model_file_digest(self.model_path)
+            except OSError as e:
+                log_warning(logger, f"Sin huella del modelo ({e}); se desactiva la caché de prefijos.")
+                self.prefix_cache = None
+                return
+        self.prefix_cache.prime(llm, request.prefix, self._model_digest, self.n_ctx)
+
+    @staticmethod
+    def _grammar(request: InferenceRequest, grammars: Dict[Tuple[str, str], object]):
+        """Gramática compilada de la petición (se compila una vez por contexto y texto)."""
+        if request.grammar is None:
+            return None
+        grammar = grammars.get(request.grammar)
+        if grammar is None:
+            grammar = grammars[request.grammar] = compile_grammar(*request.grammar)
+        return grammar
+
+    @staticmethod
+    def _execute(llm, request: InferenceRequest, grammar=None) -> str:
+        queue_wait_ms = round((time.perf_counter() - request.enqueued_at) * 1000, 3)
+        params = request.params if grammar is None else {**request.params, "grammar": grammar}
+        with tracer.span("llm.generate", "llm", queue_wait_ms=queue_wait_ms,
+                         stream=request.stream is not None, grammar=grammar is not None) as span:
+            if request.stream is None:
+                response = llm(prompt=request.prompt, **params)
+                usage = response.get("usage") or {}
+                span.set(prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+                return response["choices"][0]["text"].strip()
+
+            # Modo streaming: llama.cpp entrega un chunk por token
+            for chunk in llm(prompt=request.prompt, stream=True, **params):
+                request.stream.put(chunk["choices"][0]["text"])
+                span.add("completion_tokens")
+            request.stream.close()
+            return request.stream.text.strip()
+
+    # ---------------------------------------------------------------
+    # API pública
+    # ---------------------------------------------------------------
+    def submit(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7,
+               top_p: float = 0.9, stop: Optional[List[str]] = None, prefix: Optional[str] = None,
+               grammar: Optional[str] = None, json_schema: Optional[Dict] = None) -> Future:
+        """
+        Encola un prompt y devuelve un Future con el texto generado.
+        `prefix` es la parte fija inicial del prompt: su estado KV se restaura de
+        la caché de prefijos en lugar de evaluarse de nuevo.
+        `grammar` (texto GBNF) o `json_schema` restringen la salida a esa estructura.
+        """
+        params = {"max_tokens": max_tokens, "temperature": temperature, "top_p": top_p, "stop": stop or []}
+        return self._enqueue(InferenceRequest(prompt=prompt, params=params, prefix=prefix,
+                                              grammar=grammar_spec(grammar, json_schema)))
+
+    def _enqueue(self, request: InferenceRequest) -> Future:
+        if self._closed:
+            raise RuntimeError("InferenceScheduler ya fue detenido.")
+        try:
+            self._queue.put(request, timeout=self.submit_timeout)
+        except queue.Full:
+            log_warning(logger, "Cola de inferencia llena; petición rechazada.")
+            raise RuntimeError("Cola de inferencia llena.")
+        return request.future
+
+    def submit_stream(self, prompt: str, max_tokens: int = 512, temperature: float = 0.7,
+                      top_p: float = 0.9, stop: Optional[List[str]] = None,
+                      prefix: Optional[str] = None) -> TokenStream:
+        """
+        Encola un prompt en modo streaming. El TokenStream devuelto se itera
+        (sync o async) a medida que el modelo produce tokens.
+        """
+        params = {"max_tokens": max_tokens, "temperature": temperature, "top_p": top_p, "stop": stop or []}
+        stream = TokenStream(label="llama.cpp")
+        self._enqueue(InferenceRequest(prompt=prompt, params=params, stream=stream, prefix=prefix))
+        return stream
+
+    def submit_batch(self, prompts: List[str], **params) -> List[Future]:
+        """Encola varios prompts; se reparten entre los contextos disponibles."""
+        return [self.submit(prompt, **params) for prompt in prompts]
+
+    def generate(self, prompt: str, timeout: Optional[float] = None, **params) -> str:
+        """Versión bloqueante de submit()."""
+        return self.submit(prompt, **params).result(timeout=timeout)
+
+    def generate_json(self, prompt: str, json_schema: Dict, timeout: Optional[float] = None, **params):
+        """
+        Generación estructurada: la salida queda restringida a `json_schema` y se
+        retorna ya parseada. Lanza ValueError si se cortó antes de cerrar el JSON
+        (max_tokens insuficiente).
+        """
+        text = self.generate(prompt, timeout=timeout, json_schema=json_schema, **params)
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Salida JSON incompleta ({len(text)} caracteres): {e}") from e
+
+    def generate_batch(self, prompts: List[str], timeout: Optional[float] = None, **params) -> List[str]:
+        futures = self.submit_batch(prompts, **params)
+        return [f.result(timeout=timeout) for f in futures]
+
+    async def agenerate(self, prompt: str, **params) -> str:
+        """Versión asyncio: await scheduler.agenerate(prompt)."""
+        return await asyncio.wrap_future(self.submit(prompt, **params))
+
+    async def agenerate_batch(self, prompts: List[str], **params) -> List[str]:
+        return await asyncio.gather(*(self.agenerate(p, **params) for p in prompts))
+
+    def count_tokens(self, text: str) -> int:
+        """Tokens de `text` con el tokenizer del modelo (incluye BOS), sin pasar por la cola."""
+        # Tokenizar solo lee el vocabulario: es seguro mientras otro hilo genera
+        return len(self._leases[0].llm.tokenize(text.encode("utf-8"), add_bos=True))
+
+    # ---------------------------------------------------------------
+    # Estado y apagado
+    # ---------------------------------------------------------------
+    def stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["n_parallel"] = self.n_parallel
+        stats["n_threads"] = self.n_threads
+        if self.prefix_cache is not None:
+            stats["prefix_cache"] = self.prefix_cache.stats()
+        return stats
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Detiene los workers (tras vaciar la cola) y devuelve los modelos al pool.
+        Si era un scheduler compartido, sale del registro: get_inference_scheduler
+        crea uno nuevo para la misma configuración.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        with _schedulers_lock:
+            for key in [k for k, scheduler in _schedulers.items() if scheduler is self]:
+                del _schedulers[key]
+        for _ in self._workers:
+            self._queue.put(_STOP)
+        if wait:
+            for worker in self._workers:
+                worker.join()
+        for lease in self._leases:
+            lease.release()
+        log_info(logger, "InferenceScheduler detenido.")
+
+
+# ---------------------------------------------------------------
+# Gramáticas de salida
+# ---------------------------------------------------------------
+def grammar_spec(grammar: Optional[str] = None, json_schema: Optional[Dict] = None) -> Optional[Tuple[str, str]]:
+    """Normaliza la gramática pedida a una tupla hashable (tipo, texto)."""
+    if grammar is not None and json_schema is not None:
+        raise ValueError("Usa grammar o json_schema, no ambos.")
+    if grammar is not None:
+        return ("gbnf", grammar)
+    if json_schema is not None:
+        return ("json_schema", json.dumps(json_schema, sort_keys=True, ensure_ascii=False))
+    return None
+
+
+def compile_grammar(kind: str, text: str):
+    """Compila la gramática con llama-cpp-python (GBNF directo o derivada de un JSON schema)."""
+    from llama_cpp import LlamaGrammar
+
+    if kind == "json_schema":
+        return LlamaGrammar.from_json_schema(text, verbose=False)
+    return LlamaGrammar.from_string(text, verbose=False)
+
+
+# ---------------------------------------------------------------
+# Schedulers compartidos del proceso
+# ---------------------------------------------------------------
+_schedulers: Dict[Tuple, InferenceScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_inference_scheduler(model_path: str = DEFAULT_MODEL_PATH, n_parallel: int = 2,
+                            n_ctx: int = 4096, n_gpu_layers: int = 20, n_threads: Optional[int] = None,
+                            **kwargs) -> InferenceScheduler:
+    """
+    Retorna el scheduler compartido para una configuración de modelo (incluidos
+    los hilos por contexto). Todos los hilos del proceso (p. ej. pipelines del
+    AgentController) pasan por la misma cola; uno detenido no se reutiliza.
+    """
+    key = (os.path.normpath(model_path), n_parallel, n_ctx, n_gpu_layers, n_threads)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None or scheduler._closed:
+            kwargs.setdefault("prefix_cache", get_prefix_cache())
+            scheduler = InferenceScheduler(
+                model_path, n_parallel=n_parallel, n_ctx=n_ctx, n_threads=n_threads,
+                n_gpu_layers=n_gpu_layers, **kwargs
+            )
+            _schedulers[key] = scheduler
+        return scheduler
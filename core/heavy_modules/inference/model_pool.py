@@ -0,0 +1,203 @@
+# core/heavy_modules/inference/model_pool.py
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+import psutil
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+
+logger = init_logger("ModelPool")
+
+# Ruta por defecto del modelo GGUF compartido por todo el sistema
+DEFAULT_MODEL_PATH = (
+    "data/models/gemma_2b_it_base/"
+    "models--google--gemma-2b-it/"
+    "snapshots/96988410cbdaeb8d5093d1ebdc5a8fb563e02bad/"
+    "gemma-2b-it.gguf"
+)
+
+# (model_path, n_ctx, n_threads, n_gpu_layers, replica)
+# replica permite tener varios contextos independientes de la misma configuración
+# (los pesos se comparten vía mmap; cada réplica tiene su propio KV cache).
+ModelKey = Tuple[str, int, int, int, int]
+
+
+@dataclass
+class PooledModel:
+    """Instancia de llama.cpp cargada una sola vez por configuración."""
+    key: ModelKey
+    llm: object
+    load_seconds: float
+    rss_delta_bytes: int
+    loaded_at: float = field(default_factory=time.time)
+    active_leases: int = 0
+    total_leases: int = 0
+
+
+class ModelLease:
+    """
+    Préstamo de un modelo del pool. Se libera con release() o usándolo
+    como context manager; el modelo sigue cargado para el resto del proceso.
+    """
+
+    def __init__(self, pool: "ModelPool", entry: PooledModel):
+        self._pool = pool
+        self._entry = entry
+        self._released = False
+
+    @property
+    def llm(self):
+        if self._released:
+            raise RuntimeError("El préstamo del modelo ya fue liberado.")
+        return self._entry.llm
+
+    @property
+    def key(self) -> ModelKey:
+        return self._entry.key
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._pool._release(self._entry)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class ModelPool:
+    """
+    Registro de modelos GGUF por proceso.
+    Cada configuración (ruta, n_ctx, n_threads, n_gpu_layers) se carga una vez
+    y se comparte entre BuilderPrompt, ChainManager y column_inspector.
+    """
+
+    def __init__(self, loader=None):
+        # loader(model_path, n_ctx, n_threads, n_gpu_layers) -> instancia Llama
+        self._loader = loader or self._load_llama
+        self._models: Dict[ModelKey, PooledModel] = {}
+        self._key_locks: Dict[ModelKey, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    # ---------------------------------------------------------------
+    # Carga del modelo
+    # ---------------------------------------------------------------
+    @staticmethod
+    def _load_llama(model_path: str, n_ctx: int, n_threads: int, n_gpu_layers: int):
+        # Import local: llama_cpp solo es necesario cuando realmente se carga un modelo
+        from llama_cpp import Llama
+
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(f"Modelo GGUF no encontrado en:\n{model_path}")
+
+        return Llama(
+            model_path=model_path,
+            n_ctx=n_ctx,
+            n_threads=n_threads,
+            n_gpu_layers=n_gpu_layers,
+            verbose=False
+        )
+
+    def acquire(self, model_path: str = DEFAULT_MODEL_PATH, n_ctx: int = 4096,
+                n_threads: int = 6, n_gpu_layers: int = 20, replica: int = 0) -> ModelLease:
+        """Devuelve un préstamo del modelo, cargándolo solo la primera vez."""
+        key: ModelKey = (
+            os.path.normpath(model_path), int(n_ctx), int(n_threads), int(n_gpu_layers), int(replica)
+        )
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Un lock por configuración: dos hilos no cargan el mismo modelo en paralelo
+        with key_lock:
+            entry = self._models.get(key)
+            if entry is None:
+                entry = self._load_entry(key)
+                with self._lock:
+                    self._models[key] = entry
+
+            with self._lock:
+                entry.active_leases += 1
+                entry.total_leases += 1
+
+        return ModelLease(self, entry)
+
+    def _load_entry(self, key: ModelKey) -> PooledModel:
+        model_path, n_ctx, n_threads, n_gpu_layers, _ = key
+        process = psutil.Process()
+        try:
+            rss_before = process.memory_info().rss
+            start = time.perf_counter()
+            llm = self._loader(model_path, n_ctx, n_threads, n_gpu_layers)
+            load_seconds = time.perf_counter() - start
+            rss_delta = process.memory_info().rss - rss_before
+
+            log_info(
+                logger,
+                f"Modelo cargado en el pool: {model_path} (n_ctx={n_ctx}, n_threads={n_threads}, "
+                f"n_gpu_layers={n_gpu_layers}) en {load_seconds:.2f}s, RSS +{rss_delta / 1024 ** 2:.1f} MB"
+            )
+            return PooledModel(key=key, llm=llm, load_seconds=load_seconds, rss_delta_bytes=rss_delta)
+        except Exception as e:
+            log_error(logger, f"Error cargando modelo en el pool: {e}")
+            raise
+
+    def _release(self, entry: PooledModel) -> None:
+        with self._lock:
+            entry.active_leases = max(0, entry.active_leases - 1)
+
+    # ---------------------------------------------------------------
+    # Administración y estadísticas
+    # ---------------------------------------------------------------
+    def evict_idle(self) -> int:
+        """Descarga los modelos sin préstamos activos. Retorna cuántos se liberaron."""
+        with self._lock:
+            idle = [key for key, entry in self._models.items() if entry.active_leases == 0]
+            for key in idle:
+                del self._models[key]
+        if idle:
+            log_warning(logger, f"{len(idle)} modelos sin uso descargados del pool.")
+        return len(idle)
+
+    def stats(self) -> Dict[str, dict]:
+        """Estadísticas por configuración: tiempo de carga, memoria residente y préstamos."""
+        with self._lock:
+            entries = list(self._models.values())
+
+        stats = {}
+        for entry in entries:
+            path, n_ctx, n_threads, gpu, replica = entry.key
+            stats[f"{path}|ctx={n_ctx}|threads={n_threads}|gpu={gpu}|replica={replica}"] = {
+                "load_seconds": round(entry.load_seconds, 3),
+                "rss_delta_mb": round(entry.rss_delta_bytes / 1024 ** 2, 1),
+                "active_leases": entry.active_leases,
+                "total_leases": entry.total_leases,
+                "loaded_at": entry.loaded_at,
+            }
+        return stats
+
+    def process_rss_mb(self) -> float:
+        """Memoria residente actual del proceso (MB)."""
+        return round(psutil.Process().memory_info().rss / 1024 ** 2, 1)
+
+
+# ---------------------------------------------------------------
+# Pool global del proceso
+# ---------------------------------------------------------------
+_pool: Optional[ModelPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_model_pool() -> ModelPool:
+    """Retorna el pool compartido del proceso (se crea en el primer uso)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ModelPool()
+        return _pool
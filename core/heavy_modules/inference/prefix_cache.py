@@ -0,0 +1,207 @@
+# core/heavy_modules/inference/prefix_cache.py
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+from core.utils.tracer import tracer
+
+logger = init_logger("PrefixStateCache")
+
+CACHE_DIR = Path("data/outputs/llm_cache/kv_prefix")
+
+# Prefijos más cortos no justifican guardar/restaurar el estado (se evalúan directo)
+MIN_PREFIX_TOKENS = 32
+
+
+def make_prefix_key(model_digest: str, n_ctx: int, prefix: str) -> str:
+    """Clave del estado: modelo + tamaño de contexto + hash del texto del prefijo."""
+    h = hashlib.sha256()
+    h.update(f"{model_digest}|{n_ctx}|".encode("utf-8"))
+    h.update(prefix.encode("utf-8"))
+    return h.hexdigest()
+
+
+class PrefixStateCache:
+    """
+    Estados KV de llama.cpp para prefijos fijos de prompt (instrucciones).
+
+    - prime(llm, prefix) deja el contexto con el prefijo ya evaluado:
+        1. si el contexto ya lo contiene (última petición con el mismo prefijo), no hace nada;
+        2. si hay estado guardado (memoria o disco), lo restaura con load_state;
+        3. si no, evalúa el prefijo una vez y guarda el estado con save_state.
+      Luego llama.cpp reutiliza esos tokens y solo evalúa la parte dinámica del prompt.
+    - Disco: un archivo pickle por clave (escritura atómica), con desalojo del
+      menos usado cuando se supera max_disk_bytes.
+    - Memoria: LRU de max_memory_items estados.
+    """
+
+    def __init__(self, cache_dir: Path = CACHE_DIR, max_memory_items: int = 4,
+                 max_disk_bytes: int = 1024 ** 3, min_prefix_tokens: int = MIN_PREFIX_TOKENS):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.min_prefix_tokens = min_prefix_tokens
+
+        self._memory: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"resident": 0, "hits_memory": 0, "hits_disk": 0, "misses": 0, "errors": 0}
+        log_info(logger, f"PrefixStateCache inicializada en {self.cache_dir}")
+
+    # ---------------------------------------------------------------
+    # Almacenamiento
+    # ---------------------------------------------------------------
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl"
+
+    def get(self, key: str):
+        """Estado guardado para la clave (memoria, luego disco) o None."""
+        with self._lock:
+            state = self._memory.get(key)
+            if state is not None:
+                self._memory.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return state
+
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # mtime = último uso (orden de desalojo)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._remember(key, state)
+            self._stats["hits_disk"] += 1
+        return state
+
+    def put(self, key: str, state) -> None:
+        with self._lock:
+            self._remember(key, state)
+        path = self._path(key)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+        self._evict_disk()
+
+    def _remember(self, key: str, state) -> None:
+        self._memory[key] = state
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    def _disk_entries(self) -> list:
+        """(mtime, tamaño, ruta) de los estados en disco; tolera borrados concurrentes."""
+        entries = []
+        for path in self.cache_dir.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def _evict_disk(self) -> None:
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            total -= size
+            path.unlink(missing_ok=True)
+            evicted += 1
+        if evicted:
+            log_warning(logger, f"Caché de prefijos: {evicted} estados desalojados por tamaño.")
+
+    # ---------------------------------------------------------------
+    # Preparación del contexto
+    # ---------------------------------------------------------------
+    def prime(self, llm, prefix: str, model_digest: str, n_ctx: int) -> bool:
+        """
+        Deja `prefix` evaluado en el KV cache de `llm`. Retorna True si el
+        contexto quedó con el prefijo; ante cualquier error lo reinicia y
+        retorna False (la petición sigue con prefill completo).
+        """
+        try:
+            tokens = llm.tokenize(prefix.encode("utf-8"), add_bos=True)
+            if len(tokens) < self.min_prefix_tokens:
+                return False
+
+            # El contexto ya tiene el prefijo (llama.cpp reutiliza el prefijo común)
+            if llm.n_tokens >= len(tokens) and np.array_equal(llm.input_ids[:len(tokens)], tokens):
+                with self._lock:
+                    self._stats["resident"] += 1
+                return True
+
+            with tracer.span("llm.prefix_prime", "llm", prefix_tokens=len(tokens)) as span:
+                key = make_prefix_key(model_digest, n_ctx, prefix)
+                state = self.get(key)
+                if state is not None:
+                    llm.load_state(state)
+                    span.set(source="cache")
+                    return True
+
+                started = time.perf_counter()
+                llm.reset()
+                llm.eval(tokens)
+                self.put(key, llm.save_state())
+                with self._lock:
+                    self._stats["misses"] += 1
+                span.set(source="eval")
+                log_info(logger, f"Prefijo de {len(tokens)} tokens evaluado y guardado en "
+                                 f"{time.perf_counter() - started:.2f}s.")
+                return True
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            log_error(logger, f"No se pudo preparar el prefijo del prompt: {e}")
+            try:
+                llm.reset()
+            except Exception:
+                pass
+            return False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        for path in self.cache_dir.glob("*.pkl"):
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        entries = self._disk_entries()
+        stats["disk_entries"] = len(entries)
+        stats["disk_bytes"] = sum(size for _, size, _ in entries)
+        return stats
+
+
+# ---------------------------------------------------------------
+# Caché compartida del proceso
+# ---------------------------------------------------------------
+_cache: Optional[PrefixStateCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prefix_cache() -> PrefixStateCache:
+    """Retorna la caché de prefijos compartida (se crea en el primer uso)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = PrefixStateCache()
+        return _cache
@@ -0,0 +1,237 @@
+# core/heavy_modules/inference/response_cache.py
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+from core.utils.logger import init_logger, log_info, log_warning, log_error
+
+logger = init_logger("ResponseCache")
+
+CACHE_DIR = Path("data/outputs/llm_cache")
+
+# Bytes leídos al inicio y al final del archivo del modelo para su huella
+_DIGEST_SAMPLE_BYTES = 1024 * 1024
+_digest_cache: Dict[str, str] = {}
+_digest_lock = threading.Lock()
+
+
+def model_file_digest(model_path: str) -> str:
+    """
+    Huella rápida de un archivo de modelo (tamaño, mtime y hash de cabeza/cola).
+    Evita leer varios GB en cada proceso y cambia si el archivo se reemplaza.
+    """
+    path = os.path.abspath(model_path)
+    stat = os.stat(path)
+    cache_key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+
+    with _digest_lock:
+        if cache_key in _digest_cache:
+            return _digest_cache[cache_key]
+
+    h = hashlib.sha256()
+    h.update(f"{stat.st_size}|{stat.st_mtime_ns}".encode("utf-8"))
+    with open(path, "rb") as f:
+        h.update(f.read(_DIGEST_SAMPLE_BYTES))
+        if stat.st_size > _DIGEST_SAMPLE_BYTES:
+            f.seek(max(0, stat.st_size - _DIGEST_SAMPLE_BYTES))
+            h.update(f.read(_DIGEST_SAMPLE_BYTES))
+    digest = h.hexdigest()
+
+    with _digest_lock:
+        _digest_cache[cache_key] = digest
+    return digest
+
+
+def is_deterministic(params: dict) -> bool:
+    """El muestreo es determinista con temperatura 0 o top_k = 1 (greedy)."""
+    return params.get("temperature", 1.0) == 0 or params.get("top_k") == 1
+
+
+def make_cache_key(model_digest: str, params: dict, prompt_hash: str) -> str:
+    payload = json.dumps(
+        {"model": model_digest, "params": params, "prompt": prompt_hash},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Caché de respuestas del LLM direccionada por contenido.
+
+    - Nivel 1: LRU en memoria (max_memory_items).
+    - Nivel 2: SQLite en disco con expiración (ttl_seconds) y desalojo
+      por tamaño total (max_disk_bytes), eliminando primero lo menos usado.
+    - Solo sirve aciertos si el muestreo es determinista, salvo que el
+      llamador lo autorice explícitamente (allow_sampled=True).
+    """
+
+    def __init__(self, db_path: Path = CACHE_DIR / "responses.sqlite", max_memory_items: int = 256,
+                 max_disk_bytes: int = 256 * 1024 ** 2, ttl_seconds: Optional[float] = 7 * 24 * 3600):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_memory_items = max_memory_items
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " size INTEGER NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+        log_info(logger, f"ResponseCache inicializada en {self.db_path}")
+
+    # ---------------------------------------------------------------
+    # Consulta y guardado
+    # ---------------------------------------------------------------
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, model_digest: str, params: dict, prompt_hash: str, allow_sampled: bool = False) -> Optional[str]:
+        """Retorna la respuesta cacheada o None."""
+        if not (allow_sampled or is_deterministic(params)):
+            return None
+
+        key = make_cache_key(model_digest, params, prompt_hash)
+        now = time.time()
+        try:
+            with self._lock:
+                cached = self._memory.get(key)
+                if cached is not None:
+                    response, created_at = cached
+                    if not self._expired(created_at, now):
+                        self._memory.move_to_end(key)
+                        self._stats["hits_memory"] += 1
+                        return response
+                    del self._memory[key]
+
+                row = self._conn.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or self._expired(row[1], now):
+                    if row is not None:
+                        self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                        self._conn.commit()
+                    self._stats["misses"] += 1
+                    return None
+
+                self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self._remember(key, row[0], row[1])
+                self._stats["hits_disk"] += 1
+                return row[0]
+        except sqlite3.Error as e:
+            log_error(logger, f"Error leyendo la caché de respuestas: {e}")
+            return None
+
+    def put(self, model_digest: str, params: dict, prompt_hash: str, response: str,
+            allow_sampled: bool = False) -> None:
+        """Guarda una respuesta (solo si es reutilizable según la política de muestreo)."""
+        if not response or not (allow_sampled or is_deterministic(params)):
+            return
+
+        key = make_cache_key(model_digest, params, prompt_hash)
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        try:
+            with self._lock:
+                self._remember(key, response, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at, last_access, size) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, response, now, now, size)
+                )
+                self._conn.commit()
+                self._stats["stores"] += 1
+                self._evict_disk()
+        except sqlite3.Error as e:
+            log_error(logger, f"Error guardando en la caché de respuestas: {e}")
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_items:
+            self._memory.popitem(last=False)
+
+    # ---------------------------------------------------------------
+    # Mantenimiento
+    # ---------------------------------------------------------------
+    def _evict_disk(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+
+        evicted = 0
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total <= self.max_disk_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+            evicted += 1
+        self._conn.commit()
+        self._stats["evictions"] += evicted
+        log_warning(logger, f"Caché de respuestas: {evicted} entradas desalojadas por tamaño.")
+
+    def purge_expired(self) -> int:
+        """Elimina del disco las entradas vencidas. Retorna cuántas se borraron."""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            self._memory.clear()
+        log_info(logger, f"Caché de respuestas: {cursor.rowcount} entradas vencidas eliminadas.")
+        return cursor.rowcount
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            row = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        stats["disk_entries"], stats["disk_bytes"] = row
+        stats["memory_entries"] = len(self._memory)
+        return stats
+
+
+# ---------------------------------------------------------------
+# Caché compartida del proceso
+# ---------------------------------------------------------------
+_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    """Retorna la caché de respuestas compartida (se crea en el primer uso)."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
@@ -0,0 +1,159 @@
+# core/heavy_modules/inference/streaming.py
+
+import asyncio
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+from core.utils.logger import init_logger, log_info
+
+logger = init_logger("Streaming")
+
+# Marca de fin de stream
+_END = object()
+
+
+@dataclass
+class StreamStats:
+    """Métricas de una generación en streaming."""
+    started_at: float = field(default_factory=time.perf_counter)
+    first_token_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    n_tokens: int = 0
+
+    def mark_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.n_tokens += 1
+
+    def finish(self) -> None:
+        if self.finished_at is None:
+            self.finished_at = time.perf_counter()
+
+    @property
+    def time_to_first_token(self) -> Optional[float]:
+        if self.first_token_at is None:
+            return None
+        return self.first_token_at - self.started_at
+
+    @property
+    def tokens_per_second(self) -> float:
+        # Se mide desde el primer token: el prefill queda en time_to_first_token
+        if self.first_token_at is None or self.n_tokens < 2:
+            return 0.0
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.first_token_at
+        return (self.n_tokens - 1) / elapsed if elapsed > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        ttft = self.time_to_first_token
+        return {
+            "time_to_first_token": round(ttft, 3) if ttft is not None else None,
+            "tokens": self.n_tokens,
+            "tokens_per_second": round(self.tokens_per_second, 2),
+        }
+
+
+class TokenStream:
+    """
+    Canal productor/consumidor de tokens.
+    El productor (worker de inferencia) llama a put()/close(); el consumidor
+    itera con `for token in stream` o `async for token in stream`.
+    """
+
+    def __init__(self, label: str = "stream"):
+        self.label = label
+        self.stats = StreamStats()
+        self._queue: "queue.Queue" = queue.Queue()
+        self._parts = []
+        self._closed = threading.Event()
+        self._done_callbacks = []
+        self._callbacks_lock = threading.Lock()
+        self._error: Optional[BaseException] = None
+
+    # --- lado productor ---
+    def put(self, token: str) -> None:
+        if not token:
+            return
+        self.stats.mark_token()
+        self._parts.append(token)
+        self._queue.put(token)
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        with self._callbacks_lock:
+            if self._closed.is_set():
+                return
+            self.stats.finish()
+            self._error = error
+            self._closed.set()
+            callbacks = list(self._done_callbacks)
+        self._queue.put(error if error is not None else _END)
+        if error is None:
+            log_info(logger, f"[{self.label}] {self.stats.to_dict()}")
+            for callback in callbacks:
+                callback(self.text)
+
+    def add_done_callback(self, callback: Callable[[str], None]) -> None:
+        """
+        Registra callback(texto_completo), invocado cuando el stream termina sin error.
+        Si ya terminó, se invoca de inmediato.
+        """
+        with self._callbacks_lock:
+            if not self._closed.is_set():
+                self._done_callbacks.append(callback)
+                return
+        if self._error is None:
+            callback(self.text)
+
+    @classmethod
+    def from_text(cls, text: str, label: str = "cache") -> "TokenStream":
+        """Stream ya completo con un único trozo (p. ej. respuesta cacheada)."""
+        stream = cls(label=label)
+        stream.put(text)
+        stream.close()
+        return stream
+
+    # --- lado consumidor ---
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            item = self._queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        while True:
+            item = await asyncio.to_thread(self._queue.get)
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+    @property
+    def text(self) -> str:
+        """Texto acumulado hasta el momento."""
+        return "".join(self._parts)
+
+
+def stream_from_iterable(make_iterable: Callable[[], Iterable[str]], label: str = "stream") -> TokenStream:
+    """
+    Ejecuta un generador bloqueante en un hilo y expone sus trozos como TokenStream.
+    Útil para backends sin cola propia (p. ej. transformers + TextIteratorStreamer).
+    """
+    stream = TokenStream(label=label)
+
+    def _produce():
+        try:
+            for token in make_iterable():
+                stream.put(token)
+            stream.close()
+        except BaseException as e:
+            stream.close(error=e)
+
+    threading.Thread(target=_produce, name=f"{label}-producer", daemon=True).start()
+    return stream
@@ -2,10 +2,12 @@
 
 import pandas as pd
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced
 
 logger = init_logger("ExportExcel")
 
 
+@traced("create_excel_summary", "export")
 def create_excel_summary(report_data: dict, filename: str):
     """
     Genera un archivo Excel con métricas y secciones del reporte.
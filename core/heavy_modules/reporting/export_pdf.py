@@ -5,6 +5,7 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Tabl
 from reportlab.lib import colors
 from reportlab.lib.styles import getSampleStyleSheet
 from core.utils.logger import init_logger, log_info, log_error
+from core.utils.tracer import traced
 
 logger = init_logger("ExportPDF")
 
@@ -43,6 +44,7 @@ def save_pdf(doc: SimpleDocTemplate, story: list, filename: str):
         raise
 
 
+@traced("create_pdf", "export")
 def create_pdf(report_data: dict, filename: str):
     try:
         doc = SimpleDocTemplate(filename, pagesize=A4)
@@ -1,71 +1,433 @@
 # core/utils/column_inspector.py
+import numpy as np
 import pandas as pd
+import hashlib
 import json
 import logging
+import os
+import re
+import threading
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
 
 logger = logging.getLogger("ColumnInspector")
 
-def infer_column_roles(df: pd.DataFrame, use_model: bool = False) -> dict:
+ROLE_CACHE_PATH = Path("data/outputs/llm_cache/column_roles.json")
+
+# Columnas por petición al modelo: el JSON de salida cabe holgado en max_tokens
+ROLE_BATCH_SIZE = 20
+
+# Roles válidos (los mismos que producen las heurísticas, más dos que solo ve el modelo)
+ROLE_CHOICES = (
+    "numérico, monto/valor monetario",
+    "numérico, cantidad",
+    "numérico, no clasificado",
+    "categórico, nombre de cliente/usuario",
+    "categórico, producto/servicio",
+    "categórico, ubicación geográfica",
+    "categórico, no clasificado",
+    "fecha, timestamp",
+    "fecha, no clasificada",
+    "identificador, clave única",
+    "texto, texto libre",
+)
+
+# Reglas por nombre, en orden de prioridad (la primera regla con coincidencia gana)
+KEYWORD_ROLES = (
+    ("numérico, monto/valor monetario", ("precio", "monto", "total", "importe")),
+    ("numérico, cantidad", ("cantidad", "stock", "unidades")),
+    ("categórico, nombre de cliente/usuario", ("cliente", "usuario", "nombre")),
+    ("categórico, producto/servicio", ("producto", "item", "servicio")),
+    ("categórico, ubicación geográfica", ("pais", "ciudad", "region")),
+    ("fecha, timestamp", ("fecha", "time")),
+)
+_KEYWORD_RANK = {kw: rank for rank, (_, keywords) in enumerate(KEYWORD_ROLES) for kw in keywords}
+# Un solo regex para todas las palabras clave; el lookahead reporta también coincidencias solapadas
+_KEYWORD_RE = re.compile(
+    "(?=(" + "|".join(re.escape(kw) for kw in sorted(_KEYWORD_RANK, key=len, reverse=True)) + "))"
+)
+# Nombres típicos de identificadores (como token, para no confundir "id" dentro de "cantidad")
+_ID_NAME_RE = re.compile(r"(?:^|[_\s])(?:id|codigo|cod|sku|uuid|folio|clave)(?:$|[_\s])")
+
+# Muestreo de filas para detectar tipos (fechas/números como texto, IDs)
+SNIFF_ROWS = 1000
+# Fracción mínima de valores de la muestra que deben convertirse para aceptar el tipo
+SNIFF_MATCH_SHARE = 0.95
+# Fracción de valores distintos: >= ID_UNIQUE_SHARE es identificador, <= CATEGORY_UNIQUE_SHARE categórico
+ID_UNIQUE_SHARE = 0.95
+CATEGORY_UNIQUE_SHARE = 0.5
+# Muestra mínima para llamar identificador a una columna sin nombre de ID
+MIN_ID_SAMPLE = 20
+# Largo medio a partir del cual un texto se considera libre
+FREE_TEXT_LENGTH = 50
+
+# Rol por tipo detectado cuando el nombre no coincide con ninguna regla
+KIND_ROLES = {
+    "numeric": "numérico, no clasificado",
+    "numeric_text": "numérico, no clasificado",
+    "datetime": "fecha, no clasificada",
+    "datetime_text": "fecha, no clasificada",
+    "id": "identificador, clave única",
+    "text": "texto, texto libre",
+    "category": "categórico, no clasificado",
+}
+
+# Pistas de dtype para DataManager.load_data según el tipo detectado
+KIND_DTYPE_HINTS = {
+    "numeric_text": "float64",
+    "datetime_text": "datetime64[ns]",
+}
+
+MAX_PROFILES = 64
+
+
+def column_sample(series: pd.Series, sample_size: int = 5) -> List[str]:
+    """Valores de ejemplo (no nulos) que se muestran al modelo para una columna."""
+    return [str(v) for v in series.dropna().head(sample_size).tolist()]
+
+
+def column_role_key(name, dtype, sample: Sequence[str], model_digest: str = "") -> str:
+    """Clave de caché del rol: modelo + nombre + dtype + hash de los valores de ejemplo."""
+    h = hashlib.sha1()
+    h.update(f"{model_digest}|{name}|{dtype}|".encode("utf-8"))
+    h.update(json.dumps(list(sample), ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+
+def column_role_schema(columns: Sequence[str], roles: Sequence[str] = ROLE_CHOICES) -> dict:
+    """JSON schema de la respuesta: un rol (de `roles`) por cada columna, sin claves extra."""
+    return {
+        "type": "object",
+        "properties": {str(col): {"type": "string", "enum": list(roles)} for col in columns},
+        "required": [str(col) for col in columns],
+        "additionalProperties": False,
+    }
+
+
+@lru_cache(maxsize=4096)
+def _keyword_role(name_lower: str) -> Optional[str]:
+    ranks = [_KEYWORD_RANK[m.group(1)] for m in _KEYWORD_RE.finditer(name_lower)]
+    return KEYWORD_ROLES[min(ranks)][0] if ranks else None
+
+
+# ---------------------------------------------------------------
+# Perfil de columnas (roles + tipos detectados sobre una muestra)
+# ---------------------------------------------------------------
+@dataclass
+class ColumnProfile:
+    """
+    Perfil de las columnas de un DataFrame. Se comparte entre llamadas con el
+    mismo esquema y la misma muestra de filas (ver profile_columns): tratarlo
+    como solo lectura.
+    - roles: rol descriptivo por columna (mismos valores que ROLE_CHOICES)
+    - kinds: tipo detectado ("numeric", "numeric_text", "datetime", "datetime_text",
+      "id", "text", "category")
+    - dtype_hints: dtype sugerido para la próxima carga (ver DataManager.load_data)
+    """
+    fingerprint: str
+    sample_hash: str = ""
+    roles: Dict[str, str] = field(default_factory=dict)
+    kinds: Dict[str, str] = field(default_factory=dict)
+    dtype_hints: Dict[str, str] = field(default_factory=dict)
+    sample_rows: int = 0
+
+
+def schema_fingerprint(df: pd.DataFrame) -> str:
+    """Huella del esquema: nombres y dtypes de las columnas, en orden."""
+    schema = [[str(col), str(dtype)] for col, dtype in df.dtypes.items()]
+    return hashlib.sha1(json.dumps(schema, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _row_sample(df: pd.DataFrame, sample_rows: int) -> pd.DataFrame:
+    """Hasta sample_rows filas repartidas uniformemente (no solo las primeras)."""
+    if len(df) <= sample_rows:
+        return df
+    return df.iloc[np.unique(np.linspace(0, len(df) - 1, sample_rows).astype(np.int64))]
+
+
+def _sample_hash(sample: pd.DataFrame) -> str:
+    """Hash de los valores de la muestra (los tipos detectados dependen de ellos)."""
+    try:
+        hashes = pd.util.hash_pandas_object(sample, index=False)
+    except TypeError:  # valores no hashables (listas, dicts...)
+        hashes = pd.util.hash_pandas_object(sample.astype(str), index=False)
+    return hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+
+
+def _share(mask: pd.Series) -> float:
+    return float(mask.mean()) if len(mask) else 0.0
+
+
+def sniff_column(name, sample: pd.Series) -> str:
+    """Tipo de la columna según su dtype y, si es texto, según los valores de la muestra."""
+    dtype = sample.dtype
+    id_name = _ID_NAME_RE.search(str(name).lower()) is not None
+    values = sample.dropna()
+
+    if pd.api.types.is_bool_dtype(dtype) or isinstance(dtype, pd.CategoricalDtype):
+        return "category"
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return "datetime"
+    if pd.api.types.is_numeric_dtype(dtype):
+        if id_name and pd.api.types.is_integer_dtype(dtype) and _share(~values.duplicated()) >= ID_UNIQUE_SHARE:
+            return "id"
+        return "numeric"
+    if values.empty:
+        return "category"
+
+    text = values.astype(str).str.strip()
+    if _share(pd.to_numeric(text, errors="coerce").notna()) >= SNIFF_MATCH_SHARE:
+        return "numeric_text"
+    if _share(text.str.contains(r"\d", regex=True)) >= SNIFF_MATCH_SHARE:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            dates = pd.to_datetime(text, errors="coerce", format="mixed")
+        if _share(dates.notna()) >= SNIFF_MATCH_SHARE:
+            return "datetime_text"
+
+    if text.str.len().mean() >= FREE_TEXT_LENGTH:
+        return "text"
+    unique_share = text.nunique() / len(text)
+    if unique_share >= ID_UNIQUE_SHARE and (id_name or (
+            len(text) >= MIN_ID_SAMPLE and _share(text.str.contains(r"\s", regex=True)) < 1 - SNIFF_MATCH_SHARE)):
+        return "id"
+    return "category"
+
+
+def _build_profile(df: pd.DataFrame, sample: pd.DataFrame, fingerprint: str, sample_hash: str) -> ColumnProfile:
+    profile = ColumnProfile(fingerprint=fingerprint, sample_hash=sample_hash, sample_rows=len(sample))
+    for i, col in enumerate(df.columns):
+        column = sample.iloc[:, i]
+        kind = sniff_column(col, column)
+        profile.kinds[col] = kind
+        profile.roles[col] = _keyword_role(str(col).lower()) or KIND_ROLES[kind]
+
+        hint = KIND_DTYPE_HINTS.get(kind)
+        if hint is None and kind == "category" and pd.api.types.is_object_dtype(column.dtype):
+            values = column.dropna()
+            if len(values) and values.nunique() / len(values) <= CATEGORY_UNIQUE_SHARE:
+                hint = "category"
+        if hint is not None:
+            profile.dtype_hints[col] = hint
+    return profile
+
+
+_profiles: "OrderedDict[str, ColumnProfile]" = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def profile_columns(df: pd.DataFrame, sample_rows: int = SNIFF_ROWS) -> ColumnProfile:
+    """
+    Perfil de columnas de `df`. El tipo se detecta sobre una muestra de hasta
+    sample_rows filas; el perfil se cachea por huella de esquema + hash de esa
+    muestra, así llamadas repetidas sobre el mismo frame no vuelven a detectar
+    tipos y un frame con igual esquema pero otros valores no hereda tipos ajenos.
+    Los roles por nombre se memorizan aparte (solo dependen del nombre).
+    """
+    fingerprint = schema_fingerprint(df)
+    sample = _row_sample(df, sample_rows)
+    sample_hash = _sample_hash(sample)
+    key = f"{fingerprint}:{sample_hash}"
+    with _profiles_lock:
+        profile = _profiles.get(key)
+        if profile is not None:
+            _profiles.move_to_end(key)
+            return profile
+
+    profile = _build_profile(df, sample, fingerprint, sample_hash)
+    with _profiles_lock:
+        _profiles[key] = profile
+        while len(_profiles) > MAX_PROFILES:
+            _profiles.popitem(last=False)
+    return profile
+
+
+def apply_dtype_hints(df: pd.DataFrame, hints: Dict[str, str]) -> pd.DataFrame:
+    """
+    Convierte las columnas según `hints` (ver ColumnProfile.dtype_hints). Los
+    valores sueltos que no se pueden convertir quedan como nulos; si la columna
+    recibida no coincide con la pista (menos de SNIFF_MATCH_SHARE de sus valores
+    se convierten), la pista se descarta y la columna queda como está.
+    """
+    converted = {}
+    for col, hint in hints.items():
+        if col not in df.columns or str(df[col].dtype) == hint:
+            continue
+        if hint == "float64":
+            values = pd.to_numeric(df[col].astype("string").str.strip(), errors="coerce").astype("float64")
+        elif hint.startswith("datetime64"):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                values = pd.to_datetime(df[col], errors="coerce", format="mixed").astype(hint)
+        else:
+            converted[col] = df[col].astype(hint)
+            continue
+
+        present = int(df[col].notna().sum())
+        if present and values.notna().sum() / present < SNIFF_MATCH_SHARE:
+            logger.warning(f"Pista '{hint}' descartada para '{col}': los datos no coinciden con el perfil.")
+            continue
+        converted[col] = values
+    if not converted:
+        return df
+    df = df.copy()
+    for col, values in converted.items():
+        df[col] = values
+    return df
+
+
+class ColumnRoleCache:
+    """
+    Roles inferidos por el modelo, por columna (ver column_role_key).
+    Se persiste en un JSON (escritura atómica) para no volver a consultar
+    columnas ya vistas en ejecuciones posteriores.
+    """
+
+    def __init__(self, path: Path = ROLE_CACHE_PATH, max_entries: int = 50000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._roles: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, str]:
+        if self._roles is None:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._roles = json.load(f)
+            except FileNotFoundError:
+                self._roles = {}
+            except (OSError, ValueError) as e:
+                logger.warning(f"Caché de roles ilegible ({e}); se empieza vacía.")
+                self._roles = {}
+        return self._roles
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, str]:
+        with self._lock:
+            roles = self._load()
+            return {k: roles[k] for k in keys if k in roles}
+
+    def put_many(self, entries: Dict[str, str]) -> None:
+        if not entries:
+            return
+        with self._lock:
+            roles = self._load()
+            roles.update(entries)
+            # Desalojo de las entradas más antiguas (orden de inserción)
+            for key in list(roles)[:max(0, len(roles) - self.max_entries)]:
+                del roles[key]
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(roles, f, ensure_ascii=False)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logger.warning(f"No se pudo guardar la caché de roles: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._roles = {}
+            self.path.unlink(missing_ok=True)
+
+
+_role_cache: Optional[ColumnRoleCache] = None
+_role_cache_lock = threading.Lock()
+
+
+def get_column_role_cache() -> ColumnRoleCache:
+    """Retorna la caché de roles compartida (se crea en el primer uso)."""
+    global _role_cache
+    with _role_cache_lock:
+        if _role_cache is None:
+            _role_cache = ColumnRoleCache()
+        return _role_cache
+
+
+def _infer_roles_with_model(df: pd.DataFrame, prompt_builder, cache: ColumnRoleCache,
+                            batch_size: int, fallback: Dict[str, str], sample_size: int = 5) -> Dict:
+    """
+    Roles por modelo con salida restringida a JSON schema, en lotes de columnas.
+    Las columnas ya cacheadas no se consultan; si un lote falla (o el modelo no
+    devuelve una columna), solo esas columnas usan los roles de `fallback`.
+    """
+    from core.heavy_modules.inference.response_cache import model_file_digest
+
+    model_digest = model_file_digest(prompt_builder.model_path)
+    keys = {
+        col: column_role_key(col, df[col].dtype, column_sample(df[col], sample_size), model_digest)
+        for col in df.columns
+    }
+    cached = cache.get_many(list(keys.values()))
+    roles = {col: cached[key] for col, key in keys.items() if key in cached}
+    pending = [col for col in df.columns if col not in roles]
+    if roles:
+        logger.info(f"Roles de {len(roles)} columnas tomados de la caché.")
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            prompt = prompt_builder.build_column_prompt(df[batch], sample_size=sample_size)
+            # Margen por columna: nombre + rol más largo + comillas y separadores
+            max_tokens = 16 + sum(len(str(col)) // 2 + 24 for col in batch)
+            inferred = prompt_builder.generate_json(
+                prompt,
+                column_role_schema(batch),
+                max_tokens=max_tokens,
+                prefix=prompt.split("[COLUMN_DATA]")[0]
+            )
+        except Exception as e:
+            logger.error(f"Error usando Gemma para inferir roles de {len(batch)} columnas: {e}")
+            inferred = {}
+
+        new_entries = {}
+        for col in batch:
+            role = inferred.get(str(col)) if isinstance(inferred, dict) else None
+            if role in ROLE_CHOICES:
+                roles[col] = role
+                new_entries[keys[col]] = role
+            else:
+                roles[col] = fallback[col]
+        if len(new_entries) < len(batch):
+            logger.warning(f"{len(batch) - len(new_entries)} columnas sin rol del modelo, usando heurísticas.")
+        cache.put_many(new_entries)
+
+    return {col: roles[col] for col in df.columns}
+
+
+def infer_column_roles(df: pd.DataFrame, use_model: bool = False, prompt_builder=None,
+                       cache: Optional[ColumnRoleCache] = None, batch_size: int = ROLE_BATCH_SIZE) -> dict:
     """
     Infiera el rol de cada columna automáticamente.
-    
+
     Si use_model=True, se utiliza Gemma 2B IT para inferir roles
-    basándose en los valores de ejemplo. Si es False, se usan heurísticas simples.
-    
+    basándose en los valores de ejemplo (salida JSON garantizada por gramática,
+    en lotes de `batch_size` columnas y con caché por columna). Si es False,
+    se usan heurísticas: palabras clave del nombre y tipo detectado sobre una
+    muestra de filas (ver profile_columns, que se calcula una vez por esquema).
+
     Retorna un diccionario {columna: rol_descriptivo}.
     """
-    roles = {}
-
     if df.empty or df.shape[1] == 0:
         logger.warning("El DataFrame no tiene columnas.")
-        return roles
+        return {}
+
+    roles = profile_columns(df).roles
 
     if use_model:
         try:
-            # Import local para evitar circular import
-            from core.utils.prompt_builder import BuilderPrompt
-
-            prompt_builder = BuilderPrompt()
-            prompt = prompt_builder.build_column_prompt(df)
-
-            # Ejecutar Gemma para inferir roles
-            response = prompt_builder.execute_model(prompt, max_length=500)
+            if prompt_builder is None:
+                # Import local para evitar circular import
+                from core.utils.prompt_builder import BuilderPrompt
 
-            # Intentar parsear JSON
-            inferred_roles = json.loads(response)
-            if isinstance(inferred_roles, dict):
-                return inferred_roles
-            else:
-                logger.warning("Respuesta de Gemma no es un JSON válido, usando heurísticas.")
+                # El modelo se toma del pool compartido (no se recarga en cada llamada)
+                prompt_builder = BuilderPrompt()
+            return _infer_roles_with_model(df, prompt_builder, cache or get_column_role_cache(), batch_size, roles)
         except Exception as e:
             logger.error(f"Error usando Gemma para inferir roles: {e}")
             logger.warning("Usando heurísticas simples como fallback.")
 
-    # Fallback: heurísticas simples basadas en tipo y nombre
-    for col in df.columns:
-        dtype = df[col].dtype
-        name_lower = col.lower()
-
-        if any(k in name_lower for k in ["precio", "monto", "total", "importe"]):
-            role = "numérico, monto/valor monetario"
-        elif any(k in name_lower for k in ["cantidad", "stock", "unidades"]):
-            role = "numérico, cantidad"
-        elif any(k in name_lower for k in ["cliente", "usuario", "nombre"]):
-            role = "categórico, nombre de cliente/usuario"
-        elif any(k in name_lower for k in ["producto", "item", "servicio"]):
-            role = "categórico, producto/servicio"
-        elif any(k in name_lower for k in ["pais", "ciudad", "region"]):
-            role = "categórico, ubicación geográfica"
-        elif "fecha" in name_lower or "time" in name_lower:
-            role = "fecha, timestamp"
-        else:
-            if pd.api.types.is_numeric_dtype(dtype):
-                role = "numérico, no clasificado"
-            elif pd.api.types.is_datetime64_any_dtype(dtype):
-                role = "fecha, no clasificada"
-            else:
-                role = "categórico, no clasificado"
-
-        roles[col] = role
-
-    return roles
+    return dict(roles)
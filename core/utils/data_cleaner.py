@@ -1,7 +1,14 @@
 # core/utils/data_cleaner.py
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from scipy.stats import zscore
+from core.utils.tracer import traced
 
 def load_csv_clean(path: Path, encoding_priority=("utf-8", "latin-1")) -> pd.DataFrame:
     """
@@ -25,13 +32,20 @@ def load_csv_clean(path: Path, encoding_priority=("utf-8", "latin-1")) -> pd.Dat
 
     return df
 
+def _fillable(column: pd.Series) -> pd.Series:
+    """Enteros con nulos (Int64 de pandas/Parquet) pasan a float para admitir la media como relleno."""
+    if isinstance(column.dtype, pd.api.extensions.ExtensionDtype) and pd.api.types.is_integer_dtype(column.dtype):
+        return column.astype("float64")
+    return column
+
 def remove_nulls(df: pd.DataFrame, strategy="mean") -> pd.DataFrame:
     """Rellena valores nulos en columnas numéricas"""
     for col in df.select_dtypes(include='number').columns:
+        column = _fillable(df[col])
         if strategy == "mean":
-            df[col].fillna(df[col].mean(), inplace=True)
+            df[col] = column.fillna(column.mean())
         elif strategy == "median":
-            df[col].fillna(df[col].median(), inplace=True)
+            df[col] = column.fillna(column.median())
     return df
 
 def remove_duplicates(df: pd.DataFrame) -> pd.DataFrame:
@@ -50,10 +64,165 @@ def detect_noise(df: pd.DataFrame, z_thresh=3) -> pd.DataFrame:
         return df
     return df[(df[numeric_cols].apply(zscore).abs() < z_thresh).all(axis=1)]
 
+def fill_nulls_with(df: pd.DataFrame, values: dict) -> pd.DataFrame:
+    """Rellena nulos con valores precalculados {columna: valor} (p. ej. medias globales)"""
+    values = {col: val for col, val in values.items() if col in df.columns and pd.notna(val)}
+    return df.fillna(value=values) if values else df
+
+def filter_zscore(df: pd.DataFrame, means: dict, stds: dict, z_thresh=3) -> pd.DataFrame:
+    """
+    Elimina outliers con un z-score calculado contra medias/desviaciones dadas
+    (globales del dataset cuando se limpia por bloques).
+    """
+    mask = pd.Series(True, index=df.index)
+    for col, mean in means.items():
+        std = stds.get(col)
+        if col not in df.columns or not std or pd.isna(std):
+            continue
+        mask &= (((df[col] - mean).abs() / std) < z_thresh) | df[col].isna()
+    return df[mask]
+
+# ---------------------------------------------------------------
+# Limpieza eficiente en memoria
+# ---------------------------------------------------------------
+def downcast_column(series: pd.Series) -> pd.Series:
+    """
+    Reduce el dtype numérico sin perder información: enteros al menor tipo con
+    signo que los contiene y floats a float32 solo si todos los valores son
+    representables exactamente.
+    """
+    if pd.api.types.is_bool_dtype(series) or not pd.api.types.is_numeric_dtype(series):
+        return series
+    if pd.api.types.is_integer_dtype(series):
+        return pd.to_numeric(series, downcast="integer")
+    if series.dtype == np.float64:
+        values = series.to_numpy()
+        as_f32 = values.astype(np.float32)
+        if np.array_equal(as_f32.astype(np.float64), values, equal_nan=True):
+            return pd.Series(as_f32, index=series.index, name=series.name)
+    return series
+
+def categorize_column(series: pd.Series, max_unique_ratio: float = 0.5) -> pd.Series:
+    """Convierte columnas de texto con pocos valores distintos a 'category'."""
+    if series.dtype != object or len(series) == 0:
+        return series
+    if pd.api.types.infer_dtype(series, skipna=True) != "string":
+        return series
+    if series.nunique(dropna=True) > max_unique_ratio * len(series):
+        return series
+    return series.astype("category")
+
+def frame_memory_mb(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(deep=True).sum() / 1024 ** 2, 3)
+
+@contextmanager
+def _profile_step(report: dict, name: str, df_ref: list, track_memory: bool):
+    """Registra duración y pico de memoria (tracemalloc) de un paso de limpieza."""
+    if track_memory:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    yield
+    step = {"step": name, "seconds": round(time.perf_counter() - start, 4)}
+    if track_memory:
+        step["peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 3)
+        step["frame_mb"] = frame_memory_mb(df_ref[0])
+    report["steps"].append(step)
+
+@traced("clean_dataframe", "data")
+def clean_dataframe(df: pd.DataFrame, fill_strategy="mean", remove_outliers=True, z_thresh=3,
+                    optimize_dtypes=True, max_unique_ratio=0.5, track_memory=False,
+                    memory_budget_mb: Optional[float] = None) -> Tuple[pd.DataFrame, dict]:
+    """
+    Equivalente a normalize_columns → remove_nulls → remove_duplicates → detect_noise,
+    sin temporales del tamaño del DataFrame completo:
+
+    - nulos, downcast y categóricas se procesan columna por columna (in-place sobre df);
+    - duplicados y z-score producen solo máscaras booleanas y se aplican con una
+      única selección final (una sola copia de las filas conservadas);
+    - el z-score (ddof=0, como scipy) se calcula por columna sobre las filas sin
+      duplicar. Columnas constantes o sin datos no eliminan filas, y los nulos
+      restantes no cuentan como outliers.
+
+    Retorna (df_limpio, reporte) con filas, memoria y duración/pico de memoria
+    por paso (pico solo con track_memory=True, usa tracemalloc).
+    """
+    report = {"rows_in": len(df), "steps": []}
+    started_tracing = track_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    if track_memory or memory_budget_mb is not None:
+        report["frame_mb_in"] = frame_memory_mb(df)
+    df_ref = [df]
+
+    try:
+        with _profile_step(report, "normalize_columns", df_ref, track_memory):
+            df = normalize_columns(df)
+
+        with _profile_step(report, "fill_nulls", df_ref, track_memory):
+            if fill_strategy in ("mean", "median"):
+                for col in df.select_dtypes(include="number").columns:
+                    column = df[col]
+                    if column.hasnans:
+                        column = _fillable(column)
+                        fill = column.mean() if fill_strategy == "mean" else column.median()
+                        df[col] = column.fillna(fill)
+
+        if optimize_dtypes:
+            with _profile_step(report, "optimize_dtypes", df_ref, track_memory):
+                for col in df.columns:
+                    column = df[col]
+                    optimized = categorize_column(downcast_column(column), max_unique_ratio)
+                    if optimized is not column:
+                        df[col] = optimized
+
+        if memory_budget_mb is not None:
+            # La selección final necesita como máximo otra copia del DataFrame
+            report["frame_mb_optimized"] = frame_memory_mb(df)
+            report["over_budget"] = bool(2 * report["frame_mb_optimized"] > memory_budget_mb)
+
+        with _profile_step(report, "remove_duplicates", df_ref, track_memory):
+            keep = ~df.duplicated().to_numpy()
+
+        if remove_outliers:
+            with _profile_step(report, "detect_noise", df_ref, track_memory):
+                z_ok = np.ones(len(df), dtype=bool)
+                for col in df.select_dtypes(include="number").columns:
+                    values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+                    kept = values[keep]
+                    if not np.isfinite(kept).any():
+                        continue
+                    mean = np.nanmean(kept)
+                    std = np.nanstd(kept)
+                    if not np.isfinite(std) or std == 0:
+                        continue
+                    with np.errstate(invalid="ignore"):
+                        z_ok &= (np.abs(values - mean) < z_thresh * std) | np.isnan(values)
+                keep &= z_ok
+
+        with _profile_step(report, "select_rows", df_ref, track_memory):
+            if not keep.all():
+                df = df[keep]
+                df_ref[0] = df
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+
+    report["rows_out"] = len(df)
+    if track_memory or memory_budget_mb is not None:
+        report["frame_mb_out"] = frame_memory_mb(df)
+    return df, report
+
+@traced("save_clean_data", "data")
 def save_clean_data(df: pd.DataFrame, path: Path, index=False):
-    """Guarda datos limpios (CSV o Excel)"""
+    """Guarda datos limpios (CSV, Parquet, Feather/Arrow o Excel)"""
     path.parent.mkdir(parents=True, exist_ok=True)
-    if path.suffix.lower() == ".csv":
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
         df.to_csv(path, index=index)
+    elif suffix == ".parquet":
+        df.to_parquet(path, index=index)
+    elif suffix in (".feather", ".arrow"):
+        # Feather no admite índices que no sean un RangeIndex por defecto
+        df.reset_index(drop=not index).to_feather(path)
     else:
         df.to_excel(path, index=index)
@@ -0,0 +1,211 @@
+# core/utils/prompt_budget.py
+
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from core.heavy_modules.analytics.stats_engine import NumericStats
+from core.heavy_modules.analytics.correlation_analysis import CorrelationResult
+
+# Contexto de ChainManager (4096) menos la salida por defecto (512) y un margen
+DEFAULT_PROMPT_BUDGET = 3500
+# Tokens de holgura entre el prompt, la salida y el tamaño del contexto
+PROMPT_MARGIN_TOKENS = 64
+# Proporción de outliers esperable por azar (z>3 en una normal) y la que cuenta como señal completa
+OUTLIER_SHARE_BASELINE = 0.003
+OUTLIER_SHARE_SIGNAL = 0.02
+# Correlación mínima que suma informatividad (por debajo es ruido entre columnas)
+CORRELATION_SIGNAL = 0.5
+# Líneas que cada sección conserva antes de repartir el resto del presupuesto
+MIN_SECTION_LINES = 3
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+def context_budget(n_ctx: int, max_output_tokens: int, margin: int = PROMPT_MARGIN_TOKENS) -> int:
+    """Tokens disponibles para el prompt en un contexto de n_ctx que debe generar max_output_tokens."""
+    return max(0, n_ctx - max_output_tokens - margin)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación sin tokenizer: cada palabra o signo cuenta al menos un token y
+    las palabras largas se parten en trozos de ~4 caracteres (similar a BPE/SentencePiece).
+    """
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in _TOKEN_RE.findall(text))
+
+
+# ---------------------------------------------------------------
+# Secciones del prompt
+# ---------------------------------------------------------------
+@dataclass
+class PromptSection:
+    """
+    Bloque del prompt. Las líneas llegan ordenadas de más a menos informativa;
+    si no entran todas, las restantes se reemplazan por `summarize(restantes)`.
+    `text` es el contenido fijo (o el que se muestra si no hay líneas) y
+    siempre se incluye. `omitted` cuenta elementos descartados antes de armar
+    el prompt (fuerza la línea resumen aunque entren todas las líneas).
+    """
+    name: str
+    header: str = ""
+    lines: List[str] = field(default_factory=list)
+    priority: int = 0
+    text: str = ""
+    omitted: int = 0
+    summarize: Optional[Callable[[List[str]], str]] = None
+
+
+@dataclass
+class BudgetedPrompt:
+    text: str
+    tokens: int
+    budget: int
+    kept: Dict[str, int]
+    dropped: Dict[str, int]
+    # Texto inicial fijo (secciones sin líneas al comienzo): su estado KV es reutilizable
+    prefix: str = ""
+
+    @property
+    def truncated(self) -> bool:
+        return any(self.dropped.values())
+
+
+def _render(section: PromptSection, n_kept: int) -> str:
+    lines = section.lines[:n_kept]
+    rest = section.lines[n_kept:]
+    if rest or section.omitted:
+        lines = lines + [section.summarize(rest) if section.summarize else f"… y {len(rest)} líneas más."]
+    body = "\n".join(lines) if lines else section.text
+    return f"{section.header}{body}" if section.header else body
+
+
+def assemble_prompt(sections: Sequence[PromptSection], budget: int = DEFAULT_PROMPT_BUDGET,
+                    count_tokens: Optional[Callable[[str], int]] = None,
+                    min_lines: int = MIN_SECTION_LINES, separator: str = "\n\n") -> BudgetedPrompt:
+    """
+    Arma el prompt respetando `budget` tokens.
+
+    1. Se reserva el texto fijo y, de cada sección, su encabezado y su línea resumen.
+    2. Cada sección recibe hasta `min_lines` líneas, por prioridad.
+    3. El presupuesto restante se reparte línea a línea entre las secciones por
+       prioridad, tomando siempre la siguiente línea más informativa de cada una.
+    Los tokens de cada línea se cuentan una sola vez; el total final se mide
+    sobre el texto completo con `count_tokens` (tokenizer del modelo si se pasa).
+    """
+    count = count_tokens or estimate_tokens
+    order = sorted(range(len(sections)), key=lambda i: -sections[i].priority)
+    kept = {s.name: 0 for s in sections}
+
+    def line_cost(text: str) -> int:
+        return count(text + "\n")
+
+    costs = {s.name: [line_cost(line) for line in s.lines] for s in sections}
+    # Costo base: todas las secciones con 0 líneas (encabezado + resumen o texto vacío)
+    used = count(separator.join(_render(s, 0) for s in sections))
+
+    def fill(limit_per_section: Optional[int]) -> None:
+        nonlocal used
+        progressed = True
+        while progressed:
+            progressed = False
+            for i in order:
+                section = sections[i]
+                n = kept[section.name]
+                if n >= len(section.lines) or (limit_per_section is not None and n >= limit_per_section):
+                    continue
+                cost = costs[section.name][n]
+                if used + cost > budget:
+                    continue
+                kept[section.name] = n + 1
+                used += cost
+                progressed = True
+
+    fill(min_lines)
+    fill(None)
+
+    # Ajuste con el conteo real (el resumen cambia al variar las líneas descartadas)
+    text = separator.join(_render(s, kept[s.name]) for s in sections)
+    tokens = count(text)
+    while tokens > budget:
+        candidates = [i for i in reversed(order) if kept[sections[i].name] > 0]
+        if not candidates:
+            break
+        name = sections[candidates[0]].name
+        kept[name] -= 1
+        text = separator.join(_render(s, kept[s.name]) for s in sections)
+        tokens = count(text)
+
+    dropped = {s.name: len(s.lines) - kept[s.name] for s in sections}
+    return BudgetedPrompt(text=text, tokens=tokens, budget=budget, kept=kept, dropped=dropped,
+                          prefix=_fixed_prefix(sections, separator))
+
+
+def _fixed_prefix(sections: Sequence[PromptSection], separator: str) -> str:
+    """Secciones fijas iniciales + separador (solo si les sigue contenido variable)."""
+    fixed = []
+    for section in sections:
+        if section.lines or section.omitted:
+            break
+        fixed.append(_render(section, 0))
+    if not fixed or len(fixed) == len(sections):
+        return ""
+    return separator.join(fixed) + separator
+
+
+# ---------------------------------------------------------------
+# Ranking de columnas por informatividad
+# ---------------------------------------------------------------
+def rank_numeric_columns(stats: NumericStats, correlations: Optional[CorrelationResult] = None) -> List[str]:
+    """
+    Ordena las columnas numéricas de más a menos informativa. El puntaje suma,
+    cada uno en [0, 1]:
+    - la variabilidad relativa |std/media| en escala log, relativa a la mayor,
+    - la proporción de outliers por encima de la esperable por azar,
+    - la correlación absoluta más fuerte con otra columna, si supera CORRELATION_SIGNAL.
+    """
+    if not stats.columns:
+        return []
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cv = np.abs(stats.std / np.where(stats.mean == 0, np.nan, stats.mean))
+        outlier_share = stats.outliers / np.maximum(stats.count, 1)
+    cv = np.nan_to_num(cv, nan=0.0, posinf=0.0)
+    outlier_share = np.nan_to_num(outlier_share, nan=0.0)
+
+    max_corr = np.zeros(len(stats.columns))
+    if correlations is not None:
+        strength = np.nan_to_num(np.abs(correlations.matrix.astype(np.float64)), nan=0.0)
+        np.fill_diagonal(strength, 0.0)
+        lookup = dict(zip(correlations.columns, strength.max(axis=1)))
+        max_corr = np.array([lookup.get(c, 0.0) for c in stats.columns])
+
+    cv_score = np.log1p(cv)
+    cv_score = cv_score / cv_score.max() if cv_score.max() > 0 else cv_score
+    outlier_score = np.clip((outlier_share - OUTLIER_SHARE_BASELINE)
+                            / (OUTLIER_SHARE_SIGNAL - OUTLIER_SHARE_BASELINE), 0.0, 1.0)
+    corr_score = np.where(max_corr > CORRELATION_SIGNAL, max_corr, 0.0)
+    score = cv_score + outlier_score + corr_score
+    # Empates: se respeta el orden original de las columnas
+    order = np.lexsort((np.arange(len(score)), -score))
+    return [stats.columns[i] for i in order]
+
+
+def summarize_numeric_rest(stats: NumericStats, columns: Sequence[str]) -> str:
+    """Línea agregada para las columnas numéricas que no entran en el prompt."""
+    position = {c: i for i, c in enumerate(stats.columns)}
+    idx = [position[c] for c in columns]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cv = np.abs(stats.std[idx] / stats.mean[idx])
+    cv = cv[np.isfinite(cv)]
+    outliers = np.nansum(stats.outliers[idx])
+    if not cv.size:
+        spread = ""
+    elif f"{cv.min():.2g}" == f"{cv.max():.2g}":
+        spread = f"CV ≈ {cv.min():.2g}, "
+    else:
+        spread = f"CV entre {cv.min():.2g} y {cv.max():.2g}, "
+    return (f"… y {len(columns)} columnas numéricas más con distribución similar "
+            f"({spread}{int(outliers)} outliers en total).")
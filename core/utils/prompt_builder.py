@@ -1,52 +1,141 @@
 # core/utils/prompt_builder.py
 
 import hashlib
+import numpy as np
 import pandas as pd
-from typing import Dict, Optional
-from core.utils.column_inspector import infer_column_roles
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from core.utils.column_inspector import ROLE_CHOICES, column_sample, infer_column_roles
 
 # Módulos de analytics
-from core.heavy_modules.analytics.statistical_summary import compute_descriptive_stats
-from core.heavy_modules.analytics.anomaly_detection import detect_outliers
-from core.heavy_modules.analytics.correlation_analysis import compute_correlations
-from typing import Optional, Dict
-from llama_cpp import Llama
+from core.heavy_modules.analytics.stats_engine import NumericStats, compute_numeric_stats
+from core.heavy_modules.analytics.correlation_analysis import CorrelationResult, compute_correlation_result
+from core.heavy_modules.inference.model_pool import DEFAULT_MODEL_PATH
+from core.heavy_modules.inference.inference_scheduler import get_inference_scheduler
+from core.heavy_modules.inference.response_cache import get_response_cache, model_file_digest
 import json
+from core.utils.logger import init_logger, log_info
+from core.utils.tracer import traced, tracer
+from core.utils.prompt_budget import (
+    DEFAULT_PROMPT_BUDGET, BudgetedPrompt, PromptSection, assemble_prompt, rank_numeric_columns,
+    summarize_numeric_rest
+)
+
+logger = init_logger("BuilderPrompt")
+
+# Máximo de pares correlacionados incluidos en el prompt (tablas anchas)
+MAX_CORRELATION_PAIRS = 25
+
+# Tareas del resumen ejecutivo completo
+SUMMARY_TASKS = (
+    "TUS TAREAS Y OBJETIVOS:\n"
+    "- Genera **RECOMENDACIONES ACCIONABLES**: sugiere acciones concretas basadas en los hallazgos del análisis de datos, siendo específico y práctico.\n"
+    "- Genera **SUGERIR VISUALIZACIONES**: propone gráficos, histogramas, boxplots u otras visualizaciones útiles para interpretar los datos y sus patrones.\n"
+    "- Genera **SUMMARY**: un resumen ejecutivo consolidado de los hallazgos clave, incluyendo patrones de las columnas, distribuciones, anomalías, outliers y cualquier insight relevante.\n"
+    "- Genera **RESUMEN EJECUTIVO**: sintetiza de forma clara y concisa lo generado en RECOMENDACIONES, VISUALIZACIONES y SUMMARY, destacando los hallazgos más importantes, conclusiones clave y la situación general de los datos.\n"
+    "REGLAS:\n"
+    "- Mantén Markdown profesional.\n"
+    "- No inventes columnas ni datos.\n"
+    "- Usa solo la información proporcionada."
+)
+
+# Encabezado fijo de build_report_prompt (prefijo reutilizable en la caché KV)
+REPORT_PREFIX = (
+    "Genera un resumen ejecutivo claro y conciso.\n\n"
+    "INSTRUCCIONES:\n"
+    "- No muestres datos internos.\n"
+    "- No repitas estadísticas, columnas ni metadatos.\n"
+    "- No vuelvas a analizar los datos.\n"
+    "- Solo escribe el resumen final.\n\n"
+    "[INFORMACIÓN INTERNA — NO MOSTRAR]\n"
+)
+
+# Instrucción y tareas de un grupo de columnas en el modo map-reduce (hallazgos parciales, salida corta)
+GROUP_INSTRUCTION = "Analiza únicamente el grupo de columnas descrito abajo (es parte de un dataset más ancho)."
+GROUP_TASKS = (
+    "TU TAREA:\n"
+    "- Enumera en 3 a 8 viñetas los **HALLAZGOS CLAVE** de este grupo de columnas: distribuciones, "
+    "anomalías, outliers y relaciones entre columnas.\n"
+    "- Nombra siempre las columnas involucradas.\n"
+    "REGLAS:\n"
+    "- No escribas recomendaciones ni resumen ejecutivo: solo hallazgos.\n"
+    "- No inventes columnas ni datos.\n"
+    "- Usa solo la información proporcionada."
+)
 
 
 class BuilderPrompt:
 
-    def __init__(self):
+    def __init__(self, model_path: str = DEFAULT_MODEL_PATH, n_ctx: int = 8192,
+                 n_threads: int = 8, n_gpu_layers: int = -1):
         """
-        Constructor: carga el modelo GGUF con llama.cpp.
+        Constructor: solo guarda la configuración del modelo GGUF.
+        El modelo se toma del pool compartido (vía la cola de inferencia) la
+        primera vez que se necesita, así construir prompts no implica cargar pesos.
         """
-        self.model_path = (
-            "data/models/gemma_2b_it_base/"
-            "models--google--gemma-2b-it/"
-            "snapshots/96988410cbdaeb8d5093d1ebdc5a8fb563e02bad/"
-            "gemma-2b-it.gguf"
-        )
-
-        # Cargar modelo GGUF con llama.cpp
-        self.model = Llama(
-            model_path=self.model_path,
-            n_ctx=8192,         # contexto largo
-            n_gpu_layers=-1,    # usar GPU si existe
-            n_threads=8,        # optimización CPU
-            temperature=0.0,    # para RESÚMENES → salida estable
-            verbose=False
-        )
+        self.model_path = model_path
+        self.n_ctx = n_ctx                  # contexto largo
+        self.n_threads = n_threads          # optimización CPU
+        self.n_gpu_layers = n_gpu_layers    # usar GPU si existe
+        self._scheduler = None
+
+    @property
+    def scheduler(self):
+        if self._scheduler is None:
+            self._scheduler = get_inference_scheduler(
+                self.model_path,
+                n_parallel=1,
+                n_ctx=self.n_ctx,
+                n_gpu_layers=self.n_gpu_layers,
+                n_threads=self.n_threads
+            )
+        return self._scheduler
 
     # =========================================================
     #       MÉTODO PRINCIPAL DE INFERENCIA (produce texto)
     # =========================================================
-    def generate(self, prompt: str, max_tokens=1024) -> str:
-        response = self.model(
-            prompt,
-            max_tokens=max_tokens,
-            stop=["</s>", "###"],
-        )
-        return response["choices"][0]["text"].strip()
+    def generate(self, prompt: str, max_tokens=1024, prefix: Optional[str] = None) -> str:
+        params = {
+            "max_tokens": max_tokens,
+            "temperature": 0.0,    # para RESÚMENES → salida estable (y cacheable)
+            "stop": ["</s>", "###"],
+        }
+        cache = get_response_cache()
+        model_digest = model_file_digest(self.model_path)
+        prompt_hash = self._generate_hash(prompt)
+
+        cached = cache.get(model_digest, params, prompt_hash)
+        if cached is not None:
+            return cached
+
+        response = self.scheduler.generate(prompt, prefix=prefix, **params)
+        cache.put(model_digest, params, prompt_hash, response)
+        return response
+
+    def generate_json(self, prompt: str, json_schema: Dict, max_tokens=512, prefix: Optional[str] = None):
+        """
+        Generación restringida a `json_schema` (gramática de llama.cpp): retorna el
+        JSON ya parseado. Solo se cachean salidas completas y válidas.
+        """
+        params = {
+            "max_tokens": max_tokens,
+            "temperature": 0.0,
+            "json_schema": json_schema,
+        }
+        cache = get_response_cache()
+        model_digest = model_file_digest(self.model_path)
+        prompt_hash = self._generate_hash(prompt)
+
+        cached = cache.get(model_digest, params, prompt_hash)
+        if cached is not None:
+            return json.loads(cached)
+
+        response = self.scheduler.generate(prompt, prefix=prefix, **params)
+        try:
+            parsed = json.loads(response)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Salida JSON incompleta ({len(response)} caracteres): {e}") from e
+        cache.put(model_digest, params, prompt_hash, response)
+        return parsed
 
     # =========================================================
     #                  FORMATTERS
@@ -71,20 +160,19 @@ class BuilderPrompt:
         return "\n".join(lines)
 
     @staticmethod
-    def _format_statistics(df: pd.DataFrame) -> str:
-        numeric_cols = df.select_dtypes(include='number').columns
-        if len(numeric_cols) == 0:
+    def _format_statistics(df: pd.DataFrame, stats: Optional[NumericStats] = None) -> str:
+        stats = stats or compute_numeric_stats(df)
+        if not stats.columns:
             return "No hay columnas numéricas para calcular estadísticas."
 
-        stats_df = compute_descriptive_stats(df[numeric_cols])
-
         stats_text = []
-        for col in stats_df.index:
-            mean = stats_df.loc[col].get('mean', 'N/A')
-            median = stats_df.loc[col].get('50%', 'N/A')
-            mode = df[col].mode().iloc[0] if not df[col].mode().empty else 'N/A'
-            std = stats_df.loc[col].get('std', 'N/A')
-            outliers_count = len(detect_outliers(df[[col]]))
+        for col in stats.columns:
+            row = stats.row(col)
+            mean = row["mean"]
+            median = row["median"]
+            mode = row["mode"] if pd.notna(row["mode"]) else 'N/A'
+            std = row["std"]
+            outliers_count = row["outliers"]
 
             stats_text.append(
                 f"**{col}:** Media={mean}, Mediana={median}, "
@@ -94,41 +182,57 @@ class BuilderPrompt:
         return "\n".join(stats_text)
 
     @staticmethod
-    def _format_correlations(df: pd.DataFrame) -> str:
-        numeric_df = df.select_dtypes(include='number')
-        if numeric_df.empty:
-            return "No hay columnas numéricas para calcular correlaciones."
-
-        corr_matrix = compute_correlations(numeric_df)
-        top_corrs = []
-        for col in corr_matrix.columns:
-            high_corr = corr_matrix[col][
-                (corr_matrix[col].abs() > 0.8) & (corr_matrix[col].abs() < 1.0)
-            ]
-            for related_col, value in high_corr.items():
-                top_corrs.append(f"{col} ↔ {related_col}: {value:.2f}")
+    def _correlation_lines(correlations: CorrelationResult) -> list:
+        """Pares con |r| > 0.8 (cada par una sola vez, los más fuertes primero)."""
+        return [
+            f"{col} ↔ {related_col}: {value:.2f}"
+            for col, related_col, value in correlations.pairs(threshold=0.8, top_k=MAX_CORRELATION_PAIRS)
+        ]
+
+    @staticmethod
+    def _context_section(context: Optional[Dict]) -> Optional[PromptSection]:
+        """Contexto de memoria (la prioridad más baja): solo las entradas con contenido."""
+        context_lines = [line for k, v in (context or {}).items() if v
+                         for line in [f"{k}:"] + str(v).splitlines()]
+        if not context_lines:
+            return None
+        return PromptSection(
+            "contexto", header="CONTEXTO PREVIO (usar solo si aplica a estos datos):\n",
+            lines=context_lines, priority=0,
+            summarize=lambda rest: "… (contexto previo recortado)."
+        )
 
+    @staticmethod
+    def _count_strong_pairs(correlations: CorrelationResult, threshold: float = 0.8) -> int:
+        """Cantidad total de pares con |r| > threshold (sin armar la lista)."""
+        upper = np.triu(np.abs(np.nan_to_num(correlations.matrix.astype(np.float64))), k=1)
+        return int(np.count_nonzero(upper > threshold))
+
+    @staticmethod
+    def _format_correlations(df: pd.DataFrame, correlations: Optional[CorrelationResult] = None) -> str:
+        if correlations is None:
+            if df.select_dtypes(include='number').empty:
+                return "No hay columnas numéricas para calcular correlaciones."
+            correlations = compute_correlation_result(df)
+
+        top_corrs = BuilderPrompt._correlation_lines(correlations)
         return "\n".join(top_corrs) if top_corrs else "No hay correlaciones altas."
 
     # =========================================================
     #                   PROMPT PRINCIPAL
     # =========================================================
 
-    def build_report_prompt(self, df: pd.DataFrame, metadata: Optional[Dict] = None) -> str:
+    @traced("BuilderPrompt.build_report_prompt", "prompt")
+    def build_report_prompt(self, df: pd.DataFrame, metadata: Optional[Dict] = None,
+                            stats: Optional[NumericStats] = None,
+                            correlations: Optional[CorrelationResult] = None) -> str:
         metadata_text = self._format_metadata(metadata or {})
         columns_text = self._format_column_roles(df)
-        stats_text = self._format_statistics(df)
-        correlations_text = self._format_correlations(df)
+        stats_text = self._format_statistics(df, stats)
+        correlations_text = self._format_correlations(df, correlations)
 
         prompt = (
-            "Genera un resumen ejecutivo claro y conciso.\n\n"
-            "INSTRUCCIONES:\n"
-            "- No muestres datos internos.\n"
-            "- No repitas estadísticas, columnas ni metadatos.\n"
-            "- No vuelvas a analizar los datos.\n"
-            "- Solo escribe el resumen final.\n\n"
-
-            "[INFORMACIÓN INTERNA — NO MOSTRAR]\n"
+            f"{REPORT_PREFIX}"
             f"{metadata_text}\n"
             f"{columns_text}\n"
             f"{stats_text}\n"
@@ -144,99 +248,199 @@ class BuilderPrompt:
 
 
     @staticmethod
-    def build_prompt_chain(df: pd.DataFrame, metadata: Optional[Dict] = None, instruction: str = "") -> str:
+    @traced("BuilderPrompt.build_prompt_chain", "prompt")
+    def build_prompt_chain(df: pd.DataFrame, metadata: Optional[Dict] = None, instruction: str = "",
+                           stats: Optional[NumericStats] = None,
+                           correlations: Optional[CorrelationResult] = None,
+                           context: Optional[Dict] = None,
+                           token_budget: Optional[int] = DEFAULT_PROMPT_BUDGET,
+                           count_tokens: Optional[Callable[[str], int]] = None) -> str:
+        """Texto de build_budgeted_prompt_chain (mismos parámetros)."""
+        return BuilderPrompt.build_budgeted_prompt_chain(
+            df, metadata=metadata, instruction=instruction, stats=stats, correlations=correlations,
+            context=context, token_budget=token_budget, count_tokens=count_tokens
+        ).text
+
+    @staticmethod
+    def build_budgeted_prompt_chain(df: pd.DataFrame, metadata: Optional[Dict] = None, instruction: str = "",
+                                    stats: Optional[NumericStats] = None,
+                                    correlations: Optional[CorrelationResult] = None,
+                                    context: Optional[Dict] = None,
+                                    token_budget: Optional[int] = DEFAULT_PROMPT_BUDGET,
+                                    count_tokens: Optional[Callable[[str], int]] = None,
+                                    tasks: str = SUMMARY_TASKS) -> BudgetedPrompt:
         """
         Construye un prompt compacto para el modelo, incluyendo:
         - Metadata resumida
         - Roles de columnas
         - Estadísticas clave (redondeadas)
         - Correlaciones relevantes
+        - Contexto de memoria (p. ej. hallazgos previos de datasets parecidos)
         - Instrucciones claras para generar un resumen ejecutivo
+
+        `stats` y `correlations` permiten reutilizar resultados ya calculados sobre el mismo df.
+
+        El prompt se ajusta a `token_budget` tokens (None = sin límite): las columnas
+        se ordenan por informatividad (variabilidad, outliers, correlación) y lo que
+        no entra se resume en una línea agregada. `count_tokens` permite contar con
+        el tokenizer del modelo; si no, se usa una estimación.
+
+        Retorna el BudgetedPrompt (texto, tokens y líneas resumidas por sección).
+        `tasks` reemplaza el bloque de tareas (p. ej. GROUP_TASKS en map-reduce).
         """
 
         metadata = metadata or {}
         column_roles = infer_column_roles(df)
 
-        # Formateo de metadata resumida
-        metadata_text = "\n".join([f"{k}: {v}" for k, v in metadata.items()]) if metadata else "Sin metadata relevante"
-
-        # Formateo de roles
-        columns_text = "\n".join([f"- {col}: {role}" for col, role in column_roles.items()])
-
-        # Estadísticas resumidas
-        numeric_cols = df.select_dtypes(include='number').columns
-        stats_text = []
-        for col in numeric_cols:
-            mean = round(df[col].mean(), 2)
-            median = round(df[col].median(), 2)
-            mode = round(df[col].mode().iloc[0], 2) if not df[col].mode().empty else 'N/A'
-            std = round(df[col].std(), 2)
-            outliers_count = len(detect_outliers(df[[col]]))
-            stats_text.append(f"**{col}:** Media={mean}, Mediana={median}, Moda={mode}, Std={std}, Outliers={outliers_count}")
-        stats_text = "\n".join(stats_text) if stats_text else "No hay columnas numéricas."
-
-        # Correlaciones altas solo
-        corr_text = []
-        if not df[numeric_cols].empty:
-            corr_matrix = compute_correlations(df[numeric_cols])
-            for col in corr_matrix.columns:
-                high_corr = corr_matrix[col][(corr_matrix[col].abs() > 0.8) & (corr_matrix[col].abs() < 1.0)]
-                for related_col, val in high_corr.items():
-                    corr_text.append(f"{col} ↔ {related_col}: {round(val, 2)}")
-        corr_text = "\n".join(corr_text) if corr_text else "No hay correlaciones altas."
+        # Estadísticas resumidas (una sola pasada vectorizada sobre todas las columnas)
+        stats = stats or compute_numeric_stats(df)
+        numeric_cols = stats.columns
+        if correlations is None and numeric_cols:
+            correlations = compute_correlation_result(df[numeric_cols])
+
+        # Columnas numéricas de más a menos informativa
+        ranked_cols = rank_numeric_columns(stats, correlations)
+        stats_lines = {}
+        for col in ranked_cols:
+            row = stats.row(col)
+            mean = round(row["mean"], 2)
+            median = round(row["median"], 2)
+            mode = round(row["mode"], 2) if pd.notna(row["mode"]) else 'N/A'
+            std = round(row["std"], 2)
+            outliers_count = row["outliers"]
+            stats_lines[f"**{col}:** Media={mean}, Mediana={median}, Moda={mode}, Std={std}, Outliers={outliers_count}"] = col
+
+        # Correlaciones altas solo (las más fuertes primero)
+        corr_lines = BuilderPrompt._correlation_lines(correlations) if correlations is not None else []
+        n_strong = BuilderPrompt._count_strong_pairs(correlations) if correlations is not None else 0
+
+        # Roles: primero las columnas numéricas más informativas, luego el resto en su orden
+        ranked_set = set(ranked_cols)
+        role_order = ranked_cols + [col for col in column_roles if col not in ranked_set]
+        role_lines = [f"- {col}: {column_roles[col]}" for col in role_order if col in column_roles]
 
         # Instrucciones compactas
         instruction_text = instruction or (
             "Genera un resumen ejecutivo profesional basado únicamente en los datos proporcionados."
         )
 
-        # Construcción del prompt final
-        prompt = (
-            f"{instruction_text}\n\n"
-            "TUS TAREAS Y OBJETIVOS:\n"
-            "- Genera **RECOMENDACIONES ACCIONABLES**: sugiere acciones concretas basadas en los hallazgos del análisis de datos, siendo específico y práctico.\n"
-            "- Genera **SUGERIR VISUALIZACIONES**: propone gráficos, histogramas, boxplots u otras visualizaciones útiles para interpretar los datos y sus patrones.\n"
-            "- Genera **SUMMARY**: un resumen ejecutivo consolidado de los hallazgos clave, incluyendo patrones de las columnas, distribuciones, anomalías, outliers y cualquier insight relevante.\n"
-            "- Genera **RESUMEN EJECUTIVO**: sintetiza de forma clara y concisa lo generado en RECOMENDACIONES, VISUALIZACIONES y SUMMARY, destacando los hallazgos más importantes, conclusiones clave y la situación general de los datos.\n"
-
-            "REGLAS:\n"
-            "- Mantén Markdown profesional.\n"
-            "- No inventes columnas ni datos.\n"
-            "- Usa solo la información proporcionada.\n\n"
-            "[INFORMACIÓN INTERNA — NO INCLUIR EN EL RESUMEN]\n"
-            f"METADATA:\n{metadata_text}\n\n"
-            f"ROLES DE COLUMNAS:\n{columns_text}\n\n"
-            f"ESTADÍSTICAS:\n{stats_text}\n\n"
-            f"CORRELACIONES:\n{corr_text}"
-        )
-
+        sections = [
+            PromptSection("instrucciones", priority=100, text=f"{instruction_text}\n\n{tasks}"),
+            PromptSection(
+                "metadata", header="[INFORMACIÓN INTERNA — NO INCLUIR EN EL RESUMEN]\nMETADATA:\n",
+                lines=[f"{k}: {v}" for k, v in metadata.items()], priority=4, text="Sin metadata relevante",
+                summarize=lambda rest: f"… y {len(rest)} campos de metadata más."
+            ),
+            PromptSection(
+                "roles", header="ROLES DE COLUMNAS:\n", lines=role_lines, priority=1,
+                summarize=lambda rest: f"… y {len(rest)} columnas más (roles omitidos por espacio)."
+            ),
+            PromptSection(
+                "estadisticas", header="ESTADÍSTICAS:\n", lines=list(stats_lines), priority=3,
+                text="No hay columnas numéricas.",
+                summarize=lambda rest: summarize_numeric_rest(stats, [stats_lines[line] for line in rest])
+            ),
+            PromptSection(
+                "correlaciones", header="CORRELACIONES:\n", lines=corr_lines, priority=2,
+                text="No hay correlaciones altas.", omitted=n_strong - len(corr_lines),
+                summarize=lambda rest: f"… y {n_strong - len(corr_lines) + len(rest)} pares más con |r| > 0.8."
+            ),
+        ]
+
+        context_section = BuilderPrompt._context_section(context)
+        if context_section is not None:
+            sections.append(context_section)
+
+        # Construcción del prompt final dentro del presupuesto de tokens
+        result = assemble_prompt(sections, budget=token_budget if token_budget is not None else float("inf"),
+                                 count_tokens=count_tokens)
+        tracer.current().set(prompt_tokens=result.tokens, prompt_budget=token_budget,
+                             truncated=result.truncated)
+        if result.truncated:
+            omitted = ", ".join(f"{name}={n}" for name, n in result.dropped.items() if n)
+            log_info(logger, f"Prompt ajustado a {result.tokens}/{token_budget} tokens (líneas resumidas: {omitted}).")
+        else:
+            log_info(logger, f"Prompt construido con {result.tokens} tokens.")
+
+        return result
 
-        return prompt
 
 
+    # =========================================================
+    #         PROMPT DE REDUCCIÓN (MAP-REDUCE POR GRUPOS)
+    # =========================================================
+    @staticmethod
+    @traced("BuilderPrompt.build_reduce_prompt", "prompt")
+    def build_reduce_prompt(partials: Sequence[Tuple[str, str]], shape: Tuple[int, int],
+                            metadata: Optional[Dict] = None, instruction: str = "",
+                            cross_pairs: Optional[List[str]] = None,
+                            context: Optional[Dict] = None,
+                            token_budget: Optional[int] = DEFAULT_PROMPT_BUDGET,
+                            count_tokens: Optional[Callable[[str], int]] = None) -> BudgetedPrompt:
+        """
+        Prompt final del modo map-reduce: combina los hallazgos parciales de cada
+        grupo de columnas (`partials` = [(etiqueta, hallazgos)]) y las correlaciones
+        fuertes entre columnas de grupos distintos en el resumen ejecutivo completo.
+        Cada grupo conserva al menos sus primeras líneas dentro del presupuesto.
+        """
+        instruction_text = instruction or (
+            "Genera un resumen ejecutivo profesional basado únicamente en los hallazgos proporcionados."
+        )
+        meta_lines = [f"{k}: {v}" for k, v in (metadata or {}).items()]
+        meta_lines += [f"filas: {shape[0]}", f"columnas: {shape[1]}", f"grupos de columnas analizados: {len(partials)}"]
+
+        sections = [
+            PromptSection("instrucciones", priority=100, text=f"{instruction_text}\n\n{SUMMARY_TASKS}"),
+            PromptSection(
+                "metadata", header="[INFORMACIÓN INTERNA — NO INCLUIR EN EL RESUMEN]\nMETADATA:\n",
+                lines=meta_lines, priority=4
+            ),
+            PromptSection(
+                "correlaciones", header="CORRELACIONES ENTRE GRUPOS:\n", lines=list(cross_pairs or []),
+                priority=2, text="No hay correlaciones altas entre grupos.",
+                summarize=lambda rest: f"… y {len(rest)} pares más con |r| > 0.8."
+            ),
+        ]
+        for i, (label, findings) in enumerate(partials, start=1):
+            lines = [line.strip() for line in (findings or "").splitlines() if line.strip()]
+            sections.append(PromptSection(
+                f"grupo_{i}", header=f"HALLAZGOS DEL GRUPO {i} ({label}):\n", lines=lines, priority=3,
+                text="Sin hallazgos.", summarize=lambda rest: f"… ({len(rest)} líneas más de este grupo omitidas)."
+            ))
+        context_section = BuilderPrompt._context_section(context)
+        if context_section is not None:
+            sections.append(context_section)
+
+        result = assemble_prompt(sections, budget=token_budget if token_budget is not None else float("inf"),
+                                 count_tokens=count_tokens)
+        tracer.current().set(prompt_tokens=result.tokens, prompt_budget=token_budget,
+                             truncated=result.truncated)
+        log_info(logger, f"Prompt de reducción con {len(partials)} grupos: {result.tokens} tokens.")
+        return result
 
     # =========================================================
     #              PROMPT PARA INFERIR ROLES DE COLUMNA
     # =========================================================
-    def build_column_prompt(self, df: pd.DataFrame, sample_size: int = 5) -> str:
+    @traced("BuilderPrompt.build_column_prompt", "prompt")
+    def build_column_prompt(self, df: pd.DataFrame, sample_size: int = 5,
+                            roles: Sequence[str] = ROLE_CHOICES) -> str:
         """
         Prompt para que el modelo infiera roles columna por columna.
-        La respuesta será SOLO un JSON válido.
+        La salida se restringe con un JSON schema (ver generate_json), así que el
+        prompt solo describe las columnas y los roles válidos.
         """
 
         column_info_list = []
 
         for col in df.columns:
-            dtype = str(df[col].dtype)
-            sample_values = df[col].dropna().head(sample_size).tolist()
-            sample_values = [str(v) for v in sample_values]
             column_info_list.append({
-                "column_name": col,
-                "dtype": dtype,
-                "sample_values": sample_values
+                "column_name": str(col),
+                "dtype": str(df[col].dtype),
+                "sample_values": column_sample(df[col], sample_size)
             })
 
         column_info_json = json.dumps(column_info_list, indent=2, ensure_ascii=False)
+        roles_text = "\n".join(f"- {role}" for role in roles)
 
         prompt = (
             "Eres Gemma 2B IT, especialista en estructuras de datos.\n"
@@ -245,16 +449,12 @@ class BuilderPrompt:
             "INSTRUCCIONES:\n"
             "NO muestres el prompt ni los textos internos.\n"
             "Usa la información solo para razonar.\n"
-            "DEBES responder únicamente con un JSON válido.\n"
-            "Sin texto adicional, sin explicaciones.\n\n"
+            "Asigna a cada columna exactamente uno de estos roles:\n"
+            f"{roles_text}\n\n"
 
             f"[COLUMN_DATA]\n{column_info_json}\n\n"
 
-            "RESPUESTA OBLIGATORIA (solo JSON):\n"
-            "{\n"
-            '  "column_name_1": "rol",\n'
-            '  "column_name_2": "rol"\n'
-            "}"
+            "RESPUESTA (JSON {columna: rol}):\n"
         )
 
         return prompt
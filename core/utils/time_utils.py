@@ -2,6 +2,7 @@
 
 import time
 from contextlib import contextmanager
+from core.utils.tracer import tracer
 
 def start_timer():
     return time.time()
@@ -17,8 +18,10 @@ def elapsed_time(start_time, logger=None, task_name="Tarea"):
 
 @contextmanager
 def log_execution_time(task_name="Tarea", logger=None):
+    """Mide un bloque; con la instrumentación activa también lo registra como span."""
     start = time.time()
-    yield
+    with tracer.span(task_name, "timer"):
+        yield
     end = time.time()
     duration = end - start
     if logger:
@@ -0,0 +1,305 @@
+# core/utils/tracer.py
+
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Carpeta de salida de las trazas exportadas
+TRACE_DIR = "data/outputs/traces"
+
+# Variable de entorno que activa la instrumentación al importar el módulo
+TRACE_ENV = "AGENT_TRACE"
+
+# Spans retenidos en memoria como máximo (los más antiguos se descartan)
+MAX_SPANS = 100_000
+
+
+def _peak_rss_mb() -> float:
+    """Pico de memoria residente del proceso (MB) hasta el momento."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux lo reporta en KB, macOS en bytes
+        return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / 1024 ** 2
+    return 0.0
+
+
+def _rows_of(value) -> Optional[int]:
+    """Filas de un DataFrame/Series/ndarray (None para otros tipos)."""
+    if hasattr(value, "shape") and hasattr(value, "__len__") and getattr(value, "ndim", 0) >= 1:
+        return len(value)
+    return None
+
+
+@dataclass
+class Span:
+    """
+    Intervalo medido: tiempo de pared, CPU del hilo y aumento del pico de RSS.
+    `attrs` guarda métricas propias (filas, tokens, aciertos de caché...).
+    """
+    name: str
+    category: str
+    start_us: float
+    thread_id: int
+    thread_name: str
+    depth: int
+    parent: Optional[str] = None
+    # Traza a la que pertenece (p. ej. ID del trabajo), ver Tracer.bind
+    trace_id: Optional[str] = None
+    wall_ms: float = 0.0
+    cpu_ms: float = 0.0
+    rss_peak_delta_mb: float = 0.0
+    error: Optional[str] = None
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """Acumula un contador (p. ej. tokens generados en streaming)."""
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+
+class _NullSpan:
+    """Span inactivo: lo que se obtiene con la instrumentación apagada."""
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def add(self, key: str, amount: float = 1) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """
+    Registro de spans en memoria, exportable a JSON lines y al formato de
+    Chrome trace (chrome://tracing, ui.perfetto.dev).
+
+    Los spans se anidan por hilo; el pico de RSS es del proceso completo, así
+    que con etapas en paralelo el delta se atribuye al span que lo alcanzó.
+    Con bind(trace_id) los spans del hilo quedan etiquetados con esa traza (p. ej.
+    un trabajo) y se pueden resumir/exportar por separado aunque otros trabajos
+    corran a la vez; quien reparte trabajo a otros hilos propaga el ID con
+    current_trace_id() + bind().
+    Apagado (por defecto, salvo AGENT_TRACE=1) el costo es una comprobación.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, max_spans: int = MAX_SPANS):
+        if enabled is None:
+            enabled = os.environ.get(TRACE_ENV, "").lower() in ("1", "true", "yes")
+        self.enabled = enabled
+        self.max_spans = max_spans
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin_ns = time.perf_counter_ns()
+        self._origin_epoch = time.time()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+    def _stack(self) -> List[Span]:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def current_trace_id(self) -> Optional[str]:
+        """Traza asociada al hilo actual (None fuera de bind)."""
+        return getattr(self._local, "trace_id", None)
+
+    @contextmanager
+    def bind(self, trace_id: Optional[str]):
+        """Etiqueta con `trace_id` los spans que se abran en este hilo dentro del bloque."""
+        previous = self.current_trace_id()
+        self._local.trace_id = trace_id
+        try:
+            yield
+        finally:
+            self._local.trace_id = previous
+
+    def current(self):
+        """Span abierto más interno del hilo actual (o uno nulo)."""
+        stack = self._stack() if self.enabled else None
+        return stack[-1] if stack else _NULL_SPAN
+
+    @contextmanager
+    def span(self, name: str, category: str = "app", **attrs):
+        if not self.enabled:
+            yield _NULL_SPAN
+            return
+
+        stack = self._stack()
+        thread = threading.current_thread()
+        span = Span(
+            name=name,
+            category=category,
+            start_us=(time.perf_counter_ns() - self._origin_ns) / 1000,
+            thread_id=thread.ident or 0,
+            thread_name=thread.name,
+            depth=len(stack),
+            parent=stack[-1].name if stack else None,
+            trace_id=self.current_trace_id(),
+            attrs=dict(attrs),
+        )
+        stack.append(span)
+        rss_before = _peak_rss_mb()
+        cpu_before = time.thread_time()
+        wall_before = time.perf_counter_ns()
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.wall_ms = round((time.perf_counter_ns() - wall_before) / 1e6, 3)
+            span.cpu_ms = round((time.thread_time() - cpu_before) * 1000, 3)
+            span.rss_peak_delta_mb = round(max(0.0, _peak_rss_mb() - rss_before), 3)
+            stack.pop()
+            with self._lock:
+                self._spans.append(span)
+                if len(self._spans) > self.max_spans:
+                    del self._spans[:len(self._spans) - self.max_spans]
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        """Spans registrados; con `trace_id`, solo los de esa traza."""
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is not None:
+            spans = [span for span in spans if span.trace_id == trace_id]
+        return spans
+
+    # ---------------------------------------------------------------
+    # Resumen y exportación
+    # ---------------------------------------------------------------
+    def summary(self, trace_id: Optional[str] = None) -> List[dict]:
+        """Totales por nombre de span, ordenados por tiempo de pared acumulado."""
+        totals: Dict[str, dict] = {}
+        for span in self.spans(trace_id):
+            entry = totals.setdefault(span.name, {
+                "name": span.name, "category": span.category, "calls": 0,
+                "wall_ms": 0.0, "cpu_ms": 0.0, "rss_peak_delta_mb": 0.0, "errors": 0,
+            })
+            entry["calls"] += 1
+            entry["wall_ms"] += span.wall_ms
+            entry["cpu_ms"] += span.cpu_ms
+            entry["rss_peak_delta_mb"] += span.rss_peak_delta_mb
+            entry["errors"] += span.error is not None
+            for key in ("rows", "prompt_tokens", "completion_tokens"):
+                if isinstance(span.attrs.get(key), (int, float)):
+                    entry[key] = entry.get(key, 0) + span.attrs[key]
+        return sorted(totals.values(), key=lambda e: e["wall_ms"], reverse=True)
+
+    def export_jsonl(self, path, trace_id: Optional[str] = None) -> str:
+        """Un span por línea, con la hora de inicio absoluta."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for span in self.spans(trace_id):
+                record = asdict(span)
+                record["started_at"] = datetime.fromtimestamp(
+                    self._origin_epoch + span.start_us / 1e6
+                ).isoformat(timespec="microseconds")
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        return str(path)
+
+    def export_chrome_trace(self, path, trace_id: Optional[str] = None) -> str:
+        """Eventos completos ("ph": "X") que Perfetto/chrome://tracing anidan por hilo."""
+        pid = os.getpid()
+        events, threads = [], {}
+        for span in self.spans(trace_id):
+            threads[span.thread_id] = span.thread_name
+            args = {"cpu_ms": span.cpu_ms, "rss_peak_delta_mb": span.rss_peak_delta_mb, **span.attrs}
+            if span.error:
+                args["error"] = span.error
+            events.append({
+                "name": span.name, "cat": span.category, "ph": "X", "pid": pid, "tid": span.thread_id,
+                "ts": span.start_us, "dur": span.wall_ms * 1000, "args": args,
+            })
+        events.extend(
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        )
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f, ensure_ascii=False, default=str)
+        return str(path)
+
+    def export(self, prefix: str = "trace", output_dir=TRACE_DIR, trace_id: Optional[str] = None) -> Dict[str, str]:
+        """
+        Exporta ambos formatos con un nombre común; retorna {"jsonl": ..., "chrome": ...}.
+        Con `trace_id` solo se exportan los spans de esa traza.
+        """
+        stem = Path(output_dir) / f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        return {
+            "jsonl": self.export_jsonl(stem.with_suffix(".jsonl"), trace_id),
+            "chrome": self.export_chrome_trace(stem.with_suffix(".trace.json"), trace_id),
+        }
+
+
+# Tracer compartido por todo el proceso
+tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return tracer
+
+
+def traced(name: Optional[str] = None, category: str = "func") -> Callable:
+    """
+    Decorador: mide cada llamada como un span. Registra `rows` (filas del
+    primer DataFrame/array recibido) y `rows_out` si el resultado es tabular.
+    """
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            with tracer.span(span_name, category) as span:
+                for value in (*args, *kwargs.values()):
+                    rows = _rows_of(value)
+                    if rows is not None:
+                        span.set(rows=rows)
+                        break
+                result = func(*args, **kwargs)
+                rows_out = _rows_of(result)
+                if rows_out is not None:
+                    span.set(rows_out=rows_out)
+                return result
+
+        return wrapper
+
+    return decorator
@@ -8,21 +8,38 @@ Descripción:
 Funciones principales:
     - scan_raw_folder(): busca archivos nuevos en raw/
     - clean_dataset(file_path): limpia y guarda cada dataset
-    - log_cleaning_results(): mantiene registro de la limpieza
+    - clean_all_files(workers): limpieza secuencial o en paralelo (pool de procesos);
+      solo procesa archivos nuevos o modificados según el manifiesto
+    - summarize_results(results): resumen agregado de la ejecución
+    - watch_raw_folder(): modo vigilancia, limpia al llegar archivos nuevos
+
+Uso:
+    python scripts/auto_clean_data.py [--workers N] [--force] [--watch]
 """
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
+import argparse
+import hashlib
+import json
 import logging
-import sys
-import pandas as pd
+import os
+import threading
+import time
 
-from core.controller.data_manager import DataManager
+from core.controller.data_manager import DataManager, PROCESSED_FORMAT
 
 # --- Configuración de paths ---
 BASE_DIR = Path(__file__).resolve().parent.parent
 RAW_DATA_DIR = BASE_DIR / "data" / "datasets" / "raw"
 PROCESSED_DATA_DIR = BASE_DIR / "data" / "datasets" / "processed"
 LOG_FILE = BASE_DIR / "data" / "outputs" / "logs" / "auto_clean_data.log"
+MANIFEST_FILE = BASE_DIR / "data" / "datasets" / "clean_manifest.json"
+
+# Parámetros de limpieza: si cambian, todos los archivos se vuelven a limpiar
+CLEANING_PARAMS = {"fill_strategy": "mean", "remove_outliers": True, "format": PROCESSED_FORMAT}
+RAW_EXTENSIONS = (".csv", ".xlsx")
 
 # --- Logger ---
 logging.basicConfig(
@@ -43,9 +60,6 @@ def log(message: str, level="info"):
         logging.error(message)
         print(message)
 
-# --- Instanciar DataManager ---
-data_manager = DataManager()
-
 # -------------------------------------------------------------------------
 # Funciones principales
 # -------------------------------------------------------------------------
@@ -54,42 +68,291 @@ def scan_raw_folder():
     files = list(RAW_DATA_DIR.glob("*.csv")) + list(RAW_DATA_DIR.glob("*.xlsx"))
     return files
 
-def clean_dataset(file_path: Path):
-    """Limpia y guarda un dataset usando DataManager"""
+# -------------------------------------------------------------------------
+# Manifiesto de archivos crudos (limpieza incremental)
+# -------------------------------------------------------------------------
+def load_manifest(path: Path = None) -> dict:
+    """Carga el manifiesto {nombre: {size, mtime_ns, sha256, params, output, ...}}."""
+    path = Path(path or MANIFEST_FILE)
+    if not path.exists():
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        log(f"[WARN] Manifiesto ilegible, se reconstruye: {e}", level="warning")
+        return {}
+
+def save_manifest(manifest: dict, path: Path = None) -> None:
+    """Escritura atómica: un corte a mitad de escritura no deja el manifiesto corrupto."""
+    path = Path(path or MANIFEST_FILE)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def file_sha256(file_path: Path, block_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def processed_name(file_path: Path, params: dict = CLEANING_PARAMS) -> str:
+    """
+    Nombre de la salida limpia. Conserva la extensión original (ventas.csv ->
+    ventas.csv.parquet): ventas.csv y ventas.xlsx no escriben el mismo archivo.
+    """
+    return f"{Path(file_path).name}.{params['format']}"
+
+def select_changed_files(files, manifest: dict, params: dict = CLEANING_PARAMS):
+    """
+    Separa los archivos que hay que limpiar. Un archivo se omite si su entrada
+    del manifiesto tiene los mismos parámetros, su salida existe y no cambió:
+    primero se compara tamaño/mtime (sin leer el archivo) y solo si difieren se
+    calcula el hash (un `touch` sin cambios de contenido no provoca re-limpieza).
+
+    Retorna (pendientes, huellas) donde huellas = {nombre: {size, mtime_ns, sha256}}.
+    """
+    pending, fingerprints = [], {}
+    for file_path in files:
+        stat = file_path.stat()
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        entry = manifest.get(file_path.name)
+        up_to_date = (
+            entry is not None
+            and entry.get("params") == params
+            and entry.get("output") is not None
+            and Path(entry["output"]).name == processed_name(file_path, params)
+            and Path(entry["output"]).exists()
+        )
+        if up_to_date and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            continue
+
+        fingerprint["sha256"] = file_sha256(file_path)
+        if up_to_date and entry.get("sha256") == fingerprint["sha256"]:
+            entry.update(fingerprint)
+            continue
+
+        fingerprints[file_path.name] = fingerprint
+        pending.append(file_path)
+    return pending, fingerprints
+
+def update_manifest(manifest: dict, results: list, fingerprints: dict, params: dict = CLEANING_PARAMS,
+                    existing_files=None) -> dict:
+    """
+    Registra los archivos limpiados con éxito y descarta entradas de archivos que
+    ya no existen. Las salidas con un nombre anterior que ya no usa ninguna entrada
+    se borran (no quedan dos versiones del mismo dataset en processed/).
+    """
+    previous = set()
+    for result in results:
+        if result["status"] != "ok":
+            continue
+        old_output = manifest.get(result["file"], {}).get("output")
+        if old_output and old_output != result["output"]:
+            previous.add(old_output)
+        manifest[result["file"]] = {
+            **fingerprints[result["file"]],
+            "params": params,
+            "output": result["output"],
+            "rows_in": result["rows_in"],
+            "rows_out": result["rows_out"],
+            "cleaned_at": datetime.now().isoformat(timespec="seconds"),
+        }
+    if existing_files is not None:
+        names = {f.name for f in existing_files}
+        for name in [n for n in manifest if n not in names]:
+            del manifest[name]
+    in_use = {entry.get("output") for entry in manifest.values()}
+    for stale in previous - in_use:
+        Path(stale).unlink(missing_ok=True)
+        log(f"[INFO] Salida anterior eliminada: {stale}")
+    return manifest
+
+def clean_dataset(file_path: Path, output_dir: Path = PROCESSED_DATA_DIR, params: dict = CLEANING_PARAMS) -> dict:
+    """
+    Limpia y guarda un dataset usando DataManager.
+    Retorna un dict con el resultado; los errores quedan aislados por archivo.
+    Se ejecuta tanto en el proceso principal como en los workers del pool.
+    """
+    file_path = Path(file_path)
+    result = {"file": file_path.name, "status": "ok", "rows_in": 0, "rows_out": 0,
+              "seconds": 0.0, "output": None, "error": None}
+    start = time.perf_counter()
     try:
         log(f"[INFO] Procesando archivo: {file_path.name}")
 
+        # DataManager por llamada: es liviano y cada worker del pool tiene el suyo
+        data_manager = DataManager()
+        data_manager.processed_dir = Path(output_dir)
+
         # Cargar dataset
-        df = pd.read_csv(file_path) if file_path.suffix.lower() == ".csv" else pd.read_excel(file_path)
+        df = data_manager.load_data(str(file_path))
+        result["rows_in"] = len(df)
 
         # Limpieza usando core
-        df_clean = data_manager.clean_data(df)
+        df_clean = data_manager.clean_data(
+            df, fill_strategy=params["fill_strategy"], remove_outliers=params["remove_outliers"], inplace=True
+        )
+        result["rows_out"] = len(df_clean)
 
-        # Guardar dataset limpio
-        output_file = PROCESSED_DATA_DIR / file_path.name
-        data_manager.save_processed(df_clean, file_path.name)
-        log(f"[INFO] Archivo limpio guardado en: {output_file}")
+        # Guardar dataset limpio en formato columnar (conserva dtypes y evita re-parsear texto)
+        result["output"] = data_manager.save_processed(df_clean, processed_name(file_path, params))
+        log(f"[INFO] Archivo limpio guardado en: {result['output']}")
 
     except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
         log(f"[ERROR] Error procesando {file_path.name}: {e}", level="error")
 
-def clean_all_files():
-    """Itera todos los archivos nuevos y aplica limpieza automática"""
+    result["seconds"] = round(time.perf_counter() - start, 3)
+    return result
+
+def _largest_first(files):
+    """Ordena por tamaño descendente: los archivos grandes no quedan al final del pool."""
+    return sorted(files, key=lambda f: f.stat().st_size, reverse=True)
+
+def clean_files_parallel(files, workers: int, output_dir: Path = PROCESSED_DATA_DIR,
+                         params: dict = CLEANING_PARAMS) -> list:
+    """Ejecuta clean_dataset sobre un pool de procesos, con aislamiento de errores por archivo."""
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(clean_dataset, f, output_dir, params): f for f in _largest_first(files)}
+        for future in as_completed(futures):
+            file_path = futures[future]
+            try:
+                results.append(future.result())
+            except Exception as e:
+                # El worker murió (p. ej. sin memoria): se registra y se sigue con el resto
+                log(f"[ERROR] Worker falló procesando {file_path.name}: {e}", level="error")
+                results.append({"file": file_path.name, "status": "error", "rows_in": 0, "rows_out": 0,
+                                "seconds": 0.0, "output": None, "error": repr(e)})
+    return results
+
+def summarize_results(results: list, elapsed: float) -> dict:
+    """Resumen agregado de una ejecución de limpieza."""
+    failures = [r for r in results if r["status"] != "ok"]
+    summary = {
+        "files": len(results),
+        "succeeded": len(results) - len(failures),
+        "failed": len(failures),
+        "rows_in": sum(r["rows_in"] for r in results),
+        "rows_out": sum(r["rows_out"] for r in results),
+        "cpu_seconds": round(sum(r["seconds"] for r in results), 3),
+        "wall_seconds": round(elapsed, 3),
+        "failures": {r["file"]: r["error"] for r in failures},
+    }
+    log(f"[INFO] Resumen: {summary['succeeded']}/{summary['files']} archivos, "
+        f"{summary['rows_in']} -> {summary['rows_out']} filas, "
+        f"{summary['wall_seconds']}s (suma por archivo {summary['cpu_seconds']}s)")
+    for name, error in summary["failures"].items():
+        log(f"[WARN] Falló {name}: {error}", level="warning")
+    return summary
+
+def clean_all_files(workers: int = 1, force: bool = False) -> dict:
+    """
+    Itera los archivos nuevos o modificados (según el manifiesto) y aplica limpieza automática.
+    workers > 1 usa un pool de procesos; workers = 0 usa todos los núcleos.
+    force=True ignora el manifiesto y limpia todo.
+    """
     PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
     log("=== Iniciando limpieza automática de datasets ===")
 
-    files = scan_raw_folder()
-    if not files:
+    all_files = scan_raw_folder()
+    if not all_files:
         log("[WARN] No se encontraron archivos en raw/", level="warning")
-        return
+        return {**summarize_results([], 0.0), "skipped": 0}
 
-    for file_path in files:
-        clean_dataset(file_path)
+    manifest = {} if force else load_manifest(MANIFEST_FILE)
+    files, fingerprints = select_changed_files(all_files, manifest)
+    skipped = len(all_files) - len(files)
+    if skipped:
+        log(f"[INFO] {skipped} archivos sin cambios omitidos (manifiesto).")
 
+    results = []
+    start = time.perf_counter()
+    if files:
+        workers = min(workers or os.cpu_count() or 1, len(files))
+        if workers > 1:
+            log(f"[INFO] Limpieza en paralelo: {len(files)} archivos, {workers} procesos")
+            results = clean_files_parallel(files, workers, PROCESSED_DATA_DIR)
+        else:
+            results = [clean_dataset(f, PROCESSED_DATA_DIR) for f in files]
+
+    summary = summarize_results(results, time.perf_counter() - start)
+    summary["skipped"] = skipped
+    save_manifest(update_manifest(manifest, results, fingerprints, existing_files=all_files), MANIFEST_FILE)
     log("=== Limpieza automática completada ===")
+    return summary
+
+def watch_raw_folder(workers: int = 1, interval: float = 10.0, settle_seconds: float = 2.0,
+                     stop_event: threading.Event = None) -> None:
+    """
+    Modo vigilancia: ejecuta clean_all_files cada vez que cambia raw/.
+    Usa eventos del sistema de archivos si `watchdog` está instalado; si no,
+    sondea cada `interval` segundos (barato: los archivos sin cambios solo se
+    comparan por tamaño/mtime). `settle_seconds` espera a que termine la copia
+    de un archivo antes de limpiarlo.
+    """
+    stop_event = stop_event or threading.Event()
+    changed = threading.Event()
+    observer = None
+    try:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        class _RawHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = [getattr(event, "src_path", ""), getattr(event, "dest_path", "")]
+                if any(str(p).lower().endswith(RAW_EXTENSIONS) for p in paths):
+                    changed.set()
+
+        RAW_DATA_DIR.mkdir(parents=True, exist_ok=True)
+        observer = Observer()
+        observer.schedule(_RawHandler(), str(RAW_DATA_DIR), recursive=False)
+        observer.start()
+        log(f"[INFO] Vigilando {RAW_DATA_DIR} (eventos del sistema de archivos)")
+    except ImportError:
+        log(f"[INFO] watchdog no instalado; sondeando {RAW_DATA_DIR} cada {interval}s")
+
+    try:
+        clean_all_files(workers=workers)
+        while not stop_event.is_set():
+            if observer is not None:
+                if not changed.wait(timeout=interval):
+                    continue
+                # Esperar a que dejen de llegar eventos (copias en curso)
+                while changed.is_set() and not stop_event.is_set():
+                    changed.clear()
+                    stop_event.wait(settle_seconds)
+            elif stop_event.wait(interval):
+                break
+            if not stop_event.is_set():
+                clean_all_files(workers=workers)
+    except KeyboardInterrupt:
+        log("[INFO] Vigilancia detenida por el usuario.")
+    finally:
+        if observer is not None:
+            observer.stop()
+            observer.join()
 
 # -------------------------------------------------------------------------
 # Ejecución directa
 # -------------------------------------------------------------------------
 if __name__ == "__main__":
-    clean_all_files()
+    parser = argparse.ArgumentParser(description="Limpieza automática de datasets en raw/")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Procesos en paralelo (1 = secuencial, 0 = todos los núcleos)")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignora el manifiesto y vuelve a limpiar todos los archivos")
+    parser.add_argument("--watch", action="store_true",
+                        help="Queda vigilando raw/ y limpia los archivos nuevos o modificados")
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="Segundos entre sondeos en modo vigilancia sin watchdog")
+    args = parser.parse_args()
+    if args.watch:
+        watch_raw_folder(workers=args.workers, interval=args.interval)
+    else:
+        clean_all_files(workers=args.workers, force=args.force)
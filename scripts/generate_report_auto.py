@@ -48,7 +48,7 @@ def ensure_directories():
 def load_all_processed_data() -> pd.DataFrame:
     """Carga todos los archivos procesados en un único DataFrame usando DataManager."""
     data_manager = DataManager()
-    files = list(PROCESSED_DATA_DIR.glob("*.*"))
+    files = data_manager.list_processed_files(PROCESSED_DATA_DIR)
     if not files:
         log("[WARN] No se encontraron archivos procesados.", level="warning")
         return pd.DataFrame()
@@ -2,15 +2,27 @@
 """
 Módulo: generate_sample_data.py
 Descripción:
-    Genera datasets sintéticos para pruebas del sistema.
-    Soporta CSV y Excel, con posibilidad de añadir ruido controlado.
+    Genera datasets sintéticos para pruebas y carga del sistema.
+    Las columnas se construyen con numpy.random.Generator por bloques y se
+    escriben en streaming (CSV/Parquet), así que el tamaño del archivo no está
+    limitado por la memoria. El contenido se describe con un esquema (tipos,
+    distribuciones, tasas de nulos/duplicados/outliers, cardinalidades,
+    rangos de fechas) y es reproducible con una semilla fija.
     Archivos generados en data/datasets/samples/.
+
+Uso:
+    python scripts/generate_sample_data.py [--rows 50000000] [--schema esquema.json]
+                                           [--formats csv parquet] [--seed 42] [--noise 0.05]
 """
 
 from pathlib import Path
-from datetime import datetime
-import random
+from typing import Dict, Iterator, Optional, Sequence
+import argparse
+import json
 import logging
+import time
+
+import numpy as np
 import pandas as pd
 
 # --- Configuración de paths ---
@@ -18,7 +30,30 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SAMPLES_DIR = BASE_DIR / "data" / "datasets" / "samples"
 LOG_FILE = BASE_DIR / "data" / "outputs" / "logs" / "generate_sample_data.log"
 
+SEED = 42
+DEFAULT_CHUNK_SIZE = 1_000_000
+EXCEL_MAX_ROWS = 1_048_575
+FORMATS = ("csv", "parquet", "excel")
+
+# Esquema por defecto: el dataset de ejemplo histórico (id, 3 features, label binaria)
+DEFAULT_SCHEMA = {
+    "columns": [
+        {"name": "id", "type": "id"},
+        {"name": "feature1", "type": "float", "distribution": "uniform", "low": 0, "high": 100, "decimals": 2},
+        {"name": "feature2", "type": "float", "distribution": "uniform", "low": 0, "high": 50, "decimals": 2},
+        {"name": "feature3", "type": "float", "distribution": "uniform", "low": 10, "high": 500, "decimals": 2},
+        {"name": "label", "type": "int", "low": 0, "high": 2},
+    ],
+    "null_rate": 0.0,
+    "duplicate_rate": 0.0,
+    "outlier_rate": 0.0,
+}
+
+# Distancia (en desviaciones estándar) a la que se colocan los outliers
+OUTLIER_SIGMAS = 8.0
+
 # --- Logger ---
+LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
 logging.basicConfig(
     filename=LOG_FILE,
     level=logging.INFO,
@@ -37,55 +72,214 @@ def log(message: str, level="info"):
         logger.error(message)
     print(message)
 
-# --- Funciones principales ---
-def generate_sample_rows(num_rows=100):
-    """Genera una lista de diccionarios con datos sintéticos."""
-    rows = []
-    for i in range(1, num_rows + 1):
-        rows.append({
-            "id": i,
-            "feature1": round(random.uniform(0, 100), 2),
-            "feature2": round(random.uniform(0, 50), 2),
-            "feature3": round(random.uniform(10, 500), 2),
-            "label": random.choice([0, 1])
-        })
-    return rows
-
-def add_noise(df: pd.DataFrame, noise_level=0.05):
-    """Introduce ruido aleatorio a valores numéricos del DataFrame."""
-    numeric_cols = df.select_dtypes(include="number").columns
-    for col in numeric_cols:
-        df[col] = df[col].apply(lambda x: x * (1 + random.uniform(-noise_level, noise_level)))
+# --- Esquema ---
+def load_schema(path) -> dict:
+    """Lee un esquema JSON con la misma forma que DEFAULT_SCHEMA."""
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _rate(spec: dict, schema: dict, key: str) -> float:
+    return float(spec.get(key, schema.get(key, 0.0)))
+
+# --- Generación de columnas (vectorizada) ---
+def _draw(spec: dict, n: int, rng: np.random.Generator) -> np.ndarray:
+    distribution = spec.get("distribution", "uniform" if spec["type"] == "int" else "normal")
+    if distribution == "normal":
+        return rng.normal(spec.get("mean", 0.0), spec.get("std", 1.0), n)
+    if distribution == "uniform":
+        return rng.uniform(spec.get("low", 0.0), spec.get("high", 1.0), n)
+    if distribution == "lognormal":
+        return rng.lognormal(spec.get("mean", 0.0), spec.get("sigma", 1.0), n)
+    if distribution == "exponential":
+        return rng.exponential(spec.get("scale", 1.0), n)
+    if distribution == "poisson":
+        return rng.poisson(spec.get("lam", 1.0), n).astype(np.float64)
+    raise ValueError(f"Distribución no soportada en '{spec['name']}': {distribution}")
+
+def _inject_outliers(values: np.ndarray, rate: float, rng: np.random.Generator) -> np.ndarray:
+    """Coloca una fracción `rate` de valores a ±OUTLIER_SIGMAS desviaciones de la media."""
+    mask = rng.random(values.size) < rate
+    if mask.any():
+        spread = values.std() or 1.0
+        signs = rng.choice(np.array([-1.0, 1.0]), mask.sum())
+        values[mask] = values.mean() + signs * OUTLIER_SIGMAS * spread
+    return values
+
+def _categories(spec: dict) -> list:
+    if "categories" in spec:
+        return list(spec["categories"])
+    prefix = spec.get("prefix", f"{spec['name']}_")
+    return [f"{prefix}{i}" for i in range(int(spec.get("cardinality", 5)))]
+
+def _category_weights(spec: dict, k: int) -> np.ndarray:
+    """Pesos explícitos, o distribución tipo Zipf con `skew` (0 = uniforme)."""
+    if "weights" in spec:
+        weights = np.asarray(spec["weights"], dtype=np.float64)
+    else:
+        weights = 1.0 / np.arange(1, k + 1) ** float(spec.get("skew", 0.0))
+    return weights / weights.sum()
+
+def generate_column(spec: dict, schema: dict, start: int, n: int, rng: np.random.Generator):
+    """Genera `n` valores de una columna (array de NumPy o extensión de pandas)."""
+    kind = spec["type"]
+    null_mask = rng.random(n) < _rate(spec, schema, "null_rate") if kind != "id" else None
+
+    if kind == "id":
+        return np.arange(start, start + n, dtype=np.int64) + int(spec.get("start", 1))
+
+    if kind in ("float", "int"):
+        if kind == "int" and spec.get("distribution", "uniform") == "uniform":
+            values = rng.integers(int(spec.get("low", 0)), int(spec.get("high", 100)), n).astype(np.float64)
+        else:
+            values = _draw(spec, n, rng)
+        values = _inject_outliers(values, _rate(spec, schema, "outlier_rate"), rng)
+        if kind == "int":
+            values = np.round(values).astype(np.int64)
+            return pd.arrays.IntegerArray(values, null_mask) if null_mask.any() else values
+        if "decimals" in spec:
+            values = np.round(values, int(spec["decimals"]))
+        values[null_mask] = np.nan
+        return values
+
+    if kind == "category":
+        categories = _categories(spec)
+        codes = rng.choice(len(categories), n, p=_category_weights(spec, len(categories)))
+        codes[null_mask] = -1
+        return pd.Categorical.from_codes(codes, categories=categories)
+
+    if kind == "bool":
+        values = rng.random(n) < float(spec.get("p", 0.5))
+        return pd.arrays.BooleanArray(values, null_mask) if null_mask.any() else values
+
+    if kind == "date":
+        unit = spec.get("unit", "D")
+        first = np.datetime64(spec.get("start", "2020-01-01"), unit)
+        last = np.datetime64(spec.get("end", "2024-12-31"), unit)
+        span = int((last - first).astype(np.int64)) + 1
+        values = first + rng.integers(0, span, n).astype(f"timedelta64[{unit}]")
+        values[null_mask] = np.datetime64("NaT")
+        # Resolución estándar de pandas: la misma al releer desde Parquet
+        return values.astype("datetime64[ns]")
+
+    raise ValueError(f"Tipo de columna no soportado en '{spec['name']}': {kind}")
+
+def generate_chunk(schema: dict, start: int, n: int, rng: np.random.Generator) -> pd.DataFrame:
+    """Bloque de `n` filas a partir de la fila `start`, con duplicados dentro del bloque."""
+    columns = {spec["name"]: generate_column(spec, schema, start, n, rng) for spec in schema["columns"]}
+
+    # Duplicados: filas al azar sobrescritas con copias exactas de otras del mismo bloque
+    n_duplicates = int(n * float(schema.get("duplicate_rate", 0.0)))
+    if n_duplicates:
+        targets = rng.choice(n, n_duplicates, replace=False)
+        sources = rng.choice(n, n_duplicates, replace=False)
+        for values in columns.values():
+            values[targets] = values[sources]
+    return pd.DataFrame(columns)
+
+def add_noise(df: pd.DataFrame, noise_level=0.05, rng: Optional[np.random.Generator] = None) -> pd.DataFrame:
+    """Ruido multiplicativo ±noise_level en las columnas float (ids y enteros no se alteran)."""
+    rng = rng or np.random.default_rng(SEED)
+    for col in df.select_dtypes(include="float").columns:
+        df[col] = df[col].to_numpy() * (1 + rng.uniform(-noise_level, noise_level, len(df)))
     return df
 
-def save_csv(df: pd.DataFrame, filename="sample_data.csv"):
-    file_path = SAMPLES_DIR / filename
-    df.to_csv(file_path, index=False)
-    log(f"[INFO] CSV generado: {file_path}")
-    return file_path
+def iter_chunks(schema: dict, num_rows: int, seed: int = SEED, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                noise_level: float = 0.0) -> Iterator[pd.DataFrame]:
+    """
+    Genera el dataset por bloques. Cada bloque usa su propio generador
+    derivado de (seed, índice de bloque): misma semilla y chunk_size, mismos datos.
+    """
+    for index, start in enumerate(range(0, num_rows, chunk_size)):
+        rng = np.random.default_rng([seed, index])
+        chunk = generate_chunk(schema, start, min(chunk_size, num_rows - start), rng)
+        if noise_level:
+            chunk = add_noise(chunk, noise_level, rng)
+        yield chunk
 
-def save_excel(df: pd.DataFrame, filename="sample_data.xlsx"):
-    file_path = SAMPLES_DIR / filename
-    df.to_excel(file_path, index=False)
-    log(f"[INFO] Excel generado: {file_path}")
-    return file_path
+def generate_frame(schema: dict = DEFAULT_SCHEMA, num_rows: int = 100, seed: int = SEED,
+                   chunk_size: int = DEFAULT_CHUNK_SIZE, noise_level: float = 0.0) -> pd.DataFrame:
+    """Dataset completo en memoria (para tamaños que caben en RAM)."""
+    chunks = list(iter_chunks(schema, num_rows, seed, chunk_size, noise_level))
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
 
-def generate_sample_data(num_rows=100, add_noise_flag=False):
-    """Genera dataset sintético en CSV y Excel."""
-    SAMPLES_DIR.mkdir(parents=True, exist_ok=True)
-    log(f"[INFO] Directorio de samples verificado: {SAMPLES_DIR}")
+# --- Escritura en streaming ---
+def write_dataset(schema: dict, num_rows: int, stem: Path, formats: Sequence[str] = ("csv",), seed: int = SEED,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE, noise_level: float = 0.0) -> Dict[str, Path]:
+    """
+    Escribe el dataset bloque a bloque en cada formato pedido. Excel no admite
+    escritura incremental: se omite si supera EXCEL_MAX_ROWS filas.
+    """
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Formatos no soportados: {sorted(unknown)}")
+    if "excel" in formats and num_rows > EXCEL_MAX_ROWS:
+        log(f"[WARNING] Excel omitido: {num_rows:,} filas superan el límite de la hoja.", level="warning")
+        formats = [fmt for fmt in formats if fmt != "excel"]
 
-    rows = generate_sample_rows(num_rows)
-    df = pd.DataFrame(rows)
+    stem = Path(stem)
+    stem.parent.mkdir(parents=True, exist_ok=True)
+    paths = {fmt: stem.with_suffix({"csv": ".csv", "parquet": ".parquet", "excel": ".xlsx"}[fmt]) for fmt in formats}
+    start_time = time.perf_counter()
+    csv_file = open(paths["csv"], "w", encoding="utf-8", newline="") if "csv" in paths else None
+    parquet_writer = None
+    excel_chunks = []
+    try:
+        for index, chunk in enumerate(iter_chunks(schema, num_rows, seed, chunk_size, noise_level)):
+            if csv_file is not None:
+                chunk.to_csv(csv_file, index=False, header=index == 0)
+            if "parquet" in paths:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                if parquet_writer is None:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                    parquet_writer = pq.ParquetWriter(paths["parquet"], table.schema)
+                else:
+                    table = pa.Table.from_pandas(chunk, schema=parquet_writer.schema, preserve_index=False)
+                parquet_writer.write_table(table)
+            if "excel" in paths:
+                excel_chunks.append(chunk)
+    finally:
+        if csv_file is not None:
+            csv_file.close()
+        if parquet_writer is not None:
+            parquet_writer.close()
+    if excel_chunks:
+        pd.concat(excel_chunks, ignore_index=True).to_excel(paths["excel"], index=False)
 
-    if add_noise_flag:
-        df = add_noise(df)
-        log(f"[INFO] Ruido agregado a los datos (±{5}%)")
+    elapsed = time.perf_counter() - start_time
+    for fmt, path in paths.items():
+        log(f"[INFO] {fmt.upper()} generado: {path}")
+    log(f"[INFO] {num_rows:,} filas en {elapsed:.1f}s ({num_rows / max(elapsed, 1e-9):,.0f} filas/s)")
+    return paths
 
-    csv_path = save_csv(df)
-    excel_path = save_excel(df)
-    return csv_path, excel_path
+def generate_sample_data(num_rows=100, add_noise_flag=False, schema: Optional[dict] = None,
+                         formats: Sequence[str] = ("csv",), seed: int = SEED,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE, filename: str = "sample_data",
+                         noise_level: float = 0.05) -> Dict[str, Path]:
+    """Genera el dataset sintético en data/datasets/samples/ y retorna {formato: ruta}."""
+    SAMPLES_DIR.mkdir(parents=True, exist_ok=True)
+    log(f"[INFO] Directorio de samples verificado: {SAMPLES_DIR}")
+    if add_noise_flag:
+        log(f"[INFO] Ruido agregado a los datos (±{noise_level:.0%})")
+    return write_dataset(schema or DEFAULT_SCHEMA, num_rows, SAMPLES_DIR / filename, formats=formats, seed=seed,
+                         chunk_size=chunk_size, noise_level=noise_level if add_noise_flag else 0.0)
 
 # --- Ejecución directa ---
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generador de datasets sintéticos.")
+    parser.add_argument("--rows", type=int, default=100, help="Número de filas")
+    parser.add_argument("--schema", type=Path, help="Esquema JSON (por defecto: dataset de ejemplo)")
+    parser.add_argument("--formats", nargs="+", default=["csv"], choices=FORMATS)
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--noise", type=float, default=0.0, help="Ruido multiplicativo en columnas float (0.05 = ±5%%)")
+    parser.add_argument("--output", default="sample_data", help="Nombre base de los archivos")
+    args = parser.parse_args(argv)
+
+    schema = load_schema(args.schema) if args.schema else DEFAULT_SCHEMA
+    return generate_sample_data(num_rows=args.rows, add_noise_flag=args.noise > 0, schema=schema,
+                                formats=args.formats, seed=args.seed, chunk_size=args.chunk_size,
+                                filename=args.output, noise_level=args.noise)
+
 if __name__ == "__main__":
-    generate_sample_data(num_rows=100, add_noise_flag=True)
+    main()
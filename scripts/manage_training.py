@@ -47,7 +47,7 @@ def run_training(epochs=3, batch_size=32, incremental=False):
     model_manager = ModelManager()
 
     # Verificar datasets procesados
-    processed_files = list(PROCESSED_DIR.glob("*.*"))
+    processed_files = data_manager.list_processed_files(PROCESSED_DIR)
     if not processed_files:
         log(f"[ERROR] No se encontraron archivos en {PROCESSED_DIR}", level="error")
         sys.exit(1)
@@ -0,0 +1,402 @@
+# scripts/run_benchmarks.py
+"""
+Módulo: run_benchmarks.py
+Descripción:
+    Benchmarks reproducibles de los caminos críticos del sistema: carga,
+    limpieza y resumen (DataManager), analítica, construcción de prompts,
+    exportación de reportes y una llamada LLM simulada.
+
+    Para cada escala se genera (con generate_sample_data, y se guarda en caché)
+    un dataset sintético con nulos, duplicados y outliers a partir de una
+    semilla fija. Cada benchmark
+    reporta tiempo (mínimo/mediana de varias repeticiones), throughput y pico
+    de memoria asignada (tracemalloc, en una pasada aparte para no sesgar los
+    tiempos). Los resultados se guardan en JSON en data/outputs/benchmarks/ y
+    se pueden comparar contra una ejecución anterior para detectar regresiones.
+
+Uso:
+    python scripts/run_benchmarks.py [--scales xs s] [--only load_csv clean_data]
+                                     [--repeat 3] [--compare baseline.json]
+"""
+
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from core.controller.data_manager import DataManager
+from core.heavy_modules.analytics.anomaly_detection import detect_outliers
+from core.heavy_modules.analytics.correlation_analysis import compute_correlation_result
+from core.heavy_modules.analytics.statistical_summary import generate_histograms
+from core.heavy_modules.analytics.stats_engine import compute_numeric_stats
+from core.heavy_modules.inference.inference_scheduler import InferenceScheduler
+from core.heavy_modules.inference.model_pool import ModelPool
+from core.heavy_modules.reporting.report_builder import ReportBuilder
+from core.utils.prompt_builder import BuilderPrompt
+from scripts.generate_sample_data import generate_frame, write_dataset
+
+# --- Configuración de paths ---
+BASE_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = BASE_DIR / "data" / "outputs" / "benchmarks"
+DATASETS_DIR = BASE_DIR / "data" / "benchmarks" / "datasets"
+LOG_FILE = BASE_DIR / "data" / "outputs" / "logs" / "run_benchmarks.log"
+
+# Escalas: nombre -> (filas, columnas)
+SCALES = {
+    "xs": (10_000, 5),
+    "s": (100_000, 20),
+    "m": (1_000_000, 50),
+    "wide": (50_000, 2_000),
+    "l": (10_000_000, 20),
+}
+DEFAULT_SCALES = ("xs", "s")
+
+SEED = 42
+NULL_RATE = 0.02
+DUPLICATE_RATE = 0.01
+OUTLIER_RATE = 0.002
+
+# Histogramas: como mucho este número de columnas por escala (acota el tiempo en tablas anchas)
+MAX_CHART_COLUMNS = 20
+
+# Llamada LLM simulada: prompts por lote y tokens por respuesta
+LLM_PROMPTS = 32
+LLM_TOKENS = 256
+
+# Una regresión es una mediana más de un REGRESSION_THRESHOLD más lenta que la base
+REGRESSION_THRESHOLD = 0.15
+
+# --- Logger ---
+LOG_FILE.parent.mkdir(parents=True, exist_ok=True)
+logging.basicConfig(
+    filename=LOG_FILE,
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S"
+)
+
+
+def log(message: str, level="info"):
+    getattr(logging, level)(message)
+    print(message)
+
+
+# --- Datos sintéticos ---
+def benchmark_schema(cols: int, null_rate: float = NULL_RATE, duplicate_rate: float = DUPLICATE_RATE,
+                     outlier_rate: float = OUTLIER_RATE) -> dict:
+    """
+    Esquema para generate_sample_data: un id, una fecha, ~10% de columnas
+    categóricas y el resto numéricas (normales, enteras y log-normales).
+    """
+    columns = [{"name": "id", "type": "id"}, {"name": "fecha", "type": "date", "start": "2020-01-01",
+                                              "end": "2024-12-31"}]
+    n_features = max(1, cols - 2)
+    n_categorical = max(1, n_features // 10) if n_features > 2 else 0
+    numeric_kinds = [
+        {"type": "float", "distribution": "normal", "mean": 100, "std": 15},
+        {"type": "int", "low": 0, "high": 1_000},
+        {"type": "float", "distribution": "lognormal", "mean": 3, "sigma": 0.5},
+    ]
+    for i in range(n_features - n_categorical):
+        columns.append({"name": f"num_{i}", **numeric_kinds[i % 3]})
+    for i in range(n_categorical):
+        columns.append({"name": f"cat_{i}", "type": "category", "cardinality": 8 + 4 * i, "skew": 1.0,
+                        "prefix": "cat_"})
+    return {"columns": columns, "null_rate": null_rate, "duplicate_rate": duplicate_rate,
+            "outlier_rate": outlier_rate}
+
+
+def make_dataset(rows: int, cols: int, seed: int = SEED, **rates) -> pd.DataFrame:
+    """Dataset sintético en memoria con nulos, filas duplicadas y outliers."""
+    return generate_frame(benchmark_schema(cols, **rates), rows, seed=seed)
+
+
+def prepare_dataset(scale: str, rows: int, cols: int, seed: int, datasets_dir: Path) -> Dict[str, Path]:
+    """Genera en streaming el dataset de una escala (CSV + Parquet) si no existe ya."""
+    stem = datasets_dir / f"bench_{scale}_{rows}x{cols}_seed{seed}"
+    paths = {"csv": stem.with_suffix(".csv"), "parquet": stem.with_suffix(".parquet")}
+    if not all(path.exists() for path in paths.values()):
+        log(f"[INFO] Generando dataset {scale}: {rows:,} filas x {cols} columnas...")
+        write_dataset(benchmark_schema(cols), rows, stem, formats=("csv", "parquet"), seed=seed)
+    return paths
+
+
+# --- LLM simulado ---
+class StubLlama:
+    """Sustituto de llama.cpp: responde LLM_TOKENS tokens sin costo de modelo (mide la cola y el overhead)."""
+
+    def __init__(self, *args):
+        self.answer = " ".join(["token"] * LLM_TOKENS)
+
+    def __call__(self, prompt, stream=False, **params):
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": LLM_TOKENS}
+        return {"choices": [{"text": self.answer}], "usage": usage}
+
+
+# --- Benchmarks ---
+@dataclass
+class Benchmark:
+    """`run(ctx, prepared)` retorna las unidades procesadas; `setup(ctx)` no se cronometra."""
+    name: str
+    run: Callable
+    setup: Optional[Callable] = None
+    unit: str = "rows"
+
+
+def _load_csv(ctx, _) -> int:
+    return len(ctx["dm"].load_data(str(ctx["paths"]["csv"])))
+
+
+def _load_parquet(ctx, _) -> int:
+    return len(ctx["dm"].load_data(str(ctx["paths"]["parquet"])))
+
+
+def _clean_data(ctx, df) -> int:
+    # setup ya entrega una copia: se mide la limpieza sin la copia defensiva
+    ctx["dm"].clean_data(df, inplace=True)
+    return len(df)
+
+
+def _summarize_dataset(ctx, _) -> int:
+    return ctx["dm"].summarize_dataset(ctx["clean"])["rows"]
+
+
+def _numeric_stats(ctx, _) -> int:
+    compute_numeric_stats(ctx["clean"])
+    return len(ctx["clean"])
+
+
+def _correlations(ctx, _) -> int:
+    compute_correlation_result(ctx["clean"])
+    return len(ctx["clean"])
+
+
+def _outliers_iqr(ctx, _) -> int:
+    detect_outliers(ctx["clean"], method="iqr")
+    return len(ctx["clean"])
+
+
+def _chart_columns(ctx) -> pd.DataFrame:
+    numeric = ctx["clean"].select_dtypes(include="number").columns[:MAX_CHART_COLUMNS]
+    return ctx["clean"][numeric]
+
+
+def _histograms(ctx, df) -> int:
+    generate_histograms(df, output_dir=str(Path(ctx["workdir"]) / "charts"), workers=1, force=True)
+    return len(df)
+
+
+def _build_prompt_chain(ctx, _) -> int:
+    BuilderPrompt.build_prompt_chain(df=ctx["clean"])
+    return len(ctx["clean"])
+
+
+def _report_builder(ctx) -> ReportBuilder:
+    builder = ReportBuilder()
+    builder.build_structure()
+    builder.add_text_sections({"Resumen": ctx["prompt"][:2000]})
+    builder.embed_charts(ctx["charts"])
+    return builder
+
+
+def _finalize_report(ctx, builder) -> int:
+    builder.finalize_report(["pdf", "excel"], filename=str(Path(ctx["workdir"]) / "reporte_bench"))
+    return len(ctx["clean"])
+
+
+def _stub_scheduler(ctx) -> InferenceScheduler:
+    scheduler = InferenceScheduler("benchmark-stub.gguf", n_parallel=2, n_threads=1,
+                                   pool=ModelPool(loader=StubLlama))
+    ctx["cleanup"].append(scheduler.shutdown)
+    return scheduler
+
+
+def _llm_stub(ctx, scheduler) -> int:
+    scheduler.generate_batch([ctx["prompt"]] * LLM_PROMPTS, max_tokens=LLM_TOKENS)
+    return LLM_PROMPTS
+
+
+BENCHMARKS: List[Benchmark] = [
+    Benchmark("load_csv", _load_csv),
+    Benchmark("load_parquet", _load_parquet),
+    Benchmark("clean_data", _clean_data, setup=lambda ctx: ctx["raw"].copy()),
+    Benchmark("summarize_dataset", _summarize_dataset),
+    Benchmark("numeric_stats", _numeric_stats),
+    Benchmark("correlations", _correlations),
+    Benchmark("outliers_iqr", _outliers_iqr),
+    Benchmark("histograms", _histograms, setup=_chart_columns),
+    Benchmark("build_prompt_chain", _build_prompt_chain),
+    Benchmark("finalize_report", _finalize_report, setup=_report_builder),
+    Benchmark("llm_stub", _llm_stub, setup=_stub_scheduler, unit="prompts"),
+]
+
+
+def _measure(bench: Benchmark, ctx: dict, repeat: int, track_memory: bool) -> dict:
+    times, units = [], 0
+    for _ in range(repeat):
+        prepared = bench.setup(ctx) if bench.setup else None
+        gc.collect()
+        start = time.perf_counter()
+        units = bench.run(ctx, prepared)
+        times.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if track_memory:
+        prepared = bench.setup(ctx) if bench.setup else None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            bench.run(ctx, prepared)
+            peak_mb = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 2)
+        finally:
+            tracemalloc.stop()
+
+    median = statistics.median(times)
+    return {
+        "benchmark": bench.name,
+        "unit": bench.unit,
+        "units": int(units),
+        "repeat": repeat,
+        "seconds": {"min": round(min(times), 6), "median": round(median, 6), "runs": [round(t, 6) for t in times]},
+        "throughput_per_s": round(units / median, 2) if median > 0 else None,
+        "peak_alloc_mb": peak_mb,
+    }
+
+
+def run_scale(scale: str, rows: int, cols: int, repeat: int = 3, only: Optional[Sequence[str]] = None,
+              track_memory: bool = True, seed: int = SEED, datasets_dir: Path = DATASETS_DIR) -> List[dict]:
+    """Ejecuta los benchmarks seleccionados sobre una escala."""
+    paths = prepare_dataset(scale, rows, cols, seed, datasets_dir)
+    dm = DataManager()
+    raw = dm.load_data(str(paths["parquet"]))
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench_") as workdir:
+        ctx = {"dm": dm, "paths": paths, "raw": raw, "workdir": workdir, "cleanup": []}
+        ctx["clean"] = dm.clean_data(raw)
+        ctx["prompt"] = BuilderPrompt.build_prompt_chain(df=ctx["clean"])
+        ctx["charts"] = generate_histograms(_chart_columns(ctx).iloc[:, :3], output_dir=str(Path(workdir) / "seed"))
+        try:
+            for bench in BENCHMARKS:
+                if only and bench.name not in only:
+                    continue
+                result = _measure(bench, ctx, repeat, track_memory)
+                result.update({"scale": scale, "rows": rows, "cols": cols})
+                results.append(result)
+                log(
+                    f"[BENCH] {scale:>5} {bench.name:<20} mediana {result['seconds']['median']:.4f}s  "
+                    f"{result['throughput_per_s']:,.0f} {bench.unit}/s  pico {result['peak_alloc_mb']} MB"
+                )
+        finally:
+            for cleanup in ctx["cleanup"]:
+                cleanup()
+    return results
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(scales: Dict[str, tuple], repeat: int = 3, only: Optional[Sequence[str]] = None,
+              track_memory: bool = True, seed: int = SEED, datasets_dir: Path = DATASETS_DIR) -> dict:
+    results = []
+    for scale, (rows, cols) in scales.items():
+        results.extend(run_scale(scale, rows, cols, repeat=repeat, only=only, track_memory=track_memory,
+                                 seed=seed, datasets_dir=datasets_dir))
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "seed": seed,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def save_results(report: dict, output_dir: Path = RESULTS_DIR) -> Path:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    path = output_dir / f"bench_{stamp}_{report['meta']['commit']}.json"
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    log(f"[INFO] Resultados guardados en {path}")
+    return path
+
+
+def compare_results(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> List[dict]:
+    """Compara medianas por (escala, benchmark). Retorna una fila por par común, marcando regresiones."""
+    base = {(r["scale"], r["benchmark"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        previous = base.get((result["scale"], result["benchmark"]))
+        if previous is None or not previous["seconds"]["median"]:
+            continue
+        ratio = result["seconds"]["median"] / previous["seconds"]["median"]
+        rows.append({
+            "scale": result["scale"],
+            "benchmark": result["benchmark"],
+            "baseline_s": previous["seconds"]["median"],
+            "current_s": result["seconds"]["median"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks de los caminos críticos del sistema.")
+    parser.add_argument("--scales", nargs="+", default=list(DEFAULT_SCALES), choices=list(SCALES),
+                        help="Escalas a ejecutar (por defecto: %(default)s)")
+    parser.add_argument("--only", nargs="+", choices=[b.name for b in BENCHMARKS],
+                        help="Ejecutar solo estos benchmarks")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones cronometradas por benchmark")
+    parser.add_argument("--no-memory", action="store_true", help="Omitir la pasada de memoria (tracemalloc)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--compare", type=Path, help="JSON de una ejecución anterior para detectar regresiones")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="Tolerancia relativa antes de marcar una regresión (0.15 = 15%%)")
+    args = parser.parse_args(argv)
+
+    report = run_suite({name: SCALES[name] for name in args.scales}, repeat=args.repeat, only=args.only,
+                       track_memory=not args.no_memory, seed=args.seed)
+    save_results(report)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare_results(report, baseline, args.threshold)
+        for row in rows:
+            flag = "REGRESIÓN" if row["regression"] else "ok"
+            log(f"[COMPARE] {row['scale']:>5} {row['benchmark']:<20} {row['baseline_s']:.4f}s -> "
+                f"{row['current_s']:.4f}s (x{row['ratio']}) {flag}")
+        if any(row["regression"] for row in rows):
+            log("[WARNING] Se detectaron regresiones de rendimiento.", level="warning")
+            return 1
+    return 0
+
+
+# --- Ejecución directa ---
+if __name__ == "__main__":
+    raise SystemExit(main())
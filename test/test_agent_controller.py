@@ -0,0 +1,81 @@
+# test/test_agent_controller.py
+# pytest -v test/test_agent_controller.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import core.controller.agent_controller as agent_controller
+from core.controller.agent_controller import AgentController
+from core.controller.data_manager import DataManager
+from core.controller.job_scheduler import JobScheduler
+from core.controller.pipeline_dag import ArtifactStore
+from core.controller.report_manager import ReportManager
+
+
+class FakeAgent:
+    def analyze_data(self, df):
+        return {"Hallazgos del análisis": f"{len(df.columns)} columnas"}
+
+
+class FakeModelManager:
+    current_version = "v-test"
+
+    def fine_tune(self, df, epochs=3):
+        return None
+
+
+@pytest.fixture
+def controller(tmp_path):
+    c = AgentController.__new__(AgentController)
+    c.state = agent_controller.AgentState.IDLE
+    c.agent = FakeAgent()
+    c.data_manager = DataManager()
+    c.model_manager = FakeModelManager()
+    c.report_manager = ReportManager.__new__(ReportManager)
+    c.report_manager.visualizations = []
+    c.scheduler = JobScheduler(max_workers=2, max_queue=10)
+    c.pipeline = c._build_pipeline()
+    c.pipeline.store = ArtifactStore(tmp_path / "artifacts")
+    yield c
+    c.shutdown()
+
+
+def _dataset(tmp_path, name, columns):
+    rng = np.random.default_rng(len(name))
+    path = tmp_path / f"{name}.csv"
+    pd.DataFrame({col: rng.normal(size=50) for col in columns}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_each_run_builds_its_own_report(controller, tmp_path):
+    first = controller.get_job_result(
+        controller.run_pipeline(_dataset(tmp_path, "ventas", ["alfa", "beta"])), timeout=60)
+    second = controller.get_job_result(
+        controller.run_pipeline(_dataset(tmp_path, "stock", ["gamma"])), timeout=60)
+
+    first_charts, second_charts = first["report_path"]["charts"], second["report_path"]["charts"]
+    assert len(first_charts) == 2 and len(second_charts) == 1
+    assert "gamma" in second_charts[0] and not set(first_charts) & set(second_charts)
+    assert second["report_path"]["sections"] == {"Hallazgos del análisis": "1 columnas"}
+
+
+def test_datasets_sharing_a_column_keep_their_own_charts(controller, tmp_path):
+    first = controller.get_job_result(
+        controller.run_pipeline(_dataset(tmp_path, "ventas", ["monto"])), timeout=60)
+    second = controller.get_job_result(
+        controller.run_pipeline(_dataset(tmp_path, "compras", ["monto"])), timeout=60)
+
+    (first_chart,), (second_chart,) = first["report_path"]["charts"], second["report_path"]["charts"]
+    assert first_chart != second_chart
+    assert str(tmp_path / "artifacts" / "charts") in first_chart
+
+
+def test_model_change_reruns_only_the_analysis(controller, tmp_path):
+    path = _dataset(tmp_path, "ventas", ["monto"])
+    controller.get_job_result(controller.run_pipeline(path), timeout=60)
+    assert controller.get_job_result(controller.run_pipeline(path), timeout=60)["executed"] == []
+
+    controller.agent.chain_manager = type("Chain", (), {"model_digest": "otro-checkpoint"})()
+    rerun = controller.get_job_result(controller.run_pipeline(path), timeout=60)
+    assert sorted(rerun["executed"]) == ["analysis", "report"]
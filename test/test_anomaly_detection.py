@@ -0,0 +1,96 @@
+# test/test_anomaly_detection.py
+# pytest -v test/test_anomaly_detection.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import zscore
+
+from core.heavy_modules.analytics.anomaly_detection import OutlierDetector, detect_outliers
+from core.heavy_modules.analytics.quantile_sketch import QuantileSketch
+from core.heavy_modules.analytics.stats_engine import StatsAccumulator
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(3)
+    n = 20_000
+    data = pd.DataFrame({
+        "normal": rng.normal(50, 5, n),
+        "sesgada": rng.lognormal(0, 0.6, n),
+        "texto": ["x"] * n,
+    })
+    data.loc[[10, 500, 7000], "normal"] = [200.0, -90.0, 130.0]
+    return data
+
+
+def _chunks(df, size=3000):
+    return [df.iloc[i:i + size] for i in range(0, len(df), size)]
+
+
+def test_sketch_quantiles_close_to_exact():
+    values = np.random.default_rng(0).exponential(size=200_000)
+    sketches = [QuantileSketch(k=1024, seed=i).update(part) for i, part in enumerate(np.array_split(values, 7))]
+    merged = sketches[0]
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+
+    qs = [0.01, 0.25, 0.5, 0.75, 0.99]
+    estimated = merged.quantiles(qs)
+    # Error de rango: el valor estimado cae cerca del cuantil pedido
+    ranks = np.searchsorted(np.sort(values), estimated) / values.size
+    assert np.abs(ranks - qs).max() < 0.01
+    assert merged.count == values.size
+    assert merged.nbytes() < values.nbytes / 10
+
+
+def test_sketch_is_exact_for_small_inputs():
+    values = np.arange(100, dtype=float)
+    sketch = QuantileSketch().update(values)
+    assert sketch.is_exact
+    assert sketch.quantiles([0.25, 0.5]).tolist() == np.quantile(values, [0.25, 0.5]).tolist()
+
+
+def test_zscore_matches_scipy(df):
+    mask = detect_outliers(df, method="zscore", return_mask=True)
+    numeric = df[["normal", "sesgada"]]
+    expected = (np.abs(numeric.apply(zscore)) > 3).any(axis=1).to_numpy()
+    np.testing.assert_array_equal(mask, expected)
+
+    flagged = detect_outliers(df, method="zscore")
+    assert flagged["is_outlier"].tolist() == expected.tolist()
+
+
+def test_iqr_matches_pandas_quantiles(df):
+    mask = detect_outliers(df, method="iqr", return_mask=True)
+    expected = np.zeros(len(df), dtype=bool)
+    for col in ["normal", "sesgada"]:
+        q1, q3 = df[col].quantile(0.25), df[col].quantile(0.75)
+        expected |= ((df[col] < q1 - 1.5 * (q3 - q1)) | (df[col] > q3 + 1.5 * (q3 - q1))).to_numpy()
+    np.testing.assert_array_equal(mask, expected)
+
+
+@pytest.mark.parametrize("method", ["zscore", "iqr", "mad"])
+def test_streaming_detector_agrees_with_in_memory(df, method):
+    exact = detect_outliers(df, method=method, return_mask=True)
+
+    # Dos particiones entrenadas por separado y combinadas
+    chunks = _chunks(df)
+    detector = OutlierDetector(method=method).fit(chunks[:3]).merge(OutlierDetector(method=method).fit(chunks[3:]))
+    indices = detector.outlier_indices(chunks)
+
+    expected = np.flatnonzero(exact)
+    assert {10, 500, 7000} <= set(indices)
+    if method == "zscore":
+        np.testing.assert_array_equal(indices, expected)
+    else:
+        # Límites aproximados: solo difieren filas pegadas al umbral
+        assert len(set(indices) ^ set(expected)) <= 0.001 * len(df)
+
+
+def test_accumulator_median_uses_sketch(df):
+    accumulator = StatsAccumulator()
+    for chunk in _chunks(df):
+        accumulator.update(chunk)
+    stats = accumulator.result()
+    assert stats.row("sesgada")["median"] == pytest.approx(df["sesgada"].median(), rel=0.01)
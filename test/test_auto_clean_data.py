@@ -0,0 +1,126 @@
+# test/test_auto_clean_data.py
+# pytest -v test/test_auto_clean_data.py
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import auto_clean_data
+
+
+@pytest.fixture
+def raw_dirs(tmp_path, monkeypatch):
+    raw_dir = tmp_path / "raw"
+    processed_dir = tmp_path / "processed"
+    raw_dir.mkdir()
+    monkeypatch.setattr(auto_clean_data, "RAW_DATA_DIR", raw_dir)
+    monkeypatch.setattr(auto_clean_data, "PROCESSED_DATA_DIR", processed_dir)
+    monkeypatch.setattr(auto_clean_data, "MANIFEST_FILE", tmp_path / "manifest.json")
+
+    rng = np.random.default_rng(1)
+    for i, n in enumerate([50, 400, 120]):
+        df = pd.DataFrame({"Valor": rng.normal(size=n), "Grupo": rng.choice(["a", "b"], n)})
+        df = pd.concat([df, df.iloc[:5]], ignore_index=True)
+        df.to_csv(raw_dir / f"datos_{i}.csv", index=False)
+    # Archivo corrupto: no debe afectar a los demás
+    (raw_dir / "roto.xlsx").write_bytes(b"no es un excel")
+    return raw_dir, processed_dir
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_clean_all_files_isolates_errors(raw_dirs, workers):
+    _, processed_dir = raw_dirs
+    summary = auto_clean_data.clean_all_files(workers=workers)
+
+    assert summary["files"] == 4
+    assert summary["succeeded"] == 3
+    assert list(summary["failures"]) == ["roto.xlsx"]
+    assert summary["rows_in"] == 50 + 400 + 120 + 15
+    assert summary["rows_out"] <= 50 + 400 + 120
+    assert sorted(p.name for p in processed_dir.glob("*.parquet")) == [
+        "datos_0.csv.parquet", "datos_1.csv.parquet", "datos_2.csv.parquet"
+    ]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_raw_files_sharing_a_stem_keep_separate_outputs(raw_dirs, workers):
+    raw_dir, processed_dir = raw_dirs
+    (raw_dir / "roto.xlsx").unlink()
+    pd.DataFrame({"Monto": [1.0, 2.0, 3.0]}).to_csv(raw_dir / "ventas.csv", index=False)
+    pd.DataFrame({"Cliente": ["a", "b"], "Total": [5.0, 6.0]}).to_excel(raw_dir / "ventas.xlsx", index=False)
+
+    assert auto_clean_data.clean_all_files(workers=workers)["failed"] == 0
+    manifest = auto_clean_data.load_manifest()
+    assert manifest["ventas.csv"]["output"] != manifest["ventas.xlsx"]["output"]
+    assert list(pd.read_parquet(processed_dir / "ventas.csv.parquet").columns) == ["monto"]
+    assert list(pd.read_parquet(processed_dir / "ventas.xlsx.parquet").columns) == ["cliente", "total"]
+
+
+def test_outputs_with_the_old_name_are_recleaned_and_removed(raw_dirs):
+    raw_dir, processed_dir = raw_dirs
+    auto_clean_data.clean_all_files()
+    # Manifiesto de una versión anterior: la salida no llevaba la extensión original
+    manifest = auto_clean_data.load_manifest()
+    legacy = processed_dir / "datos_0.parquet"
+    (processed_dir / "datos_0.csv.parquet").rename(legacy)
+    manifest["datos_0.csv"]["output"] = str(legacy)
+    auto_clean_data.save_manifest(manifest)
+
+    summary = auto_clean_data.clean_all_files()
+    assert summary["skipped"] == 2 and summary["succeeded"] == 1
+    assert not legacy.exists() and (processed_dir / "datos_0.csv.parquet").exists()
+
+
+def test_largest_first(raw_dirs):
+    raw_dir, _ = raw_dirs
+    ordered = auto_clean_data._largest_first(sorted(raw_dir.glob("*.csv")))
+    assert [p.name for p in ordered] == ["datos_1.csv", "datos_2.csv", "datos_0.csv"]
+
+
+def test_manifest_skips_unchanged_files(raw_dirs):
+    raw_dir, _ = raw_dirs
+    first = auto_clean_data.clean_all_files()
+    assert first["succeeded"] == 3 and first["skipped"] == 0
+
+    # Sin cambios: solo se reintenta el archivo que falló
+    second = auto_clean_data.clean_all_files()
+    assert second["skipped"] == 3
+    assert second["files"] == 1
+
+    # touch sin cambiar contenido: el hash coincide y no se re-limpia
+    target = raw_dir / "datos_0.csv"
+    os.utime(target, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert auto_clean_data.clean_all_files()["skipped"] == 3
+
+    # Contenido modificado: se vuelve a limpiar solo ese archivo
+    target.write_text("Valor,Grupo\n1.0,a\n2.0,b\n")
+    third = auto_clean_data.clean_all_files()
+    assert third["skipped"] == 2
+    assert third["rows_in"] == 2
+
+    assert auto_clean_data.clean_all_files(force=True)["skipped"] == 0
+
+
+def test_watch_mode_cleans_new_files(raw_dirs):
+    raw_dir, processed_dir = raw_dirs
+    stop = threading.Event()
+    watcher = threading.Thread(
+        target=auto_clean_data.watch_raw_folder,
+        kwargs={"interval": 0.05, "settle_seconds": 0.05, "stop_event": stop},
+    )
+    watcher.start()
+    try:
+        deadline = time.time() + 10
+        while not (processed_dir / "datos_0.csv.parquet").exists() and time.time() < deadline:
+            time.sleep(0.05)
+        pd.DataFrame({"Valor": [1.0, 2.0, 3.0]}).to_csv(raw_dir / "nuevo.csv", index=False)
+        while not (processed_dir / "nuevo.csv.parquet").exists() and time.time() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        watcher.join(timeout=10)
+    assert (processed_dir / "nuevo.csv.parquet").exists()
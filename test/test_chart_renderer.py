@@ -0,0 +1,45 @@
+# test/test_chart_renderer.py
+# pytest -v test/test_chart_renderer.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.heavy_modules.analytics.chart_renderer import heatmap_spec
+from core.heavy_modules.analytics.correlation_analysis import compute_correlation_result, visualize_correlation_matrix
+from core.heavy_modules.analytics.statistical_summary import generate_histograms
+
+
+@pytest.fixture
+def df():
+    rng = np.random.default_rng(2)
+    return pd.DataFrame({f"c{i}": rng.normal(i, 1, 300) for i in range(6)} | {"texto": ["a"] * 300})
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_histograms_rendered_and_skipped_when_unchanged(df, tmp_path, workers):
+    paths = generate_histograms(df, output_dir=str(tmp_path), workers=workers)
+    assert sorted(p.split("/")[-1] for p in paths) == [f"c{i}_hist.png" for i in range(6)]
+    mtimes = {p: (tmp_path / p.split("/")[-1]).stat().st_mtime_ns for p in paths}
+
+    df.loc[0, "c3"] = 99.0
+    generate_histograms(df, output_dir=str(tmp_path), workers=workers)
+    changed = [p for p in paths if (tmp_path / p.split("/")[-1]).stat().st_mtime_ns != mtimes[p]]
+    assert [c.split("/")[-1] for c in changed] == ["c3_hist.png"]
+
+
+def test_heatmap_drops_annotations_and_downsamples():
+    rng = np.random.default_rng(0)
+    matrix = np.corrcoef(rng.normal(size=(120, 50)))
+    labels = [f"s{i}" for i in range(120)]
+
+    spec = heatmap_spec(matrix, labels, "h.png", max_columns=40)
+    assert len(spec.labels) == 40 and spec.matrix.shape == (40, 40)
+    assert spec.annotate is False
+    assert heatmap_spec(matrix[:10, :10], labels[:10], "h.png").annotate is True
+
+
+def test_visualize_correlation_matrix(df, tmp_path):
+    output = tmp_path / "sub" / "heatmap.png"
+    path = visualize_correlation_matrix(compute_correlation_result(df), output_file=str(output))
+    assert output.exists() and path == str(output)
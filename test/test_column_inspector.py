@@ -0,0 +1,153 @@
+# test/test_column_inspector.py
+# pytest -v test/test_column_inspector.py
+
+import json
+
+import pandas as pd
+import pytest
+
+import core.heavy_modules.inference.inference_scheduler as inference_scheduler
+import core.utils.prompt_builder as prompt_builder
+from core.controller.data_manager import DataManager
+from core.heavy_modules.inference.inference_scheduler import InferenceScheduler
+from core.heavy_modules.inference.model_pool import ModelPool
+from core.heavy_modules.inference.response_cache import ResponseCache
+from core.utils.column_inspector import (
+    ColumnProfile, ColumnRoleCache, apply_dtype_hints, infer_column_roles, profile_columns
+)
+from core.utils.prompt_builder import BuilderPrompt
+
+
+class FakeLlama:
+    """Responde un JSON que cumple el schema recibido; falla si el lote incluye 'roto'."""
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    def __call__(self, prompt, stream=False, grammar=None, **params):
+        assert grammar is not None and grammar[0] == "json_schema"
+        schema = grammar[1]
+        columns = list(schema["properties"])
+        self.calls.append(columns)
+        if "roto" in columns:
+            return {"choices": [{"text": '{"roto": "numé'}]}  # cortado por max_tokens
+        roles = {c: schema["properties"][c]["enum"][-1] if c.startswith("id") else "numérico, cantidad"
+                 for c in columns}
+        return {"choices": [{"text": json.dumps(roles, ensure_ascii=False)}]}
+
+
+@pytest.fixture
+def builder(tmp_path, monkeypatch):
+    monkeypatch.setattr(inference_scheduler, "compile_grammar", lambda kind, text: (kind, json.loads(text)))
+    cache = ResponseCache(db_path=tmp_path / "cache.sqlite")
+    monkeypatch.setattr(prompt_builder, "get_response_cache", lambda: cache)
+
+    model_file = tmp_path / "modelo.gguf"
+    model_file.write_bytes(b"gguf" * 100)
+    calls = []
+    builder = BuilderPrompt(model_path=str(model_file))
+    builder._scheduler = InferenceScheduler(str(model_file), n_parallel=1, n_threads=1,
+                                            pool=ModelPool(loader=lambda *args: FakeLlama(calls)))
+    builder.calls = calls
+    yield builder
+    builder._scheduler.shutdown()
+
+
+def _df(n=25):
+    data = {f"col{i}": range(3) for i in range(n)}
+    data["id_pedido"] = [10, 11, 12]
+    return pd.DataFrame(data)
+
+
+def test_roles_are_batched_schema_constrained_and_cached(builder, tmp_path):
+    cache = ColumnRoleCache(path=tmp_path / "roles.json")
+    df = _df()
+    roles = infer_column_roles(df, use_model=True, prompt_builder=builder, cache=cache, batch_size=10)
+
+    assert list(roles) == list(df.columns)
+    assert roles["id_pedido"] == "texto, texto libre" and roles["col0"] == "numérico, cantidad"
+    assert [len(c) for c in builder.calls] == [10, 10, 6]
+
+    # Otra ejecución (caché recargada de disco): solo se consultan las columnas nuevas
+    df["extra"] = ["a", "b", "c"]
+    again = infer_column_roles(df, use_model=True, prompt_builder=builder,
+                               cache=ColumnRoleCache(path=tmp_path / "roles.json"), batch_size=10)
+    assert builder.calls[-1] == ["extra"] and len(builder.calls) == 4
+    assert again["col3"] == roles["col3"]
+
+
+def test_failed_batch_falls_back_to_heuristics_only_for_its_columns(builder, tmp_path):
+    df = pd.DataFrame({"roto": [1.5, 2.0], "monto_total": [1, 2], "region": ["n", "s"], "stock": [3, 4]})
+    cache = ColumnRoleCache(path=tmp_path / "roles.json")
+    roles = infer_column_roles(df, use_model=True, prompt_builder=builder, cache=cache, batch_size=2)
+
+    assert roles["roto"] == "numérico, no clasificado"
+    assert roles["monto_total"] == "numérico, monto/valor monetario"
+    assert roles["region"] == roles["stock"] == "numérico, cantidad"
+    assert len(cache.get_many(list(cache._load()))) == 2
+
+
+def test_keyword_matcher_keeps_rule_priority():
+    df = pd.DataFrame({"cantidad_total": [1], "regionombre": ["a"], "stock_item": [2], "otro": [3.0]})
+    roles = infer_column_roles(df)
+    assert roles == {
+        "cantidad_total": "numérico, monto/valor monetario",
+        "regionombre": "categórico, nombre de cliente/usuario",
+        "stock_item": "numérico, cantidad",
+        "otro": "numérico, no clasificado",
+    }
+
+
+def test_profile_sniffs_text_columns_on_a_sample_and_is_cached():
+    n = 5000
+    df = pd.DataFrame({
+        "alta": pd.date_range("2024-01-01", periods=n, freq="h").strftime("%Y-%m-%d %H:%M"),
+        "importe_txt": [f" {i}.5" for i in range(n)],
+        "ref": [f"A{i:06d}" for i in range(n)],
+        "codigo": range(n),
+        "zona": ["norte", "sur"] * (n // 2),
+        "nota": ["comentario libre del cliente sobre la entrega del pedido"] * n,
+    })
+    profile = profile_columns(df, sample_rows=200)
+
+    assert profile.sample_rows == 200
+    assert profile.kinds == {"alta": "datetime_text", "importe_txt": "numeric_text", "ref": "id",
+                             "codigo": "id", "zona": "category", "nota": "text"}
+    assert profile.roles["alta"] == "fecha, no clasificada"
+    assert profile.roles["importe_txt"] == "numérico, monto/valor monetario"
+    assert profile.roles["ref"] == "identificador, clave única"
+    assert profile.dtype_hints == {"alta": "datetime64[ns]", "importe_txt": "float64", "zona": "category"}
+    # Mismo frame: se reutiliza el perfil sin volver a detectar tipos
+    assert profile_columns(df, sample_rows=200) is profile
+
+
+def test_same_schema_with_other_values_gets_its_own_profile():
+    numbers = profile_columns(pd.DataFrame({"x": ["1.5", "2", "3"] * 10}))
+    colors = profile_columns(pd.DataFrame({"x": ["rojo", "verde", "azul"] * 10}))
+
+    assert numbers.kinds == {"x": "numeric_text"} and numbers.dtype_hints == {"x": "float64"}
+    assert colors.kinds == {"x": "category"} and colors.dtype_hints == {"x": "category"}
+
+    # Una pista que no corresponde a los datos recibidos no vacía la columna
+    df = pd.DataFrame({"x": ["rojo", "verde", "azul"] * 10})
+    assert apply_dtype_hints(df, numbers.dtype_hints)["x"].tolist() == df["x"].tolist()
+
+
+def test_load_data_applies_profile_dtype_hints(tmp_path):
+    df = pd.DataFrame({"fecha_txt": ["2024-01-01", "2024-02-01", "2024-03-01"] * 10,
+                       "valor": ["1.5", "2", "3"] * 10,
+                       "zona": ["norte", "sur", "norte"] * 10})
+    df.loc[0, ["fecha_txt", "valor"]] = ["x", "s/d"]
+    path = tmp_path / "datos.csv"
+    df.to_csv(path, index=False)
+
+    dm = DataManager()
+    raw = dm.load_data(str(path))
+    profile = ColumnProfile(fingerprint="", dtype_hints={"fecha_txt": "datetime64[ns]", "valor": "float64",
+                                                         "zona": "category", "ausente": "category"})
+    typed = dm.load_data(str(path), dtype={"zona": str}, profile=profile)
+
+    assert raw["valor"].dtype == object
+    assert typed["valor"].dtype == "float64" and typed["valor"].isna().sum() == 1
+    assert str(typed["fecha_txt"].dtype) == "datetime64[ns]"
+    assert typed["zona"].dtype == object  # dtype explícito gana
@@ -0,0 +1,60 @@
+# test/test_correlation_analysis.py
+# pytest -v test/test_correlation_analysis.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.heavy_modules.analytics.correlation_analysis import (
+    compute_correlation_result,
+    compute_correlations,
+    detect_multicollinearity
+)
+
+
+@pytest.fixture
+def sensors():
+    rng = np.random.default_rng(5)
+    base = rng.normal(size=(800, 1))
+    X = rng.normal(size=(800, 40)) + base * np.linspace(0, 3, 40)
+    df = pd.DataFrame(X, columns=[f"s{i}" for i in range(40)])
+    df["copia"] = df["s39"] * 2 + 1
+    df["constante"] = 7.0
+    df["texto"] = "x"
+    return df
+
+
+@pytest.mark.parametrize("method", ["pearson", "spearman"])
+def test_matches_pandas(sensors, method):
+    expected = sensors.corr(method=method, numeric_only=True)
+    result = compute_correlation_result(sensors, method=method, block_size=16)
+    assert result.matrix.dtype == np.float32
+    pd.testing.assert_frame_equal(result.to_frame(), expected, atol=1e-5)
+
+
+def test_pairwise_nulls_match_pandas(sensors):
+    df = sensors.copy()
+    df.loc[::7, "s3"] = np.nan
+    df.loc[::11, "s20"] = np.nan
+    pd.testing.assert_frame_equal(compute_correlations(df), df.corr(numeric_only=True), atol=1e-5)
+
+
+def test_pairs_threshold_and_top_k(sensors):
+    result = compute_correlation_result(sensors)
+    pairs = result.pairs(threshold=0.8)
+    expected = sensors.corr(numeric_only=True).abs()
+    n_expected = int((np.triu(expected.to_numpy(), k=1) > 0.8).sum())
+
+    assert len(pairs) == n_expected
+    assert pairs[0][:2] == ("s39", "copia") and pairs[0][2] == pytest.approx(1.0)
+    strengths = [abs(r) for _, _, r in pairs]
+    assert strengths == sorted(strengths, reverse=True)
+    top = result.pairs(threshold=0.8, top_k=3)
+    assert [abs(r) for _, _, r in top] == strengths[:3]
+
+
+def test_multicollinearity_reuses_result(sensors):
+    result = compute_correlation_result(sensors)
+    high = detect_multicollinearity(sensors, threshold=0.9, corr=result)
+    assert high == result.pairs(threshold=0.9, absolute=True)
+    assert all(col != "constante" and other != "constante" for col, other, _ in high)
@@ -145,3 +145,229 @@ def test_summarize_dataset(data_manager, sample_df):
     assert "summary_stats" in summary
     assert summary["rows"] == len(sample_df)
     assert set(summary["columns"]) == set(sample_df.columns)
+
+
+# ---------------------------------------------------------------
+# Modo por bloques (streaming)
+# ---------------------------------------------------------------
+@pytest.fixture
+def large_csv(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "A": rng.normal(10, 2, 1000),
+        "B": rng.integers(0, 50, 1000).astype(float),
+        "Ciudad": rng.choice(["Bogotá", "Medellín", "Cali"], 1000),
+    })
+    df.loc[::17, "A"] = np.nan
+    df.loc[5, "B"] = 5000.0
+    df = pd.concat([df, df.iloc[:20]], ignore_index=True)
+    path = tmp_path / "grande.csv"
+    df.to_csv(path, index=False)
+    return path, df
+
+
+def test_detect_encoding_latin1(data_manager, tmp_path):
+    path = tmp_path / "latin.csv"
+    path.write_bytes("ciudad,valor\nBogotá,1\nMedellín,2\n".encode("latin-1"))
+    assert data_manager.detect_encoding(str(path)) == "latin-1"
+    df = data_manager.load_data(str(path))
+    assert df["ciudad"].tolist() == ["Bogotá", "Medellín"]
+
+
+def test_load_data_chunks_recovers_from_invalid_bytes_after_prefix(data_manager, tmp_path):
+    # El prefijo (1 MB) es ASCII válido; el byte latin-1 aparece recién al iterar
+    path = tmp_path / "mixto.csv"
+    lines = [f"Bogota,{i}" for i in range(150_000)] + ["Bogotá,-1"]
+    path.write_bytes(("ciudad,valor\n" + "\n".join(lines) + "\n").encode("latin-1"))
+
+    full = data_manager.load_data(str(path))
+    chunked = pd.concat(data_manager.load_data_chunks(str(path), chunksize=40_000))
+    assert len(full) == 150_001
+    pd.testing.assert_frame_equal(chunked, full)
+    assert chunked["ciudad"].iloc[-1] == "Bogotá"
+
+
+def test_load_data_chunks_matches_full_load(data_manager, large_csv):
+    path, _ = large_csv
+    chunks = list(data_manager.load_data_chunks(str(path), chunksize=300, usecols=["A", "B"]))
+    assert len(chunks) == 4
+    pd.testing.assert_frame_equal(
+        pd.concat(chunks, ignore_index=True),
+        data_manager.load_data(str(path), usecols=["A", "B"])
+    )
+
+
+def test_summarize_dataset_chunked_matches_full(data_manager, large_csv):
+    path, _ = large_csv
+    full = data_manager.summarize_dataset(data_manager.load_data(str(path)))
+    chunked = data_manager.summarize_dataset_chunked(data_manager.load_data_chunks(str(path), chunksize=250))
+
+    assert chunked["rows"] == full["rows"]
+    assert chunked["missing_values"] == full["missing_values"]
+    for key in ("count", "mean", "std", "min", "max"):
+        for col in ("A", "B"):
+            assert chunked["summary_stats"][col][key] == pytest.approx(full["summary_stats"][col][key])
+
+
+def test_clean_data_chunked_matches_full(data_manager, large_csv):
+    path, _ = large_csv
+    full = data_manager.clean_data(data_manager.load_data(str(path)))
+    chunked = pd.concat(data_manager.clean_data_chunked(str(path), chunksize=250))
+
+    assert not chunked.duplicated().any()
+    assert chunked["b"].max() < 5000
+    assert abs(len(chunked) - len(full)) <= 2
+
+
+def test_clean_data_chunked_median_fill_matches_full(data_manager, tmp_path):
+    # Columna sesgada con muchos nulos: la mediana de relleno desplaza media y desviación
+    rng = np.random.default_rng(3)
+    df = pd.DataFrame({"A": rng.exponential(10, size=3000), "B": rng.normal(size=3000)})
+    df.loc[rng.random(3000) < 0.4, "A"] = np.nan
+    path = tmp_path / "sesgado.csv"
+    df.to_csv(path, index=False)
+
+    full = data_manager.clean_data(data_manager.load_data(str(path)), fill_strategy="median")
+    chunked = pd.concat(data_manager.clean_data_chunked(str(path), chunksize=700, fill_strategy="median"))
+    assert chunked.index.equals(full.index)
+
+
+def test_correlations_chunked_exact(large_csv):
+    from core.heavy_modules.analytics.correlation_analysis import (
+        compute_correlations,
+        compute_correlations_chunked
+    )
+    _, df = large_csv
+    chunks = [df.iloc[i:i + 300] for i in range(0, len(df), 300)]
+    pd.testing.assert_frame_equal(compute_correlations_chunked(chunks), compute_correlations(df))
+
+
+def test_correlations_chunked_with_large_mean_offset():
+    from core.heavy_modules.analytics.correlation_analysis import compute_correlations_chunked
+    rng = np.random.default_rng(3)
+    n = 3000
+    base = rng.normal(size=n)
+    df = pd.DataFrame({
+        "a": 1e8 + base,
+        "b": 1e8 + base + rng.normal(size=n),
+        "c": -5e7 + np.linspace(0, 1e4, n) + rng.normal(size=n),  # la media cambia entre bloques
+        "d": rng.normal(size=n),
+    })
+    df.loc[::9, "b"] = np.nan
+    chunks = [df.iloc[i:i + 700] for i in range(0, n, 700)]
+    pd.testing.assert_frame_equal(compute_correlations_chunked(chunks), df.corr(), atol=1e-6)
+
+
+# ---------------------------------------------------------------
+# Formatos columnares (Parquet / Feather)
+# ---------------------------------------------------------------
+@pytest.fixture
+def typed_df():
+    return pd.DataFrame({
+        "id": np.arange(10, dtype="int32"),
+        "precio": np.linspace(0, 9, 10),
+        "categoria": pd.Categorical(list("abababcbca")),
+        "fecha": pd.date_range("2024-01-01", periods=10),
+    })
+
+
+@pytest.mark.parametrize("ext", ["parquet", "feather"])
+def test_columnar_roundtrip_preserves_dtypes(data_manager, typed_df, ext):
+    path = data_manager.save_processed(typed_df, filename=f"tipado.{ext}")
+    assert data_manager.detect_file_type(path) == ext
+
+    loaded = data_manager.load_data(path)
+    pd.testing.assert_frame_equal(loaded, typed_df)
+
+
+@pytest.mark.parametrize("ext", ["parquet", "feather"])
+def test_columnar_projection_and_filters(data_manager, typed_df, ext):
+    path = data_manager.save_processed(typed_df, filename=f"tipado.{ext}")
+
+    df = data_manager.load_data(path, usecols=["id", "precio"], filters=[("precio", ">=", 7)])
+    assert list(df.columns) == ["id", "precio"]
+    assert df["id"].tolist() == [7, 8, 9]
+
+    chunks = list(data_manager.load_data_chunks(path, chunksize=4, filters=[("categoria", "==", "a")]))
+    assert sum(len(c) for c in chunks) == 4
+
+
+def test_filters_rejected_for_csv(data_manager, tmp_path):
+    path = tmp_path / "datos.csv"
+    pd.DataFrame({"a": [1, 2]}).to_csv(path, index=False)
+    with pytest.raises(ValueError):
+        data_manager.load_data(str(path), filters=[("a", ">", 1)])
+
+
+def test_list_processed_files_prefers_columnar(data_manager, typed_df):
+    data_manager.save_processed(typed_df, filename="ventas.csv")
+    data_manager.save_processed(typed_df, filename="ventas.parquet")
+    data_manager.save_processed(typed_df, filename="clientes.csv")
+    data_manager.save_processed(typed_df, filename="stock.csv")
+    data_manager.save_processed(typed_df, filename="stock.csv.parquet")
+    data_manager.save_processed(typed_df, filename="stock.xlsx.parquet")
+    (data_manager.processed_dir / "notas.txt").write_text("x")
+
+    names = [p.name for p in data_manager.list_processed_files()]
+    assert names == ["clientes.csv", "stock.csv.parquet", "stock.xlsx.parquet", "ventas.parquet"]
+
+
+# ---------------------------------------------------------------
+# Limpieza eficiente en memoria
+# ---------------------------------------------------------------
+@pytest.fixture
+def wide_df():
+    rng = np.random.default_rng(7)
+    n = 2000
+    df = pd.DataFrame({
+        "Edad": rng.integers(18, 90, n),
+        "Ingreso": rng.normal(3000, 500, n),
+        "Puntaje": rng.integers(0, 10, n).astype(float),
+        "Ciudad": rng.choice(["Bogotá", "Lima", "Quito"], n),
+        "Codigo": [f"id-{i}" for i in range(n)],
+    })
+    df.loc[::13, "Ingreso"] = np.nan
+    df.loc[[3, 9], "Ingreso"] = 90000.0
+    return pd.concat([df, df.iloc[:50]], ignore_index=True)
+
+
+def test_clean_data_matches_legacy_pipeline(data_manager, wide_df):
+    from core.utils.data_cleaner import remove_nulls, remove_duplicates, normalize_columns, detect_noise
+    legacy = detect_noise(remove_duplicates(remove_nulls(normalize_columns(wide_df.copy()))))
+
+    cleaned = data_manager.clean_data(wide_df.copy())
+    pd.testing.assert_frame_equal(cleaned, legacy, check_dtype=False, check_categorical=False)
+
+
+def test_clean_data_leaves_the_input_untouched_unless_inplace(data_manager, wide_df):
+    original = wide_df.copy()
+    cleaned = data_manager.clean_data(wide_df)
+    pd.testing.assert_frame_equal(wide_df, original)
+
+    in_place = data_manager.clean_data(wide_df, inplace=True)
+    pd.testing.assert_frame_equal(in_place, cleaned)
+    assert list(wide_df.columns) == list(cleaned.columns)  # la entrada sí se modificó
+
+
+def test_clean_data_optimizes_dtypes_and_reports(data_manager, wide_df):
+    cleaned = data_manager.clean_data(wide_df.copy(), track_memory=True, memory_budget_mb=0.001)
+    report = data_manager.last_cleaning_report
+
+    assert cleaned["edad"].dtype == np.int8
+    assert cleaned["puntaje"].dtype == np.float32
+    assert cleaned["ingreso"].dtype == np.float64
+    assert isinstance(cleaned["ciudad"].dtype, pd.CategoricalDtype)
+    assert cleaned["codigo"].dtype == object
+
+    assert report["frame_mb_out"] < report["frame_mb_in"]
+    assert report["over_budget"] is True
+    assert [s["step"] for s in report["steps"]] == [
+        "normalize_columns", "fill_nulls", "optimize_dtypes", "remove_duplicates", "detect_noise", "select_rows"
+    ]
+    assert all("peak_mb" in s for s in report["steps"])
+
+
+def test_clean_data_constant_column_keeps_rows(data_manager):
+    df = pd.DataFrame({"a": [1.0] * 20, "b": list(range(19)) + [1000]})
+    cleaned = data_manager.clean_data(df)
+    assert len(cleaned) == 19
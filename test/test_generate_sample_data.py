@@ -0,0 +1,70 @@
+# test/test_generate_sample_data.py
+# pytest -v test/test_generate_sample_data.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from scripts import generate_sample_data as gen
+
+SCHEMA = {
+    "columns": [
+        {"name": "id", "type": "id"},
+        {"name": "monto", "type": "float", "distribution": "lognormal", "mean": 4, "sigma": 0.3, "decimals": 2},
+        {"name": "cantidad", "type": "int", "distribution": "poisson", "lam": 3},
+        {"name": "region", "type": "category", "categories": ["norte", "sur", "este"], "weights": [0.6, 0.3, 0.1]},
+        {"name": "activo", "type": "bool", "p": 0.8, "null_rate": 0.0},
+        {"name": "fecha", "type": "date", "start": "2023-01-01", "end": "2023-12-31"},
+    ],
+    "null_rate": 0.05,
+    "duplicate_rate": 0.02,
+    "outlier_rate": 0.01,
+}
+
+
+def test_same_seed_same_data_and_schema_rates():
+    df = gen.generate_frame(SCHEMA, 20_000, seed=3, chunk_size=7_000)
+    again = gen.generate_frame(SCHEMA, 20_000, seed=3, chunk_size=7_000)
+    pd.testing.assert_frame_equal(df, again)
+
+    assert len(df) == 20_000
+    assert df["monto"].isna().mean() == pytest.approx(0.05, abs=0.01)
+    assert df["activo"].isna().sum() == 0
+    assert df.duplicated().sum() >= 0.015 * len(df)
+    assert df["region"].value_counts(normalize=True)["norte"] == pytest.approx(0.6, abs=0.03)
+    assert df["fecha"].min() >= pd.Timestamp("2023-01-01") and df["fecha"].max() <= pd.Timestamp("2023-12-31")
+    assert str(df["cantidad"].dtype) == "Int64"
+
+    # Los outliers quedan lejos de la distribución principal
+    monto = df["monto"].dropna()
+    assert ((monto - monto.median()).abs() > 5 * monto.std()).sum() > 0
+
+
+def test_streaming_write_matches_in_memory(tmp_path):
+    paths = gen.write_dataset(SCHEMA, 5_000, tmp_path / "datos", formats=("csv", "parquet"), seed=1,
+                              chunk_size=1_500)
+    expected = gen.generate_frame(SCHEMA, 5_000, seed=1, chunk_size=1_500)
+
+    parquet = pd.read_parquet(paths["parquet"])
+    pd.testing.assert_frame_equal(parquet, expected)
+    csv = pd.read_csv(paths["csv"])
+    assert len(csv) == 5_000
+    assert list(csv.columns) == [c["name"] for c in SCHEMA["columns"]]
+    np.testing.assert_allclose(csv["monto"].to_numpy(), expected["monto"].to_numpy())
+
+
+def test_default_schema_and_noise_keep_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(gen, "SAMPLES_DIR", tmp_path)
+    paths = gen.generate_sample_data(num_rows=100, add_noise_flag=True)
+    df = pd.read_csv(paths["csv"])
+
+    assert list(df.columns) == ["id", "feature1", "feature2", "feature3", "label"]
+    assert df["id"].tolist() == list(range(1, 101))
+    assert set(df["label"]) <= {0, 1}
+
+
+def test_invalid_specs_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="Tipo de columna"):
+        gen.generate_frame({"columns": [{"name": "x", "type": "texto"}]}, 10)
+    with pytest.raises(ValueError, match="Formatos"):
+        gen.write_dataset(gen.DEFAULT_SCHEMA, 10, tmp_path / "x", formats=("json",))
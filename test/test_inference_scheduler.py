@@ -0,0 +1,133 @@
+# test/test_inference_scheduler.py
+# pytest -v test/test_inference_scheduler.py
+
+import asyncio
+import threading
+import time
+import pytest
+
+from core.heavy_modules.inference.model_pool import ModelPool
+from core.heavy_modules.inference.inference_scheduler import InferenceScheduler, get_inference_scheduler
+from core.utils.tracer import tracer
+
+
+class FakeLlama:
+    """Llama simulado que detecta llamadas concurrentes sobre la misma instancia."""
+
+    def __init__(self):
+        self.active = 0
+        self.overlap = False
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, stream=False, **params):
+        if stream:
+            return iter([{"choices": [{"text": tok}]} for tok in prompt.split()])
+        with self._lock:
+            self.active += 1
+            self.overlap = self.overlap or self.active > 1
+        self.calls.append(params)
+        time.sleep(0.05)
+        with self._lock:
+            self.active -= 1
+        return {"choices": [{"text": f" {prompt.upper()} "}]}
+
+
+@pytest.fixture
+def scheduler():
+    instances = []
+
+    def loader(*args):
+        instances.append(FakeLlama())
+        return instances[-1]
+
+    sched = InferenceScheduler("modelo.gguf", n_parallel=3, n_threads=1, pool=ModelPool(loader=loader))
+    sched.instances = instances
+    yield sched
+    sched.shutdown()
+
+
+def test_one_context_per_worker_and_no_overlap(scheduler):
+    results = scheduler.generate_batch([f"p{i}" for i in range(9)])
+
+    assert results == [f"P{i}" for i in range(9)]
+    assert len(scheduler.instances) == 3
+    assert not any(llm.overlap for llm in scheduler.instances)
+    # La carga se reparte entre los contextos
+    assert sum(len(llm.calls) for llm in scheduler.instances) == 9
+
+
+def test_requests_run_in_parallel(scheduler):
+    start = time.perf_counter()
+    scheduler.generate_batch(["a", "b", "c"])
+    # 3 peticiones de 50 ms en 3 contextos: bastante menos que 150 ms en serie
+    assert time.perf_counter() - start < 0.14
+
+
+def test_per_request_sampling_params(scheduler):
+    scheduler.generate("x", max_tokens=7, temperature=0.0)
+    params = [c for llm in scheduler.instances for c in llm.calls][0]
+    assert params["max_tokens"] == 7
+    assert params["temperature"] == 0.0
+
+
+def test_async_api(scheduler):
+    async def run():
+        return await scheduler.agenerate_batch(["uno", "dos"])
+
+    assert asyncio.run(run()) == ["UNO", "DOS"]
+
+
+def test_submit_after_shutdown_fails(scheduler):
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit("tarde")
+
+
+def test_streaming_yields_tokens_and_stats(scheduler):
+    stream = scheduler.submit_stream("hola mundo desde llama")
+    tokens = list(stream)
+
+    assert tokens == ["hola", "mundo", "desde", "llama"]
+    assert stream.stats.n_tokens == 4
+    assert stream.stats.time_to_first_token is not None
+
+
+def test_streaming_async_iteration(scheduler):
+    async def run():
+        return [tok async for tok in scheduler.submit_stream("a b c")]
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+
+
+def test_worker_spans_inherit_the_caller_trace(scheduler):
+    tracer.enable()
+    tracer.clear()
+    try:
+        with tracer.bind("job-7"):
+            scheduler.generate("hola")
+        scheduler.generate("sin trabajo")
+        spans = [s for s in tracer.spans() if s.name == "llm.generate"]
+    finally:
+        tracer.disable()
+        tracer.clear()
+    assert [s.trace_id for s in spans] == ["job-7", None]
+    assert spans[0].thread_name.startswith("llm-worker-")
+
+
+def test_shared_scheduler_is_keyed_by_threads_and_replaced_after_shutdown():
+    pool = ModelPool(loader=lambda *args: FakeLlama())
+    options = {"n_parallel": 1, "pool": pool, "prefix_cache": None}
+    created = [get_inference_scheduler("compartido.gguf", n_threads=n, **options) for n in (1, 2)]
+    one, two = created
+    try:
+        assert get_inference_scheduler("compartido.gguf", n_threads=1, **options) is one
+        assert two is not one and two.n_threads == 2
+
+        one.shutdown()
+        created.append(get_inference_scheduler("compartido.gguf", n_threads=1, **options))
+        assert created[-1] is not one
+        assert created[-1].generate("hola")
+    finally:
+        for sched in created:
+            sched.shutdown()
@@ -0,0 +1,112 @@
+# test/test_job_scheduler.py
+# pytest -v test/test_job_scheduler.py
+
+import threading
+import time
+
+import pytest
+
+from core.controller.job_scheduler import JobScheduler, JobState
+
+
+@pytest.fixture
+def scheduler():
+    s = JobScheduler(max_workers=2, max_queue=10, resources={"cpu": 2, "llm": 1})
+    yield s
+    s.shutdown(wait=True, cancel_pending=True)
+
+
+def test_result_and_error_are_captured(scheduler):
+    ok = scheduler.submit(lambda job, x: x * 2, 21, name="doble")
+    bad = scheduler.submit(lambda job: 1 / 0, name="falla")
+
+    assert scheduler.result(ok, timeout=5) == 42
+    assert scheduler.wait(bad, timeout=5).state == JobState.ERROR
+    assert "ZeroDivisionError" in scheduler.status(bad)["error"]
+    with pytest.raises(RuntimeError, match="ZeroDivisionError"):
+        scheduler.result(bad)
+
+
+def test_queued_job_is_cancelled_immediately():
+    s = JobScheduler(max_workers=1, max_queue=10)
+    gate = threading.Event()
+    try:
+        blocker = s.submit(lambda job: gate.wait(5))
+        queued = s.submit(lambda job: "no debería ejecutarse")
+
+        assert s.cancel(queued) is True
+        assert s.status(queued)["state"] == "cancelled"
+        gate.set()
+        s.wait(blocker, timeout=5)
+        assert s.get(queued).result is None
+        assert s.cancel(blocker) is False
+    finally:
+        s.shutdown()
+
+
+def test_running_job_stops_at_next_phase(scheduler):
+    started = threading.Event()
+    release = threading.Event()
+
+    def pipeline(job):
+        job.set_state(JobState.RUNNING, "limpieza")
+        started.set()
+        release.wait(5)
+        job.set_state(JobState.TRAINING, "fine-tuning")
+        return "completo"
+
+    job_id = scheduler.submit(pipeline)
+    assert started.wait(5)
+    scheduler.cancel(job_id)
+    release.set()
+
+    job = scheduler.wait(job_id, timeout=5)
+    assert job.state == JobState.CANCELLED
+    assert job.phase == "limpieza"
+
+
+def test_llm_resource_serializes_jobs(scheduler):
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def analyze(job):
+        with job.resource("llm"):
+            with lock:
+                active.append(job.job_id)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(job.job_id)
+
+    ids = [scheduler.submit(analyze) for _ in range(3)]
+    for job_id in ids:
+        scheduler.result(job_id, timeout=5)
+    assert max(peak) == 1
+
+
+def test_full_queue_rejects_jobs():
+    s = JobScheduler(max_workers=1, max_queue=1)
+    gate = threading.Event()
+    started = threading.Event()
+    try:
+        s.submit(lambda job: (started.set(), gate.wait(5)))
+        assert started.wait(5)
+        s.submit(lambda job: None)
+        with pytest.raises(RuntimeError, match="llena"):
+            s.submit(lambda job: None)
+        assert len(s.list_jobs()) == 2
+    finally:
+        gate.set()
+        s.shutdown()
+
+
+def test_list_jobs_and_stats(scheduler):
+    ids = [scheduler.submit(lambda job: None, name=f"tarea-{i}") for i in range(3)]
+    for job_id in ids:
+        scheduler.wait(job_id, timeout=5)
+
+    jobs = scheduler.list_jobs()
+    assert [j["name"] for j in jobs] == ["tarea-0", "tarea-1", "tarea-2"]
+    assert all(j["state"] == "done" and j["run_seconds"] is not None for j in jobs)
+    assert scheduler.stats()["states"] == {"done": 3}
@@ -0,0 +1,78 @@
+# test/test_knowledge_index.py
+# pytest -v test/test_knowledge_index.py
+
+import numpy as np
+import pandas as pd
+
+from core.heavy_modules.agents.knowledge_index import (
+    HashingEmbedder, KnowledgeIndex, condense_findings, profile_dataset
+)
+from core.utils.prompt_builder import BuilderPrompt
+
+
+def _ventas(seed, rows=2_000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "monto": rng.normal(100, 10, rows).round(2),
+        "cantidad": rng.integers(1, 10, rows),
+        "region": rng.choice(["norte", "sur"], rows),
+    })
+
+
+def _sensores(seed, rows=2_000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "temperatura": rng.normal(20, 3, rows),
+        "humedad": rng.uniform(30, 90, rows),
+        "presion": rng.normal(1013, 5, rows),
+        "equipo": rng.choice(["a", "b", "c"], rows),
+    })
+
+
+ANALISIS = (
+    "**RECOMENDACIONES:** revisar montos altos.\n\n"
+    "**RESUMEN EJECUTIVO:** Las ventas se concentran en la región norte con montos estables.\n"
+)
+
+
+def test_similar_datasets_rank_first_and_near_duplicates_are_found(tmp_path):
+    index = KnowledgeIndex(index_dir=tmp_path)
+    index.add(profile_dataset(_ventas(1)), ANALISIS, session_id="s1")
+    index.add(profile_dataset(_sensores(1)), "Sensores estables.", session_id="s1")
+
+    results = index.search(profile_dataset(_ventas(2)), k=2)
+    assert results[0][1]["analysis"] == ANALISIS
+    assert results[0][0] > results[1][0]
+
+    assert index.find_duplicate(profile_dataset(_ventas(1)))["analysis"] == ANALISIS
+    assert index.find_duplicate(profile_dataset(_ventas(1).rename(columns={"monto": "importe"}))) is None
+
+
+def test_index_persists_and_reembeds_on_embedder_change(tmp_path):
+    index = KnowledgeIndex(index_dir=tmp_path)
+    index.add(profile_dataset(_ventas(1)), ANALISIS)
+
+    reloaded = KnowledgeIndex(index_dir=tmp_path)
+    assert len(reloaded) == 1
+    assert reloaded.search(profile_dataset(_ventas(1)), k=1)[0][0] > 0.999
+
+    class OtroEmbedder(HashingEmbedder):
+        name = "otro"
+
+    other = KnowledgeIndex(index_dir=tmp_path, embedder=OtroEmbedder(dim=64))
+    assert other.search(profile_dataset(_ventas(1)), k=1)[0][0] > 0.999
+
+
+def test_condensed_findings_enter_the_prompt(tmp_path):
+    index = KnowledgeIndex(index_dir=tmp_path, max_entries=1)
+    index.add(profile_dataset(_sensores(1)), "viejo")
+    index.add(profile_dataset(_ventas(1)), ANALISIS)
+    assert len(index) == 1
+
+    condensed = condense_findings(index.search(profile_dataset(_ventas(3)), k=3))
+    assert "región norte" in condensed and "RECOMENDACIONES" not in condensed
+
+    df = _ventas(3)
+    prompt = BuilderPrompt.build_prompt_chain(df, context={"hallazgos_previos": condensed, "vacio": ""})
+    assert "CONTEXTO PREVIO" in prompt and "región norte" in prompt and "vacio" not in prompt
+    assert "CONTEXTO PREVIO" not in BuilderPrompt.build_prompt_chain(df, context={"hallazgos_previos": ""})
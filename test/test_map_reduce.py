@@ -0,0 +1,96 @@
+# test/test_map_reduce.py
+# pytest -v test/test_map_reduce.py
+
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.heavy_modules.agents.chain_manager import ChainManager
+from core.heavy_modules.agents.map_reduce import cross_group_pairs, partition_columns
+from core.heavy_modules.analytics.correlation_analysis import compute_correlation_result
+from core.heavy_modules.inference.inference_scheduler import InferenceScheduler
+from core.heavy_modules.inference.model_pool import ModelPool
+from core.heavy_modules.inference.response_cache import ResponseCache
+from core.utils.prompt_builder import BuilderPrompt
+
+
+def _erp(n_numeric=150, rows=300, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(0, 1, rows)
+    data = {f"m{i}": rng.normal(50, 5, rows) for i in range(n_numeric)}
+    data.update({f"ventas_{k}": base * (k + 1) + rng.normal(0, 0.01, rows) for k in range(3)})
+    data["region"] = rng.choice(["norte", "sur"], rows)
+    data["cliente"] = rng.choice(["a", "b", "c"], rows)
+    data["fecha_alta"] = pd.date_range("2024-01-01", periods=rows, freq="D")
+    return pd.DataFrame(data)
+
+
+class FakeLlama:
+    """Devuelve un hallazgo por prompt y registra los prompts (y sus hilos)."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def tokenize(self, data, add_bos=True):
+        # ~3 bytes por token
+        return [data[i:i + 3] for i in range(0, len(data), 3)]
+
+    def __call__(self, prompt, stream=False, **params):
+        self.log.append((threading.current_thread().name, prompt, params["max_tokens"]))
+        if "HALLAZGOS DEL GRUPO" in prompt:
+            return {"choices": [{"text": "- hallazgo final"}]}
+        group = prompt.split("grupo: ")[1].split(" ")[0] if "grupo: " in prompt else "único"
+        return {"choices": [{"text": f"- hallazgo {group}"}]}
+
+
+@pytest.fixture
+def chain(tmp_path):
+    log = []
+    scheduler = InferenceScheduler("modelo.gguf", n_parallel=3, n_threads=1,
+                                   pool=ModelPool(loader=lambda *args: FakeLlama(log)))
+    manager = ChainManager.__new__(ChainManager)
+    manager.scheduler = scheduler
+    manager.prompt_builder = BuilderPrompt()
+    manager.response_cache = ResponseCache(db_path=tmp_path / "cache.sqlite")
+    manager.model_digest = "modelo"
+    manager.memory_context = {}
+    manager.trace = []
+    manager.last_prompt = None
+    manager.calls = log
+    yield manager
+    scheduler.shutdown()
+
+
+def test_partition_keeps_correlated_columns_together_and_respects_size():
+    df = _erp()
+    corr = compute_correlation_result(df)
+    groups = partition_columns(df, corr, max_columns=40)
+
+    assert all(len(g.columns) <= 40 for g in groups)
+    assert sorted(c for g in groups for c in g.columns) == sorted(df.columns)
+    assert any({"ventas_0", "ventas_1", "ventas_2"} <= set(g.columns) for g in groups)
+    assert any(set(g.columns) == {"region", "cliente"} for g in groups)
+    assert cross_group_pairs(corr, groups) == []
+
+
+def test_wide_dataset_goes_through_map_reduce_in_parallel(chain):
+    df = _erp()
+    result = chain.execute_chain(df=df)
+
+    map_calls = [c for c in chain.calls if c[2] == 256]
+    reduce_calls = [c for c in chain.calls if "HALLAZGOS DEL GRUPO" in c[1]]
+    assert result == "- hallazgo final"
+    assert len(map_calls) >= 4 and len(reduce_calls) == 1
+    assert len({thread for thread, _, _ in map_calls}) > 1
+    # Cada prompt cabe en el contexto dejando lugar para la salida
+    count = chain.scheduler.count_tokens
+    assert all(count(prompt) + max_tokens <= chain.scheduler.n_ctx for _, prompt, max_tokens in chain.calls)
+    assert "- hallazgo 1" in reduce_calls[0][1]
+
+
+def test_narrow_dataset_uses_single_prompt(chain):
+    chain.execute_chain(df=_erp(n_numeric=5))
+    assert len(chain.calls) == 1 and chain.calls[0][2] == 512
+    assert not chain.last_prompt.truncated
@@ -0,0 +1,61 @@
+# test/test_memory_manager.py
+# pytest -v test/test_memory_manager.py
+
+import json
+import threading
+
+from core.heavy_modules.agents.memory_manager import MemoryManager
+
+
+def test_store_upserts_keys_and_keeps_history(tmp_path):
+    memory = MemoryManager(memory_dir=tmp_path, max_versions=2)
+    memory.store_context("s1", {"analysis": "v1", "rows": 10})
+    memory.store_context("s1", {"analysis": "v2"})
+    memory.store_context("s1", {"analysis": "v3", "rows": 10})
+
+    assert memory.recall_context("s1") == {"analysis": "v3", "rows": 10}
+    history = memory.get_history("s1", key="analysis")
+    # Solo se conservan las dos últimas versiones; el valor repetido de 'rows' no crea versión
+    assert [(h["version"], h["value"]) for h in history] == [(3, "v3"), (2, "v2")]
+    assert len(memory.get_history("s1", key="rows")) == 1
+    assert memory.recall_context("otra") == {}
+
+
+def test_recall_cache_sees_writes_from_other_connections(tmp_path):
+    first = MemoryManager(memory_dir=tmp_path)
+    second = MemoryManager(memory_dir=tmp_path)
+
+    first.store_context("s1", {"analysis": "inicial"})
+    assert second.recall_context("s1") == {"analysis": "inicial"}
+    first.store_context("s1", {"analysis": "nueva"})
+    assert second.recall_context("s1") == {"analysis": "nueva"}
+
+    second.clear_memory("s1")
+    assert first.recall_context("s1") == {}
+    assert first.get_history("s1") == []
+
+
+def test_concurrent_writers_do_not_lose_keys(tmp_path):
+    managers = [MemoryManager(memory_dir=tmp_path) for _ in range(4)]
+
+    def writer(i, memory):
+        for j in range(25):
+            memory.store_context("compartida", {f"w{i}_{j}": j})
+
+    threads = [threading.Thread(target=writer, args=(i, m)) for i, m in enumerate(managers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(MemoryManager(memory_dir=tmp_path).recall_context("compartida")) == 100
+
+
+def test_legacy_json_is_migrated(tmp_path):
+    with open(tmp_path / "antigua.json", "w", encoding="utf-8") as f:
+        json.dump({"analysis": "previo"}, f)
+
+    memory = MemoryManager(memory_dir=tmp_path)
+    assert memory.recall_context("antigua") == {"analysis": "previo"}
+    assert not (tmp_path / "antigua.json").exists()
+    assert memory.list_sessions() == ["antigua"]
@@ -66,3 +66,14 @@ def test_generate_from_prompt_empty_prompt(model_manager):
     result = model_manager.generate_from_prompt("")
     assert result == ""
     mock_model.generate_text.assert_called_once_with("", max_tokens=512, temperature=0.7)
+
+def test_stream_from_prompt_yields_tokens(model_manager):
+    """Verifica que stream_from_prompt entrega los tokens a medida que se producen"""
+    mock_model = MagicMock()
+    mock_model.stream_text.return_value = iter(["Texto", " en", " streaming"])
+    model_manager.model = mock_model
+
+    stream = model_manager.stream_from_prompt("Resume")
+    assert list(stream) == ["Texto", " en", " streaming"]
+    assert stream.text == "Texto en streaming"
+    assert stream.stats.n_tokens == 3
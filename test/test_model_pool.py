@@ -0,0 +1,66 @@
+# test/test_model_pool.py
+# pytest -v test/test_model_pool.py
+
+import threading
+import pytest
+from unittest.mock import MagicMock
+
+from core.heavy_modules.inference.model_pool import ModelPool
+
+
+@pytest.fixture
+def loader():
+    """Loader simulado: devuelve un Llama falso por cada carga."""
+    return MagicMock(side_effect=lambda *args: MagicMock(name=f"llm_{args}"))
+
+
+def test_same_configuration_is_loaded_once(loader):
+    pool = ModelPool(loader=loader)
+    lease_a = pool.acquire("modelo.gguf", n_ctx=4096, n_threads=6, n_gpu_layers=20)
+    lease_b = pool.acquire("modelo.gguf", n_ctx=4096, n_threads=6, n_gpu_layers=20)
+
+    assert lease_a.llm is lease_b.llm
+    assert loader.call_count == 1
+
+
+def test_different_configuration_gets_its_own_model(loader):
+    pool = ModelPool(loader=loader)
+    lease_a = pool.acquire("modelo.gguf", n_ctx=4096)
+    lease_b = pool.acquire("modelo.gguf", n_ctx=8192)
+
+    assert lease_a.llm is not lease_b.llm
+    assert loader.call_count == 2
+
+
+def test_concurrent_acquire_loads_once(loader):
+    pool = ModelPool(loader=loader)
+    leases = []
+
+    def worker():
+        leases.append(pool.acquire("modelo.gguf"))
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert loader.call_count == 1
+    assert len({id(lease.llm) for lease in leases}) == 1
+
+
+def test_stats_and_release(loader):
+    pool = ModelPool(loader=loader)
+    with pool.acquire("modelo.gguf") as lease:
+        stats = next(iter(pool.stats().values()))
+        assert stats["active_leases"] == 1
+        assert "load_seconds" in stats and "rss_delta_mb" in stats
+
+    stats = next(iter(pool.stats().values()))
+    assert stats["active_leases"] == 0
+    assert stats["total_leases"] == 1
+    with pytest.raises(RuntimeError):
+        _ = lease.llm
+
+    assert pool.evict_idle() == 1
+    assert pool.stats() == {}
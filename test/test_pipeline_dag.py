@@ -0,0 +1,178 @@
+# test/test_pipeline_dag.py
+# pytest -v test/test_pipeline_dag.py
+
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from core.controller.job_scheduler import JobScheduler, JobState
+from core.controller.pipeline_dag import ArtifactStore, PipelineDAG, Stage
+
+
+def _clean(file_path):
+    return pd.read_csv(file_path).dropna()
+
+
+def _total(clean):
+    return float(clean["x"].sum())
+
+
+def _count(clean):
+    return len(clean)
+
+
+def _report(total, count):
+    return f"{count} filas, total {total}"
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "datos.csv"
+    pd.DataFrame({"x": [1.0, 2.0, None, 4.0]}).to_csv(path, index=False)
+    return path
+
+
+def _dag(tmp_path, report_version="1", **overrides):
+    stages = {
+        "clean": Stage("clean", _clean, inputs=("file_path",)),
+        "total": Stage("total", _total, inputs=("clean",)),
+        "count": Stage("count", _count, inputs=("clean",)),
+        "report": Stage("report", _report, inputs=("total", "count"), version=report_version),
+    }
+    stages.update(overrides)
+    return PipelineDAG(stages.values(), store=ArtifactStore(tmp_path / "artifacts"))
+
+
+def test_rerun_reuses_every_stage(tmp_path, source):
+    first = _dag(tmp_path).run({"file_path": str(source)})
+    assert first.outputs == {"report": "3 filas, total 7.0"}
+    assert sorted(first.executed) == ["clean", "count", "report", "total"]
+
+    second = _dag(tmp_path).run({"file_path": str(source)})
+    assert second.executed == []
+    assert second.outputs == first.outputs
+    assert isinstance(ArtifactStore(tmp_path / "artifacts").load("clean", second.fingerprints["clean"]),
+                      pd.DataFrame)
+
+
+def test_version_change_reruns_only_that_stage(tmp_path, source):
+    _dag(tmp_path).run({"file_path": str(source)})
+    run = _dag(tmp_path, report_version="2").run({"file_path": str(source)})
+    assert run.executed == ["report"]
+
+
+def test_source_change_invalidates_downstream(tmp_path, source):
+    _dag(tmp_path).run({"file_path": str(source)})
+    pd.DataFrame({"x": [10.0, 20.0]}).to_csv(source, index=False)
+    run = _dag(tmp_path).run({"file_path": str(source)})
+    assert sorted(run.executed) == ["clean", "count", "report", "total"]
+    assert run.outputs["report"] == "2 filas, total 30.0"
+
+
+def test_force_reruns_stage_and_descendants(tmp_path, source):
+    _dag(tmp_path).run({"file_path": str(source)})
+    run = _dag(tmp_path).run({"file_path": str(source)}, force=["total"])
+    assert sorted(run.executed) == ["report", "total"]
+
+
+def test_failure_keeps_completed_artifacts(tmp_path, source):
+    def broken(clean):
+        raise RuntimeError("fallo de conteo")
+
+    dag = _dag(tmp_path, count=Stage("count", broken, inputs=("clean",)))
+    with pytest.raises(RuntimeError, match="fallo de conteo"):
+        dag.run({"file_path": str(source)})
+
+    run = _dag(tmp_path).run({"file_path": str(source)})
+    assert sorted(run.executed) == ["count", "report"]
+
+
+def test_independent_stages_run_concurrently(tmp_path, source):
+    barrier = threading.Barrier(2, timeout=5)
+
+    def total(clean):
+        barrier.wait()
+        return _total(clean)
+
+    def count(clean):
+        barrier.wait()
+        return _count(clean)
+
+    dag = _dag(tmp_path, total=Stage("total", total, inputs=("clean",)),
+               count=Stage("count", count, inputs=("clean",)))
+    assert dag.run({"file_path": str(source)}).outputs["report"] == "3 filas, total 7.0"
+
+
+def test_cycles_and_unknown_inputs_are_rejected(tmp_path):
+    dag = PipelineDAG([Stage("a", _total, inputs=("b",)), Stage("b", _total, inputs=("a",))],
+                      store=ArtifactStore(tmp_path))
+    with pytest.raises(ValueError, match="Ciclo"):
+        dag.order()
+    with pytest.raises(ValueError, match="desconocidas"):
+        _dag(tmp_path).run({})
+
+
+def test_stages_report_state_to_job(tmp_path, source):
+    phases = []
+
+    def train(clean):
+        phases.append(job_ref[0].state)
+        return len(clean)
+
+    dag = _dag(tmp_path, count=Stage("count", train, inputs=("clean",), resource="training",
+                                     state=JobState.TRAINING))
+    dag.max_workers = 1
+    scheduler = JobScheduler(max_workers=1)
+    job_ref = []
+
+    def pipeline(job):
+        job_ref.append(job)
+        return dag.run({"file_path": str(source)}, job=job).outputs
+
+    try:
+        assert scheduler.result(scheduler.submit(pipeline), timeout=10) == {"report": "3 filas, total 7.0"}
+    finally:
+        scheduler.shutdown()
+    assert phases == [JobState.TRAINING]
+
+
+def test_eviction_is_least_recently_used_and_skips_pinned(tmp_path):
+    store = ArtifactStore(tmp_path / "artifacts", keep=2)
+    store.save("etapa", "a", 1)
+    store.save("etapa", "b", 2)
+    old = time.time() - 100
+    for name in ("a", "b"):
+        os.utime(tmp_path / "artifacts" / "etapa" / f"{name}.pkl", (old, old))
+
+    assert store.load("etapa", "a") == 1   # "a" pasa a ser el más reciente
+    store.save("etapa", "c", 3)
+    assert store.find("etapa", "a") and store.find("etapa", "b") is None
+
+    with store.pinned([("etapa", "a")]):
+        os.utime(tmp_path / "artifacts" / "etapa" / "a.pkl", (old, old))
+        store.save("etapa", "d", 4)
+        # "a" es el menos usado pero está fijado: se conserva aunque supere keep
+        assert store.load("etapa", "a") == 1
+    assert sorted(p.stem for p in (tmp_path / "artifacts" / "etapa").glob("*.pkl")) == ["a", "c", "d"]
+
+
+def _write_count(clean, workdir):
+    path = workdir / "conteo.txt"
+    path.write_text(str(len(clean)))
+    return str(path)
+
+
+def test_workdir_is_per_fingerprint(tmp_path, source):
+    other = tmp_path / "otros.csv"
+    pd.DataFrame({"x": [5.0, 6.0]}).to_csv(other, index=False)
+    dag = _dag(tmp_path, count=Stage("count", _write_count, inputs=("clean",), workdir=True))
+
+    first = dag.run({"file_path": str(source)}, targets=["count"]).outputs["count"]
+    second = dag.run({"file_path": str(other)}, targets=["count"]).outputs["count"]
+    assert first != second
+    assert open(first).read() == "3" and open(second).read() == "2"
+    # El artefacto cacheado sigue apuntando a su propio archivo
+    assert dag.run({"file_path": str(source)}, targets=["count"]).outputs["count"] == first
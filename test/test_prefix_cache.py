@@ -0,0 +1,118 @@
+# test/test_prefix_cache.py
+# pytest -v test/test_prefix_cache.py
+
+import numpy as np
+import pytest
+
+from core.heavy_modules.inference.inference_scheduler import InferenceScheduler
+from core.heavy_modules.inference.model_pool import ModelPool
+from core.heavy_modules.inference.prefix_cache import PrefixStateCache
+from core.utils.prompt_budget import PromptSection, assemble_prompt
+
+PREFIX = "Instrucciones fijas del análisis. " * 20 + "\n\n"
+
+
+class FakeLlama:
+    """
+    Imita la reutilización de prefijo de llama-cpp-python: solo se evalúan los
+    tokens que no coinciden con los que ya están en el contexto.
+    """
+
+    def __init__(self):
+        self.input_ids = np.zeros(0, dtype=np.intc)
+        self.evaluated = 0
+
+    @property
+    def n_tokens(self):
+        return len(self.input_ids)
+
+    def tokenize(self, data, add_bos=True):
+        return [1] + [hash(w) % 1000 + 2 for w in data.decode("utf-8").split(" ")]
+
+    def reset(self):
+        self.input_ids = np.zeros(0, dtype=np.intc)
+
+    def eval(self, tokens):
+        self.evaluated += len(tokens)
+        self.input_ids = np.concatenate([self.input_ids, np.asarray(tokens, dtype=np.intc)])
+
+    def save_state(self):
+        return {"input_ids": self.input_ids.copy()}
+
+    def load_state(self, state):
+        self.input_ids = state["input_ids"].copy()
+
+    def __call__(self, prompt, stream=False, **params):
+        tokens = np.asarray(self.tokenize(prompt.encode("utf-8")), dtype=np.intc)
+        common = 0
+        for a, b in zip(self.input_ids, tokens):
+            if a != b:
+                break
+            common += 1
+        self.input_ids = self.input_ids[:common]
+        self.eval(tokens[common:])
+        return {"choices": [{"text": "ok"}]}
+
+
+@pytest.fixture
+def model_file(tmp_path):
+    path = tmp_path / "modelo.gguf"
+    path.write_bytes(b"gguf" * 100)
+    return str(path)
+
+
+def _scheduler(model_file, cache, instances):
+    def loader(*args):
+        instances.append(FakeLlama())
+        return instances[-1]
+    return InferenceScheduler(model_file, n_parallel=1, n_threads=1, pool=ModelPool(loader=loader),
+                              prefix_cache=cache)
+
+
+def test_prefix_state_is_reused_in_context_and_from_disk(tmp_path, model_file):
+    prefix_tokens = len(FakeLlama().tokenize(PREFIX.encode("utf-8")))
+    instances = []
+    cache = PrefixStateCache(cache_dir=tmp_path / "kv")
+    scheduler = _scheduler(model_file, cache, instances)
+    try:
+        scheduler.generate(PREFIX + "datos A", prefix=PREFIX)
+        scheduler.generate(PREFIX + "datos B", prefix=PREFIX)
+    finally:
+        scheduler.shutdown()
+    # El prefijo se evaluó una sola vez; la segunda petición lo encontró en el contexto
+    assert instances[0].evaluated < 2 * prefix_tokens
+    assert cache.stats()["misses"] == 1 and cache.stats()["disk_entries"] == 1
+
+    # Otro proceso (caché y modelo nuevos) restaura el estado desde disco
+    instances = []
+    fresh = PrefixStateCache(cache_dir=tmp_path / "kv")
+    scheduler = _scheduler(model_file, fresh, instances)
+    try:
+        assert scheduler.generate(PREFIX + "datos C", prefix=PREFIX) == "ok"
+    finally:
+        scheduler.shutdown()
+    assert instances[0].evaluated < 10
+    assert fresh.stats()["hits_disk"] == 1
+
+
+def test_mismatched_or_broken_prefix_falls_back_to_full_prefill(tmp_path, model_file):
+    instances = []
+    scheduler = _scheduler(model_file, PrefixStateCache(cache_dir=tmp_path / "kv"), instances)
+    try:
+        # El prompt no empieza con el prefijo: se ignora
+        assert scheduler.generate("otro prompt", prefix=PREFIX) == "ok"
+        instances[0].save_state = None  # save_state falla: la petición sigue igual
+        assert scheduler.generate(PREFIX + "datos", prefix=PREFIX) == "ok"
+    finally:
+        scheduler.shutdown()
+    assert scheduler.prefix_cache.stats()["errors"] == 1
+
+
+def test_budgeted_prompt_exposes_fixed_prefix():
+    sections = [
+        PromptSection("instrucciones", text="Reglas fijas."),
+        PromptSection("datos", header="DATOS:\n", lines=["a", "b"]),
+    ]
+    result = assemble_prompt(sections)
+    assert result.prefix == "Reglas fijas.\n\n" and result.text.startswith(result.prefix)
+    assert assemble_prompt(sections[:1]).prefix == ""
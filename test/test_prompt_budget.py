@@ -0,0 +1,61 @@
+# test/test_prompt_budget.py
+# pytest -v test/test_prompt_budget.py
+
+import numpy as np
+import pandas as pd
+
+from core.heavy_modules.analytics.stats_engine import compute_numeric_stats
+from core.heavy_modules.analytics.correlation_analysis import compute_correlation_result
+from core.utils.prompt_budget import (
+    PromptSection, assemble_prompt, estimate_tokens, rank_numeric_columns
+)
+from core.utils.prompt_builder import BuilderPrompt
+
+
+def _wide(cols=120, rows=500, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {f"x{i}": rng.normal(100, 1, rows) for i in range(cols)}
+    data["volatil"] = rng.normal(10, 50, rows)
+    data["base"] = rng.normal(0, 1, rows)
+    data["espejo"] = data["base"] * 2 + rng.normal(0, 0.01, rows)
+    return pd.DataFrame(data)
+
+
+def test_assemble_respects_budget_and_priorities():
+    sections = [
+        PromptSection("fijo", text="Instrucciones " * 20, priority=10),
+        PromptSection("a", header="A:\n", lines=[f"linea a{i} " * 5 for i in range(50)], priority=2),
+        PromptSection("b", header="B:\n", lines=[f"linea b{i} " * 5 for i in range(50)], priority=1,
+                      summarize=lambda rest: f"… y {len(rest)} de b."),
+    ]
+    result = assemble_prompt(sections, budget=300, min_lines=2)
+
+    assert result.tokens <= 300 and result.tokens == estimate_tokens(result.text)
+    assert result.kept["a"] > result.kept["b"] >= 2
+    assert f"… y {result.dropped['b']} de b." in result.text
+    assert "… y" in result.text and result.truncated
+
+    full = assemble_prompt(sections, budget=10 ** 6)
+    assert not full.truncated and "linea b49" in full.text
+
+
+def test_rank_prefers_variable_and_correlated_columns():
+    df = _wide(cols=10)
+    stats = compute_numeric_stats(df)
+    ranked = rank_numeric_columns(stats, compute_correlation_result(df))
+    assert set(ranked[:3]) == {"volatil", "base", "espejo"}
+
+
+def test_wide_prompt_fits_budget_and_aggregates_rest():
+    df = _wide()
+    unbounded = BuilderPrompt.build_prompt_chain(df, token_budget=None)
+    prompt = BuilderPrompt.build_prompt_chain(df, token_budget=1200)
+
+    assert estimate_tokens(unbounded) > 1200 >= estimate_tokens(prompt)
+    assert "**volatil:**" in prompt and "base ↔ espejo" in prompt
+    assert "columnas numéricas más con distribución similar" in prompt
+    assert "TUS TAREAS Y OBJETIVOS" in prompt and "REGLAS:" in prompt
+
+    # Con un tokenizer propio se respeta su conteo
+    prompt_chars = BuilderPrompt.build_prompt_chain(df, token_budget=3000, count_tokens=len)
+    assert len(prompt_chars) <= 3000
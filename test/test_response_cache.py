@@ -0,0 +1,63 @@
+# test/test_response_cache.py
+# pytest -v test/test_response_cache.py
+
+import pytest
+
+from core.heavy_modules.inference.response_cache import ResponseCache, model_file_digest
+
+GREEDY = {"max_tokens": 64, "temperature": 0.0}
+SAMPLED = {"max_tokens": 64, "temperature": 0.7}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(db_path=tmp_path / "cache.sqlite", max_memory_items=2)
+
+
+def test_deterministic_responses_are_cached(cache):
+    assert cache.get("modelo", GREEDY, "hash1") is None
+    cache.put("modelo", GREEDY, "hash1", "respuesta")
+
+    assert cache.get("modelo", GREEDY, "hash1") == "respuesta"
+    # Cambiar modelo o parámetros invalida la clave
+    assert cache.get("otro_modelo", GREEDY, "hash1") is None
+    assert cache.get("modelo", {**GREEDY, "max_tokens": 32}, "hash1") is None
+
+
+def test_sampled_responses_require_opt_in(cache):
+    cache.put("modelo", SAMPLED, "hash1", "muestreada")
+    assert cache.get("modelo", SAMPLED, "hash1", allow_sampled=True) is None
+
+    cache.put("modelo", SAMPLED, "hash1", "muestreada", allow_sampled=True)
+    assert cache.get("modelo", SAMPLED, "hash1") is None
+    assert cache.get("modelo", SAMPLED, "hash1", allow_sampled=True) == "muestreada"
+
+
+def test_disk_tier_survives_new_instance(tmp_path):
+    db = tmp_path / "cache.sqlite"
+    ResponseCache(db_path=db).put("modelo", GREEDY, "hash1", "persistida")
+
+    fresh = ResponseCache(db_path=db)
+    assert fresh.get("modelo", GREEDY, "hash1") == "persistida"
+    assert fresh.stats()["hits_disk"] == 1
+
+
+def test_ttl_and_size_eviction(tmp_path):
+    expiring = ResponseCache(db_path=tmp_path / "ttl.sqlite", ttl_seconds=-1)
+    expiring.put("modelo", GREEDY, "hash1", "vieja")
+    assert expiring.get("modelo", GREEDY, "hash1") is None
+
+    small = ResponseCache(db_path=tmp_path / "small.sqlite", max_disk_bytes=10)
+    small.put("modelo", GREEDY, "a", "0123456789")
+    small.put("modelo", GREEDY, "b", "abcdefghij")
+    stats = small.stats()
+    assert stats["disk_entries"] == 1
+    assert stats["evictions"] == 1
+
+
+def test_model_file_digest_changes_with_content(tmp_path):
+    model = tmp_path / "modelo.gguf"
+    model.write_bytes(b"pesos-v1")
+    first = model_file_digest(str(model))
+    model.write_bytes(b"pesos-v2-distintos")
+    assert model_file_digest(str(model)) != first
@@ -0,0 +1,46 @@
+# test/test_run_benchmarks.py
+# pytest -v test/test_run_benchmarks.py
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from scripts import run_benchmarks
+
+
+def test_make_dataset_is_reproducible_and_dirty():
+    df = run_benchmarks.make_dataset(5_000, 12, seed=7)
+    again = run_benchmarks.make_dataset(5_000, 12, seed=7)
+
+    pd.testing.assert_frame_equal(df, again)
+    assert df.shape == (5_000, 12)
+    assert df.duplicated().sum() > 0
+    assert df["num_0"].isna().mean() > 0
+    assert isinstance(df["cat_0"].dtype, pd.CategoricalDtype)
+    assert np.issubdtype(df["fecha"].dtype, np.datetime64)
+
+
+def test_run_suite_writes_comparable_results(tmp_path):
+    report = run_benchmarks.run_suite({"t": (800, 6)}, repeat=1, datasets_dir=tmp_path / "datasets")
+    results = {r["benchmark"]: r for r in report["results"]}
+
+    assert set(results) == {b.name for b in run_benchmarks.BENCHMARKS}
+    assert results["load_csv"]["units"] == 800
+    assert results["llm_stub"]["unit"] == "prompts"
+    assert all(r["peak_alloc_mb"] is not None and r["throughput_per_s"] > 0 for r in results.values())
+
+    path = run_benchmarks.save_results(report, tmp_path / "out")
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["meta"]["seed"] == run_benchmarks.SEED
+
+
+def test_compare_flags_regressions():
+    def report(seconds):
+        return {"results": [{"scale": "xs", "benchmark": name, "seconds": {"median": s}}
+                            for name, s in seconds.items()]}
+
+    rows = run_benchmarks.compare_results(report({"load_csv": 1.3, "clean_data": 1.05, "nuevo": 1.0}),
+                                          report({"load_csv": 1.0, "clean_data": 1.0}), threshold=0.15)
+    flags = {row["benchmark"]: row["regression"] for row in rows}
+    assert flags == {"load_csv": True, "clean_data": False}
@@ -0,0 +1,51 @@
+# test/test_stats_engine.py
+# pytest -v test/test_stats_engine.py
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.stats import zscore
+
+from core.heavy_modules.analytics.stats_engine import compute_numeric_stats
+
+
+@pytest.fixture
+def mixed_df():
+    rng = np.random.default_rng(42)
+    df = pd.DataFrame({
+        "entero": rng.integers(0, 5, 500),
+        "normal": rng.normal(size=500),
+        "con_nulos": rng.uniform(0, 10, 500),
+        "vacia": [np.nan] * 500,
+        "texto": ["a"] * 500,
+    })
+    df.loc[::9, "con_nulos"] = np.nan
+    df.loc[3, "normal"] = 40.0
+    return df
+
+
+def test_matches_pandas_describe(mixed_df):
+    stats = compute_numeric_stats(mixed_df)
+    expected = mixed_df.describe().T
+    expected["median"] = mixed_df.median(numeric_only=True)
+
+    assert stats.columns == ["entero", "normal", "con_nulos", "vacia"]
+    pd.testing.assert_frame_equal(stats.to_frame()[expected.columns], expected, check_names=False)
+
+
+def test_mode_and_outliers_match_pandas_and_scipy(mixed_df):
+    stats = compute_numeric_stats(mixed_df)
+    for col in ["entero", "normal", "con_nulos"]:
+        values = mixed_df[col].dropna()
+        row = stats.row(col)
+        assert row["mode"] == values.mode().iloc[0]
+        assert row["outliers"] == int((np.abs(zscore(values)) > 3).sum())
+        assert row["nulls"] == mixed_df[col].isna().sum()
+
+    assert np.isnan(stats.row("vacia")["mode"])
+
+
+def test_empty_frame():
+    stats = compute_numeric_stats(pd.DataFrame({"x": pd.Series([], dtype=float)}))
+    assert stats.row("x")["count"] == 0
+    assert np.isnan(stats.row("x")["mean"])
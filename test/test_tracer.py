@@ -0,0 +1,122 @@
+# test/test_tracer.py
+# pytest -v test/test_tracer.py
+
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from core.controller.pipeline_dag import ArtifactStore, PipelineDAG, Stage
+from core.utils.tracer import Tracer, traced, tracer
+
+
+def test_disabled_tracer_records_nothing():
+    t = Tracer(enabled=False)
+    with t.span("nada") as span:
+        span.set(rows=10)
+    assert t.spans() == []
+
+
+def test_spans_nest_and_measure():
+    t = Tracer(enabled=True)
+    with t.span("pipeline", "stage"):
+        with t.span("load_data", "data", rows=100) as span:
+            span.add("completion_tokens", 3)
+            span.add("completion_tokens", 2)
+            sum(i * i for i in range(100_000))
+
+    inner, outer = t.spans()
+    assert (inner.name, inner.parent, inner.depth) == ("load_data", "pipeline", 1)
+    assert (outer.parent, outer.depth) == (None, 0)
+    assert inner.attrs == {"rows": 100, "completion_tokens": 5}
+    assert inner.cpu_ms > 0 and outer.wall_ms >= inner.wall_ms
+
+
+def test_error_is_recorded_and_reraised():
+    t = Tracer(enabled=True)
+    with pytest.raises(ValueError):
+        with t.span("falla"):
+            raise ValueError("dato inválido")
+    assert t.spans()[0].error == "ValueError: dato inválido"
+
+
+def test_traced_decorator_records_rows():
+    @traced("filtrar", "data")
+    def filtrar(df):
+        return df[df["x"] > 1]
+
+    tracer.enable()
+    tracer.clear()
+    try:
+        out = filtrar(pd.DataFrame({"x": np.arange(5)}))
+        span = tracer.spans()[-1]
+    finally:
+        tracer.disable()
+        tracer.clear()
+    assert len(out) == 3
+    assert (span.name, span.category) == ("filtrar", "data")
+    assert span.attrs == {"rows": 5, "rows_out": 3}
+
+
+def test_export_jsonl_and_chrome_trace(tmp_path):
+    t = Tracer(enabled=True)
+
+    def worker():
+        with t.span("llm.generate", "llm", prompt_tokens=12):
+            pass
+
+    with t.span("analysis", "stage"):
+        thread = threading.Thread(target=worker, name="llm-worker-0")
+        thread.start()
+        thread.join()
+
+    paths = t.export(prefix="prueba", output_dir=tmp_path)
+    records = [json.loads(line) for line in open(paths["jsonl"], encoding="utf-8")]
+    assert [r["name"] for r in records] == ["llm.generate", "analysis"]
+    assert "started_at" in records[0]
+
+    with open(paths["chrome"], encoding="utf-8") as f:
+        trace = json.load(f)
+    complete = [e for e in trace["traceEvents"] if e["ph"] == "X"]
+    names = {e["args"]["name"] for e in trace["traceEvents"] if e["ph"] == "M"}
+    assert {e["name"] for e in complete} == {"llm.generate", "analysis"}
+    assert all(e["dur"] >= 0 and "cpu_ms" in e["args"] for e in complete)
+    assert "llm-worker-0" in names
+
+    summary = {e["name"]: e for e in t.summary()}
+    assert summary["llm.generate"]["prompt_tokens"] == 12
+
+
+def test_job_traces_are_exported_separately(tmp_path):
+    dag = PipelineDAG([
+        Stage("doble", lambda x: x * 2, inputs=("x",)),
+        Stage("suma", lambda doble: doble + 1, inputs=("doble",)),
+    ], store=ArtifactStore(tmp_path / "artifacts"))
+
+    def job(job_id, x):
+        with tracer.bind(job_id):
+            dag.run({"x": x})
+
+    tracer.enable()
+    tracer.clear()
+    try:
+        threads = [threading.Thread(target=job, args=(f"job-{i}", i)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with tracer.span("fuera de trabajos"):
+            pass
+        paths = tracer.export(prefix="job-0", output_dir=tmp_path, trace_id="job-0")
+        summary = tracer.summary("job-1")
+    finally:
+        tracer.disable()
+        tracer.clear()
+
+    records = [json.loads(line) for line in open(paths["jsonl"], encoding="utf-8")]
+    # Las etapas corren en hilos del DAG y aun así quedan en la traza de su trabajo
+    assert sorted(r["name"] for r in records) == ["stage:doble", "stage:suma"]
+    assert {r["trace_id"] for r in records} == {"job-0"}
+    assert {e["name"]: e["calls"] for e in summary} == {"stage:doble": 1, "stage:suma": 1}